@@ -0,0 +1,80 @@
+"""Measure allocations and CPU time on the per-session path.
+
+Runs get_session_config() against the stand-in API's in-memory transport,
+so only SDK and httpx work is measured, and reports:
+
+- blocks and bytes allocated by SDK code that are alive when each request is
+  sent (the figure tests/test_allocations.py guards), with their sources;
+- the tracemalloc peak above baseline during one session, httpx included;
+- mean time per session.
+
+    PYTHONPATH=src python benchmarks/bench_allocations.py
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+import httpx
+
+from orga_ai import OrgaAI, OrgaAIConfig
+from orga_ai.testing import FakeOrgaAPI
+
+SDK_FRAMES = [
+    tracemalloc.Filter(True, "*orga_ai*"),
+    tracemalloc.Filter(False, "*orga_ai*testing.py"),
+]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=5000, help="timed sessions")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites to list")
+    args = parser.parse_args()
+
+    api = FakeOrgaAPI()
+    config = OrgaAIConfig(api_key="bench", user_email="bench@example.com")
+    client = OrgaAI(config)
+    client._client = httpx.AsyncClient(transport=api.mock_transport())
+    for _ in range(10):
+        await client.get_session_config()
+
+    snapshots = []
+
+    def on_request(request: httpx.Request) -> None:
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces(SDK_FRAMES)
+            snapshots.append((f"{request.method} {request.url.path}", snapshot))
+
+    api.on_request = on_request
+    tracemalloc.start(1)
+    await client.get_session_config()
+    api.on_request = None
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await client.get_session_config()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    print("SDK blocks alive at send time")
+    for label, snapshot in snapshots:
+        stats = snapshot.statistics("lineno")
+        blocks = sum(stat.count for stat in stats)
+        size = sum(stat.size for stat in stats)
+        print(f"  {label:<32} {blocks:>3} blocks {size:>6} B")
+        for stat in stats[: args.top]:
+            frame = stat.traceback[0]
+            print(f"      {frame.filename.rsplit('/', 1)[-1]}:{frame.lineno:<5} {stat.size:>5} B")
+    print(f"Peak traced memory per session   {peak:>6} B")
+
+    started = time.perf_counter()
+    for _ in range(args.sessions):
+        await client.get_session_config()
+    elapsed = time.perf_counter() - started
+    print(f"Time per session                 {elapsed / args.sessions * 1e6:>6.1f} us")
+    await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""Compare a task per tenant with RefreshScheduler for keeping material fresh.
+
+For 1k, 10k and 100k tenants, each way of scheduling refreshes is measured on:
+
+- ``setup``: registering every tenant with a refresh an hour or so away;
+- ``memory``: memory held while the refreshes are pending (tracemalloc);
+- ``reschedule``: moving every tenant's refresh (as after a burst of
+  refreshes returning new expiries);
+- ``fire``: CPU time to run every refresh when they are spread over one
+  second, with a refresh that does nothing.
+
+``tasks`` is one asyncio task per tenant sleeping until its refresh,
+cancelled and recreated to reschedule; ``wheel`` is RefreshScheduler.
+
+    PYTHONPATH=src python benchmarks/bench_scheduler.py
+    PYTHONPATH=src python benchmarks/bench_scheduler.py --tenants 10000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from orga_ai.scheduler import RefreshScheduler
+
+
+class TaskPerTenant:
+    """One sleeping task per tenant."""
+
+    def __init__(self, on_refresh: Callable[[], None]) -> None:
+        self.on_refresh = on_refresh
+        self.tasks: Dict[int, "asyncio.Task[None]"] = {}
+
+    def add(self, tenant: int, delay: float) -> None:
+        old = self.tasks.pop(tenant, None)
+        if old is not None:
+            old.cancel()
+        self.tasks[tenant] = asyncio.ensure_future(self._run(tenant, delay))
+
+    async def _run(self, tenant: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        del self.tasks[tenant]
+        self.on_refresh()
+
+    async def aclose(self) -> None:
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class Wheel:
+    """RefreshScheduler with entries whose material expires after ``delay``."""
+
+    def __init__(self, on_refresh: Callable[[], None]) -> None:
+        self.scheduler = RefreshScheduler(
+            refresh_ahead=1.0, jitter=0.0, min_interval=0.0, max_concurrency=1024
+        )
+        self.on_refresh = on_refresh
+
+    async def _refresh(self) -> Optional[float]:
+        self.on_refresh()
+        return time.time() + 3600
+
+    def add(self, tenant: int, delay: float) -> None:
+        self.scheduler.add(tenant, self._refresh, expires_at=time.time() + delay)
+
+    async def aclose(self) -> None:
+        await self.scheduler.aclose()
+
+
+async def measure(kind: str, tenants: int) -> Dict[str, Any]:
+    rng = random.Random(0)
+    fired = 0
+
+    def on_refresh() -> None:
+        nonlocal fired
+        fired += 1
+
+    factory = TaskPerTenant if kind == "tasks" else Wheel
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    scheduler = factory(on_refresh)
+    for tenant in range(tenants):
+        scheduler.add(tenant, rng.uniform(3000, 4000))
+    setup = time.perf_counter() - started
+    await asyncio.sleep(0)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for tenant in range(tenants):
+        scheduler.add(tenant, rng.uniform(3000, 4000))
+    reschedule = time.perf_counter() - started
+    await scheduler.aclose()
+
+    scheduler = factory(on_refresh)
+    for tenant in range(tenants):
+        scheduler.add(tenant, rng.uniform(0.1, 1.1))
+    cpu = time.process_time()
+    while fired < tenants:
+        await asyncio.sleep(0.05)
+    fire = time.process_time() - cpu
+    await scheduler.aclose()
+
+    return {
+        "setup_ms": setup * 1000,
+        "memory_mb": memory / 1e6,
+        "reschedule_ms": reschedule * 1000,
+        "fire_cpu_ms": fire * 1000,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args(argv)
+
+    print(f"{'tenants':>8} {'kind':>6} {'setup ms':>9} {'memory MB':>10} {'reschedule ms':>14} {'fire CPU ms':>12}")
+    for tenants in args.tenants:
+        for kind in ("tasks", "wheel"):
+            result = asyncio.run(measure(kind, tenants))
+            print(
+                f"{tenants:>8} {kind:>6} {result['setup_ms']:>9.1f} {result['memory_mb']:>10.2f} "
+                f"{result['reschedule_ms']:>14.1f} {result['fire_cpu_ms']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Measure the latency saved by fetching ICE servers alongside the token.
+
+Mints sessions one after another (or from a few concurrent workers) through
+a client against the local stand-in API, in a child process, and reports
+latency percentiles for each mode and the saving over the serial path:
+
+- ``serial``: the ICE request waits for the new token;
+- ``speculative``: ``speculative_ice_fetch``, the ICE request is authorized
+  with the previous session's token and sent alongside the token request;
+- ``speculative_api_key``: as above, with ``ice_api_key_auth`` so the first
+  session is fetched speculatively too.
+
+Nothing caches ICE config here, so every session fetches it.
+
+    PYTHONPATH=src python benchmarks/bench_speculative_ice.py
+    PYTHONPATH=src python benchmarks/bench_speculative_ice.py --latency 40 --concurrency 1 8 --json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from orga_ai import OrgaAI, OrgaAIConfig
+from orga_ai.loadgen import summarize
+from orga_ai.testing import FakeOrgaAPIProcess
+
+
+MODES = ("serial", "speculative", "speculative_api_key")
+DEFAULT_CONCURRENCY = (1, 8)
+
+
+async def measure(mode: str, url: str, concurrency: int, sessions: int) -> Dict[str, Any]:
+    """Mint ``sessions`` sessions from ``concurrency`` workers."""
+    config = OrgaAIConfig(
+        api_key="bench",
+        user_email="bench@example.com",
+        base_url=url,
+        speculative_ice_fetch=mode != "serial",
+        ice_api_key_auth=mode == "speculative_api_key",
+    )
+    latencies: List[float] = []
+    remaining = sessions
+
+    async def worker(client: OrgaAI) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await client.get_session_config()
+            latencies.append(time.perf_counter() - started)
+
+    async with OrgaAI(config) as client:
+        # Open the connections before measuring
+        await asyncio.gather(*(client.get_session_config() for _ in range(concurrency)))
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        speculative = client.stats()["speculative_ice"]
+
+    return {
+        "concurrency": concurrency,
+        "sessions": len(latencies),
+        "latency_ms": summarize(latencies),
+        "speculative_ice": speculative,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=MODES + ("all",), default="all")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument("--sessions", type=int, default=200, help="sessions per point")
+    parser.add_argument("--latency", type=float, default=20.0, help="stand-in API latency, ms")
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    modes = MODES if args.mode == "all" else (args.mode,)
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    with FakeOrgaAPIProcess(latency=args.latency / 1000) as api:
+        for mode in modes:
+            results[mode] = [
+                asyncio.run(measure(mode, api.url, concurrency, args.sessions))
+                for concurrency in args.concurrency
+            ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    serial = {point["concurrency"]: point for point in results.get("serial", [])}
+    for mode, points in results.items():
+        print(f"\n{mode}")
+        print(f"{'concurrency':>12} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'saved':>7}")
+        for point in points:
+            latency = point["latency_ms"]
+            baseline = serial.get(point["concurrency"])
+            saved = ""
+            if mode != "serial" and baseline is not None and baseline["latency_ms"]["mean"]:
+                saved = f"{1 - latency['mean'] / baseline['latency_ms']['mean']:.0%}"
+            print(
+                f"{point['concurrency']:>12} {latency['p50']:>8.2f} {latency['p99']:>8.2f} "
+                f"{latency['mean']:>8.2f} {saved:>7}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
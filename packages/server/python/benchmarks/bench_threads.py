@@ -0,0 +1,169 @@
+"""Measure how sync session minting scales with threads.
+
+Runs the sync entry points from 1 to 64 threads against the local stand-in
+API (in a child process, so it does not compete with the threads measured)
+and reports sessions per second, speed-up over one thread and latency
+percentiles for each thread count:
+
+- ``sync``: ``get_session_config_sync(config)`` per session;
+- ``shared_run``: one shared client, ``asyncio.run(client.get_session_config())``
+  per session;
+- ``shared_loop``: one shared client, each thread running its sessions on
+  its own long-lived event loop.
+
+On a GIL build threads only overlap while waiting on the network, so the
+speed-up is bounded by the share of each call spent outside Python. On a
+free-threaded build (python3.13t) it should keep growing up to the number
+of cores.
+
+    PYTHONPATH=src python benchmarks/bench_threads.py
+    PYTHONPATH=src python benchmarks/bench_threads.py --mode sync --threads 1 8 64 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import sysconfig
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from orga_ai import OrgaAI, OrgaAIConfig, get_session_config_sync
+from orga_ai.loadgen import summarize
+from orga_ai.testing import FakeOrgaAPIProcess
+
+
+MODES = ("sync", "shared_run", "shared_loop")
+DEFAULT_THREADS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def gil_enabled() -> bool:
+    is_enabled = getattr(sys, "_is_gil_enabled", None)
+    return True if is_enabled is None else is_enabled()
+
+
+class Worker:
+    """Mints sessions in one thread until told to stop."""
+
+    def __init__(self, mode: str, config: OrgaAIConfig, client: Optional[OrgaAI]) -> None:
+        self.mode = mode
+        self.config = config
+        self.client = client
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def run(self, start: threading.Barrier, stop: threading.Event) -> None:
+        loop = asyncio.new_event_loop() if self.mode == "shared_loop" else None
+        session = self._session_function(loop)
+        start.wait()
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    session()
+                except Exception:
+                    self.errors += 1
+                    continue
+                self.latencies.append(time.perf_counter() - started)
+        finally:
+            if loop is not None:
+                # Lets the client close this loop's connection pool
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+
+    def _session_function(self, loop: Optional[asyncio.AbstractEventLoop]) -> Callable[[], Any]:
+        """Return a function minting one session the way the mode does."""
+        config, client = self.config, self.client
+        if self.mode == "sync":
+            return lambda: get_session_config_sync(config)
+        assert client is not None
+        if loop is None:
+            return lambda: asyncio.run(client.get_session_config())
+        return lambda: loop.run_until_complete(client.get_session_config())
+
+
+def measure(mode: str, config: OrgaAIConfig, threads: int, duration: float, warmup: float) -> Dict[str, Any]:
+    """Run ``threads`` workers for ``duration`` seconds after a warm-up."""
+    client = OrgaAI(config) if mode != "sync" else None
+    workers = [Worker(mode, config, client) for _ in range(threads)]
+    start = threading.Barrier(threads + 1)
+    stop = threading.Event()
+    pool = [
+        threading.Thread(target=worker.run, args=(start, stop), daemon=True)
+        for worker in workers
+    ]
+    for thread in pool:
+        thread.start()
+    start.wait()
+    time.sleep(warmup)
+    for worker in workers:
+        worker.latencies.clear()
+        worker.errors = 0
+    began = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    elapsed = time.perf_counter() - began
+    for thread in pool:
+        thread.join()
+    if client is not None:
+        asyncio.run(client.close())
+
+    latencies = [latency for worker in workers for latency in worker.latencies]
+    return {
+        "threads": threads,
+        "sessions": len(latencies),
+        "errors": sum(worker.errors for worker in workers),
+        "sessions_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms": summarize(latencies),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=MODES + ("all",), default="all")
+    parser.add_argument("--threads", type=int, nargs="+", default=list(DEFAULT_THREADS))
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per point")
+    parser.add_argument("--warmup", type=float, default=0.5, help="seconds before measuring")
+    parser.add_argument("--latency", type=float, default=1.0, help="stand-in API latency, ms")
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    modes = MODES if args.mode == "all" else (args.mode,)
+    environment = {
+        "python": sys.version.split()[0],
+        "free_threaded_build": bool(sysconfig.get_config_var("Py_GIL_DISABLED")),
+        "gil_enabled": gil_enabled(),
+        "cpus": os.cpu_count(),
+    }
+    if not args.json:
+        print(", ".join(f"{name}={value}" for name, value in environment.items()))
+
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    with FakeOrgaAPIProcess(latency=args.latency / 1000) as api:
+        config = OrgaAIConfig(api_key="bench", user_email="bench@example.com", base_url=api.url)
+        for mode in modes:
+            results[mode] = []
+            if not args.json:
+                print(f"\n{mode}")
+                print(f"{'threads':>8} {'sessions/s':>11} {'speed-up':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            for threads in args.threads:
+                point = measure(mode, config, threads, args.duration, args.warmup)
+                base = results[mode][0]["sessions_per_second"] if results[mode] else point["sessions_per_second"]
+                point["speedup"] = round(point["sessions_per_second"] / base, 2) if base else 0.0
+                results[mode].append(point)
+                if not args.json:
+                    print(
+                        f"{threads:>8} {point['sessions_per_second']:>11.1f} {point['speedup']:>8.2f}x "
+                        f"{point['latency_ms']['p50']:>8.2f} {point['latency_ms']['p99']:>8.2f} "
+                        f"{point['errors']:>7}"
+                    )
+
+    if args.json:
+        print(json.dumps({"environment": environment, "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Measure the latency impact of micro-batched token issuance.
+
+Sends bursts of concurrent get_session_config() calls to the local stand-in
+API (orga_ai.testing.FakeOrgaAPI) with token batching disabled and with a
+range of batching windows, and reports per-call latency percentiles and the
+number of token requests the API received.
+
+    PYTHONPATH=src python benchmarks/bench_token_batching.py
+    PYTHONPATH=src python benchmarks/bench_token_batching.py --burst 500 --latency 30
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List, Optional
+
+from orga_ai import OrgaAI, OrgaAIConfig
+from orga_ai.testing import FakeOrgaAPI
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(
+    api: FakeOrgaAPI, window: Optional[float], burst: int, bursts: int, batch_tokens: bool
+) -> None:
+    api.batch_tokens = batch_tokens
+    before = api.requests.get("/v1/realtime/client-secrets", 0)
+    config = OrgaAIConfig(
+        api_key="bench",
+        user_email="bench@example.com",
+        base_url=api.url,
+        token_batch_window=window,
+    )
+    latencies: List[float] = []
+
+    async def one() -> None:
+        started = time.perf_counter()
+        await client.get_session_config()
+        latencies.append(time.perf_counter() - started)
+
+    async with OrgaAI(config) as client:
+        await client.get_session_config()  # Warm up the connection pool
+        latencies.clear()
+        wall = time.perf_counter()
+        for _ in range(bursts):
+            await asyncio.gather(*(one() for _ in range(burst)))
+        wall = time.perf_counter() - wall
+
+    requests = api.requests.get("/v1/realtime/client-secrets", 0) - before - 1
+    label = "off" if not window else f"{window:g} ms"
+    if window and not batch_tokens:
+        label += " (no API support)"
+    print(
+        f"{label:>24}  "
+        f"p50 {percentile(latencies, 0.50) * 1000:7.1f} ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  "
+        f"mean {statistics.mean(latencies) * 1000:7.1f} ms  "
+        f"{len(latencies) / wall:8.0f} sessions/s  "
+        f"{requests:6d} token requests"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=200, help="concurrent calls per burst")
+    parser.add_argument("--bursts", type=int, default=5, help="number of bursts")
+    parser.add_argument("--latency", type=float, default=20, help="API latency in ms")
+    parser.add_argument(
+        "--windows", type=float, nargs="+", default=[1, 5, 20], help="batch windows in ms"
+    )
+    args = parser.parse_args()
+
+    api = FakeOrgaAPI(latency=args.latency / 1000).start_in_thread()
+    try:
+        print(f"{args.bursts} bursts of {args.burst} calls, API latency {args.latency:g} ms")
+        await run(api, None, args.burst, args.bursts, batch_tokens=True)
+        for window in args.windows:
+            await run(api, window, args.burst, args.bursts, batch_tokens=True)
+        await run(api, args.windows[0], args.burst, args.bursts, batch_tokens=False)
+    finally:
+        api.stop_thread()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
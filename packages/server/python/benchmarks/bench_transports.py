@@ -0,0 +1,122 @@
+"""Compare the httpx and aiohttp transports.
+
+Mints sessions through one client at increasing concurrency against the
+local stand-in API (in a child process, so it does not compete with the
+client measured) and reports sessions per second, latency percentiles and
+CPU time per session for each transport:
+
+- ``httpx``: the default transport;
+- ``aiohttp``: the aiohttp transport with its own session per event loop;
+- ``aiohttp_shared``: the aiohttp transport sending through a
+  ``ClientSession`` owned by the application.
+
+    PYTHONPATH=src python benchmarks/bench_transports.py
+    PYTHONPATH=src python benchmarks/bench_transports.py --concurrency 1 32 --json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from orga_ai import OrgaAI, OrgaAIConfig
+from orga_ai.loadgen import summarize
+from orga_ai.testing import FakeOrgaAPIProcess
+
+
+KINDS = ("httpx", "aiohttp", "aiohttp_shared")
+DEFAULT_CONCURRENCY = (1, 8, 32)
+
+
+async def measure(
+    kind: str, url: str, concurrency: int, duration: float, warmup: float
+) -> Dict[str, Any]:
+    """Run ``concurrency`` workers minting sessions for ``duration`` seconds."""
+    session = aiohttp.ClientSession() if kind == "aiohttp_shared" else None
+    config = OrgaAIConfig(
+        api_key="bench",
+        user_email="bench@example.com",
+        base_url=url,
+        transport="httpx" if kind == "httpx" else "aiohttp",
+        aiohttp_session=session,
+    )
+    latencies: List[float] = []
+    errors = 0
+    stop = False
+
+    async def worker(client: OrgaAI) -> None:
+        nonlocal errors
+        while not stop:
+            started = time.perf_counter()
+            try:
+                await client.get_session_config()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    async with OrgaAI(config) as client:
+        workers = [asyncio.ensure_future(worker(client)) for _ in range(concurrency)]
+        await asyncio.sleep(warmup)
+        latencies.clear()
+        errors = 0
+        began, cpu = time.perf_counter(), time.process_time()
+        await asyncio.sleep(duration)
+        elapsed, cpu = time.perf_counter() - began, time.process_time() - cpu
+        stop = True
+        await asyncio.gather(*workers)
+    if session is not None:
+        await session.close()
+
+    return {
+        "concurrency": concurrency,
+        "sessions": len(latencies),
+        "errors": errors,
+        "sessions_per_second": round(len(latencies) / elapsed, 1),
+        "cpu_us_per_session": round(cpu / len(latencies) * 1e6, 1) if latencies else 0.0,
+        "latency_ms": summarize(latencies),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kind", choices=KINDS + ("all",), default="all")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per point")
+    parser.add_argument("--warmup", type=float, default=0.5, help="seconds before measuring")
+    parser.add_argument("--latency", type=float, default=1.0, help="stand-in API latency, ms")
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    kinds = KINDS if args.kind == "all" else (args.kind,)
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    with FakeOrgaAPIProcess(latency=args.latency / 1000) as api:
+        for kind in kinds:
+            results[kind] = []
+            if not args.json:
+                print(f"\n{kind}")
+                print(
+                    f"{'concurrency':>12} {'sessions/s':>11} {'CPU us':>8} "
+                    f"{'p50 ms':>8} {'p99 ms':>8} {'errors':>7}"
+                )
+            for concurrency in args.concurrency:
+                point = asyncio.run(measure(kind, api.url, concurrency, args.duration, args.warmup))
+                results[kind].append(point)
+                if not args.json:
+                    print(
+                        f"{concurrency:>12} {point['sessions_per_second']:>11.1f} "
+                        f"{point['cpu_us_per_session']:>8.1f} {point['latency_ms']['p50']:>8.2f} "
+                        f"{point['latency_ms']['p99']:>8.2f} {point['errors']:>7}"
+                    )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+"""Soak test the SDK for memory, file descriptor and task leaks.
+
+Runs the SDK's entry points for many iterations against the local stand-in
+API (orga_ai.testing.FakeOrgaAPI, run in a child process so its own work
+does not count) and samples process resources as it goes:
+
+- resident set size (RSS);
+- Python heap in use, from tracemalloc;
+- open file descriptors (sockets included);
+- asyncio tasks still pending on the harness event loop;
+- live threads.
+
+The first sample is taken after a warm-up, so connection pools and caches
+that are filled once do not count as growth. The run fails (exit status 1)
+if any resource grew by more than its threshold between that baseline and
+the final sample.
+
+Scenarios:
+
+- ``construct``: create an OrgaAI client and drop it without closing it,
+  as a per-request health check does;
+- ``async_context``: ``async with OrgaAI(config)`` around one session;
+- ``sync_context``: ``with OrgaAI(config)`` around one session, driven by a
+  long-lived event loop;
+- ``sync``: ``get_session_config_sync(config)``, a new event loop per call;
+- ``shared_client``: one long-lived client serving every session.
+
+    PYTHONPATH=src python benchmarks/soak.py --iterations 1000000
+    PYTHONPATH=src python benchmarks/soak.py --scenario sync --iterations 20000 --json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from orga_ai import OrgaAI, OrgaAIConfig, get_session_config_sync
+from orga_ai.testing import FakeOrgaAPIProcess
+
+
+SCENARIOS = ("construct", "async_context", "sync_context", "sync", "shared_client")
+
+
+@dataclass
+class Sample:
+    """Process resources after a number of iterations."""
+    iteration: int
+    elapsed: float
+    rss_kb: int
+    heap_kb: int
+    fds: int
+    tasks: int
+    threads: int
+
+
+@dataclass
+class Thresholds:
+    """Maximum growth allowed between the baseline and the final sample."""
+    rss_kb: int
+    heap_kb: int
+    fds: int
+    tasks: int
+    threads: int
+
+
+def rss_kb() -> int:
+    """Current resident set size, or the peak where it is not available."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def open_fds() -> int:
+    for directory in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(directory))
+        except OSError:
+            continue
+    return -1
+
+
+class Scenario:
+    """Runs iterations of one way of using the SDK.
+
+    Async scenarios run their iterations on ``loop``, which stays set as the
+    current event loop so the sync context manager can use it too.
+    """
+
+    def __init__(self, name: str, config: OrgaAIConfig, loop: asyncio.AbstractEventLoop) -> None:
+        self.name = name
+        self.config = config
+        self.loop = loop
+        self._shared: Optional[OrgaAI] = None
+        self._runners: Dict[str, Callable[[int], None]] = {
+            "construct": self._construct,
+            "async_context": self._async_context,
+            "sync_context": self._sync_context,
+            "sync": self._sync,
+            "shared_client": self._shared_client,
+        }
+
+    def run(self, count: int) -> None:
+        self._runners[self.name](count)
+
+    def close(self) -> None:
+        if self._shared is not None:
+            self.loop.run_until_complete(self._shared.close())
+            self._shared = None
+
+    def _construct(self, count: int) -> None:
+        for _ in range(count):
+            OrgaAI(self.config)
+
+    def _async_context(self, count: int) -> None:
+        async def iterations() -> None:
+            for _ in range(count):
+                async with OrgaAI(self.config) as client:
+                    await client.get_session_config()
+
+        self.loop.run_until_complete(iterations())
+
+    def _sync_context(self, count: int) -> None:
+        for _ in range(count):
+            with OrgaAI(self.config) as client:
+                self.loop.run_until_complete(client.get_session_config())
+
+    def _sync(self, count: int) -> None:
+        for _ in range(count):
+            get_session_config_sync(self.config)
+
+    def _shared_client(self, count: int) -> None:
+        async def iterations() -> None:
+            if self._shared is None:
+                self._shared = OrgaAI(self.config)
+            for _ in range(count):
+                await self._shared.get_session_config()
+
+        self.loop.run_until_complete(iterations())
+
+
+def sample(
+    iteration: int, started: float, loop: asyncio.AbstractEventLoop, trace: bool
+) -> Sample:
+    gc.collect()
+    return Sample(
+        iteration=iteration,
+        elapsed=round(time.perf_counter() - started, 3),
+        rss_kb=rss_kb(),
+        heap_kb=tracemalloc.get_traced_memory()[0] // 1024 if trace else 0,
+        fds=open_fds(),
+        tasks=len([t for t in asyncio.all_tasks(loop) if not t.done()]),
+        threads=threading.active_count(),
+    )
+
+
+def soak(
+    name: str,
+    base_url: str,
+    iterations: int,
+    samples: int,
+    warmup: int,
+    thresholds: Thresholds,
+    trace: bool,
+    log: Callable[[str], None],
+) -> Dict[str, Any]:
+    """Run one scenario and compare its final sample against the baseline."""
+    config = OrgaAIConfig(api_key="soak", user_email="soak@example.com", base_url=base_url)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    scenario = Scenario(name, config, loop)
+    history: List[Sample] = []
+    try:
+        scenario.run(warmup)
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        history.append(sample(0, started, loop, trace))
+        step = max(1, iterations // samples)
+        done = 0
+        while done < iterations:
+            count = min(step, iterations - done)
+            scenario.run(count)
+            done += count
+            history.append(sample(done, started, loop, trace))
+            log(_format_sample(name, history[-1]))
+    finally:
+        scenario.close()
+        if trace:
+            tracemalloc.stop()
+        asyncio.set_event_loop(None)
+        loop.close()
+
+    baseline, final = history[0], history[-1]
+    growth = {
+        "rss_kb": final.rss_kb - baseline.rss_kb,
+        "heap_kb": final.heap_kb - baseline.heap_kb,
+        "fds": final.fds - baseline.fds,
+        "tasks": final.tasks - baseline.tasks,
+        "threads": final.threads - baseline.threads,
+    }
+    limits = asdict(thresholds)
+    failures = [
+        f"{metric} grew by {growth[metric]} (limit {limits[metric]})"
+        for metric in growth
+        if growth[metric] > limits[metric]
+    ]
+    elapsed = final.elapsed or 1e-9
+    return {
+        "scenario": name,
+        "iterations": iterations,
+        "iterations_per_second": round(iterations / elapsed, 1),
+        "growth": growth,
+        "thresholds": limits,
+        "passed": not failures,
+        "failures": failures,
+        "samples": [asdict(s) for s in history],
+    }
+
+
+def _format_sample(name: str, s: Sample) -> str:
+    return (
+        f"{name:>14} {s.iteration:>10} it  {s.elapsed:8.1f} s  "
+        f"rss {s.rss_kb:>8} KiB  heap {s.heap_kb:>7} KiB  "
+        f"fds {s.fds:>4}  tasks {s.tasks:>3}  threads {s.threads:>2}"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenario", choices=SCENARIOS + ("all",), default="all", help="what to run"
+    )
+    parser.add_argument("--iterations", type=int, default=100_000, help="per scenario")
+    parser.add_argument("--samples", type=int, default=10, help="samples per scenario")
+    parser.add_argument("--warmup", type=int, default=200, help="iterations before baseline")
+    parser.add_argument("--base-url", help="API to use instead of the local stand-in")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip heap tracing")
+    parser.add_argument("--max-rss-growth", type=int, default=16384, help="KiB")
+    parser.add_argument("--max-heap-growth", type=int, default=2048, help="KiB")
+    parser.add_argument("--max-fd-growth", type=int, default=16)
+    parser.add_argument("--max-task-growth", type=int, default=0)
+    parser.add_argument("--max-thread-growth", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    thresholds = Thresholds(
+        rss_kb=args.max_rss_growth,
+        heap_kb=args.max_heap_growth,
+        fds=args.max_fd_growth,
+        tasks=args.max_task_growth,
+        threads=args.max_thread_growth,
+    )
+    log: Callable[[str], None] = (
+        (lambda line: None) if args.json else (lambda line: print(line, flush=True))
+    )
+    names = SCENARIOS if args.scenario == "all" else (args.scenario,)
+
+    api: Optional[FakeOrgaAPIProcess] = None
+    base_url = args.base_url
+    if base_url is None:
+        api = FakeOrgaAPIProcess().start()
+        base_url = api.url
+    try:
+        results = [
+            soak(
+                name,
+                base_url,
+                args.iterations,
+                args.samples,
+                args.warmup,
+                thresholds,
+                not args.no_tracemalloc,
+                log,
+            )
+            for name in names
+        ]
+    finally:
+        if api is not None:
+            api.stop()
+
+    if args.json:
+        print(json.dumps({"results": results}, indent=2))
+    else:
+        for result in results:
+            verdict = "PASS" if result["passed"] else "FAIL"
+            print(
+                f"{verdict} {result['scenario']}: {result['iterations']} iterations "
+                f"({result['iterations_per_second']:.0f}/s), growth {result['growth']}"
+            )
+            for failure in result["failures"]:
+                print(f"     {failure}")
+    return 0 if all(result["passed"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,16 +22,59 @@ Example:
     print(f"Token: {session_config.ephemeral_token}")
     print(f"ICE servers: {session_config.ice_servers}")
     ```
+
+The client (and with it httpx) is imported lazily on first access, so
+importing configuration types and errors stays cheap on cold starts.
 """
 
-from .client import OrgaAI, get_session_config_sync
-from .types import OrgaAIConfig, SessionConfig, IceServer
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+from .types import OrgaAIConfig, SessionConfig, IceServer, EphemeralToken
 from .errors import (
     OrgaAIError,
     OrgaAIAuthenticationError,
     OrgaAIServerError,
+    OrgaAIDrainingError,
+    AgentUnavailableError,
 )
 
+if TYPE_CHECKING:
+    from .client import OrgaAI, get_session_config_sync
+    from .backends import (
+        CacheBackend,
+        MemoryCacheBackend,
+        FileCacheBackend,
+        RedisCacheBackend,
+    )
+    from .scheduler import RefreshScheduler
+    from .agent import AgentClient
+
+# Attributes resolved on first access, mapped to the module defining them
+_LAZY_ATTRIBUTES = {
+    "OrgaAI": ".client",
+    "get_session_config_sync": ".client",
+    "CacheBackend": ".backends",
+    "MemoryCacheBackend": ".backends",
+    "FileCacheBackend": ".backends",
+    "RedisCacheBackend": ".backends",
+    "RefreshScheduler": ".scheduler",
+    "AgentClient": ".agent",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
 # Version information
 __version__ = "1.0.0-beta.1"
 
@@ -44,15 +87,30 @@ __all__ = [
     "OrgaAIConfig",
     "SessionConfig", 
     "IceServer",
+    "EphemeralToken",
     
     # Error classes
     "OrgaAIError",
     "OrgaAIAuthenticationError",
     "OrgaAIServerError",
+    "OrgaAIDrainingError",
+    "AgentUnavailableError",
     
     # Convenience functions
     "get_session_config_sync",
     
+    # Cache backends
+    "CacheBackend",
+    "MemoryCacheBackend",
+    "FileCacheBackend",
+    "RedisCacheBackend",
+    
+    # Proactive refresh
+    "RefreshScheduler",
+    
+    # Local session agent
+    "AgentClient",
+    
     # Version
     "__version__",
 ]
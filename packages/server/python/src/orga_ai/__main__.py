@@ -0,0 +1,31 @@
+"""Command-line tools for the OrgaAI Python SDK.
+
+Usage:
+    python -m orga_ai loadgen --stand-in --duration 10
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Dispatch to a subcommand and return its exit status."""
+    parser = argparse.ArgumentParser(prog="python -m orga_ai")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    loadgen_parser = commands.add_parser(
+        "loadgen", help="measure how many sessions per second one client can mint"
+    )
+    from . import loadgen
+
+    loadgen.add_arguments(loadgen_parser)
+
+    args = parser.parse_args(argv)
+    if args.command == "loadgen":
+        return loadgen.main(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
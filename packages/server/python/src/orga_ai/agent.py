@@ -0,0 +1,609 @@
+"""Local agent serving session configs to worker processes.
+
+A host running many worker processes, each with its own client, holds as
+many connection pools, caches and ICE refreshes against the API. The agent
+is one process per host that owns a single OrgaAI client, with its
+connection pool, caches and ICE refresh, and hands session configs to the
+workers over a Unix domain socket:
+
+    python -m orga_ai.agent --socket /run/orga-ai/agent.sock
+
+Workers use ``AgentClient`` instead of OrgaAI. It keeps one connection to
+the agent per event loop and, when given a config, falls back to calling
+the API directly while the agent is unavailable (not started, restarting or
+draining):
+
+```python
+client = AgentClient("/run/orga-ai/agent.sock", config)
+session_config = await client.get_session_config()
+```
+
+Requests and responses are binary frames: a header with the request ID, the
+operation (or, in responses, the status) and the payload length, then the
+payload. Responses may come back in any order, so a connection carries any
+number of concurrent requests. Sessions are encoded as length-prefixed
+strings and fixed-size fields, and errors as their type, status, code and
+message, so the worker raises the same error the agent's client did.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from .counters import Counters
+from .errors import (
+    AgentUnavailableError,
+    OrgaAIAuthenticationError,
+    OrgaAIDrainingError,
+    OrgaAIError,
+    OrgaAIServerError,
+)
+from .loops import LoopLocal
+from .types import EphemeralToken, IceServer, OrgaAIConfig, SessionConfig
+
+
+# Operations, in request headers
+GET_SESSION = 1
+ACQUIRE_SESSION = 2
+RELEASE_SESSION = 3
+STATS = 4
+
+# Statuses, in response headers
+OK = 0
+ERROR = 1
+
+# Largest payload accepted, in bytes
+MAX_PAYLOAD = 1 << 20
+
+_HEADER = struct.Struct("!IBI")  # request ID, operation or status, payload length
+_LENGTH = struct.Struct("!H")  # string length
+_SESSION = struct.Struct("!dB")  # token expiry (NaN if unknown), ICE server count
+_SERVER = struct.Struct("!BBd")  # flags, URL count, credential expiry (NaN if unknown)
+_ERROR = struct.Struct("!BH")  # error type, HTTP status (0 if none)
+
+# IceServer flags
+_URL_LIST = 1
+_USERNAME = 2
+_CREDENTIAL = 4
+
+# Error types, by their index on the wire
+_ERROR_TYPES = (OrgaAIError, OrgaAIAuthenticationError, OrgaAIServerError, OrgaAIDrainingError)
+
+
+def _pack_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _LENGTH.pack(len(data)) + data
+
+
+def _unpack_string(data: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    return data[offset:offset + length].decode("utf-8"), offset + length
+
+
+def _pack_expiry(expires_at: Optional[float]) -> float:
+    return math.nan if expires_at is None else expires_at
+
+
+def _unpack_expiry(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def encode_session(session: SessionConfig) -> bytes:
+    """Encode a session config as a response payload."""
+    parts = [
+        _pack_string(session.ephemeral_token),
+        _SESSION.pack(_pack_expiry(session.expires_at), len(session.ice_servers)),
+    ]
+    for server in session.ice_servers:
+        urls = [server.urls] if isinstance(server.urls, str) else server.urls
+        flags = 0 if isinstance(server.urls, str) else _URL_LIST
+        if server.username is not None:
+            flags |= _USERNAME
+        if server.credential is not None:
+            flags |= _CREDENTIAL
+        parts.append(_SERVER.pack(flags, len(urls), _pack_expiry(server.expires_at)))
+        parts.extend(_pack_string(url) for url in urls)
+        if server.username is not None:
+            parts.append(_pack_string(server.username))
+        if server.credential is not None:
+            parts.append(_pack_string(server.credential))
+    return b"".join(parts)
+
+
+def decode_session(data: bytes) -> SessionConfig:
+    """Decode a session config encoded by encode_session()."""
+    token, offset = _unpack_string(data, 0)
+    expires_at, count = _SESSION.unpack_from(data, offset)
+    offset += _SESSION.size
+    ice_servers = []
+    for _ in range(count):
+        flags, url_count, server_expires_at = _SERVER.unpack_from(data, offset)
+        offset += _SERVER.size
+        urls = []
+        for _ in range(url_count):
+            url, offset = _unpack_string(data, offset)
+            urls.append(url)
+        username = credential = None
+        if flags & _USERNAME:
+            username, offset = _unpack_string(data, offset)
+        if flags & _CREDENTIAL:
+            credential, offset = _unpack_string(data, offset)
+        ice_servers.append(IceServer(
+            urls=urls if flags & _URL_LIST else urls[0],
+            username=username,
+            credential=credential,
+            expires_at=_unpack_expiry(server_expires_at),
+        ))
+    expires_at = _unpack_expiry(expires_at)
+    return SessionConfig(
+        ephemeral_token=EphemeralToken(token, expires_at),
+        ice_servers=ice_servers,
+        expires_at=expires_at,
+    )
+
+
+def encode_error(error: OrgaAIError) -> bytes:
+    """Encode an SDK error as a response payload."""
+    kind = 0
+    for index, error_type in enumerate(_ERROR_TYPES):
+        if isinstance(error, error_type):
+            kind = index
+    return (
+        _ERROR.pack(kind, error.status or 0)
+        + _pack_string(error.code or "")
+        + _pack_string(error.message)
+    )
+
+
+def decode_error(data: bytes) -> OrgaAIError:
+    """Rebuild the SDK error encoded by encode_error()."""
+    kind, status = _ERROR.unpack_from(data, 0)
+    code, offset = _unpack_string(data, _ERROR.size)
+    message, _ = _unpack_string(data, offset)
+    error_type = _ERROR_TYPES[kind] if kind < len(_ERROR_TYPES) else OrgaAIError
+    if error_type is OrgaAIAuthenticationError or error_type is OrgaAIDrainingError:
+        return error_type(message)
+    if error_type is OrgaAIServerError:
+        return OrgaAIServerError(message, status=status)
+    return OrgaAIError(message, status=status or None, code=code or None)
+
+
+class SessionAgent:
+    """Serves an OrgaAI client's session configs over a Unix domain socket.
+
+    Args:
+        client: Client the sessions come from; the agent drains and closes
+            it when it closes
+        path: Path of the socket; a stale socket left by an agent that
+            exited is replaced
+        mode: Permissions of the socket file, which decide who can get
+            sessions from the agent
+    """
+
+    def __init__(self, client: Any, path: str, mode: int = 0o600) -> None:
+        self.client = client
+        self.path = path
+        self.mode = mode
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+        self._stats = Counters("connections", "requests", "errors")
+
+    async def start(self) -> "SessionAgent":
+        """Start listening on the socket.
+
+        Raises:
+            OrgaAIError: If another agent is listening on the socket, or the
+                path is taken by something other than a socket
+        """
+        if os.path.exists(self.path):
+            if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+                raise OrgaAIError(f"{self.path} exists and is not a socket")
+            if _listening(self.path):
+                raise OrgaAIError(f"Another agent is listening on {self.path}")
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, self.mode)
+        return self
+
+    async def close(self, timeout: float = 30.0) -> None:
+        """Stop accepting workers, drain the client and remove the socket.
+
+        Requests already received are answered, for up to ``timeout``
+        seconds; later ones get OrgaAIDrainingError, so their workers fall
+        back to direct calls.
+        """
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+        server.close()
+        await self.client.drain(timeout=timeout)
+        for writer in list(self._connections):
+            writer.close()
+        await server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return agent counters, the connected workers and the client's stats."""
+        stats: Dict[str, Any] = self._stats.snapshot()
+        stats["connected"] = len(self._connections)
+        stats["client"] = self.client.stats()
+        return stats
+
+    async def __aenter__(self) -> "SessionAgent":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._stats.add("connections")
+        self._connections.add(writer)
+        requests: Set["asyncio.Task[None]"] = set()
+        try:
+            while True:
+                request_id, operation, length = _HEADER.unpack(
+                    await reader.readexactly(_HEADER.size)
+                )
+                if length > MAX_PAYLOAD:
+                    break
+                payload = await reader.readexactly(length) if length else b""
+                # Answered concurrently, in whatever order they finish
+                task = asyncio.ensure_future(self._answer(writer, request_id, operation, payload))
+                requests.add(task)
+                task.add_done_callback(requests.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # Nobody is left to take the answers
+            for task in requests:
+                task.cancel()
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _answer(
+        self, writer: asyncio.StreamWriter, request_id: int, operation: int, payload: bytes
+    ) -> None:
+        self._stats.add("requests")
+        try:
+            status, response = OK, await self._perform(operation, payload)
+        except OrgaAIError as error:
+            self._stats.add("errors")
+            status, response = ERROR, encode_error(error)
+        except Exception as error:
+            self._stats.add("errors")
+            status, response = ERROR, encode_error(OrgaAIServerError(f"Agent error: {error}"))
+        if writer.is_closing():
+            return
+        writer.write(_HEADER.pack(request_id, status, len(response)) + response)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _perform(self, operation: int, payload: bytes) -> bytes:
+        if operation == GET_SESSION:
+            return encode_session(await self.client.get_session_config())
+        if operation == ACQUIRE_SESSION:
+            return encode_session(await self.client.acquire_session())
+        if operation == RELEASE_SESSION:
+            return bytes([self.client.release_session(payload.decode("utf-8"))])
+        if operation == STATS:
+            return json.dumps(self.stats(), default=str).encode("utf-8")
+        raise OrgaAIError(f"Unknown agent operation {operation}")
+
+
+def _listening(path: str) -> bool:
+    """Return whether something accepts connections on a Unix socket."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+class _AgentConnection:
+    """A connection to the agent carrying concurrent requests on one event loop."""
+
+    def __init__(self, path: str, timeout: float) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional["asyncio.Task[None]"] = None
+        self._pending: Dict[int, "asyncio.Future[Tuple[int, bytes]]"] = {}
+        self._ids = itertools.count(1)
+        self._connecting = asyncio.Lock()
+
+    async def request(self, operation: int, payload: bytes = b"") -> Tuple[int, bytes]:
+        """Send a request and return the response's status and payload.
+
+        Raises:
+            OSError: If the agent cannot be reached or the connection is lost
+            asyncio.TimeoutError: If the agent does not answer in time
+        """
+        if self._writer is None:
+            await self._connect()
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            raise ConnectionError("Session agent connection lost")
+        request_id = next(self._ids) & 0xFFFFFFFF
+        future: "asyncio.Future[Tuple[int, bytes]]" = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            writer.write(_HEADER.pack(request_id, operation, len(payload)) + payload)
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self) -> None:
+        """Close the connection, failing the requests waiting on it."""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        self._disconnect()
+
+    async def _connect(self) -> None:
+        async with self._connecting:
+            if self._writer is not None:
+                return
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.path), self.timeout
+            )
+            self._writer = writer
+            self._reader_task = asyncio.ensure_future(self._read_responses(reader))
+
+    async def _read_responses(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                request_id, status, length = _HEADER.unpack(
+                    await reader.readexactly(_HEADER.size)
+                )
+                payload = await reader.readexactly(length) if length else b""
+                future = self._pending.get(request_id)
+                if future is not None and not future.done():
+                    future.set_result((status, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._disconnect()
+
+    def _disconnect(self) -> None:
+        writer, self._writer = self._writer, None
+        self._reader_task = None
+        if writer is not None:
+            writer.close()
+        # The next request reconnects
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Session agent connection lost"))
+
+
+class AgentClient:
+    """Gets session configs from the local agent, or directly while it is down.
+
+    Has the session methods of OrgaAI, and raises the same errors, as
+    reported by the agent's client. When the agent cannot be reached, or is
+    draining, calls go to an OrgaAI client created from ``config``, and the
+    agent is tried again after ``retry_interval``.
+
+    Args:
+        socket_path: Path of the agent's socket
+        config: Configuration for direct calls while the agent is
+            unavailable; without it such calls raise AgentUnavailableError
+        timeout: How long to wait for the agent to connect or answer, in
+            seconds
+        retry_interval: How long calls go direct after the agent was found
+            unavailable, in seconds
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        config: Optional[OrgaAIConfig] = None,
+        timeout: float = 30.0,
+        retry_interval: float = 1.0,
+    ) -> None:
+        self.socket_path = socket_path
+        self.config = config
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._connections: LoopLocal[_AgentConnection] = LoopLocal(
+            lambda: _AgentConnection(socket_path, timeout), _AgentConnection.close
+        )
+        self._direct_client: Optional[Any] = None
+        self._unavailable_until = 0.0
+        self._stats = Counters("agent", "fallbacks")
+
+    async def get_session_config(self) -> SessionConfig:
+        """Get a session config from the agent, or directly if it is unavailable.
+
+        Raises:
+            OrgaAIError: For various error conditions
+            OrgaAIAuthenticationError: For authentication failures
+            OrgaAIServerError: For server errors
+            AgentUnavailableError: If the agent is unavailable and there is
+                no config to fall back to
+        """
+        response = await self._request(GET_SESSION)
+        if response is None:
+            return await self._direct().get_session_config()
+        return decode_session(response)
+
+    async def acquire_session(self) -> SessionConfig:
+        """Lease a session config that can be handed back if it goes unused.
+
+        See OrgaAI.acquire_session(). Sessions are leased from the agent,
+        so one released by any worker can be handed to any other.
+        """
+        response = await self._request(ACQUIRE_SESSION)
+        if response is None:
+            return await self._direct().acquire_session()
+        return decode_session(response)
+
+    async def release_session(self, session: Union[SessionConfig, str]) -> bool:
+        """Hand back an unused session leased by acquire_session().
+
+        Returns:
+            bool: Whether the session went back into a ready pool; see
+            OrgaAI.release_session()
+        """
+        token = session.ephemeral_token if isinstance(session, SessionConfig) else session
+        # Leased directly while the agent was unavailable
+        if self._direct_client is not None and self._direct_client.release_session(token):
+            return True
+        try:
+            response = await self._request(RELEASE_SESSION, token.encode("utf-8"))
+        except AgentUnavailableError:
+            return False
+        return bool(response and response[0])
+
+    async def agent_stats(self) -> Optional[Dict[str, Any]]:
+        """Return the agent's stats, including its client's, or None if it is unavailable."""
+        try:
+            response = await self._request(STATS)
+        except AgentUnavailableError:
+            return None
+        return json.loads(response) if response is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many calls the agent served and how many went direct."""
+        stats: Dict[str, Any] = self._stats.snapshot()
+        stats["connections"] = len(self._connections)
+        stats["direct"] = (
+            self._direct_client.stats() if self._direct_client is not None else None
+        )
+        return stats
+
+    async def close(self) -> None:
+        """Close the connections to the agent and the direct client."""
+        await self._connections.aclose()
+        if self._direct_client is not None:
+            await self._direct_client.close()
+
+    async def __aenter__(self) -> "AgentClient":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def _request(self, operation: int, payload: bytes = b"") -> Optional[bytes]:
+        """Send a request to the agent.
+
+        Returns:
+            Optional[bytes]: The response payload, or None if the agent is
+            unavailable and the call should go direct
+
+        Raises:
+            OrgaAIError: The error the agent's client raised
+            AgentUnavailableError: If the agent is unavailable and there is
+                no config to fall back to
+        """
+        if time.monotonic() >= self._unavailable_until:
+            try:
+                status, response = await self._connections.get().request(operation, payload)
+            except (OSError, asyncio.TimeoutError):
+                pass
+            else:
+                if status == OK:
+                    self._stats.add("agent")
+                    return response
+                error = decode_error(response)
+                if not isinstance(error, OrgaAIDrainingError):
+                    raise error
+            self._unavailable_until = time.monotonic() + self.retry_interval
+        if self.config is None:
+            raise AgentUnavailableError(f"Session agent at {self.socket_path} is unavailable")
+        self._stats.add("fallbacks")
+        return None
+
+    def _direct(self) -> Any:
+        if self._direct_client is None:
+            from .client import OrgaAI
+
+            assert self.config is not None
+            self._direct_client = OrgaAI(self.config)
+        return self._direct_client
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the agent until SIGTERM or SIGINT, then drain it."""
+    parser = argparse.ArgumentParser(
+        prog="python -m orga_ai.agent", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("--socket", required=True, help="path of the Unix socket")
+    parser.add_argument("--mode", default="600", help="socket file permissions, in octal")
+    parser.add_argument("--api-key", default=os.getenv("ORGA_API_KEY"))
+    parser.add_argument("--user-email", default=os.getenv("ORGA_USER_EMAIL"))
+    parser.add_argument(
+        "--base-url", action="append", help="API base URL; repeat to route between several"
+    )
+    parser.add_argument("--pool-size", type=int, default=100, help="max connections")
+    parser.add_argument("--timeout", type=int, default=10000, help="milliseconds")
+    parser.add_argument("--dns-cache", action="store_true", help="enable the DNS cache")
+    parser.add_argument("--token-batch-window", type=float, help="milliseconds")
+    parser.add_argument("--session-pool-size", type=int, help="released sessions kept")
+    parser.add_argument(
+        "--no-ice-refresh", action="store_true", help="do not keep the ICE config fresh"
+    )
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="seconds")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.api_key or not args.user_email:
+        parser.error("--api-key and --user-email (or ORGA_API_KEY and ORGA_USER_EMAIL) are required")
+
+    config = OrgaAIConfig(
+        api_key=args.api_key,
+        user_email=args.user_email,
+        base_url=args.base_url,
+        debug=args.debug,
+        timeout=args.timeout,
+        max_connections=args.pool_size,
+        dns_cache=args.dns_cache,
+        token_batch_window=args.token_batch_window,
+        session_pool_size=args.session_pool_size,
+    )
+
+    async def serve() -> None:
+        from .client import OrgaAI
+        from .scheduler import RefreshScheduler
+
+        agent = SessionAgent(OrgaAI(config), args.socket, mode=int(args.mode, 8))
+        await agent.start()
+        scheduler = None
+        if not args.no_ice_refresh:
+            scheduler = RefreshScheduler()
+            scheduler.watch(agent.client)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        # The first line of output tells parent processes the agent is ready
+        print(f"Listening on {args.socket}", flush=True)
+        try:
+            await stop.wait()
+        finally:
+            if scheduler is not None:
+                await scheduler.aclose()
+            await agent.close(timeout=args.drain_timeout)
+
+    asyncio.run(serve())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
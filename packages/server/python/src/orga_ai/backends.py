@@ -0,0 +1,493 @@
+"""Pluggable cache backends for sharing session material across processes and nodes.
+
+The OrgaAI client uses a cache backend to share ICE config and prefetched
+sessions. Three implementations are built in:
+
+- ``MemoryCacheBackend``: in-process only, useful as a default and in tests;
+- ``FileCacheBackend``: a directory shared by processes on one host (or on a
+  shared filesystem);
+- ``RedisCacheBackend``: any server speaking the Redis protocol, for sharing
+  across a fleet of nodes.
+
+Values are opaque bytes. Besides get/set, backends provide atomic
+operations: ``add`` (set only if absent) and ``delete_if`` (delete only if
+unchanged), used to elect a single refresher per key and let only that
+refresher release it, and ``push``/``claim``, a queue whose items are handed
+out exactly once, used for single-use ephemeral tokens.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+from urllib.parse import unquote, urlparse
+
+from .loops import LoopLocal
+
+if sys.platform == "win32":  # pragma: no cover
+    import msvcrt
+else:
+    import fcntl
+
+T = TypeVar("T")
+
+
+class CacheBackend(ABC):
+    """Interface for cache backends used by the OrgaAI client."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the value for a key, or None if missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Store a value for ``ttl`` seconds, replacing any existing value."""
+
+    @abstractmethod
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Store a value only if the key is absent.
+
+        Returns:
+            bool: True if the value was stored (the caller won the key)
+        """
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove a key (value or queue) if present."""
+
+    async def delete_if(self, key: str, value: bytes) -> bool:
+        """Remove a key only if it still holds ``value``.
+
+        Used to release a key won with ``add`` without removing one that
+        expired and was won by another process in the meantime. This default
+        compares and deletes in two steps, so it is not atomic; backends
+        should override it.
+
+        Returns:
+            bool: True if the key held ``value`` and was removed
+        """
+        if await self.get(key) != value:
+            return False
+        await self.delete(key)
+        return True
+
+    @abstractmethod
+    async def push(self, key: str, value: bytes, ttl: float) -> None:
+        """Append an item to the queue at ``key``.
+
+        The queue expires ``ttl`` seconds after the last push.
+        """
+
+    @abstractmethod
+    async def claim(self, key: str) -> Optional[bytes]:
+        """Atomically remove and return the oldest item of the queue at ``key``.
+
+        Each pushed item is returned by at most one claim, across every
+        process sharing the backend.
+        """
+
+    async def close(self) -> None:
+        """Release any resources held by the backend."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Cache backend storing everything in this process's memory."""
+
+    def __init__(self) -> None:
+        self._values: Dict[str, Tuple[float, bytes]] = {}
+        self._queues: Dict[str, Tuple[float, Deque[bytes]]] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[0]:
+                del self._values[key]
+                return None
+            return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, value)
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and now < entry[0]:
+                return False
+            self._values[key] = (now + ttl, value)
+            return True
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+            self._queues.pop(key, None)
+
+    async def delete_if(self, key: str, value: bytes) -> bool:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or time.monotonic() >= entry[0] or entry[1] != value:
+                return False
+            del self._values[key]
+            return True
+
+    async def push(self, key: str, value: bytes, ttl: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._queues.get(key)
+            items: Deque[bytes] = deque() if entry is None or now >= entry[0] else entry[1]
+            items.append(value)
+            self._queues[key] = (now + ttl, items)
+
+    async def claim(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._queues.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[0] or not entry[1]:
+                del self._queues[key]
+                return None
+            return entry[1].popleft()
+
+
+class FileCacheBackend(CacheBackend):
+    """Cache backend storing entries as files in a directory.
+
+    Every key maps to a file named after its digest. Values are written to a
+    temporary file and renamed into place, ``add`` and ``delete_if`` check and
+    change a key while holding a lock on its ``.lock`` file, and queue items
+    are claimed by renaming them, so all operations are atomic across
+    processes sharing the directory. The file work runs in the default
+    executor rather than on the event loop.
+
+    Args:
+        directory: Directory to store entries in; created if missing
+    """
+
+    _EXPIRY = struct.Struct("<d")
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._run(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return await self._run(self._add, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._run(self._delete, key)
+
+    async def delete_if(self, key: str, value: bytes) -> bool:
+        return await self._run(self._delete_if, key, value)
+
+    async def push(self, key: str, value: bytes, ttl: float) -> None:
+        await self._run(self._push, key, value, ttl)
+
+    async def claim(self, key: str) -> Optional[bytes]:
+        return await self._run(self._claim, key)
+
+    @staticmethod
+    async def _run(function: Callable[..., T], *args: Any) -> T:
+        # File I/O and waiting for a key lock block, so they are kept off the
+        # event loop
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        return self._read(self._path(key))
+
+    def _set(self, key: str, value: bytes, ttl: float) -> None:
+        self._write_atomic(self._path(key), value, ttl)
+
+    def _add(self, key: str, value: bytes, ttl: float) -> bool:
+        path = self._path(key)
+        # Checking and taking over an expired entry in separate steps would
+        # let two processes both see it expired and both win the key
+        with self._locked(path):
+            if self._read(path) is not None:
+                return False
+            self._write_atomic(path, value, ttl)
+            return True
+
+    def _delete(self, key: str) -> None:
+        path = self._path(key)
+        self._unlink(path)
+        queue = path + ".queue"
+        if os.path.isdir(queue):
+            for name in os.listdir(queue):
+                self._unlink(os.path.join(queue, name))
+
+    def _delete_if(self, key: str, value: bytes) -> bool:
+        path = self._path(key)
+        with self._locked(path):
+            if self._read(path) != value:
+                return False
+            self._unlink(path)
+            return True
+
+    def _push(self, key: str, value: bytes, ttl: float) -> None:
+        queue = self._path(key) + ".queue"
+        os.makedirs(queue, mode=0o700, exist_ok=True)
+        # Names sort by push time; the random suffix keeps them unique
+        name = f"{time.time_ns():020d}-{os.urandom(4).hex()}"
+        self._write_atomic(os.path.join(queue, name), value, ttl)
+
+    def _claim(self, key: str) -> Optional[bytes]:
+        queue = self._path(key) + ".queue"
+        try:
+            names = sorted(n for n in os.listdir(queue) if not n.startswith("."))
+        except FileNotFoundError:
+            return None
+        for name in names:
+            source = os.path.join(queue, name)
+            claimed = os.path.join(queue, f".claimed-{name}-{os.getpid()}")
+            try:
+                # Only one process can rename the item away
+                os.rename(source, claimed)
+            except FileNotFoundError:
+                continue
+            value = self._read(claimed)
+            self._unlink(claimed)
+            if value is not None:
+                return value
+        return None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _locked(path: str) -> Iterator[None]:
+        """Hold an exclusive lock on the key at ``path`` against every process."""
+        # The lock belongs to this open file, so it also excludes other
+        # threads and is released if the process dies
+        fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if sys.platform == "win32":  # pragma: no cover
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+        finally:
+            os.close(fd)
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if len(data) < self._EXPIRY.size:
+            return None
+        if time.time() >= self._EXPIRY.unpack_from(data)[0]:
+            return None
+        return data[self._EXPIRY.size:]
+
+    def _write_atomic(self, path: str, value: bytes, ttl: float) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(self._EXPIRY.pack(time.time() + ttl) + value)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+class RedisProtocolError(Exception):
+    """Raised when a Redis-protocol server returns an error reply."""
+
+
+class RedisCacheBackend(CacheBackend):
+    """Cache backend for servers speaking the Redis protocol (RESP2).
+
+    A minimal built-in client is used so no Redis library is required.
+    Commands are pipelined over a single connection per event loop, which is
+    opened lazily and re-opened after connection errors.
+
+    Args:
+        url: Server URL, e.g. "redis://:password@localhost:6379/0"
+        prefix: Prefix added to every key
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "") -> None:
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self._connections: LoopLocal[_RedisConnection] = LoopLocal(
+            _RedisConnection, _RedisConnection.close
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        reply = await self._command(b"GET", self._key(key))
+        return reply if isinstance(reply, bytes) else None
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._command(b"SET", self._key(key), value, b"PX", _millis(ttl))
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        reply = await self._command(b"SET", self._key(key), value, b"NX", b"PX", _millis(ttl))
+        return reply == b"OK"
+
+    async def delete(self, key: str) -> None:
+        await self._command(b"DEL", self._key(key))
+
+    async def delete_if(self, key: str, value: bytes) -> bool:
+        reply = await self._command(b"EVAL", _DELETE_IF_SCRIPT, b"1", self._key(key), value)
+        return reply == 1
+
+    async def push(self, key: str, value: bytes, ttl: float) -> None:
+        redis_key = self._key(key)
+        await self._pipeline(
+            [
+                [b"RPUSH", redis_key, value],
+                [b"PEXPIRE", redis_key, _millis(ttl)],
+            ]
+        )
+
+    async def claim(self, key: str) -> Optional[bytes]:
+        reply = await self._command(b"LPOP", self._key(key))
+        return reply if isinstance(reply, bytes) else None
+
+    async def close(self) -> None:
+        await self._connections.aclose()
+
+    def _key(self, key: str) -> bytes:
+        return (self.prefix + key).encode("utf-8")
+
+    async def _command(self, *args: bytes) -> "RespValue":
+        return (await self._pipeline([list(args)]))[0]
+
+    async def _pipeline(self, commands: List[List[bytes]]) -> List["RespValue"]:
+        connection = self._connections.get()
+        async with connection.lock:
+            if connection.writer is None:
+                await self._connect(connection)
+            try:
+                return await connection.send(commands)
+            except BaseException:
+                # A cancellation or error between the write and the last
+                # reply leaves replies in the stream that would answer the
+                # next command, so the connection is never reused
+                await connection.close()
+                raise
+
+    async def _connect(self, connection: "_RedisConnection") -> None:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password is not None:
+            setup.append([b"AUTH", self.password.encode("utf-8")])
+        if self.db:
+            setup.append([b"SELECT", str(self.db).encode("ascii")])
+        try:
+            if setup:
+                await _exchange(reader, writer, setup)
+        except BaseException:
+            writer.close()
+            raise
+        # Only a connection that is authenticated and on its database is kept
+        connection.reader, connection.writer = reader, writer
+
+
+class _RedisConnection:
+    """A Redis-protocol connection used by one event loop."""
+
+    __slots__ = ("reader", "writer", "lock")
+
+    def __init__(self) -> None:
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.lock = asyncio.Lock()
+
+    async def send(self, commands: List[List[bytes]]) -> List["RespValue"]:
+        assert self.reader is not None and self.writer is not None
+        return await _exchange(self.reader, self.writer, commands)
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+RespValue = Union[bytes, int, None, List["RespValue"], RedisProtocolError]
+
+_DELETE_IF_SCRIPT = (
+    b'if redis.call("GET", KEYS[1]) == ARGV[1] then '
+    b'return redis.call("DEL", KEYS[1]) else return 0 end'
+)
+
+
+async def _exchange(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, commands: List[List[bytes]]
+) -> List[RespValue]:
+    """Send pipelined commands and read one reply for each."""
+    writer.write(b"".join(_encode_command(command) for command in commands))
+    await writer.drain()
+    replies = [await _read_reply(reader) for _ in commands]
+    for reply in replies:
+        if isinstance(reply, RedisProtocolError):
+            raise reply
+    return replies
+
+
+def _millis(ttl: float) -> bytes:
+    return str(max(1, int(ttl * 1000))).encode("ascii")
+
+
+def _encode_command(args: List[bytes]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> RespValue:
+    line = await reader.readuntil(b"\r\n")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body
+    if kind == b"-":
+        return RedisProtocolError(body.decode("utf-8", "replace"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(count)]
+    raise RedisProtocolError(f"Unexpected reply: {line!r}")
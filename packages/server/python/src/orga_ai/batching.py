@@ -0,0 +1,202 @@
+"""Micro-batching of ephemeral token requests.
+
+When many sessions are requested at once, each would otherwise become its own
+``POST /v1/realtime/client-secrets``. ``TokenBatcher`` holds token requests
+for a short window and issues them together: as one request asking for
+several tokens when the API supports it, or as concurrent individual
+requests over the pooled connections when it does not.
+
+Whether batching is supported is learned from the first batched request: an
+API that rejects the ``count`` parameter, or ignores it and returns a single
+token, is not asked again until a backoff has passed, which starts at
+``reprobe_interval`` and doubles with each rejection up to an hour. A
+rejection can be transient, such as a deployment rolling out, so batching
+is never given up for good.
+
+A batcher can be shared by several event loops: requests are batched with
+others from the same loop, while what was learned about the API and the
+counters are shared.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .counters import Counters
+
+
+MAX_REPROBE_INTERVAL = 3600.0
+
+class TokenBatcher:
+    """Groups concurrent token requests into batches.
+
+    Args:
+        fetch_one: Fetches a single token
+        fetch_many: Fetches ``count`` tokens in one request. Returns None if
+            the API does not support batching, or fewer tokens than asked for
+            if it ignored the count
+        window: How long the first request of a batch waits for others, in
+            seconds
+        max_size: Batch size that triggers an immediate flush
+        spawn: Runs a coroutine in the background; defaults to
+            ``asyncio.ensure_future``
+        reprobe_interval: How long after the first rejection a batched
+            request is tried again, in seconds
+        clock: Monotonic clock used for the backoff
+
+    Attributes:
+        supports_batching: Whether the API accepted the last batched request,
+            or None until one has been tried
+    """
+
+    def __init__(
+        self,
+        fetch_one: Callable[[], Awaitable[str]],
+        fetch_many: Callable[[int], Awaitable[Optional[List[str]]]],
+        window: float,
+        max_size: int = 100,
+        spawn: Optional[Callable[[Any], None]] = None,
+        reprobe_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._fetch_one = fetch_one
+        self._fetch_many = fetch_many
+        self.window = window
+        self.max_size = max(1, max_size)
+        self._spawn = spawn if spawn is not None else asyncio.ensure_future
+        self.supports_batching: Optional[bool] = None
+        self.reprobe_interval = reprobe_interval
+        self._clock = clock
+        # Backoff after consecutive rejections, and when batching is next tried
+        self._backoff = reprobe_interval
+        self._reprobe_at = 0.0
+        # The batch being collected on each loop; a loop only has an entry
+        # while it has requests waiting
+        self._batches: Dict[asyncio.AbstractEventLoop, _Batch] = {}
+        self._stats = Counters(
+            "requests", "flushes", "batches", "batched_tokens", "individual_tokens"
+        )
+
+    async def get_token(self) -> str:
+        """Wait for a token from the next batch.
+
+        Raises:
+            Whatever fetching the token raised; a failed batched request fails
+            every request in the batch
+        """
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[str]" = loop.create_future()
+        # Only this loop's thread adds or removes its own entry, so the map
+        # needs no lock
+        batch = self._batches.get(loop)
+        if batch is None:
+            batch = self._batches[loop] = _Batch()
+        self._stats.add("requests")
+        batch.pending.append(future)
+        if len(batch.pending) >= self.max_size:
+            self._flush(loop)
+        elif batch.timer is None:
+            batch.timer = loop.call_later(self.window, self._flush, loop)
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batching counters and whether the API supports batching."""
+        stats: Dict[str, Any] = self._stats.snapshot()
+        stats["pending"] = sum(len(batch.pending) for batch in list(self._batches.values()))
+        stats["supports_batching"] = self.supports_batching
+        return stats
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        batch = self._batches.pop(loop, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        waiters = [future for future in batch.pending if not future.done()]
+        if waiters:
+            self._count("flushes")
+            self._spawn(self._issue(waiters))
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        self._stats.add(name, amount)
+
+    async def _issue(self, waiters: List["asyncio.Future[str]"]) -> None:
+        try:
+            tokens: List[str] = []
+            if len(waiters) > 1 and self._may_batch():
+                try:
+                    batch = await self._fetch_many(len(waiters))
+                except Exception as error:
+                    for future in waiters:
+                        _settle(future, error=error)
+                    return
+                if batch is None or len(batch) < len(waiters):
+                    self._rejected()
+                else:
+                    self.supports_batching = True
+                    self._backoff = self.reprobe_interval
+                    self._count("batches")
+                tokens = list(batch or [])
+                self._count("batched_tokens", min(len(tokens), len(waiters)))
+            for future, token in zip(waiters, tokens):
+                _settle(future, result=token)
+            await self._issue_individually(waiters[len(tokens):])
+        except BaseException:
+            # Cancelled (e.g. the client closed): don't leave callers hanging
+            for future in waiters:
+                future.cancel()
+            raise
+
+    def _may_batch(self) -> bool:
+        if self.supports_batching is not False:
+            return True
+        now = self._clock()
+        if now < self._reprobe_at:
+            return False
+        # Only this batch tries again; the others wait for its answer
+        self._reprobe_at = now + self._backoff
+        return True
+
+    def _rejected(self) -> None:
+        if self.supports_batching is False:
+            # Rejected again after a backoff
+            self._backoff = min(self._backoff * 2, MAX_REPROBE_INTERVAL)
+        self.supports_batching = False
+        self._reprobe_at = self._clock() + self._backoff
+
+    async def _issue_individually(self, waiters: List["asyncio.Future[str]"]) -> None:
+        if not waiters:
+            return
+        self._count("individual_tokens", len(waiters))
+        results = await asyncio.gather(
+            *(self._fetch_one() for _ in waiters), return_exceptions=True
+        )
+        for future, result in zip(waiters, results):
+            if isinstance(result, BaseException):
+                _settle(future, error=result)
+            else:
+                _settle(future, result=result)
+
+
+class _Batch:
+    """Token requests waiting on one event loop."""
+
+    __slots__ = ("pending", "timer")
+
+    def __init__(self) -> None:
+        self.pending: List["asyncio.Future[str]"] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+def _settle(
+    future: "asyncio.Future[str]",
+    result: Optional[str] = None,
+    error: Optional[BaseException] = None,
+) -> None:
+    """Resolve a waiter unless its caller has already given up on it."""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)  # type: ignore[arg-type]
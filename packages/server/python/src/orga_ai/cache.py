@@ -0,0 +1,129 @@
+"""Caching helpers for the OrgaAI Python SDK.
+
+This module contains the small in-process caches used by the OrgaAI client.
+They are intentionally dependency-free so they can be shared between client
+instances living in the same process.
+"""
+
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+def credentials_key(api_key: str, user_email: str, base_url: str) -> str:
+    """Build a stable cache key for a set of client credentials.
+
+    The key is a digest so that raw API keys are never used as dictionary keys
+    or exposed through stats and debug output. Any change to the API key, user
+    email or base URL yields a different key, which is what invalidates cached
+    entries when the configuration changes.
+
+    Args:
+        api_key: The OrgaAI API key
+        user_email: The developer's email address
+        base_url: The OrgaAI API base URL
+
+    Returns:
+        str: Hex digest identifying the credentials
+    """
+    raw = f"{api_key}\0{user_email}\0{base_url}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+class NegativeCache:
+    """Short-lived cache of authentication failures.
+
+    When the API rejects a set of credentials with a 401, the failure is
+    remembered for a configurable window. Repeated calls with the same
+    credentials during that window are answered locally instead of sending
+    another request upstream.
+
+    Attributes:
+        max_entries: Maximum number of credential keys remembered at once
+        hits: Number of lookups answered from the cache (suppressed calls)
+        stores: Number of failures recorded
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stores = 0
+        self._clock = clock
+        self._entries: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached failure message for a key, if still valid.
+
+        Args:
+            key: Credentials key from credentials_key()
+
+        Returns:
+            Optional[str]: The original error message, or None on a miss
+        """
+        # The cache is process-wide and consulted on every request, so a miss
+        # (the normal case) is answered without taking the lock
+        if key not in self._entries:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, message = entry
+            if self._clock() >= expires_at:
+                del self._entries[key]
+                return None
+            self.hits += 1
+            return message
+
+    def put(self, key: str, message: str, ttl: float) -> None:
+        """Remember an authentication failure.
+
+        Args:
+            key: Credentials key from credentials_key()
+            message: Error message to replay on suppressed calls
+            ttl: How long to remember the failure, in seconds
+        """
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._evict_locked()
+            self._entries[key] = (self._clock() + ttl, message)
+            self.stores += 1
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Forget a cached failure, or every cached failure if no key is given.
+
+        Args:
+            key: Credentials key to forget (optional)
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _evict_locked(self) -> None:
+        """Drop expired entries, then the entry closest to expiry if still full."""
+        now = self._clock()
+        expired = [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if len(self._entries) >= self.max_entries:
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
+
+
+# Process-wide cache shared by every OrgaAI instance. Clients are often created
+# per request, so a per-instance cache would not protect against retry storms.
+auth_failure_cache = NegativeCache()
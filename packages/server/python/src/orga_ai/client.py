@@ -4,22 +4,119 @@ This module contains the core OrgaAI client that handles API communication
 and session configuration. This is equivalent to the client.ts file in the TypeScript version.
 """
 
+import os
 import re
+import threading
+import importlib.util
+import json
+import time
 import asyncio
-import warnings
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set, Tuple, Union
 from urllib.parse import urlencode
 
-import httpx
-
-from .types import OrgaAIConfig, SessionConfig, IceServer
+from .backends import CacheBackend
+from .batching import TokenBatcher
+from .counters import Counters
+from .cache import NegativeCache, auth_failure_cache, credentials_key
+from .dns import CachingResolver
+from .ice_probe import IceServerProber
+from .leases import SessionPool
+from .loops import LoopLocal
+from .profiler import SlowCallRecorder, current_timeline, mark
+from .prefetch import AdaptivePrefetcher
+from .parsing import parse_ephemeral_token, parse_ephemeral_tokens, parse_ice_servers
+from .routing import EndpointRouter
+from .shared_memory import SharedIceCache
+from .snapshot import IceSnapshot
+from .transports import (
+    TRANSPORTS,
+    AiohttpTransport,
+    HTTPClient,
+    HTTPResponse,
+    HttpxTransport,
+    Transport,
+    detect_transport,
+)
+from .types import OrgaAIConfig, SessionConfig, IceServer, earliest_expiry
 from .errors import (
     OrgaAIError,
     OrgaAIAuthenticationError,
     OrgaAIServerError,
+    OrgaAIDrainingError,
 )
 
 
+# How often a process waiting on another process's refresh polls the backend
+BACKEND_POLL_INTERVAL = 0.05
+
+# How often drain() checks whether the calls in progress have finished
+DRAIN_POLL_INTERVAL = 0.01
+
+# close() tasks scheduled by the sync context manager on a running loop,
+# kept until they finish since the loop only holds weak references
+_closing_tasks: Set["asyncio.Task[None]"] = set()
+
+# Statuses meaning an endpoint was reached but could not serve the request;
+# they count against its health like a connection failure
+ENDPOINT_ERROR_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Statuses meaning the API does not accept a batched token request
+BATCH_UNSUPPORTED_STATUSES = (400, 404, 405, 422)
+
+# Same regex as the TypeScript version, compiled once
+EMAIL_REGEX = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+
+TOKEN_PATH = "/v1/realtime/client-secrets"
+ICE_CONFIG_PATH = "/v1/realtime/ice-config"
+
+
+def _token_expiry(ephemeral_token: str) -> Optional[float]:
+    """Return the expiry parsing attached to a token, if it knew one."""
+    return getattr(ephemeral_token, "expires_at", None)
+
+
+def _expired(ice_servers: list[IceServer]) -> bool:
+    """Whether any of the ICE credentials has expired."""
+    expires_at = earliest_expiry(ice_servers)
+    return expires_at is not None and expires_at <= time.time()
+
+
+def _cache_ttl(ttl: float, ice_servers: list[IceServer]) -> float:
+    """Cap a cache TTL so ICE credentials are not cached past their expiry."""
+    expires_at = earliest_expiry(ice_servers)
+    if expires_at is None:
+        return ttl
+    return min(ttl, expires_at - time.time())
+
+
+class _RequestTemplates:
+    """Request URLs and headers derived from the client's configuration.
+    
+    Built once per set of credentials so the per-session path only looks
+    them up instead of re-encoding query strings and rebuilding headers.
+    """
+    
+    __slots__ = (
+        "api_key", "user_email", "base_url", "credentials_key",
+        "token_urls", "ice_urls", "token_headers",
+    )
+    
+    def __init__(self, api_key: str, user_email: str, base_url: str, base_urls: list[str]) -> None:
+        self.api_key = api_key
+        self.user_email = user_email
+        self.base_url = base_url
+        self.credentials_key = credentials_key(api_key, user_email, base_url)
+        query = urlencode({"email": user_email})
+        # Full URLs keyed by base URL, in the shape _send() expects
+        self.token_urls = {base: f"{base}{TOKEN_PATH}?{query}" for base in base_urls}
+        self.ice_urls = {base: f"{base}{ICE_CONFIG_PATH}" for base in base_urls}
+        # Shared by every token request; transports copy headers, never mutate them
+        self.token_headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+
+
 class OrgaAI:
     """Main OrgaAI client class.
     
@@ -43,31 +140,433 @@ class OrgaAI:
             raise OrgaAIError("User email is required")
         
         # Validate email format (same regex as TypeScript version)
-        email_regex = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
-        if not re.match(email_regex, config.user_email):
+        if not EMAIL_REGEX.match(config.user_email):
             raise OrgaAIError("Invalid email format")
         
         # Set configuration with defaults (equivalent to TypeScript defaults)
         self.api_key = config.api_key
         self.user_email = config.user_email
-        self.base_url = config.base_url or "https://api.orga-ai.com"
+        self._templates: Optional[_RequestTemplates] = None
         self.debug = config.debug or False
         self.timeout = config.timeout or 10000
+        self.max_connections = config.max_connections or 100
+        self.http2 = config.http2 or False
+        self.trust_responses = config.trust_responses or False
+        self.auth_failure_cache_ttl = config.auth_failure_cache_ttl or 0
+        
+        # Negative cache for 401s, shared by all clients in the process
+        self._auth_failures: NegativeCache = auth_failure_cache
+        self._auth_failures_suppressed = 0
+        
+        # Latency/error tracking across base URLs, with failover between them
+        self._endpoint_reprobe_interval = (config.endpoint_reprobe_interval or 30000) / 1000
+        if isinstance(config.base_url, str):
+            self._use_base_urls([config.base_url])
+        else:
+            self._use_base_urls(list(config.base_url or ["https://api.orga-ai.com"]))
+        self._background_tasks: Set["asyncio.Task[None]"] = set()
+        
+        # Optional reachability ranking of the returned ICE servers
+        self.rank_ice_servers = config.rank_ice_servers or False
+        self.drop_unreachable_ice_servers = config.drop_unreachable_ice_servers or False
+        self._ice_prober = IceServerProber(timeout=(config.ice_probe_timeout or 500) / 1000)
+        
+        # Optional DNS cache plugged into the HTTP transport
+        self._dns: Optional[CachingResolver] = None
+        if config.dns_cache or config.dns_resolver is not None:
+            self._dns = CachingResolver(
+                config.dns_resolver,
+                default_ttl=(config.dns_cache_ttl or 60000) / 1000,
+            )
+        
+        # Optional on-disk snapshot of the last ICE config, used to serve the
+        # first session of a fresh process without the ICE round-trip
+        self._ice_snapshot: Optional[IceSnapshot] = None
+        self._ice_snapshot_pending = False
+        if config.ice_snapshot_path:
+            self._ice_snapshot = IceSnapshot(
+                config.ice_snapshot_path,
+                max_age=(config.ice_snapshot_max_age or 300000) / 1000,
+            )
+            self._ice_snapshot_pending = True
+        
+        # Optional ICE config cache shared by every worker process on the host
+        self._shared_ice: Optional[SharedIceCache] = None
+        self.shared_ice_cache_ttl = config.shared_ice_cache_ttl or 60000
+        if config.shared_ice_cache_path:
+            self._shared_ice = SharedIceCache(
+                config.shared_ice_cache_path, self._credentials_key()
+            )
         
-        # Create HTTP client (equivalent to fetch in TypeScript)
-        self._client = httpx.AsyncClient(timeout=self.timeout / 1000)  # Convert ms to seconds
+        # Optional cache backend sharing ICE config and prefetched sessions
+        # across processes and nodes
+        self._cache_backend: Optional[CacheBackend] = config.cache_backend
+        self.ice_cache_ttl = config.ice_cache_ttl or 60000
+        self.prefetched_session_ttl = config.prefetched_session_ttl or 30000
+        self._prefetched_sessions_served = 0
+        
+        # Sessions leased by acquire_session(), and those returned unused
+        # that are handed out again
+        self._sessions = SessionPool(
+            size=config.session_pool_size or 100,
+            lease_ttl=self.prefetched_session_ttl / 1000,
+            min_validity=(config.session_min_validity or 5000) / 1000,
+        )
+        
+        # Optional reserve of prefetched sessions in this process, sized from
+        # the arrival rate of calls and refilled in the background
+        self._prefetcher: Optional[AdaptivePrefetcher] = None
+        if config.adaptive_prefetch:
+            self._prefetcher = AdaptivePrefetcher(
+                max_size=config.prefetch_max_sessions or 100,
+                session_ttl=self.prefetched_session_ttl / 1000,
+                min_validity=self._sessions.min_validity,
+            )
+        
+        # ICE servers fetched by refresh_ice_servers(), with the Unix time
+        # until which they are served
+        self._refreshed_ice: Optional[Tuple[list[IceServer], float]] = None
+        
+        # ICE servers last fetched from the API, with the Unix time they were
+        # fetched, which drain() can hand to a snapshot
+        self._latest_ice: Optional[Tuple[list[IceServer], float]] = None
+        
+        # Optional capture of slow get_session_config() calls
+        self._slow_calls: Optional[SlowCallRecorder] = None
+        if config.slow_call_threshold is not None:
+            self._slow_calls = SlowCallRecorder(
+                config.slow_call_threshold / 1000,
+                size=config.slow_call_buffer_size or 100,
+            )
+        
+        # Optional ICE fetch overlapping the token request, authorized with
+        # the most recent token and the Unix time until which it is used
+        self._speculative_ice: Optional[Counters] = None
+        self._recent_token: Optional[Tuple[str, float]] = None
+        self.ice_api_key_auth = config.ice_api_key_auth or False
+        if config.speculative_ice_fetch:
+            self._speculative_ice = Counters("attempts", "used", "fallbacks")
+        
+        # Calls in progress, which drain() waits for
+        self._calls = Counters("in_flight")
+        self._draining = False
+        
+        # Optional micro-batching of concurrent ephemeral token requests
+        self._token_batcher: Optional[TokenBatcher] = None
+        if config.token_batch_window:
+            self._token_batcher = TokenBatcher(
+                self._fetch_ephemeral_token,
+                self._fetch_ephemeral_tokens,
+                window=config.token_batch_window / 1000,
+                max_size=config.token_batch_max_size or 100,
+                spawn=self._spawn,
+            )
+        
+        # HTTP transport (httpx or aiohttp) the requests are sent through
+        self.transport: Transport = self._create_transport(config)
+        
+        # HTTP clients are bound to the event loop they are first used on,
+        # so each running loop gets its own, created on first use there and
+        # closed when that loop shuts down. Caches, routing and stats above
+        # are shared by every loop.
+        self._http_clients: LoopLocal[HTTPClient] = LoopLocal(
+            self.transport.create_client, self.transport.close_client
+        )
+        self._pinned_client: Optional[HTTPClient] = None
+        self._stats_lock = threading.Lock()
+    
+    def _create_transport(self, config: OrgaAIConfig) -> Transport:
+        """Create the transport named by the config, or the detected one."""
+        if isinstance(config.transport, Transport):
+            return config.transport
+        name = config.transport
+        if name is None:
+            name = "aiohttp" if config.aiohttp_session is not None else detect_transport()
+        if name not in TRANSPORTS:
+            raise OrgaAIError(
+                f"Unknown transport {name!r}; expected one of: {', '.join(TRANSPORTS)}"
+            )
+        timeout = self.timeout / 1000  # Convert ms to seconds
+        if name == "aiohttp":
+            if importlib.util.find_spec("aiohttp") is None:
+                raise OrgaAIError(
+                    "The aiohttp transport requires the 'aiohttp' package; "
+                    "install it with: pip install orga-ai[aiohttp]"
+                )
+            if self.http2:
+                raise OrgaAIError("http2 is not supported by the aiohttp transport")
+            return AiohttpTransport(
+                timeout,
+                max_connections=self.max_connections,
+                resolver=self._dns,
+                session=config.aiohttp_session,
+                tracing=self._slow_calls is not None,
+            )
+        if config.aiohttp_session is not None:
+            raise OrgaAIError("aiohttp_session requires the aiohttp transport")
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            raise OrgaAIError(
+                "http2 requires the 'h2' package; install it with: pip install orga-ai[http2]"
+            )
+        return HttpxTransport(
+            timeout,
+            max_connections=self.max_connections,
+            http2=self.http2,
+            resolver=self._dns,
+            tracing=self._slow_calls is not None,
+        )
+    
+    @property
+    def _client(self) -> HTTPClient:
+        """The HTTP client for the running event loop, created on first request."""
+        if self._pinned_client is not None:
+            return self._pinned_client
+        return self._http_clients.get()
+    
+    @_client.setter
+    def _client(self, client: HTTPClient) -> None:
+        # An injected client is used on every loop
+        self._pinned_client = client
+    
+    @property
+    def _http_client(self) -> Optional[HTTPClient]:
+        """The running event loop's HTTP client, if one has been created."""
+        if self._pinned_client is not None:
+            return self._pinned_client
+        return self._http_clients.peek()
     
     def _log(self, message: str, data: Optional[Any] = None) -> None:
         """Log debug messages if debug mode is enabled.
         
         This is equivalent to the private log method in the TypeScript version.
+        The message, without the data, is also recorded in the timeline of a
+        call being profiled for slowness.
         """
+        mark(message)
         if self.debug:
             if data is not None:
                 print(f"[OrgaAI] {message}", data)
             else:
                 print(f"[OrgaAI] {message}")
     
+    def _credentials_key(self) -> str:
+        """Return the negative cache key for the current credentials.
+        
+        The key is derived from the live attributes, so changing the API key,
+        user email or base URL on the client invalidates any cached failure.
+        """
+        return self._request_templates().credentials_key
+    
+    def _request_templates(self) -> _RequestTemplates:
+        """Return the request templates, rebuilding them if credentials changed.
+        
+        Setting ``base_url`` to a URL other than the first of ``base_urls``
+        replaces them with that one URL, with a fresh endpoint router.
+        """
+        templates = self._templates
+        if (
+            templates is None
+            or templates.api_key is not self.api_key
+            or templates.user_email is not self.user_email
+            or templates.base_url is not self.base_url
+        ):
+            if self.base_url != self.base_urls[0]:
+                self._use_base_urls([self.base_url])
+            templates = self._templates = _RequestTemplates(
+                self.api_key, self.user_email, self.base_url, self.base_urls
+            )
+        return templates
+    
+    def _use_base_urls(self, base_urls: list[str]) -> None:
+        """Route requests between ``base_urls``, with no endpoint health recorded yet."""
+        self.base_urls = base_urls
+        self.base_url = base_urls[0]
+        self._router = EndpointRouter(base_urls, reprobe_interval=self._endpoint_reprobe_interval)
+        # With a single base URL there is nothing to rank, so skip the router
+        self._only_base_url = tuple(base_urls) if len(base_urls) == 1 else None
+    
+    def invalidate_auth_failures(self) -> None:
+        """Forget any cached authentication failure for this client's credentials.
+        
+        Call this after fixing credentials upstream (e.g. re-enabling an API key)
+        to retry immediately instead of waiting for the cache window to expire.
+        """
+        self._auth_failures.invalidate(self._credentials_key())
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return counters describing this client's activity.
+        
+        Returns:
+            Dict[str, Any]: Snapshot of the client's counters
+        """
+        return {
+            "auth_failures": {
+                "suppressed": self._auth_failures_suppressed,
+                "cache_hits": self._auth_failures.hits,
+                "cache_stores": self._auth_failures.stores,
+                "cache_size": len(self._auth_failures),
+            },
+            "endpoints": self._router.snapshot(),
+            "ice_probes": {
+                "sent": self._ice_prober.probes_sent,
+            },
+            "dns": self._dns.stats() if self._dns is not None else None,
+            "shared_ice": (
+                self._shared_ice.stats() if self._shared_ice is not None else None
+            ),
+            "prefetched_sessions": {
+                "served": self._prefetched_sessions_served,
+            },
+            "adaptive_prefetch": (
+                self._prefetcher.stats() if self._prefetcher is not None else None
+            ),
+            "token_batching": (
+                self._token_batcher.stats() if self._token_batcher is not None else None
+            ),
+            "speculative_ice": (
+                self._speculative_ice.snapshot() if self._speculative_ice is not None else None
+            ),
+            "transports": len(self._http_clients),
+            "leases": self._sessions.stats(),
+            "in_flight": self._calls.get("in_flight"),
+            "slow_calls": (
+                self._slow_calls.stats() if self._slow_calls is not None else None
+            ),
+            "draining": self._draining,
+        }
+    
+    def slow_calls(self, clear: bool = False) -> list[Dict[str, Any]]:
+        """Return the timelines of the most recent slow get_session_config() calls.
+        
+        Calls are captured when ``slow_call_threshold`` is set. Each timeline
+        has the call's ``started_at`` (Unix time), ``duration_ms``, ``error``
+        (None if it succeeded) and ``events``, in the order they started.
+        Every event has ``at_ms`` (from the start of the call), an ``event``
+        name, ``duration_ms`` (None for instant events) and a ``detail``.
+        
+        Args:
+            clear: Also empty the buffer
+            
+        Returns:
+            list[Dict[str, Any]]: The timelines, oldest first
+            
+        Raises:
+            OrgaAIError: If slow call capture is not enabled
+        """
+        if self._slow_calls is None:
+            raise OrgaAIError("slow_calls requires slow_call_threshold")
+        return self._slow_calls.records(clear)
+    
+    def dump_slow_calls(self, path: str) -> int:
+        """Write the timelines of slow_calls() to a JSON file.
+        
+        Args:
+            path: File to write
+            
+        Returns:
+            int: Number of timelines written
+            
+        Raises:
+            OrgaAIError: If slow call capture is not enabled
+        """
+        if self._slow_calls is None:
+            raise OrgaAIError("dump_slow_calls requires slow_call_threshold")
+        return self._slow_calls.dump(path)
+    
+    async def _send(
+        self, method: str, urls: Dict[str, str], headers: Dict[str, str]
+    ) -> HTTPResponse:
+        """Send a request to the best available endpoint, failing over on connection errors.
+        
+        Every endpoint is tried at most once, best candidate first. Errors
+        raised before the request reached the server trigger failover, so a
+        request is never processed twice. Error responses (5xx and 429) count
+        against the endpoint's health, and GET requests, which are
+        idempotent, fail over on them too.
+        
+        Args:
+            method: "GET" or "POST"
+            urls: Full request URL for each base URL
+            headers: Request headers
+            
+        Returns:
+            HTTPResponse: The first successful response from any endpoint,
+            or the last error response if every endpoint answered with one
+            
+        Raises:
+            Exception: One of the transport's request_errors, if no endpoint
+                could be reached
+        """
+        self._schedule_probes()
+        send = self._client.post if method == "POST" else self._client.get
+        last_error: Optional[BaseException] = None
+        error_response: Optional[HTTPResponse] = None
+        timeline = current_timeline()
+        candidates = self._only_base_url or self._router.candidates()
+        for base_url in candidates:
+            started = time.monotonic()
+            if timeline is not None:
+                timeline.begin("request")
+            try:
+                response = await send(urls[base_url], headers=headers)
+            except self.transport.connect_errors as error:
+                if timeline is not None:
+                    timeline.end("request", f"{method} {base_url}: {type(error).__name__}")
+                self._router.record_failure(base_url)
+                self._log(f"Endpoint {base_url} unreachable, failing over", str(error))
+                last_error = error
+                continue
+            if timeline is not None:
+                timeline.end("request", f"{method} {urls[base_url].partition('?')[0]}: {response.status_code}")
+            if response.status_code in ENDPOINT_ERROR_STATUSES:
+                # A quick error says nothing about how fast the endpoint
+                # serves requests, so it is not a latency sample
+                self._router.record_failure(base_url)
+                if method == "GET" and base_url is not candidates[-1]:
+                    self._log(f"Endpoint {base_url} answered {response.status_code}, failing over")
+                    error_response = response
+                    continue
+                return response
+            self._router.record_success(base_url, time.monotonic() - started)
+            return response
+        if error_response is not None:
+            return error_response
+        assert last_error is not None
+        raise last_error
+    
+    def _spawn(self, coro: Any) -> None:
+        """Run a coroutine in the background, tracked so close() can cancel it."""
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def _schedule_probes(self) -> None:
+        """Start background re-probes for demoted endpoints that are due."""
+        if not self._router.demoted_count:
+            return
+        for base_url in self._router.due_for_probe():
+            self._spawn(self._probe(base_url))
+    
+    async def _probe(self, base_url: str) -> None:
+        """Check whether a demoted endpoint is reachable again.
+        
+        Any HTTP response other than 5xx or 429, including a 404, means the
+        endpoint is serving again and it is promoted back into rotation.
+        """
+        started = time.monotonic()
+        try:
+            response = await self._client.get(f"{base_url}/")
+        except self.transport.request_errors:
+            self._router.record_failure(base_url)
+            self._log(f"Endpoint {base_url} still unreachable")
+        else:
+            if response.status_code in ENDPOINT_ERROR_STATUSES:
+                self._router.record_failure(base_url)
+                self._log(f"Endpoint {base_url} still answering {response.status_code}")
+                return
+            self._router.record_success(base_url, time.monotonic() - started)
+            self._log(f"Endpoint {base_url} is reachable again")
+    
     async def get_session_config(self) -> SessionConfig:
         """Get session configuration for the user.
         
@@ -80,31 +579,530 @@ class OrgaAI:
             OrgaAIError: For various error conditions
             OrgaAIAuthenticationError: For authentication failures
             OrgaAIServerError: For server errors
+            OrgaAIDrainingError: If the client is draining
         """
+        self._begin_call()
+        timeline = self._slow_calls.start() if self._slow_calls is not None else None
         try:
             self._log("Fetching session config")
+            # Every call counts towards the arrival rate the reserve is sized
+            # for, even those answered by a returned lease
+            if self._prefetcher is not None:
+                self._prefetcher.arrive()
+            
+            # A leased session released unused is the cheapest of all
+            if self._sessions.ready:
+                returned = self._sessions.take()
+                if returned is not None:
+                    self._log("Using returned session config")
+                    return returned
+            
+            # Then the adaptive reserve, topped back up in the background
+            if self._prefetcher is not None:
+                reserved = self._prefetcher.take()
+                self._top_up_reserve()
+                if reserved is not None:
+                    self._log("Using session config from the prefetch reserve")
+                    return reserved
+            
+            # A session prefetched by any process sharing the cache backend
+            # saves both round-trips
+            if self._cache_backend is not None:
+                prefetched = await self._claim_prefetched_session()
+                if prefetched is not None:
+                    self._log("Using prefetched session config")
+                    return prefetched
             
             # Fetch ephemeral token first
-            ephemeral_token = await self._fetch_ephemeral_token()
-            self._log("Fetched ephemeral token", ephemeral_token)
+            minting = time.perf_counter()
+            if self._speculative_ice is not None:
+                ephemeral_token, ice_servers = await self._issue_token_and_ice()
+            else:
+                ephemeral_token = await self._issue_ephemeral_token()
+                self._log("Fetched ephemeral token", ephemeral_token)
+                
+                # Then get ICE servers using the token
+                ice_servers = await self._get_ice_servers(ephemeral_token)
+            if self._prefetcher is not None:
+                self._prefetcher.observe_latency(time.perf_counter() - minting)
             
-            # Then fetch ICE servers using the token
-            ice_servers = await self._fetch_ice_servers(ephemeral_token)
-            self._log("Fetched ICE servers", ice_servers)
+            if self.rank_ice_servers:
+                ice_servers = await self._ice_prober.rank(
+                    ice_servers, drop_unreachable=self.drop_unreachable_ice_servers
+                )
+                self._log("Ranked ICE servers", ice_servers)
             
             return SessionConfig(
                 ephemeral_token=ephemeral_token,
-                ice_servers=ice_servers
+                ice_servers=ice_servers,
+                expires_at=_token_expiry(ephemeral_token),
             )
             
-        except (OrgaAIError, OrgaAIAuthenticationError, OrgaAIServerError):
+        except (OrgaAIError, OrgaAIAuthenticationError, OrgaAIServerError) as error:
             # Re-raise our custom errors
+            if timeline is not None:
+                timeline.error = f"{type(error).__name__}: {error}"
             raise
         except Exception as error:
             # Wrap unexpected errors
+            if timeline is not None:
+                timeline.error = f"{type(error).__name__}: {error}"
             raise OrgaAIServerError(
                 f"Failed to get session config: {str(error)}"
             )
+        finally:
+            self._calls.add("in_flight", -1)
+            if timeline is not None:
+                assert self._slow_calls is not None
+                self._slow_calls.finish(timeline)
+    
+    async def acquire_session(self) -> SessionConfig:
+        """Lease a session config that can be handed back if it goes unused.
+        
+        Works like get_session_config(), which also hands out returned
+        sessions. Pass the session (or its token) to release_session() when
+        it is not going to be used, e.g. when the user leaves before
+        connecting.
+        
+        Returns:
+            SessionConfig: Contains ephemeral token and ICE servers
+            
+        Raises:
+            OrgaAIError: For various error conditions
+            OrgaAIAuthenticationError: For authentication failures
+            OrgaAIServerError: For server errors
+            OrgaAIDrainingError: If the client is draining
+        """
+        session = await self.get_session_config()
+        self._sessions.lease(session)
+        return session
+    
+    def release_session(self, session: Union[SessionConfig, str]) -> bool:
+        """Hand back an unused session leased by acquire_session().
+        
+        The session is handed out again by the next acquire_session() or
+        get_session_config() call, as long as it is still valid for
+        ``session_min_validity``. Each lease can be released once, from any
+        thread.
+        
+        Args:
+            session: The leased session config, or its ephemeral token
+            
+        Returns:
+            bool: Whether the session went back into the ready pool; False
+            if it expires too soon, was not leased here or was already
+            released, or the client is draining
+        """
+        token = session.ephemeral_token if isinstance(session, SessionConfig) else session
+        kept = self._sessions.release(token, keep=not self._draining)
+        self._log("Returned session config" if kept else "Discarded returned session config")
+        return kept
+    
+    def _begin_call(self) -> None:
+        """Count a public call as in progress, unless the client is draining.
+        
+        Raises:
+            OrgaAIDrainingError: If drain() has been called
+        """
+        if self._draining:
+            raise OrgaAIDrainingError()
+        self._calls.add("in_flight")
+    
+    async def _get_ice_servers(self, ephemeral_token: str) -> list[IceServer]:
+        """Get ICE servers from the fastest available source.
+        
+        Sources are tried in order: servers kept by refresh_ice_servers(),
+        the on-disk snapshot (first session only), the shared-memory cache,
+        the cache backend, then the API. Cached servers whose credentials
+        have expired are skipped. Fetched servers are written back to every
+        configured cache.
+        """
+        refreshed = self._refreshed_ice
+        if refreshed is not None and time.time() < refreshed[1]:
+            return refreshed[0]
+        
+        ice_servers = self._load_ice_snapshot()
+        if ice_servers is not None:
+            self._log("Loaded ICE servers from snapshot", ice_servers)
+            return ice_servers
+        
+        if self._shared_ice is not None:
+            entry = self._shared_ice.read()
+            if entry is not None and not _expired(entry.ice_servers):
+                # Only one worker on the host wins the claim and refreshes
+                if entry.refresh_due and self._shared_ice.try_claim_refresh(
+                    lease=self.timeout / 1000
+                ):
+                    self._spawn(self._refresh_shared_ice(ephemeral_token))
+                self._log("Loaded ICE servers from shared cache", entry.ice_servers)
+                return entry.ice_servers
+        
+        if self._cache_backend is not None:
+            ice_servers = await self._backend_ice_servers(ephemeral_token)
+            if ice_servers is not None:
+                return ice_servers
+        
+        ice_servers = await self._fetch_ice_servers(ephemeral_token)
+        self._log("Fetched ICE servers", ice_servers)
+        await self._store_ice_servers(ice_servers)
+        return ice_servers
+    
+    async def _backend_ice_servers(self, ephemeral_token: str) -> Optional[list[IceServer]]:
+        """Get ICE servers through the cache backend, electing one refresher.
+        
+        On a miss, the process that wins the refresh key fetches and publishes
+        the ICE servers; the others wait for that result instead of fetching
+        the same config themselves.
+        
+        Returns:
+            Optional[list[IceServer]]: The ICE servers, or None if the caller
+            should fetch them itself
+        """
+        backend = self._cache_backend
+        assert backend is not None
+        key = self._cache_key("ice")
+        
+        ice_servers = await self._backend_read_ice(key)
+        if ice_servers is not None:
+            self._log("Loaded ICE servers from cache backend", ice_servers)
+            return ice_servers
+        
+        lock_key = f"{key}:refresh"
+        lease = self.timeout / 1000
+        # A token unique to this attempt, so that a refresher outliving its
+        # lease releases only its own lock, not the next winner's
+        owner = os.urandom(16).hex().encode("ascii")
+        try:
+            won = await backend.add(lock_key, owner, lease)
+        except Exception as error:
+            self._log("Cache backend unavailable", str(error))
+            return None
+        
+        if won:
+            try:
+                ice_servers = await self._fetch_ice_servers(ephemeral_token)
+                self._log("Fetched ICE servers", ice_servers)
+                await self._store_ice_servers(ice_servers)
+                return ice_servers
+            finally:
+                await self._backend_call(backend.delete_if(lock_key, owner))
+        
+        # Another process is refreshing; wait for its result
+        deadline = time.monotonic() + lease
+        while time.monotonic() < deadline:
+            await asyncio.sleep(BACKEND_POLL_INTERVAL)
+            ice_servers = await self._backend_read_ice(key)
+            if ice_servers is not None:
+                self._log("Loaded ICE servers refreshed by another process", ice_servers)
+                return ice_servers
+        return None
+    
+    async def _backend_read_ice(self, key: str) -> Optional[list[IceServer]]:
+        """Read and decode ICE servers from the cache backend."""
+        assert self._cache_backend is not None
+        data = await self._backend_call(self._cache_backend.get(key))
+        if data is None:
+            return None
+        try:
+            ice_servers = [IceServer.from_dict(item) for item in json.loads(data)]
+        except (ValueError, KeyError, TypeError):
+            return None
+        return None if _expired(ice_servers) else ice_servers
+    
+    async def _backend_call(self, operation: Any) -> Any:
+        """Await a cache backend operation, treating failures as a miss.
+        
+        The cache backend is only an optimization, so an unavailable backend
+        must never fail a session.
+        """
+        try:
+            return await operation
+        except Exception as error:
+            self._log("Cache backend unavailable", str(error))
+            return None
+    
+    def _cache_key(self, name: str) -> str:
+        """Namespace a cache backend key by the client's credentials."""
+        return f"orga:{self._credentials_key()[:32]}:{name}"
+    
+    async def prefetch_sessions(self, count: int) -> int:
+        """Mint sessions ahead of time and share them through the cache backend.
+        
+        Each prefetched session is handed out exactly once, by the next
+        get_session_config() call in any process sharing the backend, until
+        it is older than ``prefetched_session_ttl`` or its token or ICE
+        credentials expire.
+        
+        Args:
+            count: Number of sessions to prefetch
+            
+        Returns:
+            int: Number of sessions prefetched
+            
+        Raises:
+            OrgaAIError: If no cache backend is configured
+            OrgaAIDrainingError: If the client is draining
+        """
+        if self._cache_backend is None:
+            raise OrgaAIError("prefetch_sessions requires a cache_backend")
+        self._begin_call()
+        try:
+            results = await asyncio.gather(
+                *(self._mint_session() for _ in range(count)), return_exceptions=True
+            )
+            sessions = [result for result in results if isinstance(result, SessionConfig)]
+            ttl = self.prefetched_session_ttl / 1000
+            for session in sessions:
+                expires_at = time.time() + ttl
+                valid_until = session.valid_until
+                if valid_until is not None:
+                    expires_at = min(expires_at, valid_until)
+                payload = json.dumps({
+                    "ephemeral_token": session.ephemeral_token,
+                    "token_expires_at": session.expires_at,
+                    "ice_servers": [server.to_dict() for server in session.ice_servers],
+                    "expires_at": expires_at,
+                }).encode("utf-8")
+                await self._backend_call(self._cache_backend.push(
+                    self._cache_key("sessions"), payload, ttl
+                ))
+        finally:
+            self._calls.add("in_flight", -1)
+        self._log(f"Prefetched {len(sessions)} of {count} sessions")
+        return len(sessions)
+    
+    async def _mint_session(self) -> SessionConfig:
+        """Fetch a new token and ICE servers, bypassing prefetched sessions."""
+        ephemeral_token = await self._issue_ephemeral_token()
+        ice_servers = await self._get_ice_servers(ephemeral_token)
+        return SessionConfig(
+            ephemeral_token=ephemeral_token,
+            ice_servers=ice_servers,
+            expires_at=_token_expiry(ephemeral_token),
+        )
+    
+    def _top_up_reserve(self) -> None:
+        """Refill the adaptive reserve in the background if it is below target."""
+        assert self._prefetcher is not None
+        count = self._prefetcher.start_refill()
+        if count:
+            self._spawn(self._refill_reserve(count))
+    
+    async def _refill_reserve(self, count: int) -> None:
+        """Mint sessions into the adaptive reserve until it reaches its target."""
+        assert self._prefetcher is not None
+        try:
+            while count and not self._draining:
+                started = time.perf_counter()
+                results = await asyncio.gather(
+                    *(self._mint_session() for _ in range(count)), return_exceptions=True
+                )
+                self._prefetcher.observe_latency(time.perf_counter() - started)
+                minted = 0
+                for result in results:
+                    if isinstance(result, SessionConfig):
+                        self._prefetcher.put(result)
+                        minted += 1
+                self._log(f"Prefetched {minted} of {count} sessions into the reserve")
+                if minted < count:
+                    # The next call tries again, rather than a retry loop here
+                    return
+                count = self._prefetcher.deficit()
+        finally:
+            self._prefetcher.finish_refill()
+    
+    async def _claim_prefetched_session(self) -> Optional[SessionConfig]:
+        """Claim the oldest unexpired prefetched session, if any."""
+        assert self._cache_backend is not None
+        key = self._cache_key("sessions")
+        while True:
+            data = await self._backend_call(self._cache_backend.claim(key))
+            if data is None:
+                return None
+            try:
+                item = json.loads(data)
+                if time.time() >= item["expires_at"]:
+                    continue
+                session = SessionConfig(
+                    ephemeral_token=item["ephemeral_token"],
+                    ice_servers=[IceServer.from_dict(s) for s in item["ice_servers"]],
+                    expires_at=item.get("token_expires_at"),
+                )
+            except (ValueError, KeyError, TypeError):
+                continue
+            with self._stats_lock:
+                self._prefetched_sessions_served += 1
+            return session
+    
+    async def refresh_ice_servers(self) -> float:
+        """Fetch ICE servers now and serve them to new sessions until they expire.
+        
+        The servers are also published to every configured cache. This is
+        what RefreshScheduler (see orga_ai.scheduler) calls to keep a
+        client's ICE config fresh ahead of its sessions.
+        
+        Returns:
+            float: Unix time until which the servers are served: their
+            credentials' expiry, or ``ice_cache_ttl`` from now if unknown
+            
+        Raises:
+            OrgaAIAuthenticationError: If authentication fails (401)
+            OrgaAIServerError: For other errors
+            OrgaAIDrainingError: If the client is draining
+        """
+        self._begin_call()
+        try:
+            ephemeral_token = await self._issue_ephemeral_token()
+            ice_servers = await self._fetch_ice_servers(ephemeral_token)
+            valid_until = earliest_expiry(ice_servers)
+            if valid_until is None:
+                valid_until = time.time() + self.ice_cache_ttl / 1000
+            self._refreshed_ice = (ice_servers, valid_until)
+            self._log("Refreshed ICE servers", ice_servers)
+            await self._store_ice_servers(ice_servers)
+            return valid_until
+        finally:
+            self._calls.add("in_flight", -1)
+    
+    async def _refresh_shared_ice(self, ephemeral_token: str) -> None:
+        """Refresh the shared ICE cache in the background."""
+        try:
+            ice_servers = await self._fetch_ice_servers(ephemeral_token)
+        except OrgaAIError as error:
+            # The claim lapses on its own and another worker retries
+            self._log("Background ICE refresh failed", str(error))
+            return
+        await self._store_ice_servers(ice_servers)
+    
+    async def _store_ice_servers(self, ice_servers: list[IceServer]) -> None:
+        """Publish freshly fetched ICE servers to the configured caches.
+        
+        Cache TTLs are capped at the credentials' expiry, and servers whose
+        credentials have already expired are not published. The ICE snapshot
+        is only rewritten once it is missing or halfway to its maximum age;
+        drain() writes the latest servers on shutdown.
+        """
+        if _expired(ice_servers):
+            return
+        self._latest_ice = (ice_servers, time.time())
+        if self._shared_ice is not None:
+            self._shared_ice.write(
+                ice_servers, ttl=_cache_ttl(self.shared_ice_cache_ttl / 1000, ice_servers)
+            )
+        if self._ice_snapshot is not None and self._ice_snapshot.claim_save():
+            # A blocking write and rename, kept off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._ice_snapshot.save, self._credentials_key(), ice_servers
+            )
+        if self._cache_backend is not None:
+            payload = json.dumps([server.to_dict() for server in ice_servers])
+            await self._backend_call(self._cache_backend.set(
+                self._cache_key("ice"),
+                payload.encode("utf-8"),
+                _cache_ttl(self.ice_cache_ttl / 1000, ice_servers),
+            ))
+    
+    def _load_ice_snapshot(self) -> Optional[list[IceServer]]:
+        """Return snapshot ICE servers for the first session only."""
+        if not self._ice_snapshot_pending or self._ice_snapshot is None:
+            return None
+        self._ice_snapshot_pending = False
+        ice_servers = self._ice_snapshot.load(self._credentials_key())
+        if ice_servers is None or _expired(ice_servers):
+            return None
+        return ice_servers
+    
+    async def _issue_ephemeral_token(self) -> str:
+        """Get an ephemeral token, through the batcher when batching is enabled."""
+        if self._token_batcher is not None:
+            return await self._token_batcher.get_token()
+        return await self._fetch_ephemeral_token()
+    
+    async def _issue_token_and_ice(self) -> Tuple[str, list[IceServer]]:
+        """Get a token and ICE servers, fetching the ICE servers alongside the token.
+        
+        The ICE request is authorized with a still-valid token from a recent
+        session, or with the API key when ``ice_api_key_auth`` is set, so it
+        does not wait for the new token. Without such a credential, or if
+        the speculative fetch fails, the ICE servers are fetched with the new
+        token once it arrives.
+        """
+        assert self._speculative_ice is not None
+        credential = self._speculative_credential()
+        ice_servers: Optional[list[IceServer]] = None
+        if credential is None:
+            ephemeral_token = await self._issue_ephemeral_token()
+        else:
+            self._speculative_ice.add("attempts")
+            token_result, ice_result = await asyncio.gather(
+                self._issue_ephemeral_token(),
+                self._get_ice_servers(credential),
+                return_exceptions=True,
+            )
+            if isinstance(token_result, BaseException):
+                raise token_result
+            ephemeral_token = token_result
+            if isinstance(ice_result, Exception):
+                # The recent token may have been revoked; stop using it
+                self._recent_token = None
+                self._speculative_ice.add("fallbacks")
+                self._log("Speculative ICE fetch failed, fetching with the new token", str(ice_result))
+            elif isinstance(ice_result, BaseException):
+                raise ice_result
+            else:
+                self._speculative_ice.add("used")
+                ice_servers = ice_result
+        self._log("Fetched ephemeral token", ephemeral_token)
+        
+        valid_until = _token_expiry(ephemeral_token)
+        if valid_until is None:
+            valid_until = time.time() + self.prefetched_session_ttl / 1000
+        self._recent_token = (ephemeral_token, valid_until)
+        
+        if ice_servers is None:
+            ice_servers = await self._get_ice_servers(ephemeral_token)
+        return ephemeral_token, ice_servers
+    
+    def _speculative_credential(self) -> Optional[str]:
+        """Return a credential the ICE config can be fetched with ahead of a new token.
+        
+        A recent token is used while it stays valid for longer than a request
+        can take.
+        """
+        recent = self._recent_token
+        if recent is not None and recent[1] - time.time() > self.timeout / 1000:
+            return recent[0]
+        if self.ice_api_key_auth:
+            return self.api_key
+        return None
+    
+    def _check_auth_failure_cache(self) -> Optional[str]:
+        """Raise a cached authentication failure, if any.
+        
+        Returns:
+            Optional[str]: The negative cache key to store a new failure
+            under, or None if the cache is disabled
+            
+        Raises:
+            OrgaAIAuthenticationError: If a failure for these credentials is cached
+        """
+        if not self.auth_failure_cache_ttl:
+            return None
+        auth_key = self._credentials_key()
+        cached_message = self._auth_failures.get(auth_key)
+        if cached_message is not None:
+            with self._stats_lock:
+                self._auth_failures_suppressed += 1
+            self._log("Authentication failure served from negative cache")
+            raise OrgaAIAuthenticationError(cached_message)
+        return auth_key
+    
+    def _authentication_failed(self, auth_key: Optional[str]) -> OrgaAIAuthenticationError:
+        """Record a 401 in the negative cache and return the error to raise."""
+        message = "Invalid API key or user email"
+        if auth_key is not None:
+            self._auth_failures.put(auth_key, message, self.auth_failure_cache_ttl / 1000)
+        return OrgaAIAuthenticationError(message)
     
     async def _fetch_ephemeral_token(self) -> str:
         """Fetch ephemeral token from the API.
@@ -115,23 +1113,20 @@ class OrgaAI:
             str: The ephemeral token
             
         Raises:
-            OrgaAIAuthenticationError: If authentication fails (401)
+            OrgaAIAuthenticationError: If authentication fails (401), or failed
+                recently and the failure is still in the negative cache
             OrgaAIServerError: For other HTTP errors
         """
-        # Build URL with email parameter (equivalent to TypeScript URL construction)
-        params = {"email": self.user_email}
-        url = f"{self.base_url}/v1/realtime/client-secrets?{urlencode(params)}"
+        auth_key = self._check_auth_failure_cache()
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        # URL with email parameter and headers are prebuilt from the config
+        templates = self._request_templates()
         
         try:
-            response = await self._client.post(url, headers=headers)
+            response = await self._send("POST", templates.token_urls, templates.token_headers)
             
             if response.status_code == 401:
-                raise OrgaAIAuthenticationError("Invalid API key or user email")
+                raise self._authentication_failed(auth_key)
             elif not response.is_success:
                 raise OrgaAIServerError(
                     f"Failed to fetch ephemeral token: {response.reason_phrase}",
@@ -139,12 +1134,55 @@ class OrgaAI:
                 )
             
             try:
-                data = response.json()
-                return data["ephemeral_token"]
-            except (KeyError, ValueError, TypeError) as error:
+                return parse_ephemeral_token(response.content, self.trust_responses)
+            except ValueError as error:
+                raise OrgaAIServerError(f"Invalid response format: {str(error)}")
+            
+        except self.transport.request_errors as error:
+            raise OrgaAIServerError(f"Network error: {str(error)}")
+    
+    async def _fetch_ephemeral_tokens(self, count: int) -> Optional[list[str]]:
+        """Fetch several ephemeral tokens in one request.
+        
+        Args:
+            count: Number of tokens to request
+            
+        Returns:
+            Optional[list[str]]: The tokens, or None if the API rejected the
+            count parameter. An API that ignores the parameter returns a
+            single token.
+            
+        Raises:
+            OrgaAIAuthenticationError: If authentication fails (401)
+            OrgaAIServerError: For other HTTP errors
+        """
+        auth_key = self._check_auth_failure_cache()
+        
+        templates = self._request_templates()
+        urls = {base: f"{url}&count={count}" for base, url in templates.token_urls.items()}
+        
+        try:
+            response = await self._send("POST", urls, templates.token_headers)
+            
+            if response.status_code == 401:
+                raise self._authentication_failed(auth_key)
+            elif response.status_code in BATCH_UNSUPPORTED_STATUSES:
+                self._log("Token batching not supported by the API", response.status_code)
+                return None
+            elif not response.is_success:
+                raise OrgaAIServerError(
+                    f"Failed to fetch ephemeral tokens: {response.reason_phrase}",
+                    response.status_code
+                )
+            
+            try:
+                tokens = parse_ephemeral_tokens(response.content, self.trust_responses)
+            except ValueError as error:
                 raise OrgaAIServerError(f"Invalid response format: {str(error)}")
+            self._log(f"Fetched {len(tokens)} ephemeral tokens in one request")
+            return tokens
             
-        except httpx.RequestError as error:
+        except self.transport.request_errors as error:
             raise OrgaAIServerError(f"Network error: {str(error)}")
     
     async def _fetch_ice_servers(self, ephemeral_token: str) -> list[IceServer]:
@@ -161,11 +1199,10 @@ class OrgaAI:
         Raises:
             OrgaAIServerError: For HTTP errors
         """
-        url = f"{self.base_url}/v1/realtime/ice-config"
         headers = {"Authorization": f"Bearer {ephemeral_token}"}
         
         try:
-            response = await self._client.get(url, headers=headers)
+            response = await self._send("GET", self._request_templates().ice_urls, headers)
             
             if not response.is_success:
                 raise OrgaAIServerError(
@@ -174,54 +1211,113 @@ class OrgaAI:
                 )
             
             try:
-                data = response.json()
-                ice_servers_data = data["iceServers"]
-            except (KeyError, ValueError, TypeError) as error:
+                return parse_ice_servers(response.content, self.trust_responses)
+            except ValueError as error:
                 raise OrgaAIServerError(f"Invalid response format: {str(error)}")
             
-            # Convert dict data to IceServer objects
-            ice_servers = []
-            for server_data in ice_servers_data:
-                ice_server = IceServer(
-                    urls=server_data["urls"],
-                    username=server_data.get("username"),
-                    credential=server_data.get("credential")
-                )
-                ice_servers.append(ice_server)
-            
-            return ice_servers
-            
-        except httpx.RequestError as error:
+        except self.transport.request_errors as error:
             raise OrgaAIServerError(f"Network error: {str(error)}")
     
+    async def drain(
+        self, timeout: float = 30.0, snapshot_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Shut the client down gracefully, e.g. on SIGTERM during a rolling deploy.
+        
+        New calls are refused with OrgaAIDrainingError straight away. Calls
+        already in progress, on any event loop or thread, are given until
+        ``timeout`` to finish. Then background tasks are cancelled and the
+        client is closed as by close(), which fails any call still running.
+        
+        The last ICE servers fetched from the API, if their credentials are
+        still valid, can be written to a snapshot for the next process to
+        serve its first session from (see ``ice_snapshot_path``).
+        
+        Args:
+            timeout: Seconds to wait for calls in progress
+            snapshot_path: Where to write the ICE snapshot (defaults to the
+                configured ``ice_snapshot_path``; no snapshot if neither is set)
+            
+        Returns:
+            Dict[str, Any]: ``abandoned``, the number of calls still running
+            at the deadline, and ``snapshot_saved``, whether a snapshot was
+            written
+        """
+        self._draining = True
+        self._log("Draining")
+        deadline = time.monotonic() + timeout
+        while self._calls.get("in_flight") and time.monotonic() < deadline:
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        abandoned = self._calls.get("in_flight")
+        if abandoned:
+            self._log(f"Drain deadline passed with {abandoned} calls in progress")
+        
+        snapshot_saved = False
+        snapshot = self._ice_snapshot
+        if snapshot_path is not None:
+            snapshot = IceSnapshot(snapshot_path, max_age=0)
+        latest = self._latest_ice
+        if snapshot is not None and latest is not None and not _expired(latest[0]):
+            snapshot_saved = snapshot.save(self._credentials_key(), latest[0], saved_at=latest[1])
+            self._log("Saved ICE snapshot" if snapshot_saved else "Could not save ICE snapshot")
+        
+        await self.close()
+        return {"abandoned": abandoned, "snapshot_saved": snapshot_saved}
+    
     async def close(self) -> None:
-        """Close the HTTP client and clean up resources.
+        """Close the HTTP clients and clean up resources.
         
         This should be called when you're done with the client to avoid
         resource leaks. In async contexts, it's good practice to use this.
+        HTTP clients of other event loops that are still running are closed
+        on those loops in the background.
         """
-        await self._client.aclose()
+        # Tasks can only be cancelled and awaited from their own loop
+        current = asyncio.get_running_loop()
+        local = []
+        for task in list(self._background_tasks):
+            loop = task.get_loop()
+            if loop is current:
+                task.cancel()
+                local.append(task)
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(task.cancel)
+        if local:
+            await asyncio.gather(*local, return_exceptions=True)
+        if self._pinned_client is not None:
+            await self._pinned_client.aclose()
+        await self._http_clients.aclose()
+        # The DNS cache is shared by every loop's clients, so it lives as
+        # long as the OrgaAI instance
+        if self._dns is not None:
+            await self._dns.aclose()
+        if self._shared_ice is not None:
+            self._shared_ice.close()
     
     def __enter__(self) -> "OrgaAI":
         """Support for context manager (with statement)."""
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
-        """Clean up when exiting sync context manager."""
+        """Clean up when exiting sync context manager.
+        
+        Called from sync code running on an event loop, which cannot block
+        on that loop, close() is scheduled on it and runs as soon as the
+        caller yields to the loop.
+        """
         try:
-            # Try to close in current thread
-            loop = asyncio.get_event_loop()
-            if not loop.is_running():
-                loop.run_until_complete(self.close())
-            else:
-                # If we're in an async context, schedule cleanup
-                warnings.warn(
-                    "OrgaAI client used in sync context manager within async context. "
-                    "Use 'async with' instead for proper cleanup.",
-                    ResourceWarning
-                )
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            task = running.create_task(self.close())
+            _closing_tasks.add(task)
+            task.add_done_callback(_closing_tasks.discard)
+            return
+        try:
+            # Close in current thread, on the loop the client was likely used on
+            asyncio.get_event_loop().run_until_complete(self.close())
         except RuntimeError:
-            # No event loop, create one for cleanup
+            # No usable event loop, create one for cleanup
             asyncio.run(self.close())
     
     async def __aenter__(self) -> "OrgaAI":
@@ -0,0 +1,71 @@
+"""Low-contention counters for statistics updated on the request path.
+
+A counter behind a single lock serialises every thread that updates it, and
+without a lock ``+=`` loses updates, under the GIL between bytecodes and on
+free-threaded builds outright. ``Counters`` gives each thread its own shard
+of the counters instead: a thread only ever writes to its own shard, and
+reading sums the shards.
+"""
+
+import threading
+from typing import Dict, List, Tuple
+
+
+class Counters:
+    """Named counters that many threads can increment without contending.
+
+    Shards of threads that have exited are folded into a retired total when
+    a new thread registers, so thread churn does not grow memory.
+
+    Args:
+        names: The counters, each starting at zero
+    """
+
+    def __init__(self, *names: str) -> None:
+        self._names = names
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, Dict[str, int]]] = []
+        self._retired: Dict[str, int] = dict.fromkeys(names, 0)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, amount: int = 1) -> None:
+        """Add to a counter from the calling thread."""
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._register()
+        shard[name] += amount
+
+    def get(self, name: str) -> int:
+        """Return one counter's total across all threads."""
+        with self._lock:
+            total = self._retired[name]
+            shards = [shard for _, shard in self._shards]
+        return total + sum(shard[name] for shard in shards)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return every counter's total across all threads."""
+        with self._lock:
+            totals = dict(self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            # Shards never gain keys, so iterating one while its thread
+            # updates it is safe
+            for name, value in shard.items():
+                totals[name] += value
+        return totals
+
+    def _register(self) -> Dict[str, int]:
+        shard: Dict[str, int] = dict.fromkeys(self._names, 0)
+        with self._lock:
+            live = []
+            for thread, old in self._shards:
+                if thread.is_alive():
+                    live.append((thread, old))
+                else:
+                    for name, value in old.items():
+                        self._retired[name] += value
+            live.append((threading.current_thread(), shard))
+            self._shards = live
+        self._local.shard = shard
+        return shard
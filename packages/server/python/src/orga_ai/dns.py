@@ -0,0 +1,308 @@
+"""DNS resolution cache for the OrgaAI Python SDK.
+
+httpx resolves the API host again for every new connection, through the
+blocking system resolver running in a worker thread. When connection pools
+churn this shows up as tail latency. This module provides an async resolver
+cache that plugs into the SDK's HTTP transports:
+
+- results are cached for their TTL and refreshed in the background shortly
+  before they expire, so requests rarely wait on DNS;
+- stale results are served if a refresh fails, rather than failing requests;
+- connections race the cached addresses "happy eyeballs" style (RFC 8305),
+  alternating address families, so one unreachable address does not stall
+  a connection.
+
+The upstream resolver is pluggable; anything with an async ``resolve(host,
+port)`` method returning ``(addresses, ttl)`` can be used, which is how tests
+substitute a stub resolver.
+
+The httpx integration (``CachingDNSTransport`` and ``CachingNetworkBackend``)
+lives in orga_ai.httpx_dns, so that using the cache does not import httpx;
+both names can still be imported from here.
+"""
+
+import asyncio
+import concurrent.futures
+import ipaddress
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol, Set, Tuple
+
+from .counters import Counters
+
+
+DEFAULT_TTL = 60.0
+HAPPY_EYEBALLS_DELAY = 0.25
+
+
+class Resolver(Protocol):
+    """Upstream resolver interface used by CachingResolver."""
+
+    async def resolve(self, host: str, port: int) -> Tuple[List[str], Optional[float]]:
+        """Resolve a hostname.
+
+        Returns:
+            Tuple[List[str], Optional[float]]: IP addresses in preference
+            order, and their TTL in seconds (None if unknown)
+        """
+        ...
+
+
+class SystemResolver:
+    """Resolver backed by the event loop's getaddrinfo.
+
+    The system resolver does not report TTLs, so results are returned without
+    one and CachingResolver applies its default TTL.
+    """
+
+    async def resolve(self, host: str, port: int) -> Tuple[List[str], Optional[float]]:
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(str(info[4][0]) for info in infos))
+        return addresses, None
+
+
+@dataclass
+class _DNSEntry:
+    addresses: List[str]
+    expires_at: float
+    refresh_at: float
+
+
+class CachingResolver:
+    """Caches resolver results, honouring TTLs and refreshing in the background.
+
+    Attributes:
+        default_ttl: TTL used when the upstream resolver does not report one
+        min_ttl: Lower bound applied to reported TTLs
+        refresh_ahead: Fraction of the TTL after which a background refresh
+            is started on the next lookup
+        stale_ttl: How long past expiry an entry may still be served if the
+            upstream resolver fails
+    """
+
+    def __init__(
+        self,
+        resolver: Optional[Resolver] = None,
+        default_ttl: float = DEFAULT_TTL,
+        min_ttl: float = 1.0,
+        refresh_ahead: float = 0.8,
+        stale_ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.resolver: Resolver = resolver if resolver is not None else SystemResolver()
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.refresh_ahead = refresh_ahead
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._entries: Dict[Tuple[str, int], _DNSEntry] = {}
+        # Lookups in progress on any event loop; concurrent futures so that
+        # callers on other loops can wait on them too
+        self._inflight: Dict[Tuple[str, int], "concurrent.futures.Future[List[str]]"] = {}
+        self._refresh_tasks: Dict[Tuple[str, int], "asyncio.Task[Any]"] = {}
+        self._lookup_tasks: Set["asyncio.Task[None]"] = set()
+        self._lock = threading.Lock()
+        self._stats = Counters("hits", "misses", "refreshes", "failures", "stale_served")
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        """Return the addresses for a host, from cache when possible.
+
+        Args:
+            host: Hostname to resolve
+            port: Port the addresses will be used with
+
+        Returns:
+            List[str]: IP addresses in preference order
+
+        Raises:
+            OSError: If the host cannot be resolved and nothing usable is cached
+        """
+        key = (host, port)
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and now < entry.expires_at:
+            self._count("hits")
+            if now >= entry.refresh_at:
+                self._start_refresh(key)
+            return entry.addresses
+        self._count("misses")
+        try:
+            return await self._lookup(key)
+        except OSError:
+            if entry is not None and now < entry.expires_at + self.stale_ttl:
+                self._count("stale_served")
+                return entry.addresses
+            raise
+
+    def prefer(self, host: str, port: int, address: str) -> None:
+        """Move an address that just connected successfully to the front."""
+        entry = self._entries.get((host, port))
+        if entry is not None and entry.addresses and entry.addresses[0] != address:
+            if address in entry.addresses:
+                entry.addresses = [address] + [a for a in entry.addresses if a != address]
+
+    def stats(self) -> Dict[str, int]:
+        """Return resolver metrics.
+
+        Returns:
+            Dict[str, int]: Hit, miss, refresh, failure and stale counters,
+            plus the number of cached hosts
+        """
+        stats = self._stats.snapshot()
+        stats["cached_hosts"] = len(self._entries)
+        return stats
+
+    def clear(self) -> None:
+        """Forget every cached entry."""
+        self._entries.clear()
+
+    async def aclose(self) -> None:
+        """Cancel pending background refreshes and lookups, on every loop.
+
+        The resolver is shared by the clients of every event loop, so only
+        its owner calls this, when it is done with all of them. Work running
+        on other event loops is cancelled on its loop.
+        """
+        await self._cancel(all_loops=True)
+
+    async def close_loop(self) -> None:
+        """Cancel the background refreshes and lookups of the running loop.
+
+        Called when the running loop's client is closed; other loops and the
+        cached entries are left alone.
+        """
+        await self._cancel(all_loops=False)
+
+    async def _cancel(self, all_loops: bool) -> None:
+        current = asyncio.get_running_loop()
+        with self._lock:
+            tasks = list(self._refresh_tasks.values()) + list(self._lookup_tasks)
+        local = []
+        for task in tasks:
+            loop = task.get_loop()
+            if loop is current:
+                task.cancel()
+                local.append(task)
+            elif all_loops and not loop.is_closed():
+                loop.call_soon_threadsafe(task.cancel)
+        if local:
+            await asyncio.gather(*local, return_exceptions=True)
+
+    async def _lookup(self, key: Tuple[str, int]) -> List[str]:
+        # Coalesce concurrent lookups of the same host, from any loop, into
+        # one upstream query. The query runs as its own task, so cancelling
+        # the caller that started it does not cancel it for the others
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._start_lookup(key)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _start_lookup(self, key: Tuple[str, int]) -> "concurrent.futures.Future[List[str]]":
+        # Called with the lock held
+        future: "concurrent.futures.Future[List[str]]" = concurrent.futures.Future()
+        self._inflight[key] = future
+        task = asyncio.ensure_future(self._query(key, future))
+        self._lookup_tasks.add(task)
+        task.add_done_callback(lambda t: self._finish_lookup(key, future, t))
+        return future
+
+    async def _query(
+        self, key: Tuple[str, int], future: "concurrent.futures.Future[List[str]]"
+    ) -> None:
+        try:
+            addresses, ttl = await self.resolver.resolve(*key)
+            if not addresses:
+                raise socket.gaierror(f"No addresses found for {key[0]}")
+        except Exception as error:
+            self._count("failures")
+            future.set_exception(error)
+            # Mark retrieved so an unobserved failure is not logged
+            future.exception()
+        else:
+            ttl = max(self.min_ttl, self.default_ttl if ttl is None else ttl)
+            now = self._clock()
+            self._entries[key] = _DNSEntry(
+                addresses=list(addresses),
+                expires_at=now + ttl,
+                refresh_at=now + ttl * self.refresh_ahead,
+            )
+            future.set_result(list(addresses))
+
+    def _finish_lookup(
+        self,
+        key: Tuple[str, int],
+        future: "concurrent.futures.Future[List[str]]",
+        task: "asyncio.Task[None]",
+    ) -> None:
+        with self._lock:
+            self._lookup_tasks.discard(task)
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if not future.done():
+            # Cancelled by aclose() or its loop shutting down, possibly before
+            # it started; waiters, maybe on other loops, see a failed lookup
+            self._count("failures")
+            future.set_exception(socket.gaierror(f"Lookup of {key[0]} was cancelled"))
+            future.exception()
+
+    def _start_refresh(self, key: Tuple[str, int]) -> None:
+        with self._lock:
+            if key in self._refresh_tasks or key in self._inflight:
+                return
+        self._count("refreshes")
+        task = asyncio.ensure_future(self._lookup(key))
+        with self._lock:
+            self._refresh_tasks[key] = task
+        task.add_done_callback(lambda t: self._finish_refresh(key, t))
+
+    def _finish_refresh(self, key: Tuple[str, int], task: "asyncio.Task[Any]") -> None:
+        with self._lock:
+            self._refresh_tasks.pop(key, None)
+        if not task.cancelled():
+            # A failed refresh keeps serving the cached entry until it expires
+            task.exception()
+
+    def _count(self, name: str) -> None:
+        self._stats.add(name)
+
+
+def _is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def interleave_families(addresses: Iterable[str]) -> List[str]:
+    """Order addresses alternating between IPv6 and IPv4 (RFC 8305 section 4).
+
+    The family of the first address goes first, so the resolver's (or the
+    last successful connection's) preference is kept.
+    """
+    addresses = list(addresses)
+    if not addresses:
+        return addresses
+    first_is_v6 = ":" in addresses[0]
+    primary = [a for a in addresses if (":" in a) == first_is_v6]
+    secondary = [a for a in addresses if (":" in a) != first_is_v6]
+    ordered = []
+    for index in range(max(len(primary), len(secondary))):
+        if index < len(primary):
+            ordered.append(primary[index])
+        if index < len(secondary):
+            ordered.append(secondary[index])
+    return ordered
+
+
+def __getattr__(name: str) -> Any:
+    # The httpx integration is imported on first use
+    if name in ("CachingDNSTransport", "CachingNetworkBackend"):
+        from . import httpx_dns
+
+        return getattr(httpx_dns, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -53,3 +53,27 @@ class OrgaAIServerError(OrgaAIError):
     def __init__(self, message: str = "Server error", status: int = 500) -> None:
         super().__init__(message, status=status, code="SERVER_ERROR")
         self.name = "OrgaAIServerError"
+
+
+class OrgaAIDrainingError(OrgaAIError):
+    """Raised when a call is made on a client that is draining or drained.
+    
+    See OrgaAI.drain(). The call was not started, so it can be retried
+    on another client or process.
+    """
+    
+    def __init__(self, message: str = "Client is draining and accepts no new requests") -> None:
+        super().__init__(message, code="CLIENT_DRAINING")
+        self.name = "OrgaAIDrainingError"
+
+
+class AgentUnavailableError(OrgaAIError):
+    """Raised when the local session agent cannot be reached.
+    
+    See orga_ai.agent. Only raised by an AgentClient created without a
+    config to fall back to direct calls with.
+    """
+    
+    def __init__(self, message: str = "Session agent is unavailable") -> None:
+        super().__init__(message, code="AGENT_UNAVAILABLE")
+        self.name = "AgentUnavailableError"
@@ -0,0 +1,141 @@
+"""httpx integration of the DNS resolution cache.
+
+``CachingDNSTransport`` is an httpx transport whose connections resolve the
+API host through a ``CachingResolver`` (see orga_ai.dns) and race the
+cached addresses "happy eyeballs" style.
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpcore
+import httpx
+
+from .profiler import current_timeline
+from .dns import HAPPY_EYEBALLS_DELAY, CachingResolver, _is_ip_address, interleave_families
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """httpcore network backend resolving hosts through a CachingResolver.
+
+    Connections are made to the cached IP addresses directly. TLS still uses
+    the original hostname for SNI and certificate verification, because
+    httpcore passes the origin host to ``start_tls`` separately.
+    """
+
+    def __init__(
+        self,
+        backend: httpcore.AsyncNetworkBackend,
+        resolver: CachingResolver,
+        happy_eyeballs_delay: float = HAPPY_EYEBALLS_DELAY,
+    ) -> None:
+        self._backend = backend
+        self.resolver = resolver
+        self.happy_eyeballs_delay = happy_eyeballs_delay
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        if _is_ip_address(host):
+            return await self._backend.connect_tcp(
+                host, port, timeout, local_address, socket_options
+            )
+        timeline = current_timeline()
+        if timeline is not None:
+            timeline.begin("dns")
+        try:
+            addresses = await self.resolver.resolve(host, port)
+        except OSError as error:
+            if timeline is not None:
+                timeline.end("dns", "failed")
+            raise httpcore.ConnectError(str(error)) from error
+        if timeline is not None:
+            timeline.end("dns", host)
+
+        async def attempt(address: str) -> httpcore.AsyncNetworkStream:
+            return await self._backend.connect_tcp(
+                address, port, timeout, local_address, socket_options
+            )
+
+        address, stream = await self._race(interleave_families(addresses), attempt)
+        self.resolver.prefer(host, port, address)
+        return stream
+
+    async def connect_unix_socket(
+        self,
+        path: str,
+        timeout: Optional[float] = None,
+        socket_options: Optional[Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+    async def _race(
+        self,
+        addresses: List[str],
+        attempt: Callable[[str], Any],
+    ) -> Tuple[str, httpcore.AsyncNetworkStream]:
+        """Start connection attempts staggered by the happy eyeballs delay.
+
+        The first attempt to succeed wins; the others are cancelled, and any
+        that also succeeded are closed.
+        """
+        tasks: Dict["asyncio.Task[Any]", str] = {}
+        remaining = list(addresses)
+        last_error: Optional[BaseException] = None
+        try:
+            while remaining or tasks:
+                if remaining:
+                    address = remaining.pop(0)
+                    tasks[asyncio.ensure_future(attempt(address))] = address
+                done, _ = await asyncio.wait(
+                    tasks,
+                    timeout=self.happy_eyeballs_delay if remaining else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    address = tasks.pop(task)
+                    if task.exception() is None:
+                        return address, task.result()
+                    last_error = task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                try:
+                    stream = await task
+                except BaseException:
+                    continue
+                await stream.aclose()
+        if isinstance(last_error, Exception):
+            raise last_error
+        raise httpcore.ConnectError("No addresses to connect to")
+
+
+class CachingDNSTransport(httpx.AsyncHTTPTransport):
+    """httpx transport that resolves hosts through a CachingResolver.
+
+    Accepts the same keyword arguments as ``httpx.AsyncHTTPTransport``.
+    Closing the transport leaves the resolver open.
+    """
+
+    def __init__(self, resolver: CachingResolver, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.resolver = resolver
+        # httpx does not expose the network backend, so wrap the pool's own
+        # before any connection has been created from it
+        pool = self._pool
+        pool._network_backend = CachingNetworkBackend(pool._network_backend, resolver)
+
+    async def aclose(self) -> None:
+        # The resolver may be shared with other loops' transports; only this
+        # loop's work is cancelled, and its owner closes it
+        await self.resolver.close_loop()
+        await super().aclose()
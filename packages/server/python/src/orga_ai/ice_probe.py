@@ -0,0 +1,291 @@
+"""ICE server reachability probing for the OrgaAI Python SDK.
+
+This module measures how quickly each STUN/TURN server returned by the API can
+be reached from the backend and reorders (or filters) the ICE server list so
+that clients try the closest reachable servers first.
+
+UDP servers (``stun:`` and ``turn:`` URLs) are probed with a STUN binding
+request, which TURN servers also answer, retransmitted within the timeout
+in case a datagram is lost. TCP and TLS servers (``turns:`` URLs
+and ``?transport=tcp``) are probed with a plain TCP connect.
+"""
+
+import asyncio
+import os
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .counters import Counters
+from .types import IceServer
+
+
+# STUN message constants (RFC 5389)
+STUN_BINDING_REQUEST = 0x0001
+STUN_BINDING_SUCCESS = 0x0101
+STUN_MAGIC_COOKIE = 0x2112A442
+
+# When a binding request is sent, in seconds from the first transmission.
+# RFC 5389 section 7.2.1 retransmits over UDP with a doubling interval; the
+# initial 100 ms (rather than 500 ms) fits a few attempts in a probe timeout
+STUN_RETRANSMIT_OFFSETS = (0.0, 0.1, 0.3)
+
+DEFAULT_PORTS = {"stun": 3478, "turn": 3478, "stuns": 5349, "turns": 5349}
+
+
+@dataclass(frozen=True)
+class IceTarget:
+    """Network target parsed from an ICE server URL.
+
+    Attributes:
+        host: Hostname or IP address
+        port: Port number
+        transport: "udp" or "tcp"
+    """
+    host: str
+    port: int
+    transport: str
+
+
+def parse_ice_url(url: str) -> Optional[IceTarget]:
+    """Parse a STUN/TURN URL into the network target to probe.
+
+    Args:
+        url: ICE server URL, e.g. "turn:turn.example.com:3478?transport=tcp"
+
+    Returns:
+        Optional[IceTarget]: The target, or None if the URL is not understood
+    """
+    scheme, sep, rest = url.partition(":")
+    scheme = scheme.lower()
+    if not sep or scheme not in DEFAULT_PORTS:
+        return None
+    address, _, query = rest.partition("?")
+    params = dict(
+        part.partition("=")[::2] for part in query.split("&") if part
+    )
+    if scheme in ("stuns", "turns"):
+        transport = "tcp"
+    else:
+        transport = params.get("transport", "udp").lower()
+    if address.startswith("["):
+        host, _, port_text = address[1:].partition("]")
+        port_text = port_text.lstrip(":")
+    else:
+        host, _, port_text = address.partition(":")
+    if not host:
+        return None
+    try:
+        port = int(port_text) if port_text else DEFAULT_PORTS[scheme]
+    except ValueError:
+        return None
+    return IceTarget(host=host, port=port, transport=transport)
+
+
+def build_binding_request() -> Tuple[bytes, bytes]:
+    """Build a STUN binding request.
+
+    Returns:
+        Tuple[bytes, bytes]: The request packet and its transaction ID
+    """
+    transaction_id = os.urandom(12)
+    header = struct.pack("!HHI", STUN_BINDING_REQUEST, 0, STUN_MAGIC_COOKIE)
+    return header + transaction_id, transaction_id
+
+
+def is_binding_response(data: bytes, transaction_id: bytes) -> bool:
+    """Check whether a datagram is the success response to our request."""
+    if len(data) < 20:
+        return False
+    message_type, _, cookie = struct.unpack("!HHI", data[:8])
+    return (
+        message_type == STUN_BINDING_SUCCESS
+        and cookie == STUN_MAGIC_COOKIE
+        and data[8:20] == transaction_id
+    )
+
+
+class _StunProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol resolving a future on the matching STUN response."""
+
+    def __init__(self, transaction_id: bytes, waiter: "asyncio.Future[None]") -> None:
+        self.transaction_id = transaction_id
+        self.waiter = waiter
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        if not self.waiter.done() and is_binding_response(data, self.transaction_id):
+            self.waiter.set_result(None)
+
+    def error_received(self, exc: Exception) -> None:
+        if not self.waiter.done():
+            self.waiter.set_exception(exc)
+
+
+class RttCache:
+    """Process-wide cache of probe results keyed by ICE target.
+
+    Unreachable targets are cached as None so that a dead server is not
+    probed again on every session.
+    """
+
+    def __init__(self, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: Dict[IceTarget, Tuple[float, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, target: IceTarget) -> Tuple[bool, Optional[float]]:
+        """Look up a cached probe result.
+
+        Returns:
+            Tuple[bool, Optional[float]]: Whether the entry was found, and the
+            RTT in seconds (None if the target was unreachable)
+        """
+        with self._lock:
+            entry = self._entries.get(target)
+            if entry is None or self._clock() >= entry[0]:
+                return False, None
+            return True, entry[1]
+
+    def put(self, target: IceTarget, rtt: Optional[float]) -> None:
+        """Store a probe result."""
+        with self._lock:
+            self._entries[target] = (self._clock() + self.ttl, rtt)
+
+    def clear(self) -> None:
+        """Forget every cached result."""
+        with self._lock:
+            self._entries.clear()
+
+
+rtt_cache = RttCache()
+
+
+class IceServerProber:
+    """Probes ICE servers concurrently and ranks them by measured RTT.
+
+    Probing never raises: a server that cannot be resolved, refuses the
+    connection or does not answer within the timeout is treated as
+    unreachable.
+    """
+
+    def __init__(self, timeout: float = 0.5, cache: Optional[RttCache] = None) -> None:
+        self.timeout = timeout
+        self.cache = cache if cache is not None else rtt_cache
+        self._stats = Counters("probes_sent")
+
+    @property
+    def probes_sent(self) -> int:
+        """Number of probes sent, not answered from the RTT cache."""
+        return self._stats.get("probes_sent")
+
+    async def probe(self, url: str) -> Optional[float]:
+        """Measure the round-trip time to a single ICE server URL.
+
+        Args:
+            url: ICE server URL
+
+        Returns:
+            Optional[float]: RTT in seconds, or None if unreachable
+        """
+        target = parse_ice_url(url)
+        if target is None:
+            return None
+        found, rtt = self.cache.get(target)
+        if found:
+            return rtt
+        self._stats.add("probes_sent")
+        try:
+            if target.transport == "tcp":
+                rtt = await asyncio.wait_for(self._probe_tcp(target), self.timeout)
+            else:
+                rtt = await asyncio.wait_for(self._probe_udp(target), self.timeout)
+        except (OSError, ValueError, asyncio.TimeoutError):
+            # ValueError covers hostnames the IDNA codec rejects (UnicodeError)
+            rtt = None
+        self.cache.put(target, rtt)
+        return rtt
+
+    async def rank(
+        self, servers: List[IceServer], drop_unreachable: bool = False
+    ) -> List[IceServer]:
+        """Reorder ICE servers by reachability and RTT.
+
+        Each server's URLs are probed concurrently; a server is as fast as its
+        fastest URL, and its URLs are reordered fastest first. Servers whose
+        URLs could not be parsed are kept in their original position relative
+        to unreachable servers.
+
+        Args:
+            servers: ICE servers as returned by the API
+            drop_unreachable: Remove servers with no reachable URL. The original
+                list is returned if that would leave no servers at all.
+
+        Returns:
+            List[IceServer]: Servers ordered fastest first
+        """
+        url_lists = [
+            [server.urls] if isinstance(server.urls, str) else list(server.urls)
+            for server in servers
+        ]
+        unique_urls = list(dict.fromkeys(url for urls in url_lists for url in urls))
+        results = await asyncio.gather(*(self.probe(url) for url in unique_urls))
+        rtts = dict(zip(unique_urls, results))
+
+        ranked = []
+        for index, (server, urls) in enumerate(zip(servers, url_lists)):
+            measured = [rtts[url] for url in urls if rtts[url] is not None]
+            best = min(measured) if measured else None
+            if isinstance(server.urls, list):
+                ordered = sorted(urls, key=lambda u: (rtts[u] is None, rtts[u] or 0.0))
+                server = replace(server, urls=ordered)
+            ranked.append((best is None, best or 0.0, index, server))
+        ranked.sort(key=lambda item: item[:3])
+
+        if drop_unreachable:
+            reachable = [item[3] for item in ranked if not item[0]]
+            if reachable:
+                return reachable
+            return list(servers)
+        return [item[3] for item in ranked]
+
+    async def _probe_udp(self, target: IceTarget) -> float:
+        loop = asyncio.get_running_loop()
+        request, transaction_id = build_binding_request()
+        waiter: "asyncio.Future[None]" = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _StunProtocol(transaction_id, waiter),
+            remote_addr=(target.host, target.port),
+        )
+        try:
+            # A lost request or response is retransmitted with the same
+            # transaction ID, so the RTT counts from the first transmission
+            started = time.perf_counter()
+            for offset in STUN_RETRANSMIT_OFFSETS:
+                wait = started + offset - time.perf_counter()
+                if wait > 0:
+                    await asyncio.wait((waiter,), timeout=wait)
+                if waiter.done():
+                    break
+                transport.sendto(request)
+            await waiter
+            return time.perf_counter() - started
+        finally:
+            transport.close()
+
+    async def _probe_tcp(self, target: IceTarget) -> float:
+        loop = asyncio.get_running_loop()
+        # Resolve first so that DNS time is not counted as network RTT
+        infos = await loop.getaddrinfo(
+            target.host, target.port, type=socket.SOCK_STREAM
+        )
+        address = infos[0][4]
+        started = time.perf_counter()
+        _, writer = await asyncio.open_connection(address[0], address[1])
+        rtt = time.perf_counter() - started
+        writer.close()
+        await writer.wait_closed()
+        return rtt
@@ -0,0 +1,139 @@
+"""Leasing of sessions, with return of the unused ones.
+
+A frontend often asks for a session, and the user leaves before
+connecting, so the freshly minted token and its round-trips are wasted.
+``SessionPool`` keeps track of the sessions handed out by
+OrgaAI.acquire_session(). A session released unused goes into a ready pool,
+and the next caller gets it instead of a new one while it is still valid
+for long enough to connect.
+"""
+
+import collections
+import threading
+import time
+from typing import Deque, Dict, Optional, Tuple
+
+from .counters import Counters
+from .types import SessionConfig
+
+
+class SessionPool:
+    """Outstanding session leases and the pool of sessions returned unused.
+
+    A lease lasts until its session expires, or for ``lease_ttl`` from when
+    the session was first leased if its expiry is unknown. Only sessions leased from this pool and not
+    yet released can be released, each once.
+
+    Args:
+        size: Most sessions kept ready; the one closest to expiry is
+            discarded to make room
+        lease_ttl: How long a session of unknown expiry stays usable, in
+            seconds
+        min_validity: Validity a session must have left to be handed out
+            again, in seconds
+    """
+
+    def __init__(self, size: int, lease_ttl: float, min_validity: float) -> None:
+        self.size = size
+        self.lease_ttl = lease_ttl
+        self.min_validity = min_validity
+        # Sessions ready to hand out, with the Unix time they stop being
+        # usable; the most recently returned is handed out first
+        self.ready: Deque[Tuple[SessionConfig, float]] = collections.deque()
+        # Outstanding leases by token, in the order they were taken
+        self._leases: Dict[str, Tuple[SessionConfig, float]] = {}
+        # When sessions of unknown expiry handed out again stop being usable,
+        # kept for when they are leased again so that re-leasing a session
+        # does not extend its lifetime
+        self._deadlines: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stats = Counters("acquired", "released", "reused", "discarded")
+
+    def __len__(self) -> int:
+        return len(self.ready)
+
+    def lease(self, session: SessionConfig) -> None:
+        """Record a session as leased to a caller."""
+        now = time.time()
+        token = session.ephemeral_token
+        with self._lock:
+            # Leases never released, and deadlines of sessions never leased
+            # again, are dropped once they expire
+            while self._leases:
+                oldest = next(iter(self._leases))
+                if self._leases[oldest][1] > now:
+                    break
+                del self._leases[oldest]
+            while self._deadlines:
+                oldest = next(iter(self._deadlines))
+                if self._deadlines[oldest] > now:
+                    break
+                del self._deadlines[oldest]
+            valid_until = session.valid_until
+            deadline = self._deadlines.pop(token, None)
+            if valid_until is None:
+                valid_until = now + self.lease_ttl if deadline is None else deadline
+            self._leases[token] = (session, valid_until)
+        self._stats.add("acquired")
+
+    def release(self, token: str, keep: bool = True) -> bool:
+        """End a lease, putting its session back in the pool if it is still valid.
+
+        Args:
+            token: Ephemeral token of the leased session
+            keep: Whether the session may be handed out again
+
+        Returns:
+            bool: Whether the session went back into the pool; False if it
+            expires too soon, the lease is unknown or already released, or
+            ``keep`` is False
+        """
+        discarded = 0
+        with self._lock:
+            lease = self._leases.pop(token, None)
+            if lease is None:
+                return False
+            self._stats.add("released")
+            kept = keep and lease[1] - time.time() >= self.min_validity
+            if kept:
+                self.ready.append(lease)
+                while len(self.ready) > self.size:
+                    self._discard_closest_to_expiry()
+                    discarded += 1
+            else:
+                discarded += 1
+        if discarded:
+            self._stats.add("discarded", discarded)
+        return kept
+
+    def take(self) -> Optional[SessionConfig]:
+        """Hand out a returned session still valid for ``min_validity``, if any."""
+        discarded = 0
+        session = None
+        with self._lock:
+            deadline = time.time() + self.min_validity
+            while self.ready:
+                candidate, valid_until = self.ready.pop()
+                if valid_until >= deadline:
+                    session = candidate
+                    if candidate.valid_until is None:
+                        self._deadlines[candidate.ephemeral_token] = valid_until
+                    break
+                discarded += 1
+        if discarded:
+            self._stats.add("discarded", discarded)
+        if session is not None:
+            self._stats.add("reused")
+        return session
+
+    def stats(self) -> Dict[str, int]:
+        """Return lease counters, the outstanding leases and the sessions ready."""
+        stats = self._stats.snapshot()
+        stats["outstanding"] = len(self._leases)
+        stats["ready"] = len(self.ready)
+        return stats
+
+    def _discard_closest_to_expiry(self) -> None:
+        # Called with the lock held
+        closest = min(range(len(self.ready)), key=lambda index: self.ready[index][1])
+        del self.ready[closest]
@@ -0,0 +1,374 @@
+"""Load generator measuring how many sessions per second one client can mint.
+
+Run it as ``python -m orga_ai loadgen``. It drives a single ``OrgaAI`` client,
+configured from the command line, against a base URL or the bundled
+stand-in API, and reports throughput, latency percentiles and errors.
+
+Two ways of generating load are supported:
+
+- closed loop (the default): ``--concurrency`` workers each request a
+  session as soon as their previous one completes;
+- open loop (``--rate``): sessions are started on a fixed or Poisson arrival
+  schedule regardless of how long earlier ones take, with at most
+  ``--concurrency`` in flight.
+
+Closed-loop latencies under-report queueing, because a slow response also
+delays the requests that would have been sent meanwhile ("coordinated
+omission"). Results therefore include a corrected distribution as well. In
+open-loop mode, corrected latency is measured from each session's scheduled
+start rather than from when it actually started. In closed-loop mode, the
+requests a stalled worker would have sent are back-filled at the median
+service time, as HdrHistogram does.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from .backends import MemoryCacheBackend
+from .client import OrgaAI
+from .errors import OrgaAIError
+from .testing import FakeOrgaAPIProcess
+from .types import OrgaAIConfig
+
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+# Upper bound on back-filled samples per measured sample, so one very long
+# stall cannot exhaust memory
+MAX_BACKFILL = 100_000
+
+
+@dataclass
+class LoadgenOptions:
+    """Settings for a load generation run.
+
+    Attributes:
+        base_url: API to target
+        api_key: API key sent to the target
+        user_email: User email sent to the target
+        duration: How long to generate load, in seconds
+        concurrency: Closed-loop workers, or the open-loop in-flight cap
+        rate: Open-loop arrival rate in sessions per second; None for a
+            closed loop
+        arrival: "uniform" or "poisson" open-loop arrivals
+        warmup: Sessions requested before measuring starts
+        pool_size: Maximum pooled connections
+        http2: Use HTTP/2
+        dns_cache: Enable the client's DNS cache
+        ice_cache: Cache ICE config in an in-memory cache backend
+        token_batch_window: Token batching window in milliseconds
+        timeout: Request timeout in milliseconds
+    """
+    base_url: str
+    api_key: str
+    user_email: str
+    duration: float = 10.0
+    concurrency: int = 16
+    rate: Optional[float] = None
+    arrival: str = "uniform"
+    warmup: int = 10
+    pool_size: int = 100
+    http2: bool = False
+    dns_cache: bool = False
+    ice_cache: bool = False
+    token_batch_window: Optional[float] = None
+    timeout: int = 10000
+
+
+@dataclass
+class LoadgenResult:
+    """Raw measurements from a run.
+
+    Latencies are in seconds. ``corrected`` holds the coordinated-omission
+    corrected latencies of successful sessions.
+    """
+    options: LoadgenOptions
+    elapsed: float
+    latencies: List[float] = field(default_factory=list)
+    corrected: List[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+
+    def report(self) -> Dict[str, Any]:
+        """Summarise the run as a JSON-serialisable dict."""
+        options = self.options
+        succeeded = len(self.latencies)
+        failed = sum(self.errors.values())
+        return {
+            "target": options.base_url,
+            "mode": "open" if options.rate else "closed",
+            "rate": options.rate,
+            "arrival": options.arrival if options.rate else None,
+            "concurrency": options.concurrency,
+            "pool_size": options.pool_size,
+            "http2": options.http2,
+            "dns_cache": options.dns_cache,
+            "ice_cache": options.ice_cache,
+            "token_batch_window": options.token_batch_window,
+            "elapsed": round(self.elapsed, 3),
+            "sessions": {"succeeded": succeeded, "failed": failed},
+            "throughput": round(succeeded / self.elapsed, 1) if self.elapsed else 0.0,
+            "latency_ms": summarize(self.latencies),
+            "corrected_latency_ms": summarize(self.corrected),
+            "errors": dict(self.errors.most_common()),
+        }
+
+
+def percentile(ordered: Sequence[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return 0.0
+    rank = max(1, int(-(-percent * len(ordered) // 100)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(latencies: Sequence[float]) -> Dict[str, float]:
+    """Latency percentiles, mean and max in milliseconds."""
+    ordered = sorted(latencies)
+    summary = {f"p{p:g}": round(percentile(ordered, p) * 1000, 3) for p in PERCENTILES}
+    summary["mean"] = round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0
+    summary["max"] = round(ordered[-1] * 1000, 3) if ordered else 0.0
+    return summary
+
+
+def backfill(latencies: Sequence[float], expected_interval: float) -> List[float]:
+    """Add the samples a closed-loop worker missed while it was stalled.
+
+    Equivalent to HdrHistogram's ``recordValueWithExpectedInterval``: each
+    latency longer than the expected interval also records the latencies of
+    the requests that would have been sent during it.
+    """
+    corrected = list(latencies)
+    if expected_interval <= 0:
+        return corrected
+    for latency in latencies:
+        missing = latency - expected_interval
+        added = 0
+        while missing >= expected_interval and added < MAX_BACKFILL:
+            corrected.append(missing)
+            missing -= expected_interval
+            added += 1
+    return corrected
+
+
+def classify(error: BaseException) -> str:
+    """Group an error for the breakdown, e.g. "OrgaAIServerError 503"."""
+    name = type(error).__name__
+    if isinstance(error, OrgaAIError) and error.status:
+        return f"{name} {error.status}"
+    return name
+
+
+def build_config(options: LoadgenOptions) -> OrgaAIConfig:
+    """Create the client configuration for a run."""
+    return OrgaAIConfig(
+        api_key=options.api_key,
+        user_email=options.user_email,
+        base_url=options.base_url,
+        timeout=options.timeout,
+        max_connections=options.pool_size,
+        http2=options.http2,
+        dns_cache=options.dns_cache,
+        cache_backend=MemoryCacheBackend() if options.ice_cache else None,
+        token_batch_window=options.token_batch_window,
+    )
+
+
+async def run_load(options: LoadgenOptions) -> LoadgenResult:
+    """Generate load with one client and collect measurements.
+
+    Args:
+        options: Settings for the run
+
+    Returns:
+        LoadgenResult: Latencies and errors recorded during the run
+    """
+    async with OrgaAI(build_config(options)) as client:
+        for _ in range(options.warmup):
+            try:
+                await client.get_session_config()
+            except Exception:
+                pass
+        if options.rate:
+            return await _open_loop(client, options)
+        return await _closed_loop(client, options)
+
+
+async def _closed_loop(client: OrgaAI, options: LoadgenOptions) -> LoadgenResult:
+    result = LoadgenResult(options=options, elapsed=0.0)
+    started = time.perf_counter()
+    deadline = started + options.duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            begin = time.perf_counter()
+            try:
+                await client.get_session_config()
+            except Exception as error:
+                result.errors[classify(error)] += 1
+                continue
+            result.latencies.append(time.perf_counter() - begin)
+
+    await asyncio.gather(*(worker() for _ in range(options.concurrency)))
+    result.elapsed = time.perf_counter() - started
+    ordered = sorted(result.latencies)
+    result.corrected = backfill(result.latencies, percentile(ordered, 50))
+    return result
+
+
+async def _open_loop(client: OrgaAI, options: LoadgenOptions) -> LoadgenResult:
+    assert options.rate
+    result = LoadgenResult(options=options, elapsed=0.0)
+    in_flight = asyncio.Semaphore(options.concurrency)
+    tasks = set()
+    randomness = random.Random(0)
+
+    async def session(intended: float) -> None:
+        async with in_flight:
+            begin = time.perf_counter()
+            try:
+                await client.get_session_config()
+            except Exception as error:
+                result.errors[classify(error)] += 1
+                return
+            end = time.perf_counter()
+        result.latencies.append(end - begin)
+        # Includes time spent waiting for the schedule or the in-flight cap
+        result.corrected.append(end - intended)
+
+    started = time.perf_counter()
+    intended = started
+    while intended < started + options.duration:
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.ensure_future(session(intended))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        if options.arrival == "poisson":
+            intended += randomness.expovariate(options.rate)
+        else:
+            intended += 1 / options.rate
+    if tasks:
+        await asyncio.gather(*tasks)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def format_text(report: Dict[str, Any]) -> str:
+    """Render a report for the terminal."""
+    if report["mode"] == "open":
+        mode = (
+            f"open loop, {report['rate']:g}/s {report['arrival']} arrivals, "
+            f"at most {report['concurrency']} in flight"
+        )
+    else:
+        mode = f"closed loop, {report['concurrency']} workers"
+    features = [
+        name
+        for name, enabled in (
+            ("http2", report["http2"]),
+            ("dns cache", report["dns_cache"]),
+            ("ice cache", report["ice_cache"]),
+            ("token batching", report["token_batch_window"]),
+        )
+        if enabled
+    ]
+    sessions = report["sessions"]
+    lines = [
+        f"Target      {report['target']}",
+        f"Mode        {mode}",
+        f"Client      pool {report['pool_size']}"
+        + (f", {', '.join(features)}" if features else ""),
+        f"Duration    {report['elapsed']:.2f} s",
+        f"Sessions    {sessions['succeeded']} ok, {sessions['failed']} failed",
+        f"Throughput  {report['throughput']:.1f} sessions/s",
+        "",
+        "Latency (ms)" + "".join(f"{key:>10}" for key in report["latency_ms"]),
+    ]
+    for label, key in (("measured", "latency_ms"), ("corrected", "corrected_latency_ms")):
+        lines.append(
+            f"  {label:<10}" + "".join(f"{value:>10.2f}" for value in report[key].values())
+        )
+    if report["errors"]:
+        lines.append("")
+        lines.append("Errors")
+        for name, count in report["errors"].items():
+            lines.append(f"  {name:<32}{count:>8}")
+    return "\n".join(lines)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the loadgen options to an argument parser."""
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--base-url", help="API base URL to load")
+    target.add_argument(
+        "--stand-in", action="store_true", help="start and load the bundled stand-in API"
+    )
+    parser.add_argument(
+        "--stand-in-latency", type=float, default=0.0, help="stand-in latency in ms"
+    )
+    parser.add_argument("--api-key", default=os.getenv("ORGA_API_KEY", "loadgen"))
+    parser.add_argument(
+        "--user-email", default=os.getenv("ORGA_USER_EMAIL", "loadgen@example.com")
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="workers, or open-loop in-flight cap"
+    )
+    parser.add_argument("--rate", type=float, help="open-loop arrivals per second")
+    parser.add_argument("--arrival", choices=("uniform", "poisson"), default="uniform")
+    parser.add_argument("--warmup", type=int, default=10, help="sessions before measuring")
+    parser.add_argument("--pool-size", type=int, default=100, help="max connections")
+    parser.add_argument("--http2", action="store_true", help="use HTTP/2 (needs h2)")
+    parser.add_argument("--dns-cache", action="store_true", help="enable the DNS cache")
+    parser.add_argument(
+        "--ice-cache", action="store_true", help="cache ICE config in a memory backend"
+    )
+    parser.add_argument("--token-batch-window", type=float, help="milliseconds")
+    parser.add_argument("--timeout", type=int, default=10000, help="milliseconds")
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+
+
+def main(args: argparse.Namespace) -> int:
+    """Run the load generator from parsed command-line arguments."""
+    stand_in = None
+    base_url = args.base_url
+    if args.stand_in:
+        stand_in = FakeOrgaAPIProcess(latency=args.stand_in_latency / 1000).start()
+        base_url = stand_in.url
+    options = LoadgenOptions(
+        base_url=base_url,
+        api_key=args.api_key,
+        user_email=args.user_email,
+        duration=args.duration,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        arrival=args.arrival,
+        warmup=args.warmup,
+        pool_size=args.pool_size,
+        http2=args.http2,
+        dns_cache=args.dns_cache,
+        ice_cache=args.ice_cache,
+        token_batch_window=args.token_batch_window,
+        timeout=args.timeout,
+    )
+    try:
+        report = asyncio.run(run_load(options)).report()
+    except OrgaAIError as error:
+        print(f"loadgen: {error.message}", file=sys.stderr)
+        return 2
+    finally:
+        if stand_in is not None:
+            stand_in.stop()
+    if stand_in is not None:
+        report["target"] += " (stand-in)"
+    print(json.dumps(report, indent=2) if args.json else format_text(report))
+    return 0
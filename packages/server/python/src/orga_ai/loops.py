@@ -0,0 +1,164 @@
+"""Per-event-loop values.
+
+asyncio resources such as httpx connection pools, stream connections and
+locks belong to the event loop they were created on and fail when used from
+another one. ``LoopLocal`` keeps one value per running event loop, the way
+``threading.local`` keeps one per thread, so a client shared by threads that
+each run their own loop (or by sync and async handlers) can hold loop-bound
+resources without the caller noticing.
+
+Values are finalized on their own loop when it shuts down: a watcher async
+generator is registered with the loop when its value is created, and
+``loop.shutdown_asyncgens()``, which ``asyncio.run`` and ``asyncio.Runner``
+call before closing the loop, closes it. Values of loops closed without
+that step are dropped the next time a value is created.
+"""
+
+import asyncio
+import threading
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+_Loop = Optional[asyncio.AbstractEventLoop]
+
+
+class _Slot(Generic[T]):
+    __slots__ = ("value", "watcher")
+
+    def __init__(self, value: T) -> None:
+        self.value = value
+        self.watcher: Optional[AsyncGenerator[None, None]] = None
+
+
+class LoopLocal(Generic[T]):
+    """One value per event loop.
+
+    Outside a running loop a single loop-less value is used, which ``aclose()``
+    finalizes from whichever loop it runs on.
+
+    Args:
+        factory: Creates the value for the current loop
+        finalizer: Releases a value; awaited on the value's own loop
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], T],
+        finalizer: Optional[Callable[[T], Awaitable[None]]] = None,
+    ) -> None:
+        self._factory = factory
+        self._finalizer = finalizer
+        self._slots: Dict[_Loop, _Slot[T]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get(self) -> T:
+        """Return the running loop's value, creating it on first use."""
+        loop = _running_loop()
+        slot = self._slots.get(loop)
+        if slot is not None:
+            return slot.value
+        # Only the loop's own thread creates its value, so the factory can run
+        # outside the lock; threads without a loop may race on the loop-less
+        # slot, in which case the first value wins and the others are unused
+        created = _Slot(self._factory())
+        with self._lock:
+            dropped = self._pop_closed()
+            slot = self._slots.setdefault(loop, created)
+        for old in dropped:
+            _unwatch(old)
+        if slot is created and loop is not None:
+            self._watch(loop, slot)
+        return slot.value
+
+    def peek(self) -> Optional[T]:
+        """Return the running loop's value without creating it."""
+        slot = self._slots.get(_running_loop())
+        return slot.value if slot is not None else None
+
+    async def aclose(self) -> None:
+        """Finalize and forget every value.
+
+        The running loop's value and the loop-less one are finalized here.
+        Values of other running loops are finalized on their own loop, in
+        the background, and values of closed loops are dropped. Values of
+        loops that exist but are not running are kept, to be finalized when
+        that loop shuts down.
+        """
+        current = asyncio.get_running_loop()
+        with self._lock:
+            slots = {
+                loop: slot
+                for loop, slot in self._slots.items()
+                if loop is None or loop is current or loop.is_running() or loop.is_closed()
+            }
+            for loop in slots:
+                del self._slots[loop]
+        for loop, slot in slots.items():
+            _unwatch(slot)
+            if self._finalizer is None:
+                continue
+            if loop is None or loop is current:
+                await self._finalizer(slot.value)
+            elif not loop.is_closed():
+                try:
+                    asyncio.run_coroutine_threadsafe(self._finalizer(slot.value), loop)
+                except RuntimeError:
+                    # Closed since the check
+                    pass
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, slot: _Slot[T]) -> None:
+        watcher = self._until_shutdown(loop, slot)
+        # Run the watcher up to its yield right away; starting it registers it
+        # with the running loop through the asyncgen firstiter hook
+        try:
+            watcher.asend(None).send(None)
+        except StopIteration:
+            # The loop only keeps a weak reference
+            slot.watcher = watcher
+
+    async def _until_shutdown(
+        self, loop: asyncio.AbstractEventLoop, slot: _Slot[T]
+    ) -> AsyncGenerator[None, None]:
+        try:
+            yield
+        finally:
+            if self._discard(loop, slot) and self._finalizer is not None:
+                await self._finalizer(slot.value)
+
+    def _discard(self, loop: _Loop, slot: _Slot[T]) -> bool:
+        with self._lock:
+            if self._slots.get(loop) is not slot:
+                return False
+            del self._slots[loop]
+            return True
+
+    def _pop_closed(self) -> List[_Slot[T]]:
+        # Called with the lock held; the watchers' cleanup takes it too, so
+        # the caller unwatches the returned slots after releasing it
+        closed = [loop for loop in self._slots if loop is not None and loop.is_closed()]
+        return [self._slots.pop(loop) for loop in closed]
+
+
+def _running_loop() -> _Loop:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _unwatch(slot: _Slot[T]) -> None:
+    """Close a forgotten slot's watcher without finalizing its value."""
+    watcher, slot.watcher = slot.watcher, None
+    if watcher is None:
+        return
+    try:
+        watcher.aclose().send(None)
+    except StopIteration:
+        pass
+    except RuntimeError:
+        # Being closed by its loop's shutdown at this very moment
+        pass
@@ -0,0 +1,227 @@
+"""Parsing of OrgaAI API responses.
+
+Responses are validated and turned into SDK types in one pass by pydantic
+``TypeAdapter``s, straight from the raw JSON bytes without building an
+intermediate dict first. The adapters are compiled once, on first use, so
+importing the SDK does not pay for pydantic.
+
+In trusted mode validation is skipped: the bytes are parsed with
+pydantic-core's JSON parser and the SDK types are built directly. Only
+what building them needs is checked, so a wrongly typed field is passed
+through instead of rejected.
+
+Every parse function raises ``ValueError`` for a malformed response, in
+either mode.
+
+Expiry is read from the response when the API reports it: ``expires_at``
+(Unix time) or ``expires_in`` (seconds) next to the token, and a top-level
+``expires_at`` or ``ttl`` (seconds) or a per-server ``expires_at`` in the
+ICE config. Otherwise it is taken from the credentials themselves: the
+``exp`` claim of a JWT token, and the timestamp prefix of TURN REST API
+usernames (``"<expiry>:<user>"``). Claims are read, not verified.
+"""
+
+import base64
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, List, Mapping, Optional
+
+from .types import EphemeralToken, IceServer
+
+if TYPE_CHECKING:
+    from pydantic import TypeAdapter
+
+
+class _Adapters:
+    """Compiled validators for each response shape."""
+
+    def __init__(self) -> None:
+        from pydantic import TypeAdapter
+        from typing_extensions import NotRequired, TypedDict
+
+        class EphemeralTokenResponse(TypedDict):
+            ephemeral_token: str
+            expires_at: NotRequired[float]
+            expires_in: NotRequired[float]
+
+        class EphemeralTokensResponse(TypedDict):
+            ephemeral_tokens: NotRequired[List[str]]
+            ephemeral_token: NotRequired[str]
+            expires_at: NotRequired[float]
+            expires_in: NotRequired[float]
+
+        class IceConfigResponse(TypedDict):
+            iceServers: List[IceServer]
+            expires_at: NotRequired[float]
+            ttl: NotRequired[float]
+
+        self.token: "TypeAdapter[Any]" = TypeAdapter(EphemeralTokenResponse)
+        self.tokens: "TypeAdapter[Any]" = TypeAdapter(EphemeralTokensResponse)
+        self.ice_config: "TypeAdapter[Any]" = TypeAdapter(IceConfigResponse)
+
+
+@lru_cache(maxsize=None)
+def _adapters() -> _Adapters:
+    return _Adapters()
+
+
+def _from_json(content: bytes) -> Any:
+    from pydantic_core import from_json
+
+    return from_json(content)
+
+
+def _reported_expiry(data: Mapping[str, Any], relative_field: str) -> Optional[float]:
+    """Return the expiry a response reports, absolute or relative to now."""
+    if data.get("expires_at") is not None:
+        return float(data["expires_at"])
+    if data.get(relative_field) is not None:
+        return time.time() + float(data[relative_field])
+    return None
+
+
+def token_claims_expiry(token: str) -> Optional[float]:
+    """Return the ``exp`` claim of a JWT, or None if the token is not one.
+
+    The signature is not checked; the claim is only used to schedule
+    refreshes, never to trust the token.
+    """
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    payload = parts[1]
+    try:
+        claims = _from_json(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        expiry = claims["exp"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if isinstance(expiry, bool) or not isinstance(expiry, (int, float)):
+        return None
+    return float(expiry)
+
+
+def _token(value: Any, reported: Optional[float]) -> Any:
+    if not isinstance(value, str):
+        # Only reachable in trusted mode, which passes wrong types through
+        return value
+    expires_at = reported if reported is not None else token_claims_expiry(value)
+    # Tokens of unknown expiry stay plain strings, which saves an object
+    # per session
+    return value if expires_at is None else EphemeralToken(value, expires_at)
+
+
+def _turn_rest_expiry(username: str) -> Optional[float]:
+    """Return the expiry encoded in a TURN REST API username, if any."""
+    prefix, separator, _ = username.partition(":")
+    if not separator or not prefix.isdigit():
+        return None
+    return float(prefix)
+
+
+def _with_expiry(servers: List[IceServer], reported: Optional[float]) -> List[IceServer]:
+    if reported is not None:
+        for server in servers:
+            if server.expires_at is None:
+                server.expires_at = reported
+        return servers
+    for server in servers:
+        username = server.username
+        # Cheap test first: TURN REST usernames start with the timestamp
+        if (
+            isinstance(username, str)
+            and username[:1].isdigit()
+            and server.expires_at is None
+        ):
+            server.expires_at = _turn_rest_expiry(username)
+    return servers
+
+
+def parse_ephemeral_token(content: bytes, trusted: bool = False) -> str:
+    """Parse a client-secrets response.
+
+    Args:
+        content: Raw response body
+        trusted: Skip validation
+
+    Returns:
+        str: The ephemeral token, an ``EphemeralToken`` if its expiry is known
+
+    Raises:
+        ValueError: If the response is malformed
+    """
+    if trusted:
+        try:
+            data = _from_json(content)
+            return _token(data["ephemeral_token"], _reported_expiry(data, "expires_in"))
+        except (KeyError, TypeError, AttributeError) as error:
+            raise ValueError(f"missing field {error}") from error
+    data = _adapters().token.validate_json(content)
+    return _token(data["ephemeral_token"], _reported_expiry(data, "expires_in"))
+
+
+def parse_ephemeral_tokens(content: bytes, trusted: bool = False) -> List[str]:
+    """Parse a batched client-secrets response.
+
+    An API that ignored the count parameter answers with a single token,
+    which is returned as a list of one.
+
+    Args:
+        content: Raw response body
+        trusted: Skip validation
+
+    Returns:
+        List[str]: The ephemeral tokens, ``EphemeralToken``s if their expiry
+        is known
+
+    Raises:
+        ValueError: If the response is malformed
+    """
+    if trusted:
+        try:
+            data = _from_json(content)
+            reported = _reported_expiry(data, "expires_in")
+            if "ephemeral_tokens" in data:
+                return [_token(token, reported) for token in data["ephemeral_tokens"]]
+            return [_token(data["ephemeral_token"], reported)]
+        except (KeyError, TypeError, AttributeError) as error:
+            raise ValueError(f"missing field {error}") from error
+    data = _adapters().tokens.validate_json(content)
+    reported = _reported_expiry(data, "expires_in")
+    tokens: Optional[List[str]] = data.get("ephemeral_tokens")
+    if tokens is not None:
+        return [_token(token, reported) for token in tokens]
+    if "ephemeral_token" in data:
+        return [_token(data["ephemeral_token"], reported)]
+    raise ValueError("missing field 'ephemeral_tokens'")
+
+
+def parse_ice_servers(content: bytes, trusted: bool = False) -> List[IceServer]:
+    """Parse an ice-config response.
+
+    Args:
+        content: Raw response body
+        trusted: Skip validation
+
+    Returns:
+        List[IceServer]: The ICE servers
+
+    Raises:
+        ValueError: If the response is malformed
+    """
+    if trusted:
+        try:
+            data = _from_json(content)
+            servers = [
+                IceServer(
+                    item["urls"],
+                    item.get("username"),
+                    item.get("credential"),
+                    item.get("expires_at"),
+                )
+                for item in data["iceServers"]
+            ]
+            return _with_expiry(servers, _reported_expiry(data, "ttl"))
+        except (KeyError, TypeError, AttributeError) as error:
+            raise ValueError(f"malformed ICE servers ({error!r})") from error
+    data = _adapters().ice_config.validate_json(content)
+    return _with_expiry(data["iceServers"], _reported_expiry(data, "ttl"))
@@ -0,0 +1,223 @@
+"""Adaptive sizing of a reserve of prefetched sessions.
+
+Sessions minted ahead of demand let get_session_config() answer without any
+round-trip, but a reserve of fixed size is wrong most of the time: too large
+when traffic is quiet, so its tokens expire unused, and too small during a
+spike, so it runs dry. ``AdaptivePrefetcher`` sizes the reserve from what it
+observes instead:
+
+- the arrival rate of get_session_config() calls, as a slow moving average
+  over about a minute and a fast one over a few seconds; while the fast rate
+  is ``burst_ratio`` times the slow one a burst is under way, and the fast
+  rate is used;
+- upstream latency, the time a refill takes, during which the reserve has to
+  cover the arrivals;
+- token lifetime, since sessions beyond what the arrival rate consumes
+  before they expire would only be thrown away.
+
+Arrivals are taken to be Poisson, so the target is the mean demand during a
+refill plus ``safety`` standard deviations of it, ``λL + z·√(λL)``, capped by
+the sessions consumed within their usable lifetime and by ``max_size``.
+"""
+
+import collections
+import math
+import threading
+import time
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .counters import Counters
+from .types import SessionConfig
+
+
+class RateEstimator:
+    """Exponentially weighted moving average of an event rate.
+
+    Each event adds ``1 / window`` and the estimate decays by ``e`` every
+    ``window`` seconds, so a steady rate converges to itself and updates take
+    constant time and memory.
+
+    Args:
+        window: Time constant of the average, in seconds
+    """
+
+    __slots__ = ("window", "_rate", "_last")
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._rate = 0.0
+        self._last = 0.0
+
+    def record(self, now: float) -> None:
+        """Count an event at ``now`` (a monotonic time)."""
+        self._rate = self.rate(now) + 1 / self.window
+        self._last = now
+
+    def rate(self, now: float) -> float:
+        """Return the estimated events per second at ``now``."""
+        if not self._rate:
+            return 0.0
+        return self._rate * math.exp((self._last - now) / self.window)
+
+
+class AdaptivePrefetcher:
+    """A reserve of prefetched sessions sized from observed demand.
+
+    arrive() counts each call, including those answered some other way, and
+    take() hands out the oldest reserved session still valid for
+    ``min_validity``. The owner refills the reserve with the count
+    returned by start_refill(), reports each session minted with put() and
+    the time the refill took with observe_latency(), then calls
+    finish_refill().
+
+    Args:
+        max_size: Most sessions kept in reserve
+        session_ttl: How long a reserved session may be handed out, in
+            seconds, and its lifetime when its expiry is unknown
+        min_validity: Validity a reserved session must have left to be
+            handed out, in seconds
+        slow_window: Time constant of the long-term arrival rate, in seconds
+        fast_window: Time constant of the short-term arrival rate, in seconds
+        burst_ratio: Ratio of the fast to the slow rate that signals a burst
+        safety: Standard deviations of demand kept in reserve on top of the
+            mean
+        smoothing: Weight of each new latency and lifetime observation
+    """
+
+    def __init__(
+        self,
+        max_size: int = 100,
+        session_ttl: float = 30.0,
+        min_validity: float = 5.0,
+        slow_window: float = 60.0,
+        fast_window: float = 5.0,
+        burst_ratio: float = 2.0,
+        safety: float = 2.0,
+        smoothing: float = 0.2,
+    ) -> None:
+        self.max_size = max_size
+        self.session_ttl = session_ttl
+        self.min_validity = min_validity
+        self.burst_ratio = burst_ratio
+        self.safety = safety
+        self.smoothing = smoothing
+        # Upstream latency and session lifetime, in seconds; None until observed
+        self.latency: Optional[float] = None
+        self.lifetime: Optional[float] = None
+        # Reserved sessions, oldest first, with the Unix time they stop
+        # being handed out
+        self.reserve: Deque[Tuple[SessionConfig, float]] = collections.deque()
+        self._slow = RateEstimator(slow_window)
+        self._fast = RateEstimator(fast_window)
+        self._refilling = False
+        self._lock = threading.Lock()
+        self._stats = Counters("hits", "misses", "prefetched", "expired")
+
+    def __len__(self) -> int:
+        return len(self.reserve)
+
+    def arrive(self) -> None:
+        """Count a call, however it ends up being served."""
+        now = time.monotonic()
+        with self._lock:
+            self._slow.record(now)
+            self._fast.record(now)
+
+    def take(self) -> Optional[SessionConfig]:
+        """Hand out a reserved session, if any is valid."""
+        deadline = time.time() + self.min_validity
+        expired = 0
+        session = None
+        while True:
+            try:
+                candidate, valid_until = self.reserve.popleft()
+            except IndexError:
+                break
+            if valid_until >= deadline:
+                session = candidate
+                break
+            expired += 1
+        if expired:
+            self._stats.add("expired", expired)
+        self._stats.add("misses" if session is None else "hits")
+        return session
+
+    def put(self, session: SessionConfig) -> None:
+        """Add a freshly minted session to the reserve."""
+        now = time.time()
+        valid_until = now + self.session_ttl
+        expires_at = session.valid_until
+        if expires_at is not None:
+            valid_until = min(valid_until, expires_at)
+        self.lifetime = self._smooth(self.lifetime, valid_until - now)
+        self.reserve.append((session, valid_until))
+        self._stats.add("prefetched")
+
+    def observe_latency(self, seconds: float) -> None:
+        """Record how long minting sessions upstream took."""
+        self.latency = self._smooth(self.latency, seconds)
+
+    def arrival_rate(self) -> float:
+        """Return the arrival rate the reserve is sized for, per second."""
+        now = time.monotonic()
+        slow, fast = self._slow.rate(now), self._fast.rate(now)
+        return fast if fast >= slow * self.burst_ratio else slow
+
+    def bursting(self) -> bool:
+        """Return whether arrivals are running well above their long-term rate."""
+        now = time.monotonic()
+        return self._fast.rate(now) >= self._slow.rate(now) * self.burst_ratio > 0
+
+    def target(self) -> int:
+        """Return the number of sessions the reserve should hold."""
+        if self.latency is None:
+            return 0
+        rate = self.arrival_rate()
+        demand = rate * self.latency
+        wanted = math.ceil(demand + self.safety * math.sqrt(demand))
+        lifetime = self.session_ttl if self.lifetime is None else self.lifetime
+        usable = max(lifetime - self.min_validity, 0.0)
+        return min(wanted, int(rate * usable), self.max_size)
+
+    def start_refill(self) -> int:
+        """Claim the refill if the reserve is below target.
+
+        Returns:
+            int: Number of sessions to mint, or 0 if the reserve is full
+            enough or another refill is running
+        """
+        with self._lock:
+            if self._refilling:
+                return 0
+            count = self.target() - len(self.reserve)
+            if count <= 0:
+                return 0
+            self._refilling = True
+            return count
+
+    def deficit(self) -> int:
+        """Return how many sessions the reserve is short of its target."""
+        return max(self.target() - len(self.reserve), 0)
+
+    def finish_refill(self) -> None:
+        """Release the refill claimed by start_refill()."""
+        with self._lock:
+            self._refilling = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return reserve counters, the target and the current estimates."""
+        stats: Dict[str, Any] = self._stats.snapshot()
+        served = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / served, 4) if served else None
+        stats["target"] = self.target()
+        stats["reserve"] = len(self.reserve)
+        stats["arrival_rate"] = round(self.arrival_rate(), 3)
+        stats["bursting"] = self.bursting()
+        stats["latency_ms"] = None if self.latency is None else round(self.latency * 1000, 3)
+        stats["lifetime_s"] = None if self.lifetime is None else round(self.lifetime, 3)
+        return stats
+
+    def _smooth(self, average: Optional[float], value: float) -> float:
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
@@ -0,0 +1,194 @@
+"""Capture of slow get_session_config() calls.
+
+Aggregated latency metrics show that p99 is bad, not why a given call was
+slow. With ``slow_call_threshold`` set, every get_session_config() call
+records a timeline of what it did: the client's cache decisions and
+failovers, and for each request the time spent waiting for a pooled
+connection, resolving, connecting, in the TLS handshake, until the first
+response byte (TTFB) and reading the body. Calls that finish under the
+threshold drop their timeline; slower ones keep it in a bounded ring buffer.
+
+The timeline of the running call is found through a context variable, so
+the transports and the DNS cache add to it without it being passed around,
+and code paths cost one context variable lookup when no call is profiled.
+Events carry names and short details only, never tokens or credentials.
+"""
+
+import asyncio
+import collections
+import json
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .counters import Counters
+
+
+_current: "ContextVar[Optional[CallTimeline]]" = ContextVar(
+    "orga_ai_call_timeline", default=None
+)
+
+# httpcore trace steps, by the phase they are reported as
+_HTTPCORE_PHASES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "receive_response_headers": "ttfb",
+    "receive_response_body": "body",
+}
+
+
+def _task_id() -> Optional[int]:
+    """Identify the running task, so concurrent requests keep separate phases."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        return None
+    return None if task is None else id(task)
+
+
+def current_timeline() -> "Optional[CallTimeline]":
+    """Return the timeline of the call being profiled, if any."""
+    return _current.get()
+
+
+def mark(event: str, detail: Optional[str] = None) -> None:
+    """Record an event in the timeline of the call being profiled, if any."""
+    timeline = _current.get()
+    if timeline is not None:
+        timeline.mark(event, detail)
+
+
+class CallTimeline:
+    """Events and timed phases of one call, in the order they started.
+
+    Events are instants (a cache decision, a failover); phases have a
+    duration and are opened by begin() and closed by end(), in the same
+    task, so requests a call runs concurrently each time their own phases.
+    Phases still open when the call finishes are reported as unfinished.
+    """
+
+    __slots__ = ("started", "started_at", "error", "_events", "_open", "_token")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.error: Optional[str] = None
+        # (started, ended or None for instants, name, detail)
+        self._events: List[Tuple[float, Optional[float], str, Optional[str]]] = []
+        # Start of each open phase, by name and the task that opened it
+        self._open: Dict[Tuple[str, Optional[int]], float] = {}
+        self._token: Optional[Token] = None
+
+    def mark(self, event: str, detail: Optional[str] = None) -> None:
+        """Record an instant event."""
+        self._events.append((time.perf_counter(), None, event, detail))
+
+    def begin(self, phase: str) -> None:
+        """Open a phase; reopening one restarts it."""
+        self._open[phase, _task_id()] = time.perf_counter()
+
+    def end(self, phase: str, detail: Optional[str] = None) -> None:
+        """Close a phase opened by begin(); does nothing if it is not open."""
+        started = self._open.pop((phase, _task_id()), None)
+        if started is not None:
+            self._events.append((started, time.perf_counter(), phase, detail))
+
+    async def httpcore_trace(self, name: str, info: Dict[str, Any]) -> None:
+        """httpcore ``trace`` request extension recording connection phases."""
+        step, _, state = name.rpartition(".")
+        step = step.rpartition(".")[2]
+        if state == "started" and step in ("connect_tcp", "send_request_headers"):
+            # The request has a connection: new, or taken from the pool
+            self.end("pool_wait")
+        phase = _HTTPCORE_PHASES.get(step)
+        if phase is not None:
+            if state == "started":
+                self.begin(phase)
+            else:
+                self.end(phase, None if state == "complete" else state)
+        elif step == "retry" and state == "started":
+            self.mark("connect_retry")
+
+    def to_dict(self, ended: float) -> Dict[str, Any]:
+        """Return the timeline as JSON-serializable data.
+
+        Args:
+            ended: perf_counter() time the call finished
+        """
+        events = list(self._events)
+        for (phase, _), started in self._open.items():
+            events.append((started, ended, phase, "unfinished"))
+        events.sort(key=lambda event: event[0])
+        return {
+            "started_at": self.started_at,
+            "duration_ms": round((ended - self.started) * 1000, 3),
+            "error": self.error,
+            "events": [
+                {
+                    "at_ms": round((started - self.started) * 1000, 3),
+                    "event": name,
+                    "duration_ms": None if end is None else round((end - started) * 1000, 3),
+                    "detail": detail,
+                }
+                for started, end, name, detail in events
+            ],
+        }
+
+
+class SlowCallRecorder:
+    """Keeps the timelines of the most recent slow calls.
+
+    Args:
+        threshold: Calls taking at least this long are kept, in seconds
+        size: Number of slow calls kept; older ones are dropped
+    """
+
+    def __init__(self, threshold: float, size: int = 100) -> None:
+        self.threshold = threshold
+        self._buffer: Deque[Dict[str, Any]] = collections.deque(maxlen=size)
+        self._stats = Counters("calls", "captured")
+
+    def start(self) -> CallTimeline:
+        """Start profiling a call in the current context."""
+        timeline = CallTimeline()
+        timeline._token = _current.set(timeline)
+        return timeline
+
+    def finish(self, timeline: CallTimeline) -> None:
+        """Stop profiling a call, keeping its timeline if it was slow.
+
+        Must be called in the context start() was called in.
+        """
+        ended = time.perf_counter()
+        if timeline._token is not None:
+            _current.reset(timeline._token)
+            timeline._token = None
+        self._stats.add("calls")
+        if ended - timeline.started >= self.threshold:
+            self._stats.add("captured")
+            self._buffer.append(timeline.to_dict(ended))
+
+    def records(self, clear: bool = False) -> List[Dict[str, Any]]:
+        """Return the kept timelines, oldest first.
+
+        Args:
+            clear: Empty the buffer as well
+        """
+        records = list(self._buffer)
+        if clear:
+            for _ in records:
+                self._buffer.popleft()
+        return records
+
+    def dump(self, path: str) -> int:
+        """Write the kept timelines to a JSON file; returns how many."""
+        records = self.records()
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"threshold_ms": self.threshold * 1000, "calls": records}, file, indent=2)
+        return len(records)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of calls profiled, captured and still buffered."""
+        stats = self._stats.snapshot()
+        stats["buffered"] = len(self._buffer)
+        return stats
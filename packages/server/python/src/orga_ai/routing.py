@@ -0,0 +1,205 @@
+"""Endpoint routing for the OrgaAI Python SDK.
+
+This module tracks the health of every configured API base URL and decides
+which one each request should go to. Latency and error rates are smoothed with
+an exponentially weighted moving average (EWMA) so that a single slow response
+does not flip traffic between regions.
+
+Every request records its outcome, so the router is built for many threads
+recording at once: request counts are kept per thread, and while an endpoint
+is healthy a latency sample is skipped rather than waited for when another
+thread holds the lock. The averages do not notice an occasional missing
+sample; failures and recoveries are always recorded.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .counters import Counters
+
+
+@dataclass
+class EndpointHealth:
+    """Health record for a single base URL.
+
+    Attributes:
+        url: The base URL
+        latency: Smoothed request latency in seconds (None until first sample)
+        error_rate: Smoothed fraction of failed requests, between 0 and 1
+        consecutive_failures: Failures since the last success
+        demoted_until: Monotonic time at which a demoted endpoint is re-probed
+        probe_backoff: Current re-probe delay in seconds (0 while healthy)
+        failures: Total failures recorded
+        probing: Whether a re-probe is currently in flight
+    """
+    url: str
+    latency: Optional[float] = None
+    error_rate: float = 0.0
+    consecutive_failures: int = 0
+    demoted_until: float = 0.0
+    probe_backoff: float = 0.0
+    failures: int = 0
+    probing: bool = False
+
+
+class EndpointRouter:
+    """Routes requests to the best healthy endpoint among several base URLs.
+
+    Endpoints are ranked by smoothed latency, penalised by their smoothed
+    error rate. An endpoint that fails ``failure_threshold`` times in a row,
+    by not accepting the connection or answering with an error, is demoted and skipped until it is re-probed successfully. Probe
+    delays double on every failed probe, up to ``max_reprobe_interval``.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        alpha: float = 0.3,
+        failure_threshold: int = 1,
+        reprobe_interval: float = 30.0,
+        max_reprobe_interval: float = 300.0,
+        error_penalty: float = 4.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not urls:
+            raise ValueError("At least one endpoint is required")
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.reprobe_interval = reprobe_interval
+        self.max_reprobe_interval = max_reprobe_interval
+        self.error_penalty = error_penalty
+        self._clock = clock
+        self._endpoints = [EndpointHealth(url=url) for url in urls]
+        self._by_url = {endpoint.url: endpoint for endpoint in self._endpoints}
+        self._demoted = 0
+        self._lock = threading.Lock()
+        self._requests = Counters(*self._by_url)
+
+    @property
+    def demoted_count(self) -> int:
+        """Number of endpoints currently out of rotation."""
+        return self._demoted
+
+    @property
+    def urls(self) -> List[str]:
+        """All configured base URLs, in configuration order."""
+        return [endpoint.url for endpoint in self._endpoints]
+
+    def candidates(self) -> List[str]:
+        """Return base URLs in the order they should be tried.
+
+        Healthy endpoints come first, best score first, with configuration
+        order breaking ties. Demoted endpoints follow, soonest-to-recover
+        first, so a request still has somewhere to go if every endpoint is
+        currently demoted.
+
+        Returns:
+            List[str]: Base URLs, best candidate first
+        """
+        with self._lock:
+            healthy = [e for e in self._endpoints if not e.probe_backoff]
+            demoted = [e for e in self._endpoints if e.probe_backoff]
+            healthy.sort(key=self._score)
+            demoted.sort(key=lambda e: e.demoted_until)
+            return [e.url for e in healthy + demoted]
+
+    def due_for_probe(self) -> List[str]:
+        """Return demoted endpoints whose re-probe time has arrived.
+
+        Each returned endpoint is marked as being probed so it is only handed
+        out once until record_success() or record_failure() is called for it.
+
+        Returns:
+            List[str]: Base URLs to probe
+        """
+        now = self._clock()
+        due = []
+        with self._lock:
+            for endpoint in self._endpoints:
+                if (
+                    endpoint.probe_backoff
+                    and not endpoint.probing
+                    and endpoint.demoted_until <= now
+                ):
+                    endpoint.probing = True
+                    due.append(endpoint.url)
+        return due
+
+    def record_success(self, url: str, latency: float) -> None:
+        """Record a request the endpoint served.
+
+        Args:
+            url: Base URL the request was sent to
+            latency: Time the request took, in seconds
+        """
+        endpoint = self._by_url[url]
+        self._requests.add(url)
+        if endpoint.probe_backoff or endpoint.consecutive_failures:
+            self._lock.acquire()
+        elif not self._lock.acquire(blocking=False):
+            # Healthy and another thread is recording: drop this sample
+            return
+        try:
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.alpha * (latency - endpoint.latency)
+            endpoint.error_rate *= 1 - self.alpha
+            endpoint.consecutive_failures = 0
+            endpoint.demoted_until = 0.0
+            if endpoint.probe_backoff:
+                self._demoted -= 1
+            endpoint.probe_backoff = 0.0
+            endpoint.probing = False
+        finally:
+            self._lock.release()
+
+    def record_failure(self, url: str) -> None:
+        """Record a request that never reached the endpoint, or that it answered
+        with an error status (5xx or 429).
+
+        Args:
+            url: Base URL the request was sent to
+        """
+        self._requests.add(url)
+        with self._lock:
+            endpoint = self._by_url[url]
+            endpoint.failures += 1
+            endpoint.error_rate += self.alpha * (1 - endpoint.error_rate)
+            endpoint.consecutive_failures += 1
+            endpoint.probing = False
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                if endpoint.probe_backoff:
+                    endpoint.probe_backoff = min(
+                        endpoint.probe_backoff * 2, self.max_reprobe_interval
+                    )
+                else:
+                    endpoint.probe_backoff = self.reprobe_interval
+                    self._demoted += 1
+                endpoint.demoted_until = self._clock() + endpoint.probe_backoff
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return a copy of every endpoint's health for stats and debugging.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Health figures keyed by base URL
+        """
+        requests = self._requests.snapshot()
+        with self._lock:
+            return {
+                e.url: {
+                    "healthy": not e.probe_backoff,
+                    "latency": e.latency,
+                    "error_rate": e.error_rate,
+                    "requests": requests[e.url],
+                    "failures": e.failures,
+                }
+                for e in self._endpoints
+            }
+
+    def _score(self, endpoint: EndpointHealth) -> float:
+        # Unmeasured endpoints score zero so each one gets an initial sample
+        latency = endpoint.latency or 0.0
+        return latency * (1 + self.error_penalty * endpoint.error_rate)
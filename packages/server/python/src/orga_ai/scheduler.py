@@ -0,0 +1,371 @@
+"""Proactive refresh of cached session material for many tenants.
+
+A host serving thousands of tenants, each with its own client and ICE
+config, needs every tenant's material refreshed shortly before it expires.
+One asyncio task sleeping per entry costs a task, a coroutine frame and a
+timer handle for each, and every reschedule goes through the event loop's
+timer heap. ``RefreshScheduler`` keeps the deadlines in a hierarchical timer
+wheel (``TimerWheel``) instead, driven by a single task that sleeps until
+the next deadline and hands due entries to a bounded number of refreshes.
+
+```python
+scheduler = RefreshScheduler()
+for client in clients:
+    scheduler.watch(client)
+...
+await scheduler.aclose()
+```
+"""
+
+import asyncio
+import collections
+import math
+import random
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from .counters import Counters
+from .errors import OrgaAIDrainingError
+
+
+Refresh = Callable[[], Awaitable[Optional[float]]]
+
+
+class TimerWheel:
+    """Hierarchical timer wheel with one timer per key.
+
+    Level 0 has one slot per tick of ``resolution`` seconds, and each level
+    above spans ``slots`` slots of the level below. Setting and cancelling a
+    timer are O(1), and a timer moves down at most ``levels - 1`` times
+    before it fires. Timers never fire early, and at most one tick late
+    after the time advance() is called with.
+
+    Args:
+        resolution: Length of a tick, in seconds
+        slots: Slots per level, a power of two
+        levels: Number of levels; timers further out than ``resolution *
+            slots ** levels`` wait in the top level until it comes round
+        now: Time of tick zero, on the clock timers are set with
+            (defaults to ``time.monotonic()``)
+    """
+
+    def __init__(
+        self,
+        resolution: float = 0.1,
+        slots: int = 64,
+        levels: int = 4,
+        now: Optional[float] = None,
+    ) -> None:
+        if slots < 2 or slots & (slots - 1):
+            raise ValueError("slots must be a power of two")
+        self.resolution = resolution
+        self._bits = slots.bit_length() - 1
+        self._mask = slots - 1
+        # Each slot maps keys to their deadline, in ticks
+        self._levels: List[List[Dict[Hashable, int]]] = [
+            [{} for _ in range(slots)] for _ in range(levels)
+        ]
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+        self._origin = time.monotonic() if now is None else now
+        self._tick = 0
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def schedule(self, key: Hashable, when: float) -> None:
+        """Set the key's timer to fire at ``when``, replacing any previous one."""
+        self.cancel(key)
+        deadline = max(math.ceil((when - self._origin) / self.resolution), self._tick + 1)
+        self._insert(key, deadline)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel the key's timer; returns whether one was set."""
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        del self._levels[level][slot][key]
+        return True
+
+    def next_deadline(self) -> Optional[float]:
+        """Return when advance() next has work to do, or None if idle."""
+        tick = self._next_tick()
+        return None if tick is None else self._origin + tick * self.resolution
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Move the wheel up to ``now`` and return the keys whose timers fired."""
+        target = math.floor((now - self._origin) / self.resolution)
+        fired: List[Hashable] = []
+        while self._where:
+            # Jump straight to the next tick with a slot to process
+            tick = self._next_tick()
+            if tick is None or tick > target:
+                break
+            self._tick = tick
+            self._expire(tick, fired)
+        self._tick = max(self._tick, target)
+        return fired
+
+    def _insert(self, key: Hashable, deadline: int) -> None:
+        for level in range(len(self._levels)):
+            shift = self._bits * level
+            if (deadline >> shift) - (self._tick >> shift) <= self._mask:
+                slot = (deadline >> shift) & self._mask
+                break
+        else:
+            # Beyond the top level's span: park in its furthest slot, to be
+            # re-filed when that slot comes round
+            slot = ((self._tick >> shift) + self._mask) & self._mask
+        self._levels[level][slot][key] = deadline
+        self._where[key] = (level, slot)
+
+    def _next_tick(self) -> Optional[int]:
+        best: Optional[int] = None
+        for level, wheel in enumerate(self._levels):
+            shift = self._bits * level
+            position = self._tick >> shift
+            for step in range(1, self._mask + 1):
+                if wheel[(position + step) & self._mask]:
+                    tick = (position + step) << shift
+                    if best is None or tick < best:
+                        best = tick
+                    break
+        return best
+
+    def _expire(self, tick: int, fired: List[Hashable]) -> None:
+        # Higher levels first, so timers moved down can fire on this tick
+        for level in range(len(self._levels) - 1, 0, -1):
+            shift = self._bits * level
+            if tick & ((1 << shift) - 1) == 0:
+                self._cascade(level, (tick >> shift) & self._mask, tick, fired)
+        slot = self._levels[0][tick & self._mask]
+        for key in slot:
+            del self._where[key]
+            fired.append(key)
+        slot.clear()
+
+    def _cascade(self, level: int, slot: int, tick: int, fired: List[Hashable]) -> None:
+        timers = self._levels[level][slot]
+        self._levels[level][slot] = {}
+        for key, deadline in timers.items():
+            if deadline <= tick:
+                del self._where[key]
+                fired.append(key)
+            else:
+                self._insert(key, deadline)
+
+
+class _Entry:
+    __slots__ = ("refresh", "expires_at", "failures", "running")
+
+    def __init__(self, refresh: Refresh, expires_at: Optional[float]) -> None:
+        self.refresh = refresh
+        self.expires_at = expires_at
+        self.failures = 0
+        self.running = False
+
+
+class RefreshScheduler:
+    """Refreshes cached material ahead of its expiry from one driver task.
+
+    Each entry is a key and an async ``refresh`` callable returning the Unix
+    time the refreshed material expires at, or None if unknown. An entry is
+    refreshed once ``refresh_ahead`` of its remaining lifetime has passed,
+    less some jitter so that entries created together spread out; failed
+    refreshes are retried with exponential backoff. Entries added without
+    an expiry are refreshed straight away.
+
+    The scheduler belongs to the event loop it is first used on; add() and
+    the other methods must be called from that loop.
+
+    Args:
+        refresh_ahead: Fraction of the remaining lifetime after which an
+            entry is refreshed
+        default_interval: Refresh interval for material of unknown expiry,
+            in seconds
+        min_interval: Shortest delay before refreshing an entry again, in
+            seconds
+        jitter: Largest fraction of a delay randomly taken off it
+        retry_delay: Delay before the first retry of a failed refresh, in
+            seconds
+        max_retry_delay: Longest delay between retries, in seconds
+        max_concurrency: Number of refreshes run at once; further due
+            entries wait their turn
+        resolution: Timer wheel tick, in seconds
+    """
+
+    def __init__(
+        self,
+        refresh_ahead: float = 0.8,
+        default_interval: float = 60.0,
+        min_interval: float = 1.0,
+        jitter: float = 0.1,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 60.0,
+        max_concurrency: int = 32,
+        resolution: float = 0.1,
+    ) -> None:
+        self.refresh_ahead = refresh_ahead
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_concurrency = max_concurrency
+        self._wheel = TimerWheel(resolution)
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._due: Deque[Hashable] = collections.deque()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._driver: Optional["asyncio.Task[None]"] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sleeping_until: Optional[float] = None
+        self._closed = False
+        self._stats = Counters("refreshes", "failures")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def add(self, key: Hashable, refresh: Refresh, expires_at: Optional[float] = None) -> None:
+        """Keep an entry fresh, replacing any entry under the same key.
+
+        Args:
+            key: Identifies the entry, e.g. the tenant
+            refresh: Refreshes the material; returns the Unix time it
+                expires at, or None if unknown
+            expires_at: Unix time the current material expires at, or None
+                to refresh it now
+        """
+        if self._closed:
+            raise RuntimeError("RefreshScheduler is closed")
+        self._entries[key] = _Entry(refresh, expires_at)
+        self._schedule(key, 0.0 if expires_at is None else self._delay(expires_at))
+
+    def remove(self, key: Hashable) -> bool:
+        """Stop refreshing an entry; returns whether it was registered.
+
+        A refresh already running for it is left to finish.
+        """
+        if self._entries.pop(key, None) is None:
+            return False
+        self._wheel.cancel(key)
+        return True
+
+    def watch(self, client: Any) -> None:
+        """Keep an OrgaAI client's ICE config fresh.
+
+        The client is the entry's key, so ``remove(client)`` stops it.
+        Refreshes go through ``client.refresh_ice_servers()``, which also
+        serves the refreshed servers to the client's new sessions. The
+        client is removed once it starts draining.
+        """
+        self.add(client, client.refresh_ice_servers)
+
+    def expires_at(self, key: Hashable) -> Optional[float]:
+        """Return when an entry's material expires, as of its last refresh."""
+        entry = self._entries.get(key)
+        return entry.expires_at if entry is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        """Return refresh counters and the number of entries in each state."""
+        stats = self._stats.snapshot()
+        stats["entries"] = len(self._entries)
+        stats["queued"] = len(self._due)
+        stats["running"] = len(self._tasks)
+        return stats
+
+    async def aclose(self) -> None:
+        """Stop the driver, cancel running refreshes and forget every entry."""
+        self._closed = True
+        tasks = list(self._tasks)
+        if self._driver is not None:
+            tasks.append(self._driver)
+            self._driver = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for key in list(self._entries):
+            self._wheel.cancel(key)
+        self._entries.clear()
+        self._due.clear()
+
+    def _delay(self, expires_at: Optional[float]) -> float:
+        if expires_at is None:
+            delay = self.default_interval
+        else:
+            delay = (expires_at - time.time()) * self.refresh_ahead
+        delay *= 1 - random.random() * self.jitter
+        return max(delay, self.min_interval)
+
+    def _schedule(self, key: Hashable, delay: float) -> None:
+        deadline = time.monotonic() + delay
+        self._wheel.schedule(key, deadline)
+        if self._driver is None:
+            self._wakeup = asyncio.Event()
+            self._driver = asyncio.ensure_future(self._drive())
+        elif self._sleeping_until is None or deadline < self._sleeping_until:
+            assert self._wakeup is not None
+            self._wakeup.set()
+
+    async def _drive(self) -> None:
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeup
+        assert wakeup is not None
+        while True:
+            self._due.extend(self._wheel.advance(time.monotonic()))
+            self._pump()
+            wakeup.clear()
+            self._sleeping_until = self._wheel.next_deadline()
+            handle = None
+            if self._sleeping_until is not None:
+                delay = max(self._sleeping_until - time.monotonic(), 0.0)
+                handle = loop.call_later(delay, wakeup.set)
+            try:
+                await wakeup.wait()
+            finally:
+                if handle is not None:
+                    handle.cancel()
+
+    def _pump(self) -> None:
+        """Start due refreshes, up to max_concurrency at once."""
+        while self._due and len(self._tasks) < self.max_concurrency and not self._closed:
+            key = self._due.popleft()
+            entry = self._entries.get(key)
+            if entry is None or entry.running:
+                continue
+            task = asyncio.ensure_future(self._refresh(key, entry))
+            self._tasks.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: "asyncio.Task[None]") -> None:
+        self._tasks.discard(task)
+        self._pump()
+
+    async def _refresh(self, key: Hashable, entry: _Entry) -> None:
+        entry.running = True
+        try:
+            expires_at = await entry.refresh()
+        except OrgaAIDrainingError:
+            # The client is shutting down (see OrgaAI.drain()): forget it
+            if self._entries.get(key) is entry:
+                self.remove(key)
+            return
+        except Exception:
+            # Keep serving what is cached and try again soon
+            entry.failures += 1
+            self._stats.add("failures")
+            delay = min(self.retry_delay * 2 ** (entry.failures - 1), self.max_retry_delay)
+        else:
+            entry.failures = 0
+            entry.expires_at = expires_at
+            self._stats.add("refreshes")
+            delay = self._delay(expires_at)
+        finally:
+            entry.running = False
+        if self._entries.get(key) is entry and not self._closed:
+            self._schedule(key, delay)
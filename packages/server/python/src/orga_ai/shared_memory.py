@@ -0,0 +1,291 @@
+"""Cross-process ICE config cache in a memory-mapped file.
+
+Servers running many worker processes per host would otherwise fetch and
+cache the same ICE config once per worker. This module stores the current
+``iceServers`` payload in a memory-mapped file that every worker on the host
+maps, so one worker refreshes it and the others read it directly from shared
+memory.
+
+Readers never take the file lock or make a syscall. Consistency is ensured with a
+seqlock: the writer makes the sequence number odd before changing the
+payload and even again afterwards, and readers retry if the sequence number
+was odd or changed while they were reading. Writers serialise among
+themselves with ``fcntl.flock``, which is only touched on the write path,
+and with a thread lock within the process, since threads sharing the file
+descriptor are not excluded by ``flock``.
+
+File layout (little endian)::
+
+    0   8s  magic b"ORGAICE\\0"
+    8   I   layout version
+    12  I   payload capacity
+    16  Q   sequence number (odd while a write is in progress)
+    24  I   payload length
+    28  I   pid holding the refresh lease
+    32  d   expires_at (wall clock)
+    40  d   refresh_at (wall clock)
+    48  d   refresh lease expiry (wall clock)
+    56  16s credentials key digest
+    128     payload (JSON encoded ICE servers)
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+
+from .counters import Counters
+from .errors import OrgaAIError
+from .types import IceServer
+
+
+MAGIC = b"ORGAICE\0"
+LAYOUT_VERSION = 1
+HEADER_SIZE = 128
+DEFAULT_CAPACITY = 64 * 1024
+MAX_READ_RETRIES = 100
+
+_PREFIX = struct.Struct("<8sII")
+_SEQ = struct.Struct("<Q")
+_FIELDS = struct.Struct("<IIddd16s")
+_LEASE_PID = struct.Struct("<I")
+_LEASE_UNTIL = struct.Struct("<d")
+_SEQ_OFFSET = 16
+_FIELDS_OFFSET = 24
+_LEASE_PID_OFFSET = 28
+_LEASE_UNTIL_OFFSET = 48
+
+
+@dataclass
+class SharedIceEntry:
+    """ICE config read from shared memory.
+
+    Attributes:
+        ice_servers: The cached ICE servers
+        expires_at: Wall-clock time after which the entry must not be served
+        refresh_due: Whether the entry should be refreshed by someone
+    """
+    ice_servers: List[IceServer]
+    expires_at: float
+    refresh_due: bool
+
+
+class SharedIceCache:
+    """ICE config cache shared by every process mapping the same file.
+
+    Args:
+        path: File backing the shared memory; created if missing
+        key: Credentials key from credentials_key(); entries written under
+            other credentials are treated as misses
+        capacity: Maximum encoded payload size in bytes
+        clock: Wall-clock time source (must agree across processes)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        key: str,
+        capacity: int = DEFAULT_CAPACITY,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if fcntl is None:
+            raise OrgaAIError("The shared ICE cache requires a POSIX platform")
+        self.path = path
+        self.capacity = capacity
+        self._key = bytes.fromhex(key)[:16]
+        self._clock = clock
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            size = HEADER_SIZE + capacity
+            with self._write_lock():
+                if os.fstat(self._fd).st_size < size:
+                    os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        # Sequence number and servers of the last decoded payload, replaced
+        # as one tuple so threads never see one without the other
+        self._decoded: Tuple[int, List[IceServer]] = (-1, [])
+        self._stats = Counters("reads", "hits", "decodes", "retries", "writes")
+
+    def read(self) -> Optional[SharedIceEntry]:
+        """Read the current entry without taking the file lock.
+
+        The payload is only decoded when it has changed since the last read
+        in this process; otherwise the previously decoded list is returned.
+
+        Returns:
+            Optional[SharedIceEntry]: The entry, or None if missing, expired,
+            written for other credentials or under a different layout
+        """
+        mm = self._map
+        decoded_seq, decoded = self._decoded
+        retries = 0
+        for _ in range(MAX_READ_RETRIES):
+            seq = _SEQ.unpack_from(mm, _SEQ_OFFSET)[0]
+            if seq & 1:
+                retries += 1
+                continue
+            magic, version, _ = _PREFIX.unpack_from(mm, 0)
+            length, _, expires_at, refresh_at, _, key = _FIELDS.unpack_from(
+                mm, _FIELDS_OFFSET
+            )
+            payload = None
+            if length > self.capacity:
+                self._count(reads=1, retries=retries)
+                return None
+            if seq != decoded_seq:
+                payload = mm[HEADER_SIZE:HEADER_SIZE + length]
+            if _SEQ.unpack_from(mm, _SEQ_OFFSET)[0] != seq:
+                retries += 1
+                continue
+            break
+        else:
+            self._count(reads=1, retries=retries)
+            return None
+
+        if magic != MAGIC or version != LAYOUT_VERSION or key != self._key or not length:
+            self._count(reads=1, retries=retries)
+            return None
+        now = self._clock()
+        if now >= expires_at:
+            self._count(reads=1, retries=retries)
+            return None
+        decodes = 0
+        if payload is not None:
+            try:
+                decoded = _decode(payload)
+            except (ValueError, KeyError, TypeError):
+                self._count(reads=1, retries=retries)
+                return None
+            self._decoded = (seq, decoded)
+            decodes = 1
+        self._count(reads=1, retries=retries, decodes=decodes, hits=1)
+        return SharedIceEntry(
+            ice_servers=list(decoded),
+            expires_at=expires_at,
+            refresh_due=now >= refresh_at,
+        )
+
+    def write(self, ice_servers: List[IceServer], ttl: float, refresh_ahead: float = 0.8) -> bool:
+        """Publish a new ICE config to every process on the host.
+
+        Writing also releases the refresh lease.
+
+        Args:
+            ice_servers: ICE servers to publish
+            ttl: How long the entry may be served, in seconds
+            refresh_ahead: Fraction of the TTL after which a refresh is due
+
+        Returns:
+            bool: False if the encoded payload does not fit the capacity
+        """
+        payload = _encode(ice_servers)
+        if len(payload) > self.capacity:
+            return False
+        now = self._clock()
+        mm = self._map
+        with self._write_lock():
+            seq = _SEQ.unpack_from(mm, _SEQ_OFFSET)[0]
+            if seq & 1:
+                # A writer died mid-write; its lock is gone, so recover
+                seq += 1
+            _SEQ.pack_into(mm, _SEQ_OFFSET, seq + 1)
+            _PREFIX.pack_into(mm, 0, MAGIC, LAYOUT_VERSION, self.capacity)
+            mm[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+            _FIELDS.pack_into(
+                mm,
+                _FIELDS_OFFSET,
+                len(payload),
+                0,
+                now + ttl,
+                now + ttl * refresh_ahead,
+                0.0,
+                self._key,
+            )
+            _SEQ.pack_into(mm, _SEQ_OFFSET, seq + 2)
+        self._count(writes=1)
+        return True
+
+    def try_claim_refresh(self, lease: float) -> bool:
+        """Try to become the single process refreshing the entry.
+
+        Args:
+            lease: How long the claim is held if the refresh never completes,
+                in seconds
+
+        Returns:
+            bool: True if this process should refresh the entry
+        """
+        now = self._clock()
+        mm = self._map
+        with self._write_lock():
+            if _LEASE_UNTIL.unpack_from(mm, _LEASE_UNTIL_OFFSET)[0] > now:
+                return False
+            # read() never looks at the lease fields, so they can be updated
+            # without going through the sequence number
+            _LEASE_PID.pack_into(mm, _LEASE_PID_OFFSET, os.getpid())
+            _LEASE_UNTIL.pack_into(mm, _LEASE_UNTIL_OFFSET, now + lease)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters for this process's use of the shared cache."""
+        return self._stats.snapshot()
+
+    def close(self) -> None:
+        """Unmap the file. The file itself is left for other processes."""
+        if not self._map.closed:
+            self._map.close()
+            os.close(self._fd)
+
+    def _write_lock(self) -> "_FileLock":
+        return _FileLock(self._fd, self._thread_lock)
+
+    def _count(self, **amounts: int) -> None:
+        for name, amount in amounts.items():
+            if amount:
+                self._stats.add(name, amount)
+
+
+class _FileLock:
+    """Exclusive flock, and a lock against the process's other threads,
+    held for the duration of a with block."""
+
+    def __init__(self, fd: int, thread_lock: threading.Lock) -> None:
+        self._fd = fd
+        self._thread_lock = thread_lock
+
+    def __enter__(self) -> None:
+        self._thread_lock.acquire()
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def __exit__(self, *exc_info: object) -> None:
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+
+def _encode(ice_servers: List[IceServer]) -> bytes:
+    return json.dumps(
+        [server.to_dict() for server in ice_servers], separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _decode(payload: bytes) -> List[IceServer]:
+    return [IceServer.from_dict(item) for item in json.loads(payload)]
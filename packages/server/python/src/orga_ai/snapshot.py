@@ -0,0 +1,123 @@
+"""On-disk snapshot of the last ICE configuration.
+
+Serverless runtimes start many short-lived processes. Persisting the last ICE
+server list lets the first session of a fresh process skip the ICE round-trip
+while the snapshot is recent enough for its TURN credentials to still be
+valid. Snapshots are keyed by credentials so one tenant's TURN credentials are
+never served to another.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .types import IceServer
+
+
+class IceSnapshot:
+    """Reads and writes the ICE server snapshot file.
+
+    Errors reading or writing the file are swallowed: a missing, corrupt or
+    unwritable snapshot only means the ICE config is fetched from the API.
+
+    Attributes:
+        path: Location of the snapshot file
+        max_age: Maximum snapshot age to serve, in seconds
+        saved_at: When the snapshot this process last read or wrote was
+            saved, or None if it has not seen one
+    """
+
+    def __init__(self, path: str, max_age: float) -> None:
+        self.path = path
+        self.max_age = max_age
+        self.saved_at: Optional[float] = None
+        self._saving = False
+        self._lock = threading.Lock()
+
+    def load(self, key: str) -> Optional[List[IceServer]]:
+        """Load the snapshot if it belongs to these credentials and is fresh.
+
+        Args:
+            key: Credentials key from credentials_key()
+
+        Returns:
+            Optional[List[IceServer]]: The ICE servers, or None if unusable
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("key") != key:
+                return None
+            saved_at = float(data["saved_at"])
+            if time.time() - saved_at > self.max_age:
+                return None
+            ice_servers = [IceServer.from_dict(item) for item in data["ice_servers"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self.saved_at = saved_at
+        return ice_servers
+
+    def claim_save(self) -> bool:
+        """Return whether the snapshot should be rewritten, claiming the write.
+
+        The snapshot only serves cold starts, so it is rewritten once it is
+        missing or halfway to ``max_age`` rather than after every fetch; the
+        claim keeps concurrent fetches from all writing it. It lasts until
+        the next ``save`` finishes, so a failed write is retried.
+        """
+        with self._lock:
+            if self._saving:
+                return False
+            if self.saved_at is not None and time.time() - self.saved_at < self.max_age / 2:
+                return False
+            self._saving = True
+            return True
+
+    def save(self, key: str, ice_servers: List[IceServer], saved_at: Optional[float] = None) -> bool:
+        """Atomically replace the snapshot with a new ICE server list.
+
+        Args:
+            key: Credentials key from credentials_key()
+            ice_servers: ICE servers to persist
+            saved_at: Wall-clock time the servers were fetched (defaults to now)
+
+        Returns:
+            bool: Whether the snapshot was written
+        """
+        if saved_at is None:
+            saved_at = time.time()
+        written = False
+        try:
+            written = self._write(key, ice_servers, saved_at)
+        finally:
+            with self._lock:
+                # Only a written snapshot delays the next claim
+                if written:
+                    self.saved_at = saved_at
+                self._saving = False
+        return written
+
+    def _write(self, key: str, ice_servers: List[IceServer], saved_at: float) -> bool:
+        data: Dict[str, Any] = {
+            "key": key,
+            "saved_at": saved_at,
+            "ice_servers": [server.to_dict() for server in ice_servers],
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".orga-ice-")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as file:
+                    json.dump(data, file)
+                # The snapshot holds TURN credentials
+                os.chmod(tmp_path, 0o600)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            return False
+        return True
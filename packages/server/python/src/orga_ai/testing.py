@@ -0,0 +1,365 @@
+"""Local stand-in for the OrgaAI API.
+
+``FakeOrgaAPI`` is a small asyncio HTTP/1.1 server implementing the endpoints
+the SDK calls. It is used by the SDK's own tests and benchmarks, and can be
+pointed at with ``base_url`` to exercise an application without network
+access or API quota:
+
+```python
+async with FakeOrgaAPI(latency=0.02) as api:
+    config = OrgaAIConfig(api_key="key", user_email="dev@example.com", base_url=api.url)
+    async with OrgaAI(config) as client:
+        session_config = await client.get_session_config()
+```
+
+Endpoints:
+
+- ``POST /v1/realtime/client-secrets?email=...[&count=N]`` returns
+  ``{"ephemeral_token": ...}``, or ``{"ephemeral_tokens": [...]}`` when
+  ``count`` is given and batching is enabled, with ``expires_in`` when
+  ``token_ttl`` is set;
+- ``GET /v1/realtime/ice-config`` returns ``{"iceServers": [...]}``, with
+  ``ttl`` when ``ice_ttl`` is set.
+
+Any other path returns 404. Requests with an API key other than
+``api_key`` (when set) get a 401.
+
+``FakeOrgaAPI.mock_transport()`` answers the same way in memory, for
+measurements that should not include sockets or a second event loop.
+
+The stand-in can also run as its own process, which keeps its work out of
+measurements taken in the process under test::
+
+    python -m orga_ai.testing --port 8080 --latency 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+if TYPE_CHECKING:
+    import httpx
+
+
+DEFAULT_ICE_SERVERS: List[Dict[str, Any]] = [
+    {"urls": "stun:stun.orga-ai.test:3478"},
+    {
+        "urls": ["turn:turn.orga-ai.test:3478?transport=udp"],
+        "username": "fake-user",
+        "credential": "fake-credential",
+    },
+]
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found"}
+
+
+class FakeOrgaAPI:
+    """In-process stand-in for the OrgaAI API.
+
+    Args:
+        latency: Seconds to wait before answering each request
+        batch_tokens: Whether ``count`` is honoured on client-secrets
+        api_key: If set, only this API key is accepted
+        ice_servers: ICE servers returned by ice-config
+        token_ttl: If set, client-secrets reports this ``expires_in``, in seconds
+        ice_ttl: If set, ice-config reports this ``ttl``, in seconds
+
+    Attributes:
+        requests: Number of requests received, keyed by path
+        tokens_issued: Number of ephemeral tokens issued
+        max_concurrency: Highest number of requests in flight at once
+        on_request: Called with each request received by mock_transport()
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        batch_tokens: bool = True,
+        api_key: Optional[str] = None,
+        ice_servers: Optional[List[Dict[str, Any]]] = None,
+        token_ttl: Optional[float] = None,
+        ice_ttl: Optional[float] = None,
+    ) -> None:
+        self.latency = latency
+        self.batch_tokens = batch_tokens
+        self.api_key = api_key
+        self.ice_servers = DEFAULT_ICE_SERVERS if ice_servers is None else ice_servers
+        self.token_ttl = token_ttl
+        self.ice_ttl = ice_ttl
+        self.requests: Dict[str, int] = {}
+        self.tokens_issued = 0
+        self.max_concurrency = 0
+        self.on_request: Optional[Callable[["httpx.Request"], None]] = None
+        self._in_flight = 0
+        self._token_ids = itertools.count(1)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: "set[asyncio.Task[None]]" = set()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.host = "127.0.0.1"
+        self.port = 0
+
+    @property
+    def url(self) -> str:
+        """Base URL to pass as ``OrgaAIConfig.base_url``."""
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "FakeOrgaAPI":
+        """Start listening on the running event loop."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.host, self.port = self._server.sockets[0].getsockname()[:2]
+        return self
+
+    async def close(self) -> None:
+        """Stop listening and drop open connections."""
+        if self._server is not None:
+            self._server.close()
+            handlers = list(self._handlers)
+            for task in handlers:
+                task.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> "FakeOrgaAPI":
+        """Start the server on its own event loop in a daemon thread.
+
+        Useful for sync code and benchmarks that should not share a loop
+        with the server.
+        """
+        started = threading.Event()
+        loop = asyncio.new_event_loop()
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start(host, port))
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.close())
+            loop.close()
+
+        self._thread_loop = loop
+        self._thread = threading.Thread(target=run, name="FakeOrgaAPI", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop_thread(self) -> None:
+        """Stop a server started with start_in_thread()."""
+        if self._thread is not None and self._thread_loop is not None:
+            self._thread_loop.call_soon_threadsafe(self._thread_loop.stop)
+            self._thread.join()
+            self._thread = None
+            self._thread_loop = None
+
+    def mock_transport(self) -> "httpx.MockTransport":
+        """Return an httpx transport answering like the server, in memory.
+
+        Latency is not simulated.
+        """
+        import httpx
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            if self.on_request is not None:
+                self.on_request(request)
+            headers = {name.lower(): value for name, value in request.headers.items()}
+            target = request.url.raw_path.decode("ascii")
+            status, body = self._route(request.method, target, headers)
+            return httpx.Response(status, json=body)
+
+        return httpx.MockTransport(handle)
+
+    async def __aenter__(self) -> "FakeOrgaAPI":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self._handlers.add(task)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers = request
+                self._in_flight += 1
+                self.max_concurrency = max(self.max_concurrency, self._in_flight)
+                try:
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    status, body = self._route(method, target, headers)
+                finally:
+                    self._in_flight -= 1
+                payload = json.dumps(body).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode("ascii")
+                    + payload
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str]]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0") or 0)
+        if length:
+            await reader.readexactly(length)
+        return method, target, headers
+
+    def _route(self, method: str, target: str, headers: Dict[str, str]) -> Tuple[int, Any]:
+        parts = urlsplit(target)
+        self.requests[parts.path] = self.requests.get(parts.path, 0) + 1
+        authorization = headers.get("authorization", "")
+        if method == "POST" and parts.path == "/v1/realtime/client-secrets":
+            if self.api_key is not None and authorization != f"Bearer {self.api_key}":
+                return 401, {"error": "Invalid API key"}
+            query = parse_qs(parts.query)
+            if "email" not in query:
+                return 400, {"error": "email is required"}
+            if "count" in query and self.batch_tokens:
+                count = int(query["count"][0])
+                self.tokens_issued += count
+                body = {"ephemeral_tokens": [self._token() for _ in range(count)]}
+            else:
+                self.tokens_issued += 1
+                body = {"ephemeral_token": self._token()}
+            if self.token_ttl is not None:
+                body["expires_in"] = self.token_ttl
+            return 200, body
+        if method == "GET" and parts.path == "/v1/realtime/ice-config":
+            if not authorization.startswith("Bearer "):
+                return 401, {"error": "Missing token"}
+            if self.ice_ttl is not None:
+                return 200, {"iceServers": self.ice_servers, "ttl": self.ice_ttl}
+            return 200, {"iceServers": self.ice_servers}
+        return 404, {"error": "Not found"}
+
+    def _token(self) -> str:
+        return f"fake-ephemeral-{next(self._token_ids)}"
+
+
+class FakeOrgaAPIProcess:
+    """Runs the stand-in API in a child process.
+
+    Args:
+        latency: Seconds to wait before answering each request
+        batch_tokens: Whether ``count`` is honoured on client-secrets
+    """
+
+    def __init__(self, latency: float = 0.0, batch_tokens: bool = True) -> None:
+        self.latency = latency
+        self.batch_tokens = batch_tokens
+        self.url = ""
+        self._process: Optional[subprocess.Popen] = None  # type: ignore[type-arg]
+
+    def start(self) -> "FakeOrgaAPIProcess":
+        """Start the child process and wait until it is listening."""
+        command = [
+            sys.executable,
+            "-m",
+            "orga_ai.testing",
+            "--latency",
+            str(self.latency * 1000),
+        ]
+        if not self.batch_tokens:
+            command.append("--no-batching")
+        self._process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, text=True, env=_child_env()
+        )
+        assert self._process.stdout is not None
+        line = self._process.stdout.readline()
+        if not line.startswith("Listening on "):
+            self.stop()
+            raise RuntimeError("The stand-in API failed to start")
+        self.url = line.split()[-1]
+        return self
+
+    def stop(self) -> None:
+        """Terminate the child process."""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            if self._process.stdout is not None:
+                self._process.stdout.close()
+            self._process = None
+
+    def __enter__(self) -> "FakeOrgaAPIProcess":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+def _child_env() -> Dict[str, str]:
+    """Environment letting the child import this copy of the package."""
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [package_root, env.get("PYTHONPATH")])
+    )
+    return env
+
+
+def main() -> None:
+    """Serve the stand-in API until interrupted."""
+    parser = argparse.ArgumentParser(
+        prog="python -m orga_ai.testing", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0.0, help="per-request latency in ms")
+    parser.add_argument("--no-batching", action="store_true", help="ignore the count parameter")
+    parser.add_argument("--api-key", help="only accept this API key")
+    args = parser.parse_args()
+
+    async def serve() -> None:
+        api = FakeOrgaAPI(
+            latency=args.latency / 1000,
+            batch_tokens=not args.no_batching,
+            api_key=args.api_key,
+        )
+        await api.start(args.host, args.port)
+        # The first line of output tells parent processes where to connect
+        print(f"Listening on {api.url}", flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await api.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
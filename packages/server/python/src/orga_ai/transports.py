@@ -0,0 +1,372 @@
+"""Pluggable HTTP transports for the OrgaAI client.
+
+The client only sends GET and POST requests and reads the status, reason
+and body of each response. A ``Transport`` provides that on top of an HTTP
+library: it creates the HTTP client used on each event loop (see
+orga_ai.loops) and names the exceptions those clients raise, so the client
+can tell failed requests, and among them failed connections, from other
+errors without knowing which library is underneath.
+
+Two transports are built in:
+
+- ``HttpxTransport``, the default, whose clients are plain
+  ``httpx.AsyncClient``s;
+- ``AiohttpTransport``, for applications built on aiohttp. It can share
+  the application's ``ClientSession``, so the process keeps one connection
+  pool and one TLS stack, and httpx is never imported.
+
+Each library is only imported when its transport is created.
+"""
+
+import asyncio
+import importlib.util
+import socket
+import ssl
+import sys
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Protocol, Tuple, Type
+
+from .dns import CachingResolver, interleave_families
+from .profiler import current_timeline
+
+
+class HTTPResponse(Protocol):
+    """Response interface the client reads, met by httpx responses."""
+
+    status_code: int
+    reason_phrase: str
+    content: bytes
+
+    @property
+    def is_success(self) -> bool: ...
+
+
+class HTTPClient(Protocol):
+    """HTTP client interface, met by ``httpx.AsyncClient``."""
+
+    async def get(
+        self, url: str, *, headers: Optional[Mapping[str, str]] = None
+    ) -> HTTPResponse: ...
+
+    async def post(
+        self, url: str, *, headers: Optional[Mapping[str, str]] = None
+    ) -> HTTPResponse: ...
+
+    async def aclose(self) -> None: ...
+
+
+TRANSPORTS = ("httpx", "aiohttp")
+
+
+class Transport(ABC):
+    """Interface for the HTTP transports used by the OrgaAI client.
+
+    Attributes:
+        name: Name of the transport
+        request_errors: Exceptions a client raises when a request gets no
+            response
+        connect_errors: The subset raised before the request reached the
+            server, after which it is safe to try another endpoint
+    """
+
+    name = ""
+    request_errors: Tuple[Type[BaseException], ...] = ()
+    connect_errors: Tuple[Type[BaseException], ...] = ()
+
+    @abstractmethod
+    def create_client(self) -> HTTPClient:
+        """Create an HTTP client for the running event loop."""
+
+    async def close_client(self, client: HTTPClient) -> None:
+        """Close a client created by create_client(), on its own loop."""
+        await client.aclose()
+
+
+@lru_cache(maxsize=None)
+def _ssl_context(http2: bool) -> ssl.SSLContext:
+    """Return the SSL context shared by every httpx client with this HTTP/2 setting.
+
+    Building a context loads the CA bundle, which takes tens of milliseconds
+    of CPU and used to dominate short-lived clients such as those of
+    get_session_config_sync(). A context is safe to share between threads.
+    httpcore sets its ALPN protocols from the client's http2 setting on every
+    connection, hence one context per setting. SSL_CERT_FILE and SSL_CERT_DIR
+    are read when the context is first built.
+    """
+    import httpx
+
+    return httpx.create_ssl_context()
+
+
+class HttpxTransport(Transport):
+    """Transport sending requests through httpx.
+
+    Args:
+        timeout: Connect, read, write and pool timeout, in seconds
+        max_connections: Maximum number of pooled connections per event loop
+        http2: Use HTTP/2 where the API supports it; requires ``h2``
+        resolver: DNS cache the connections resolve hosts through
+        tracing: Report connection phases to the timeline of profiled calls
+            (see orga_ai.profiler)
+    """
+
+    name = "httpx"
+
+    def __init__(
+        self,
+        timeout: float,
+        max_connections: int = 100,
+        http2: bool = False,
+        resolver: Optional[CachingResolver] = None,
+        tracing: bool = False,
+    ) -> None:
+        import httpx
+
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.http2 = http2
+        self.resolver = resolver
+        self.tracing = tracing
+        self.request_errors = (httpx.RequestError,)
+        self.connect_errors = (httpx.ConnectError, httpx.ConnectTimeout)
+
+    def create_client(self) -> HTTPClient:
+        import httpx
+
+        # httpx ignores pool settings given to the client when a transport
+        # is passed, so they always go to the transport
+        transport_options: Dict[str, Any] = {
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            "http2": self.http2,
+            "verify": _ssl_context(self.http2),
+        }
+        transport: httpx.AsyncBaseTransport
+        if self.resolver is not None:
+            from .httpx_dns import CachingDNSTransport
+
+            transport = CachingDNSTransport(self.resolver, **transport_options)
+        else:
+            transport = httpx.AsyncHTTPTransport(**transport_options)
+        event_hooks = {"request": [_trace_httpx_request]} if self.tracing else None
+        return httpx.AsyncClient(
+            timeout=self.timeout, transport=transport, event_hooks=event_hooks
+        )
+
+
+async def _trace_httpx_request(request: Any) -> None:
+    """httpx request hook handing the request to the profiled call's timeline."""
+    timeline = current_timeline()
+    if timeline is not None:
+        timeline.begin("pool_wait")
+        request.extensions["trace"] = timeline.httpcore_trace
+
+
+class TransportResponse:
+    """Response read in full by a transport that does not return httpx responses."""
+
+    __slots__ = ("status_code", "reason_phrase", "content")
+
+    def __init__(self, status_code: int, reason_phrase: str, content: bytes) -> None:
+        self.status_code = status_code
+        self.reason_phrase = reason_phrase
+        self.content = content
+
+    @property
+    def is_success(self) -> bool:
+        return 200 <= self.status_code < 300
+
+
+class AiohttpClient:
+    """HTTP client over an aiohttp ``ClientSession``.
+
+    Args:
+        session: The session requests are sent through
+        timeout: ``aiohttp.ClientTimeout`` applied to every request
+        owned: Whether aclose() closes the session
+    """
+
+    def __init__(self, session: Any, timeout: Any, owned: bool) -> None:
+        self.session = session
+        self.timeout = timeout
+        self.owned = owned
+
+    async def get(
+        self, url: str, *, headers: Optional[Mapping[str, str]] = None
+    ) -> TransportResponse:
+        return await self._request("GET", url, headers)
+
+    async def post(
+        self, url: str, *, headers: Optional[Mapping[str, str]] = None
+    ) -> TransportResponse:
+        return await self._request("POST", url, headers)
+
+    async def _request(
+        self, method: str, url: str, headers: Optional[Mapping[str, str]]
+    ) -> TransportResponse:
+        async with self.session.request(
+            method, url, headers=headers, timeout=self.timeout
+        ) as response:
+            timeline = current_timeline()
+            if timeline is not None:
+                timeline.begin("body")
+            content = await response.read()
+            if timeline is not None:
+                timeline.end("body")
+            return TransportResponse(response.status, response.reason or "", content)
+
+    async def aclose(self) -> None:
+        if self.owned:
+            await self.session.close()
+
+
+class _AiohttpResolver:
+    """aiohttp resolver answering from a CachingResolver."""
+
+    def __init__(self, resolver: CachingResolver) -> None:
+        self.resolver = resolver
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_UNSPEC
+    ) -> List[Dict[str, Any]]:
+        addresses = await self.resolver.resolve(host, port)
+        results = []
+        for address in interleave_families(addresses):
+            address_family = socket.AF_INET6 if ":" in address else socket.AF_INET
+            if family not in (socket.AF_UNSPEC, address_family):
+                continue
+            results.append({
+                "hostname": host,
+                "host": address,
+                "port": port,
+                "family": address_family,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+            })
+        if not results:
+            raise OSError(f"No addresses found for {host}")
+        return results
+
+    async def close(self) -> None:
+        pass
+
+
+class AiohttpTransport(Transport):
+    """Transport sending requests through aiohttp.
+
+    aiohttp does not speak HTTP/2. A shared session is used as it is, on
+    every event loop the client runs on, and is never closed by the SDK;
+    it should only be shared by an application running a single loop.
+
+    Args:
+        timeout: Connect (including waiting for a pooled connection) and
+            read timeout, in seconds
+        max_connections: Maximum number of pooled connections per event
+            loop, when the transport creates its own sessions
+        resolver: DNS cache the connections resolve hosts through, when the
+            transport creates its own sessions
+        session: The application's ``aiohttp.ClientSession`` to send requests
+            through, instead of creating one per event loop
+        tracing: Report connection phases to the timeline of profiled calls
+            (see orga_ai.profiler), on sessions the transport creates
+    """
+
+    name = "aiohttp"
+
+    def __init__(
+        self,
+        timeout: float,
+        max_connections: int = 100,
+        resolver: Optional[CachingResolver] = None,
+        session: Optional[Any] = None,
+        tracing: bool = False,
+    ) -> None:
+        import aiohttp
+
+        self.max_connections = max_connections
+        self.resolver = resolver
+        self.session = session
+        self.tracing = tracing
+        self.request_errors = (aiohttp.ClientError, asyncio.TimeoutError)
+        self.connect_errors = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+        self._timeout = aiohttp.ClientTimeout(
+            total=None, connect=timeout, sock_connect=timeout, sock_read=timeout
+        )
+
+    def create_client(self) -> AiohttpClient:
+        if self.session is not None:
+            return AiohttpClient(self.session, self._timeout, owned=False)
+        import aiohttp
+
+        if self.resolver is not None:
+            # The DNS cache replaces aiohttp's own
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                resolver=_AiohttpResolver(self.resolver),  # type: ignore[arg-type]
+                use_dns_cache=False,
+            )
+        else:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self._timeout,
+            trace_configs=[_aiohttp_trace_config()] if self.tracing else None,
+        )
+        return AiohttpClient(session, self._timeout, owned=True)
+
+    async def close_client(self, client: HTTPClient) -> None:
+        await client.aclose()
+        if self.resolver is not None:
+            await self.resolver.close_loop()
+
+
+def _aiohttp_trace_config() -> Any:
+    """aiohttp tracing reporting connection phases to the profiled call's timeline.
+
+    aiohttp reports the TLS handshake as part of connecting.
+    """
+    import aiohttp
+
+    def phase(name: str, start: bool) -> Any:
+        async def callback(session: Any, context: Any, params: Any) -> None:
+            timeline = current_timeline()
+            if timeline is None:
+                return
+            if start:
+                timeline.begin(name)
+            else:
+                timeline.end(name)
+        return callback
+
+    async def dns_cache_hit(session: Any, context: Any, params: Any) -> None:
+        timeline = current_timeline()
+        if timeline is not None:
+            timeline.mark("dns", "cache hit")
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_queued_start.append(phase("pool_wait", True))
+    trace.on_connection_queued_end.append(phase("pool_wait", False))
+    trace.on_dns_resolvehost_start.append(phase("dns", True))
+    trace.on_dns_resolvehost_end.append(phase("dns", False))
+    trace.on_dns_cache_hit.append(dns_cache_hit)
+    trace.on_connection_create_start.append(phase("connect", True))
+    trace.on_connection_create_end.append(phase("connect", False))
+    trace.on_request_headers_sent.append(phase("ttfb", True))
+    trace.on_request_end.append(phase("ttfb", False))
+    return trace
+
+
+def detect_transport() -> str:
+    """Pick a transport for a configuration that does not name one.
+
+    aiohttp is picked when the process already uses it and has not loaded
+    httpx, or when httpx is not installed; otherwise httpx.
+    """
+    if "httpx" in sys.modules:
+        return "httpx"
+    if "aiohttp" in sys.modules or importlib.util.find_spec("httpx") is None:
+        return "aiohttp"
+    return "httpx"
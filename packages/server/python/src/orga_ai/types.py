@@ -5,7 +5,7 @@ These are equivalent to TypeScript interfaces but implemented using Python datac
 and Pydantic models for runtime validation.
 """
 
-from typing import List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Union
 from dataclasses import dataclass
 
 
@@ -18,15 +18,123 @@ class OrgaAIConfig:
     Attributes:
         api_key: Your OrgaAI API key (required)
         user_email: Developer's email address (required)
-        base_url: OrgaAI API base URL (optional, defaults to https://api.orga-ai.com)
+        base_url: OrgaAI API base URL, or a list of base URLs to route between
+            (optional, defaults to https://api.orga-ai.com)
         debug: Enable debug logging (optional, defaults to False)
         timeout: Request timeout in milliseconds (optional, defaults to 10000)
+        max_connections: Maximum number of pooled connections to the API
+            (optional, defaults to 100)
+        http2: Use HTTP/2 where the API supports it; requires the ``h2``
+            package (optional, defaults to False)
+        auth_failure_cache_ttl: How long a 401 for these credentials is replayed
+            locally instead of calling the API again, in milliseconds
+            (optional, disabled by default)
+        endpoint_reprobe_interval: Initial delay before an unreachable base URL is
+            re-probed, in milliseconds (optional, defaults to 30000)
+        rank_ice_servers: Probe the returned STUN/TURN servers and order them by
+            measured round-trip time (optional, defaults to False)
+        ice_probe_timeout: Per-server probe timeout in milliseconds
+            (optional, defaults to 500)
+        drop_unreachable_ice_servers: When ranking, remove servers that did not
+            answer, unless none did (optional, defaults to False)
+        dns_cache: Cache DNS lookups for the API host in the HTTP transport
+            (optional, defaults to False)
+        dns_cache_ttl: TTL applied when the resolver does not report one, in
+            milliseconds (optional, defaults to 60000)
+        dns_resolver: Custom upstream resolver for the DNS cache, an object with
+            an async ``resolve(host, port)`` method; setting it enables the cache
+            (optional, defaults to the system resolver)
+        ice_snapshot_path: File to persist the last ICE config to, so the first
+            session of a new process can skip the ICE round-trip (optional)
+        ice_snapshot_max_age: Maximum age of a snapshot that may be served, in
+            milliseconds (optional, defaults to 300000)
+        shared_ice_cache_path: File to memory-map as an ICE config cache shared
+            by every worker process on the host (optional, POSIX only)
+        shared_ice_cache_ttl: How long a shared ICE config may be served, in
+            milliseconds (optional, defaults to 60000)
+        cache_backend: Cache backend (see orga_ai.backends) sharing ICE config and
+            prefetched sessions across processes and nodes (optional)
+        ice_cache_ttl: How long ICE config is kept in the cache backend, in
+            milliseconds (optional, defaults to 60000)
+        prefetched_session_ttl: How long a prefetched session, or a leased
+            one of unknown expiry, may be handed out, in milliseconds
+            (optional, defaults to 30000)
+        token_batch_window: How long concurrent ephemeral token requests are
+            held to be issued together, in milliseconds (optional, disabled
+            by default)
+        token_batch_max_size: Number of held token requests that triggers an
+            immediate batch (optional, defaults to 100)
+        trust_responses: Skip validation of API responses and build the
+            session objects directly, for maximum speed; a wrongly typed
+            field is passed through instead of rejected (optional, defaults
+            to False)
+        transport: HTTP transport, ``"httpx"`` or ``"aiohttp"``, or a
+            ``Transport`` instance (see orga_ai.transports); aiohttp requires
+            the ``aiohttp`` package (optional, defaults to aiohttp when the
+            process already uses aiohttp and has not loaded httpx, else httpx)
+        aiohttp_session: The application's ``aiohttp.ClientSession`` to send
+            requests through; selects the aiohttp transport, and is not
+            closed by the SDK (optional)
+        slow_call_threshold: Capture a timeline of every get_session_config()
+            call taking at least this long, in milliseconds (optional,
+            disabled by default; see OrgaAI.slow_calls())
+        slow_call_buffer_size: Number of slow call timelines kept
+            (optional, defaults to 100)
+        session_pool_size: Most sessions released unused by
+            release_session() kept to hand out again (optional, defaults
+            to 100)
+        session_min_validity: Validity a released session must have left
+            to be handed out again, in milliseconds (optional, defaults to
+            5000)
+        adaptive_prefetch: Keep a reserve of prefetched sessions in the
+            process, sized from the observed arrival rate, upstream latency
+            and token lifetime (optional, defaults to False; see
+            orga_ai.prefetch)
+        prefetch_max_sessions: Most sessions kept in the adaptive reserve
+            (optional, defaults to 100)
+        speculative_ice_fetch: Fetch ICE servers alongside the ephemeral
+            token instead of after it, authorized with a still-valid token
+            from a recent session; falls back to fetching them with the new
+            token (optional, defaults to False)
+        ice_api_key_auth: The ICE config endpoint accepts the API key, so a
+            speculative ICE fetch can use it when there is no recent token
+            (optional, defaults to False)
     """
     api_key: str
     user_email: str
-    base_url: Optional[str] = None
+    base_url: Optional[Union[str, List[str]]] = None
     debug: Optional[bool] = None
     timeout: Optional[int] = None
+    max_connections: Optional[int] = None
+    http2: Optional[bool] = None
+    auth_failure_cache_ttl: Optional[int] = None
+    endpoint_reprobe_interval: Optional[int] = None
+    rank_ice_servers: Optional[bool] = None
+    ice_probe_timeout: Optional[int] = None
+    drop_unreachable_ice_servers: Optional[bool] = None
+    dns_cache: Optional[bool] = None
+    dns_cache_ttl: Optional[int] = None
+    dns_resolver: Optional[Any] = None
+    ice_snapshot_path: Optional[str] = None
+    ice_snapshot_max_age: Optional[int] = None
+    shared_ice_cache_path: Optional[str] = None
+    shared_ice_cache_ttl: Optional[int] = None
+    cache_backend: Optional[Any] = None
+    ice_cache_ttl: Optional[int] = None
+    prefetched_session_ttl: Optional[int] = None
+    token_batch_window: Optional[float] = None
+    token_batch_max_size: Optional[int] = None
+    trust_responses: Optional[bool] = None
+    transport: Optional[Any] = None
+    aiohttp_session: Optional[Any] = None
+    slow_call_threshold: Optional[float] = None
+    slow_call_buffer_size: Optional[int] = None
+    session_pool_size: Optional[int] = None
+    session_min_validity: Optional[int] = None
+    adaptive_prefetch: Optional[bool] = None
+    prefetch_max_sessions: Optional[int] = None
+    speculative_ice_fetch: Optional[bool] = None
+    ice_api_key_auth: Optional[bool] = None
 
 
 @dataclass
@@ -38,9 +146,43 @@ class SessionConfig:
     Attributes:
         ephemeral_token: Temporary token for WebRTC authentication
         ice_servers: List of ICE servers for WebRTC connection
+        expires_at: Unix time the ephemeral token expires at, or None if
+            neither the API nor the token's claims say
     """
     ephemeral_token: str
     ice_servers: List["IceServer"]
+    expires_at: Optional[float] = None
+    
+    @property
+    def ice_expires_at(self) -> Optional[float]:
+        """Unix time the first of the ICE credentials expires at, if known."""
+        return earliest_expiry(self.ice_servers)
+    
+    @property
+    def valid_until(self) -> Optional[float]:
+        """Unix time the session stops being usable, if known.
+        
+        This is the earlier of the token's and the ICE credentials' expiry.
+        """
+        return earliest_expiry([self, *self.ice_servers])
+
+
+class EphemeralToken(str):
+    """An ephemeral token that knows when it expires.
+    
+    It is the token string itself, so it can be used anywhere a token is
+    expected; the expiry rides along as an attribute.
+    
+    Attributes:
+        expires_at: Unix time the token expires at, or None if unknown
+    """
+    
+    expires_at: Optional[float]
+    
+    def __new__(cls, token: str, expires_at: Optional[float] = None) -> "EphemeralToken":
+        instance = super().__new__(cls, token)
+        instance.expires_at = expires_at
+        return instance
 
 
 @dataclass
@@ -53,10 +195,54 @@ class IceServer:
         urls: ICE server URL(s) - can be a single string or list of strings
         username: Optional username for authenticated ICE servers
         credential: Optional credential for authenticated ICE servers
+        expires_at: Unix time the credential expires at, or None if unknown
     """
     urls: Union[str, List[str]]
     username: Optional[str] = None
     credential: Optional[str] = None
+    expires_at: Optional[float] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to the JSON shape used by the API and the frontend SDKs.
+        
+        ``expires_at`` is only included when known.
+        """
+        data: Dict[str, Any] = {
+            "urls": self.urls,
+            "username": self.username,
+            "credential": self.credential,
+        }
+        if self.expires_at is not None:
+            data["expires_at"] = self.expires_at
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IceServer":
+        """Build an ICE server from its JSON shape.
+        
+        Raises:
+            KeyError: If ``urls`` is missing
+            TypeError: If ``data`` is not a mapping
+        """
+        return cls(
+            urls=data["urls"],
+            username=data.get("username"),
+            credential=data.get("credential"),
+            expires_at=data.get("expires_at"),
+        )
+
+
+def earliest_expiry(items: Iterable[Any]) -> Optional[float]:
+    """Return the earliest ``expires_at`` among items, ignoring unknown ones.
+    
+    Args:
+        items: Objects with an ``expires_at`` attribute, such as ICE servers
+        
+    Returns:
+        Optional[float]: The earliest expiry, or None if none is known
+    """
+    known = [item.expires_at for item in items if item.expires_at is not None]
+    return min(known) if known else None
 
 
 # Forward reference resolution for SessionConfig
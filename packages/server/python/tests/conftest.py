@@ -0,0 +1,11 @@
+"""Fixtures shared by the test modules."""
+
+import pytest
+
+from tests.helpers import FakeClock
+
+
+@pytest.fixture
+def clock():
+    """Create a controllable clock."""
+    return FakeClock()
@@ -0,0 +1,28 @@
+"""Helpers shared by the test modules."""
+
+import socket
+
+from orga_ai import OrgaAIConfig
+
+
+class FakeClock:
+    """Manually advanced clock, standing in for time.monotonic() or time.time()."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_config(base_url, **overrides):
+    """Create a config pointed at the given base URL(s)."""
+    return OrgaAIConfig(api_key="key", user_email="test@example.com", base_url=base_url, **overrides)
+
+
+def unused_url():
+    """Return the URL of a local port nothing listens on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
@@ -0,0 +1,271 @@
+"""Tests for the local session agent.
+
+These tests verify that sessions and errors survive the binary protocol,
+that workers get session configs, leases and errors from the agent over its
+socket, and that they fall back to direct calls while it is unavailable.
+"""
+
+import asyncio
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from orga_ai import OrgaAI, SessionConfig, IceServer
+from orga_ai.agent import (
+    AgentClient,
+    SessionAgent,
+    decode_error,
+    decode_session,
+    encode_error,
+    encode_session,
+)
+from orga_ai.errors import (
+    AgentUnavailableError,
+    OrgaAIAuthenticationError,
+    OrgaAIDrainingError,
+    OrgaAIError,
+    OrgaAIServerError,
+)
+from orga_ai.testing import FakeOrgaAPI, _child_env
+
+from tests.helpers import make_config
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to about 100 bytes, which pytest's
+    # tmp_path can exceed
+    directory = tempfile.mkdtemp(prefix="orga-agent-")
+    yield os.path.join(directory, "agent.sock")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestProtocol:
+    """Test cases for the agent's binary encoding."""
+
+    def test_session_round_trip(self):
+        """Test that every session field survives encoding."""
+        session = SessionConfig(
+            ephemeral_token="tokén",
+            ice_servers=[
+                IceServer(urls="stun:stun.example.com:3478"),
+                IceServer(
+                    urls=["turn:a.example.com", "turns:b.example.com"],
+                    username="1700000000:user",
+                    credential="secret",
+                    expires_at=1700000000.0,
+                ),
+                IceServer(urls=[], username=""),
+            ],
+            expires_at=1700000123.5,
+        )
+        decoded = decode_session(encode_session(session))
+
+        assert decoded == session
+        assert decoded.ephemeral_token.expires_at == 1700000123.5
+
+    def test_unknown_expiry(self):
+        """Test that unknown expiries stay unknown."""
+        session = SessionConfig(ephemeral_token="token", ice_servers=[])
+
+        assert decode_session(encode_session(session)).expires_at is None
+
+    @pytest.mark.parametrize("error", [
+        OrgaAIError("Invalid email format"),
+        OrgaAIError("Rate limited", status=429, code="HTTP_ERROR"),
+        OrgaAIAuthenticationError("Invalid API key"),
+        OrgaAIServerError("Bad gateway", status=502),
+        OrgaAIDrainingError(),
+    ])
+    def test_error_round_trip(self, error):
+        """Test that errors come back with their type, status, code and message."""
+        decoded = decode_error(encode_error(error))
+
+        assert type(decoded) is type(error)
+        assert (decoded.message, decoded.status, decoded.code) == (
+            error.message, error.status, error.code
+        )
+
+
+class TestSessionAgent:
+    """Test cases for SessionAgent and AgentClient."""
+
+    @pytest.mark.asyncio
+    async def test_sessions_served_by_agent(self, socket_path):
+        """Test that every worker's sessions come from the agent's client."""
+        async with FakeOrgaAPI() as api:
+            async with SessionAgent(OrgaAI(make_config(api.url)), socket_path) as agent:
+                async with AgentClient(socket_path, make_config(api.url)) as first, \
+                        AgentClient(socket_path, make_config(api.url)) as second:
+                    sessions = await asyncio.gather(
+                        *(worker.get_session_config() for worker in (first, second, first))
+                    )
+                    stats = first.stats()
+                    agent_stats = await second.agent_stats()
+
+        assert len({session.ephemeral_token for session in sessions}) == 3
+        assert sessions[0].ice_servers[1].username == "fake-user"
+        assert api.requests["/v1/realtime/client-secrets"] == 3
+        assert stats == {"agent": 2, "fallbacks": 0, "connections": 1, "direct": None}
+        assert agent_stats["connections"] == 2
+        assert agent_stats["requests"] == 4
+        assert agent_stats["client"]["in_flight"] == 0
+        assert not os.path.exists(socket_path)
+
+    @pytest.mark.asyncio
+    async def test_socket_permissions(self, socket_path):
+        """Test that only the agent's user can connect by default."""
+        async with FakeOrgaAPI() as api:
+            async with SessionAgent(OrgaAI(make_config(api.url)), socket_path):
+                mode = os.stat(socket_path).st_mode & 0o777
+
+        assert mode == 0o600
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate(self, socket_path):
+        """Test that the agent's errors are raised by the worker, not fallen back from."""
+        async with FakeOrgaAPI(api_key="other") as api:
+            async with SessionAgent(OrgaAI(make_config(api.url)), socket_path):
+                async with AgentClient(socket_path, make_config(api.url)) as worker:
+                    with pytest.raises(OrgaAIAuthenticationError):
+                        await worker.get_session_config()
+                    stats = worker.stats()
+
+        assert stats["fallbacks"] == 0
+        assert stats["direct"] is None
+
+    @pytest.mark.asyncio
+    async def test_leases_shared_across_workers(self, socket_path):
+        """Test that a session released by one worker is handed to another."""
+        async with FakeOrgaAPI(token_ttl=300) as api:
+            async with SessionAgent(OrgaAI(make_config(api.url)), socket_path):
+                async with AgentClient(socket_path) as first, AgentClient(socket_path) as second:
+                    leased = await first.acquire_session()
+                    released = await first.release_session(leased)
+                    released_twice = await first.release_session(leased.ephemeral_token)
+                    reused = await second.acquire_session()
+
+        assert released is True
+        assert released_twice is False
+        assert reused.ephemeral_token == leased.ephemeral_token
+        assert api.requests["/v1/realtime/client-secrets"] == 1
+
+    @pytest.mark.asyncio
+    async def test_fallback_without_agent(self, socket_path):
+        """Test that calls go direct when nothing listens on the socket."""
+        async with FakeOrgaAPI(token_ttl=300) as api:
+            async with AgentClient(socket_path, make_config(api.url)) as worker:
+                session = await worker.get_session_config()
+                leased = await worker.acquire_session()
+                released = await worker.release_session(leased)
+                stats = worker.stats()
+
+        assert session.ephemeral_token
+        assert released is True
+        assert stats["agent"] == 0
+        assert stats["fallbacks"] == 2
+        assert stats["direct"]["leases"]["ready"] == 1
+
+    @pytest.mark.asyncio
+    async def test_unavailable_without_config(self, socket_path):
+        """Test that a worker without a config raises when the agent is down."""
+        async with AgentClient(socket_path) as worker:
+            with pytest.raises(AgentUnavailableError):
+                await worker.get_session_config()
+            assert await worker.agent_stats() is None
+
+    @pytest.mark.asyncio
+    async def test_fallback_when_agent_stops(self, socket_path):
+        """Test that workers go direct once the agent closes, and back after a restart."""
+        async with FakeOrgaAPI() as api:
+            async with AgentClient(socket_path, make_config(api.url), retry_interval=0) as worker:
+                agent = await SessionAgent(OrgaAI(make_config(api.url)), socket_path).start()
+                await worker.get_session_config()
+                await agent.close()
+                await worker.get_session_config()
+                agent = await SessionAgent(OrgaAI(make_config(api.url)), socket_path).start()
+                await worker.get_session_config()
+                await agent.close()
+                stats = worker.stats()
+
+        assert stats["agent"] == 2
+        assert stats["fallbacks"] == 1
+
+    @pytest.mark.asyncio
+    async def test_draining_agent_falls_back(self, socket_path):
+        """Test that requests a draining agent refuses go direct."""
+        async with FakeOrgaAPI() as api:
+            agent = await SessionAgent(OrgaAI(make_config(api.url)), socket_path).start()
+            async with AgentClient(socket_path, make_config(api.url)) as worker:
+                await worker.get_session_config()
+                await agent.client.drain()
+                session = await worker.get_session_config()
+                stats = worker.stats()
+            await agent.close()
+
+        assert session.ephemeral_token
+        assert stats["fallbacks"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_socket_replaced(self, socket_path):
+        """Test that a socket left by an agent that exited does not block a new one."""
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+        async with FakeOrgaAPI() as api:
+            async with SessionAgent(OrgaAI(make_config(api.url)), socket_path):
+                async with AgentClient(socket_path) as worker:
+                    assert (await worker.get_session_config()).ephemeral_token
+
+    @pytest.mark.asyncio
+    async def test_refuses_running_agent_socket(self, socket_path):
+        """Test that a second agent does not take over a live agent's socket."""
+        async with FakeOrgaAPI() as api:
+            async with SessionAgent(OrgaAI(make_config(api.url)), socket_path):
+                with pytest.raises(OrgaAIError, match="Another agent"):
+                    await SessionAgent(OrgaAI(make_config(api.url)), socket_path).start()
+
+
+class TestAgentProcess:
+    """Test cases for running the agent with python -m orga_ai.agent."""
+
+    def test_serves_until_terminated(self, socket_path):
+        """Test that the agent serves workers and removes its socket on SIGTERM."""
+        api = FakeOrgaAPI().start_in_thread()
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "orga_ai.agent",
+                "--socket", socket_path,
+                "--api-key", "key",
+                "--user-email", "test@example.com",
+                "--base-url", api.url,
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+            env=_child_env(),
+        )
+        try:
+            assert process.stdout.readline().startswith("Listening on ")
+
+            async def work():
+                async with AgentClient(socket_path) as worker:
+                    return await worker.get_session_config()
+
+            session = asyncio.run(work())
+            process.send_signal(signal.SIGTERM)
+            assert process.wait(timeout=10) == 0
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            api.stop_thread()
+
+        assert session.ephemeral_token
+        assert not os.path.exists(socket_path)
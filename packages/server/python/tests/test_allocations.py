@@ -0,0 +1,89 @@
+"""Allocation guard for the per-session request path.
+
+Everything derivable from the configuration (URLs, query strings, auth
+headers) is built once per client. These tests count the memory blocks
+allocated by SDK code that are alive at the moment each request is handed to
+the transport, and fail if that count grows past a budget.
+"""
+
+import asyncio
+import tracemalloc
+
+import httpx
+
+from orga_ai import OrgaAI, OrgaAIConfig
+from orga_ai.testing import FakeOrgaAPI
+
+# Per request, what remains is the coroutine frames of the call chain, the
+# bound send method, the endpoint iterator and (for ICE) the per-token
+# Authorization header. Rebuilding URLs or headers per call adds 2-4 blocks.
+REQUEST_BLOCK_BUDGET = 8
+SESSION_BLOCK_BUDGET = 14
+
+SDK_FRAMES = [
+    tracemalloc.Filter(True, "*orga_ai*"),
+    tracemalloc.Filter(False, "*orga_ai*testing.py"),
+]
+
+
+def measure_session_allocations(config):
+    """Return the SDK blocks alive at each request of one warm session."""
+    api = FakeOrgaAPI()
+    counts = []
+    
+    def on_request(request):
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces(SDK_FRAMES)
+            counts.append(sum(stat.count for stat in snapshot.statistics("lineno")))
+    
+    async def run():
+        client = OrgaAI(config)
+        client._client = httpx.AsyncClient(transport=api.mock_transport())
+        api.on_request = on_request
+        for _ in range(3):
+            await client.get_session_config()
+        tracemalloc.start(1)
+        try:
+            await client.get_session_config()
+        finally:
+            tracemalloc.stop()
+            await client.close()
+    
+    asyncio.run(run())
+    return counts
+
+
+class TestHotPathAllocations:
+    """Test cases for allocations on the per-session path."""
+    
+    def test_session_within_budget(self):
+        """Test that SDK allocations per request stay within budget."""
+        counts = measure_session_allocations(
+            OrgaAIConfig(api_key="key", user_email="test@example.com")
+        )
+        
+        assert len(counts) == 2  # Token and ICE requests
+        assert max(counts) <= REQUEST_BLOCK_BUDGET, counts
+        assert sum(counts) <= SESSION_BLOCK_BUDGET, counts
+    
+    def test_templates_are_reused(self):
+        """Test that URLs and headers are built once per client."""
+        client = OrgaAI(OrgaAIConfig(api_key="key", user_email="test@example.com"))
+        
+        first = client._request_templates()
+        
+        assert client._request_templates() is first
+        assert first.token_urls["https://api.orga-ai.com"] == (
+            "https://api.orga-ai.com/v1/realtime/client-secrets?email=test%40example.com"
+        )
+        assert first.token_headers["Authorization"] == "Bearer key"
+    
+    def test_templates_follow_credential_changes(self):
+        """Test that changing credentials on the client rebuilds the templates."""
+        client = OrgaAI(OrgaAIConfig(api_key="key", user_email="test@example.com"))
+        first = client._request_templates()
+        
+        client.api_key = "rotated"
+        
+        assert client._request_templates() is not first
+        assert client._request_templates().token_headers["Authorization"] == "Bearer rotated"
@@ -0,0 +1,370 @@
+"""Tests for the pluggable cache backends.
+
+Every backend runs the same contract tests. The Redis backend is tested
+against a local stand-in server speaking the subset of RESP2 it uses.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import pytest_asyncio
+
+from orga_ai.backends import (
+    FileCacheBackend,
+    MemoryCacheBackend,
+    RedisCacheBackend,
+    RedisProtocolError,
+)
+
+
+class RedisStandIn:
+    """In-memory server speaking the Redis protocol for the commands we use."""
+    
+    def __init__(self, password=None, reply_delay=0.0):
+        self.password = password
+        # Pause halfway through every reply, for tests cancelling mid-read
+        self.reply_delay = reply_delay
+        self.values = {}
+        self.lists = {}
+        self.expiry = {}
+        self.commands = []
+    
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+    
+    def close(self):
+        self.server.close()
+    
+    def expired(self, key):
+        if key in self.expiry and time.monotonic() >= self.expiry[key]:
+            self.values.pop(key, None)
+            self.lists.pop(key, None)
+            del self.expiry[key]
+        return key not in self.values and key not in self.lists
+    
+    async def read_command(self, reader):
+        count = int((await reader.readuntil(b"\r\n"))[1:-2])
+        args = []
+        for _ in range(count):
+            length = int((await reader.readuntil(b"\r\n"))[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+    
+    async def handle(self, reader, writer):
+        authed = self.password is None
+        try:
+            while True:
+                args = await self.read_command(reader)
+                name = args[0].upper()
+                self.commands.append(name)
+                if name == b"AUTH":
+                    authed = args[1].decode() == self.password
+                    writer.write(b"+OK\r\n" if authed else b"-WRONGPASS invalid password\r\n")
+                elif not authed:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                else:
+                    reply = self.execute(name, args[1:])
+                    if self.reply_delay:
+                        writer.write(reply[:len(reply) // 2])
+                        await writer.drain()
+                        await asyncio.sleep(self.reply_delay)
+                        reply = reply[len(reply) // 2:]
+                    writer.write(reply)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+    
+    def execute(self, name, args):
+        if name == b"SELECT":
+            return b"+OK\r\n"
+        if name == b"EVAL":
+            # Only the compare-and-delete script is used
+            assert b'redis.call("DEL", KEYS[1])' in args[0]
+            key, value = args[2], args[3]
+            if self.expired(key) or self.values.get(key) != value:
+                return b":0\r\n"
+            del self.values[key]
+            return b":1\r\n"
+        key = args[0]
+        self.expired(key)
+        if name == b"GET":
+            value = self.values.get(key)
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            options = [a.upper() for a in args[2:]]
+            if b"NX" in options and key in self.values:
+                return b"$-1\r\n"
+            self.values[key] = args[1]
+            if b"PX" in options:
+                ms = int(args[2 + options.index(b"PX") + 1])
+                self.expiry[key] = time.monotonic() + ms / 1000
+            return b"+OK\r\n"
+        if name == b"DEL":
+            removed = int(self.values.pop(key, None) is not None or self.lists.pop(key, None) is not None)
+            return b":%d\r\n" % removed
+        if name == b"RPUSH":
+            self.lists.setdefault(key, []).append(args[1])
+            return b":%d\r\n" % len(self.lists[key])
+        if name == b"PEXPIRE":
+            self.expiry[key] = time.monotonic() + int(args[1]) / 1000
+            return b":1\r\n"
+        if name == b"LPOP":
+            items = self.lists.get(key)
+            if not items:
+                return b"$-1\r\n"
+            value = items.pop(0)
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        return b"-ERR unknown command\r\n"
+
+
+@pytest_asyncio.fixture(params=["memory", "file", "redis"])
+async def backend(request, tmp_path):
+    """Create each backend in turn."""
+    if request.param == "memory":
+        yield MemoryCacheBackend()
+    elif request.param == "file":
+        yield FileCacheBackend(str(tmp_path / "cache"))
+    else:
+        server = await RedisStandIn().start()
+        backend = RedisCacheBackend(f"redis://127.0.0.1:{server.port}/0", prefix="test:")
+        yield backend
+        await backend.close()
+        server.close()
+
+
+class TestCacheBackendContract:
+    """Behaviour every cache backend must provide."""
+    
+    @pytest.mark.asyncio
+    async def test_get_missing(self, backend):
+        """Test that missing keys return None."""
+        assert await backend.get("missing") is None
+    
+    @pytest.mark.asyncio
+    async def test_set_and_get(self, backend):
+        """Test that stored values are returned until replaced."""
+        await backend.set("key", b"one", ttl=60)
+        assert await backend.get("key") == b"one"
+        
+        await backend.set("key", b"two", ttl=60)
+        assert await backend.get("key") == b"two"
+    
+    @pytest.mark.asyncio
+    async def test_values_expire(self, backend):
+        """Test that values are gone after their TTL."""
+        await backend.set("key", b"value", ttl=0.05)
+        await asyncio.sleep(0.1)
+        
+        assert await backend.get("key") is None
+    
+    @pytest.mark.asyncio
+    async def test_add_only_if_absent(self, backend):
+        """Test that add elects a single winner per key."""
+        assert await backend.add("lock", b"a", ttl=60) is True
+        assert await backend.add("lock", b"b", ttl=60) is False
+        assert await backend.get("lock") == b"a"
+        
+        await backend.delete("lock")
+        assert await backend.add("lock", b"c", ttl=60) is True
+    
+    @pytest.mark.asyncio
+    async def test_add_after_expiry(self, backend):
+        """Test that an expired key can be won again."""
+        await backend.add("lock", b"a", ttl=0.05)
+        await asyncio.sleep(0.1)
+        
+        assert await backend.add("lock", b"b", ttl=60) is True
+    
+    @pytest.mark.asyncio
+    async def test_delete_if_only_matching(self, backend):
+        """Test that delete_if leaves a key holding another value."""
+        await backend.add("lock", b"a", ttl=60)
+        
+        assert await backend.delete_if("lock", b"b") is False
+        assert await backend.get("lock") == b"a"
+        assert await backend.delete_if("lock", b"a") is True
+        assert await backend.get("lock") is None
+        assert await backend.delete_if("lock", b"a") is False
+    
+    @pytest.mark.asyncio
+    async def test_expired_owner_cannot_release_new_owner(self, backend):
+        """Test that a holder whose key expired cannot remove the next winner's."""
+        await backend.add("lock", b"a", ttl=0.05)
+        await asyncio.sleep(0.1)
+        assert await backend.add("lock", b"b", ttl=60) is True
+        
+        assert await backend.delete_if("lock", b"a") is False
+        assert await backend.get("lock") == b"b"
+    
+    @pytest.mark.asyncio
+    async def test_claim_is_fifo_and_single_use(self, backend):
+        """Test that queued items are claimed once each, oldest first."""
+        await backend.push("queue", b"first", ttl=60)
+        await backend.push("queue", b"second", ttl=60)
+        
+        assert await backend.claim("queue") == b"first"
+        assert await backend.claim("queue") == b"second"
+        assert await backend.claim("queue") is None
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_claims(self, backend):
+        """Test that concurrent claimers never receive the same item."""
+        for index in range(10):
+            await backend.push("queue", b"%d" % index, ttl=60)
+        
+        claimed = await asyncio.gather(*(backend.claim("queue") for _ in range(15)))
+        items = [item for item in claimed if item is not None]
+        
+        assert sorted(items) == sorted(b"%d" % index for index in range(10))
+
+
+class TestFileCacheBackend:
+    """File backend specifics."""
+    
+    @pytest.mark.asyncio
+    async def test_shared_between_instances(self, tmp_path):
+        """Test that two processes' backends see the same directory."""
+        first = FileCacheBackend(str(tmp_path))
+        second = FileCacheBackend(str(tmp_path))
+        await first.push("queue", b"token", ttl=60)
+        await first.set("key", b"value", ttl=60)
+        
+        assert await second.get("key") == b"value"
+        assert await second.claim("queue") == b"token"
+        assert await first.claim("queue") is None
+    
+    @pytest.mark.asyncio
+    async def test_waiting_for_key_lock_does_not_block_loop(self, tmp_path):
+        """Test that the event loop keeps running while add waits for a key lock."""
+        backend = FileCacheBackend(str(tmp_path))
+        held, release = threading.Event(), threading.Event()
+        
+        def hold_lock():
+            # Another process refreshing the same key
+            with backend._locked(backend._path("lock")):
+                held.set()
+                release.wait(2)
+        
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        held.wait()
+        adding = asyncio.ensure_future(backend.add("lock", b"value", ttl=60))
+        await asyncio.sleep(0.05)
+        
+        assert not adding.done()
+        release.set()
+        assert await adding is True
+        holder.join()
+    
+    def test_expired_entry_taken_over_once(self, tmp_path, monkeypatch):
+        """Test that only one of many processes takes over an expired entry."""
+        asyncio.run(FileCacheBackend(str(tmp_path)).add("lock", b"old", ttl=0.01))
+        time.sleep(0.05)
+        barrier = threading.Barrier(8)
+        read = FileCacheBackend._read
+        
+        def slow_read(self, path):
+            # Widen the window between seeing the entry expired and acting
+            value = read(self, path)
+            time.sleep(0.01)
+            return value
+        
+        monkeypatch.setattr(FileCacheBackend, "_read", slow_read)
+        
+        def contend(index):
+            # A backend and event loop per thread, as in separate processes
+            backend = FileCacheBackend(str(tmp_path))
+            barrier.wait()
+            return asyncio.run(backend.add("lock", b"%d" % index, ttl=60))
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            won = list(pool.map(contend, range(8)))
+        
+        assert won.count(True) == 1
+        winner = won.index(True)
+        assert asyncio.run(FileCacheBackend(str(tmp_path)).get("lock")) == b"%d" % winner
+
+
+class TestRedisCacheBackend:
+    """Redis backend specifics."""
+    
+    @pytest.mark.asyncio
+    async def test_auth_and_select(self):
+        """Test that the password and database from the URL are used."""
+        server = await RedisStandIn(password="s3cret").start()
+        backend = RedisCacheBackend(f"redis://:s3cret@127.0.0.1:{server.port}/2")
+        try:
+            await backend.set("key", b"value", ttl=60)
+        finally:
+            await backend.close()
+            server.close()
+        
+        assert server.commands[:3] == [b"AUTH", b"SELECT", b"SET"]
+    
+    @pytest.mark.asyncio
+    async def test_error_reply_raises(self):
+        """Test that server errors surface as RedisProtocolError."""
+        server = await RedisStandIn(password="s3cret").start()
+        backend = RedisCacheBackend(f"redis://:wrong@127.0.0.1:{server.port}/0")
+        try:
+            with pytest.raises(RedisProtocolError, match="WRONGPASS"):
+                await backend.get("key")
+        finally:
+            await backend.close()
+            server.close()
+    
+    @pytest.mark.asyncio
+    async def test_reconnects_after_connection_loss(self):
+        """Test that the next command reconnects after the server restarts."""
+        server = await RedisStandIn().start()
+        backend = RedisCacheBackend(f"redis://127.0.0.1:{server.port}/0")
+        await backend.set("key", b"value", ttl=60)
+        backend._connections.get().writer.transport.abort()
+        
+        with pytest.raises((OSError, asyncio.IncompleteReadError)):
+            await backend.get("key")
+        assert await backend.get("key") == b"value"
+        
+        await backend.close()
+        server.close()
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_command_does_not_desync_connection(self):
+        """Test that a reply left unread by a cancelled command is not handed to the next one."""
+        server = await RedisStandIn(reply_delay=0.05).start()
+        backend = RedisCacheBackend(f"redis://127.0.0.1:{server.port}/0")
+        try:
+            await backend.set("ice", b"ICE-PAYLOAD", ttl=60)
+            await backend.push("sessions", b"SESSION-1", ttl=60)
+            pending = asyncio.ensure_future(backend.get("ice"))
+            await asyncio.sleep(0.02)
+            pending.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await pending
+            
+            assert await backend.claim("sessions") == b"SESSION-1"
+            assert await backend.get("ice") == b"ICE-PAYLOAD"
+        finally:
+            await backend.close()
+            server.close()
+    
+    @pytest.mark.asyncio
+    async def test_failed_setup_not_kept(self):
+        """Test that a connection whose AUTH failed is not reused unauthenticated."""
+        server = await RedisStandIn(password="s3cret").start()
+        backend = RedisCacheBackend(f"redis://:wrong@127.0.0.1:{server.port}/0")
+        try:
+            for _ in range(2):
+                with pytest.raises(RedisProtocolError, match="WRONGPASS"):
+                    await backend.get("key")
+            
+            assert backend._connections.get().writer is None
+            assert server.commands == [b"AUTH", b"AUTH"]
+        finally:
+            await backend.close()
+            server.close()
@@ -0,0 +1,218 @@
+"""Tests for micro-batching of ephemeral token requests.
+
+These tests drive TokenBatcher with stub fetch functions to verify how
+requests are grouped, and how unsupported batching and errors are handled.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from orga_ai.batching import TokenBatcher
+from orga_ai.errors import OrgaAIAuthenticationError, OrgaAIServerError
+
+
+class StubAPI:
+    """Records token requests and answers them from a counter."""
+
+    def __init__(self, batching=True, partial=False):
+        self.batching = batching
+        self.partial = partial
+        self.single_calls = 0
+        self.batch_sizes = []
+        self.issued = 0
+        self.error = None
+
+    def _next(self):
+        self.issued += 1
+        return f"token-{self.issued}"
+
+    async def fetch_one(self):
+        self.single_calls += 1
+        await asyncio.sleep(0)
+        return self._next()
+
+    async def fetch_many(self, count):
+        self.batch_sizes.append(count)
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        if not self.batching:
+            return None
+        if self.partial:
+            return [self._next()]
+        return [self._next() for _ in range(count)]
+
+
+class TestTokenBatcher:
+    """Test cases for the TokenBatcher class."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_batch(self):
+        """Test that requests within the window become one batched request."""
+        api = StubAPI()
+        batcher = TokenBatcher(api.fetch_one, api.fetch_many, window=0.01)
+
+        tokens = await asyncio.gather(*(batcher.get_token() for _ in range(5)))
+
+        assert sorted(tokens) == [f"token-{i}" for i in range(1, 6)]
+        assert api.batch_sizes == [5]
+        assert api.single_calls == 0
+        assert batcher.supports_batching is True
+        assert batcher.stats()["batched_tokens"] == 5
+
+    @pytest.mark.asyncio
+    async def test_lone_request_is_sent_individually(self):
+        """Test that a batch of one does not use the count parameter."""
+        api = StubAPI()
+        batcher = TokenBatcher(api.fetch_one, api.fetch_many, window=0.001)
+
+        assert await batcher.get_token() == "token-1"
+        assert api.batch_sizes == []
+        assert batcher.supports_batching is None
+
+    @pytest.mark.asyncio
+    async def test_max_size_flushes_immediately(self):
+        """Test that a full batch is sent without waiting for the window."""
+        api = StubAPI()
+        batcher = TokenBatcher(api.fetch_one, api.fetch_many, window=60, max_size=3)
+
+        tokens = await asyncio.wait_for(
+            asyncio.gather(*(batcher.get_token() for _ in range(3))), timeout=1
+        )
+
+        assert len(set(tokens)) == 3
+        assert api.batch_sizes == [3]
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_individual_requests(self):
+        """Test that a rejected batch is retried as individual requests."""
+        api = StubAPI(batching=False)
+        batcher = TokenBatcher(api.fetch_one, api.fetch_many, window=0.01)
+
+        tokens = await asyncio.gather(*(batcher.get_token() for _ in range(4)))
+        await asyncio.gather(*(batcher.get_token() for _ in range(4)))
+
+        assert len(set(tokens)) == 4
+        assert api.batch_sizes == [4]  # Not tried again
+        assert api.single_calls == 8
+        assert batcher.supports_batching is False
+
+    @pytest.mark.asyncio
+    async def test_batching_retried_after_backoff(self, clock):
+        """Test that a rejected batch is tried again after a doubling backoff."""
+        api = StubAPI(batching=False)
+        batcher = TokenBatcher(
+            api.fetch_one, api.fetch_many, window=0.001, reprobe_interval=10, clock=clock
+        )
+
+        async def burst():
+            await asyncio.gather(*(batcher.get_token() for _ in range(2)))
+
+        await burst()
+        clock.now = 9
+        await burst()
+        clock.now = 10
+        await burst()
+        clock.now = 29
+        await burst()
+        clock.now = 30
+        api.batching = True
+        await burst()
+        clock.now = 31
+        await burst()
+
+        assert api.batch_sizes == [2, 2, 2, 2]
+        assert batcher.supports_batching is True
+
+    @pytest.mark.asyncio
+    async def test_ignored_count_uses_returned_token(self):
+        """Test that an API ignoring the count still serves one waiter."""
+        api = StubAPI(partial=True)
+        batcher = TokenBatcher(api.fetch_one, api.fetch_many, window=0.01)
+
+        tokens = await asyncio.gather(*(batcher.get_token() for _ in range(3)))
+
+        assert sorted(tokens) == ["token-1", "token-2", "token-3"]
+        assert api.single_calls == 2
+        assert batcher.supports_batching is False
+
+    @pytest.mark.asyncio
+    async def test_batch_error_fails_every_waiter(self):
+        """Test that a failed batched request is raised to each caller."""
+        api = StubAPI()
+        api.error = OrgaAIAuthenticationError("Invalid API key or user email")
+        batcher = TokenBatcher(api.fetch_one, api.fetch_many, window=0.01)
+
+        results = await asyncio.gather(
+            *(batcher.get_token() for _ in range(3)), return_exceptions=True
+        )
+
+        assert all(isinstance(r, OrgaAIAuthenticationError) for r in results)
+        assert api.single_calls == 0
+
+    @pytest.mark.asyncio
+    async def test_individual_errors_are_per_request(self):
+        """Test that individual fallback requests fail independently."""
+        calls = []
+
+        async def fetch_one():
+            calls.append(None)
+            if len(calls) == 2:
+                raise OrgaAIServerError("boom", 500)
+            return f"token-{len(calls)}"
+
+        async def fetch_many(count):
+            return None
+
+        batcher = TokenBatcher(fetch_one, fetch_many, window=0.01)
+        results = await asyncio.gather(
+            *(batcher.get_token() for _ in range(3)), return_exceptions=True
+        )
+
+        assert sum(isinstance(r, OrgaAIServerError) for r in results) == 1
+        assert sum(isinstance(r, str) for r in results) == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_break_batch(self):
+        """Test that a caller giving up leaves the others served."""
+        api = StubAPI()
+        batcher = TokenBatcher(api.fetch_one, api.fetch_many, window=0.02)
+
+        abandoned = asyncio.ensure_future(batcher.get_token())
+        others = [asyncio.ensure_future(batcher.get_token()) for _ in range(2)]
+        await asyncio.sleep(0)
+        abandoned.cancel()
+
+        tokens = await asyncio.gather(*others)
+
+        assert len(set(tokens)) == 2
+        assert api.batch_sizes == [2]
+
+    def test_batches_per_event_loop(self):
+        """Test that loops in different threads batch separately but share stats."""
+        api = StubAPI()
+        batcher = TokenBatcher(api.fetch_one, api.fetch_many, window=0.05)
+        barrier = threading.Barrier(2)
+        results = []
+
+        async def requests():
+            barrier.wait()
+            return await asyncio.gather(*(batcher.get_token() for _ in range(3)))
+
+        def run():
+            results.append(asyncio.run(requests()))
+
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [len(tokens) for tokens in results] == [3, 3]
+        assert api.batch_sizes == [3, 3]
+        stats = batcher.stats()
+        assert stats["requests"] == 6
+        assert stats["batches"] == 2
+        assert stats["pending"] == 0
@@ -0,0 +1,84 @@
+"""Tests for OrgaAI caching helpers.
+
+These tests verify the negative cache used to suppress repeated
+authentication failures.
+"""
+
+import pytest
+
+from orga_ai.cache import NegativeCache, credentials_key
+
+
+class TestNegativeCache:
+    """Test cases for the NegativeCache class."""
+    
+    @pytest.fixture
+    def cache(self, clock):
+        """Create a cache using the fake clock."""
+        return NegativeCache(max_entries=2, clock=clock)
+    
+    def test_miss_on_empty_cache(self, cache):
+        """Test that unknown keys are a miss."""
+        assert cache.get("key") is None
+        assert cache.hits == 0
+    
+    def test_hit_within_window(self, cache, clock):
+        """Test that failures are replayed within the TTL window."""
+        cache.put("key", "Invalid API key or user email", ttl=5)
+        clock.now = 4.9
+        
+        assert cache.get("key") == "Invalid API key or user email"
+        assert cache.hits == 1
+        assert cache.stores == 1
+    
+    def test_expires_after_window(self, cache, clock):
+        """Test that failures are forgotten once the TTL elapses."""
+        cache.put("key", "denied", ttl=5)
+        clock.now = 5
+        
+        assert cache.get("key") is None
+        assert len(cache) == 0
+    
+    def test_zero_ttl_is_not_stored(self, cache):
+        """Test that a non-positive TTL disables caching."""
+        cache.put("key", "denied", ttl=0)
+        
+        assert cache.get("key") is None
+        assert cache.stores == 0
+    
+    def test_invalidate_single_key(self, cache):
+        """Test invalidating one key leaves the others intact."""
+        cache.put("a", "denied", ttl=5)
+        cache.put("b", "denied", ttl=5)
+        cache.invalidate("a")
+        
+        assert cache.get("a") is None
+        assert cache.get("b") == "denied"
+    
+    def test_invalidate_all(self, cache):
+        """Test invalidating every key."""
+        cache.put("a", "denied", ttl=5)
+        cache.put("b", "denied", ttl=5)
+        cache.invalidate()
+        
+        assert len(cache) == 0
+    
+    def test_evicts_when_full(self, cache):
+        """Test that the entry closest to expiry is evicted when full."""
+        cache.put("a", "denied", ttl=1)
+        cache.put("b", "denied", ttl=5)
+        cache.put("c", "denied", ttl=5)
+        
+        assert len(cache) == 2
+        assert cache.get("a") is None
+        assert cache.get("c") == "denied"
+    
+    def test_credentials_key_changes_with_config(self):
+        """Test that any credential change produces a different key."""
+        base = credentials_key("key", "dev@example.com", "https://api.orga-ai.com")
+        
+        assert base == credentials_key("key", "dev@example.com", "https://api.orga-ai.com")
+        assert base != credentials_key("other", "dev@example.com", "https://api.orga-ai.com")
+        assert base != credentials_key("key", "ops@example.com", "https://api.orga-ai.com")
+        assert base != credentials_key("key", "dev@example.com", "https://eu.orga-ai.com")
+        assert "key" not in base
@@ -5,17 +5,27 @@ error conditions, and data parsing. They use pytest and pytest-httpx
 for mocking HTTP requests.
 """
 
+import asyncio
+import json
+import os
+import threading
+import time
+
 import pytest
 import httpx
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
-from orga_ai import OrgaAI, OrgaAIConfig
+from orga_ai import OrgaAI, OrgaAIConfig, IceServer, MemoryCacheBackend
+from orga_ai.testing import FakeOrgaAPI
 from orga_ai.errors import (
     OrgaAIError,
     OrgaAIAuthenticationError,
     OrgaAIServerError,
+    OrgaAIDrainingError,
 )
 
+from tests.helpers import make_config
+
 
 class TestOrgaAIClient:
     """Test cases for the OrgaAI client class."""
@@ -56,6 +66,52 @@ class TestOrgaAIClient:
         assert client.debug is True
         assert client.timeout == 30000
     
+    def test_init_multiple_base_urls(self):
+        """Test that a list of base URLs is accepted."""
+        config = OrgaAIConfig(
+            api_key="test_key",
+            user_email="test@example.com",
+            base_url=["https://us.api.com", "https://eu.api.com"]
+        )
+        client = OrgaAI(config)
+        assert client.base_urls == ["https://us.api.com", "https://eu.api.com"]
+        assert client.base_url == "https://us.api.com"
+    
+    def test_init_dns_cache(self):
+        """Test that a custom resolver enables the DNS cache."""
+        resolver = AsyncMock()
+        config = OrgaAIConfig(
+            api_key="test_key",
+            user_email="test@example.com",
+            dns_resolver=resolver
+        )
+        client = OrgaAI(config)
+        assert client._dns.resolver is resolver
+        assert client.stats()["dns"]["misses"] == 0
+    
+    def test_init_without_dns_cache(self, client):
+        """Test that the DNS cache is off by default."""
+        assert client._dns is None
+        assert client.stats()["dns"] is None
+    
+    def test_http_client_created_lazily(self, client):
+        """Test that the HTTP client is only built on first use."""
+        assert client._http_client is None
+        assert isinstance(client._client, httpx.AsyncClient)
+        assert client._http_client is client._client
+    
+    def test_ssl_context_shared(self, config):
+        """Test that clients share one SSL context instead of loading CAs each."""
+        first = OrgaAI(config)._client._transport._pool._ssl_context
+        second = OrgaAI(config)._client._transport._pool._ssl_context
+        assert first is second
+    
+    @pytest.mark.asyncio
+    async def test_close_without_requests(self, client):
+        """Test that closing an unused client does not create an HTTP client."""
+        await client.close()
+        assert client._http_client is None
+    
     def test_init_missing_api_key(self):
         """Test that client raises error when API key is missing."""
         config = OrgaAIConfig(
@@ -108,12 +164,12 @@ class TestOrgaAIClient:
         mock_client.post.return_value = AsyncMock(
             status_code=200,
             is_success=True,
-            json=AsyncMock(return_value=ephemeral_response)
+            content=json.dumps(ephemeral_response).encode()
         )
         mock_client.get.return_value = AsyncMock(
             status_code=200,
             is_success=True,
-            json=AsyncMock(return_value=ice_response)
+            content=json.dumps(ice_response).encode()
         )
         
         # Replace the client's HTTP client
@@ -178,6 +234,24 @@ class TestOrgaAIClient:
         with pytest.raises(OrgaAIServerError, match="Failed to fetch ICE servers"):
             await client._fetch_ice_servers("test_token")
     
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("trusted", [False, True])
+    async def test_fetch_ice_servers_malformed_item(self, config, trusted):
+        """Test that a server without urls is a server error, not a KeyError."""
+        config.trust_responses = trusted
+        client = OrgaAI(config)
+        mock_client = AsyncMock()
+        mock_client.get.return_value = MagicMock(
+            status_code=200,
+            is_success=True,
+            content=json.dumps({"iceServers": [{"username": "user"}]}).encode()
+        )
+        
+        client._client = mock_client
+        
+        with pytest.raises(OrgaAIServerError, match="Invalid response format"):
+            await client._fetch_ice_servers("test_token")
+    
     @pytest.mark.asyncio
     async def test_log_debug_message(self, config):
         """Test that debug messages are logged when debug is enabled."""
@@ -214,3 +288,1005 @@ class TestOrgaAIClient:
             assert output == ""
         finally:
             sys.stdout = sys.__stdout__
+
+
+class TestAuthFailureCache:
+    """Test cases for negative caching of authentication failures."""
+    
+    @pytest.fixture
+    def config(self):
+        """Create a configuration with the negative cache enabled."""
+        return OrgaAIConfig(
+            api_key="bad_api_key",
+            user_email="storm@example.com",
+            auth_failure_cache_ttl=5000
+        )
+    
+    @pytest.fixture
+    def client(self, config):
+        """Create a client with a mocked 401 response and a clean cache."""
+        client = OrgaAI(config)
+        client._auth_failures.invalidate()
+        mock_client = AsyncMock()
+        mock_client.post.return_value = AsyncMock(
+            status_code=401,
+            is_success=False,
+            reason_phrase="Unauthorized"
+        )
+        client._client = mock_client
+        yield client
+        client._auth_failures.invalidate()
+    
+    @pytest.mark.asyncio
+    async def test_repeated_401_is_suppressed(self, client):
+        """Test that repeated 401s are answered locally."""
+        for _ in range(3):
+            with pytest.raises(OrgaAIAuthenticationError, match="Invalid API key or user email"):
+                await client.get_session_config()
+        
+        assert client._client.post.call_count == 1
+        assert client.stats()["auth_failures"]["suppressed"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_cache_shared_between_clients(self, client, config):
+        """Test that a new client with the same credentials is suppressed too."""
+        with pytest.raises(OrgaAIAuthenticationError):
+            await client.get_session_config()
+        
+        other = OrgaAI(config)
+        other._client = AsyncMock()
+        with pytest.raises(OrgaAIAuthenticationError):
+            await other.get_session_config()
+        
+        other._client.post.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_config_change_invalidates(self, client):
+        """Test that changing credentials bypasses the cached failure."""
+        with pytest.raises(OrgaAIAuthenticationError):
+            await client.get_session_config()
+        
+        client.api_key = "fixed_api_key"
+        with pytest.raises(OrgaAIAuthenticationError):
+            await client.get_session_config()
+        
+        assert client._client.post.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_invalidate_auth_failures(self, client):
+        """Test that explicit invalidation retries upstream."""
+        with pytest.raises(OrgaAIAuthenticationError):
+            await client.get_session_config()
+        
+        client.invalidate_auth_failures()
+        with pytest.raises(OrgaAIAuthenticationError):
+            await client.get_session_config()
+        
+        assert client._client.post.call_count == 2
+        assert client.stats()["auth_failures"]["suppressed"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, client):
+        """Test that failures are not cached without a TTL."""
+        client.auth_failure_cache_ttl = 0
+        for _ in range(2):
+            with pytest.raises(OrgaAIAuthenticationError):
+                await client.get_session_config()
+        
+        assert client._client.post.call_count == 2
+
+
+class TestEndpointFailover:
+    """Test cases for routing between multiple base URLs."""
+    
+    @pytest.fixture
+    def client(self):
+        """Create a client with two base URLs where the first is down."""
+        config = OrgaAIConfig(
+            api_key="test_api_key",
+            user_email="test@example.com",
+            base_url=["https://down.api.com", "https://up.api.com"]
+        )
+        client = OrgaAI(config)
+        
+        async def post(url, headers):
+            if url.startswith("https://down.api.com"):
+                raise httpx.ConnectError("Connection refused")
+            return MagicMock(
+                status_code=200,
+                is_success=True,
+                content=json.dumps({"ephemeral_token": "token"}).encode()
+            )
+        
+        mock_client = AsyncMock()
+        mock_client.post.side_effect = post
+        client._client = mock_client
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_fails_over_on_connection_error(self, client):
+        """Test that a connection error moves the request to the next endpoint."""
+        assert await client._fetch_ephemeral_token() == "token"
+        
+        urls = [call.args[0] for call in client._client.post.call_args_list]
+        assert urls[0].startswith("https://down.api.com")
+        assert urls[1].startswith("https://up.api.com")
+        assert client.stats()["endpoints"]["https://down.api.com"]["healthy"] is False
+    
+    @pytest.mark.asyncio
+    async def test_demoted_endpoint_is_skipped(self, client):
+        """Test that later requests go straight to the healthy endpoint."""
+        await client._fetch_ephemeral_token()
+        client._client.post.reset_mock()
+        
+        await client._fetch_ephemeral_token()
+        
+        assert client._client.post.call_count == 1
+        assert client._client.post.call_args.args[0].startswith("https://up.api.com")
+    
+    @pytest.mark.asyncio
+    async def test_base_url_change_reroutes(self, client):
+        """Test that setting base_url sends requests to the new endpoint alone."""
+        client.base_url = "https://new.api.com"
+        
+        assert await client._fetch_ephemeral_token() == "token"
+        
+        assert client._client.post.call_args.args[0].startswith("https://new.api.com")
+        assert client.base_urls == ["https://new.api.com"]
+        assert list(client.stats()["endpoints"]) == ["https://new.api.com"]
+    
+    @pytest.mark.asyncio
+    async def test_all_endpoints_down(self, client):
+        """Test that a network error is raised when no endpoint is reachable."""
+        client._client.post.side_effect = httpx.ConnectError("Connection refused")
+        
+        with pytest.raises(OrgaAIServerError, match="Network error"):
+            await client._fetch_ephemeral_token()
+    
+    @pytest.mark.asyncio
+    async def test_demoted_endpoint_is_reprobed(self, client):
+        """Test that a due endpoint is probed in the background and restored."""
+        await client._fetch_ephemeral_token()
+        client._router._endpoints[0].demoted_until = 0
+        
+        await client._fetch_ephemeral_token()
+        await asyncio.gather(*client._background_tasks)
+        
+        client._client.get.assert_called_with("https://down.api.com/")
+        assert client.stats()["endpoints"]["https://down.api.com"]["healthy"] is True
+
+
+class TestEndpointErrorResponses:
+    """Test cases for endpoints that answer with server errors."""
+    
+    @pytest.fixture
+    def client(self):
+        """Create a client with two base URLs where the first answers 503."""
+        config = OrgaAIConfig(
+            api_key="test_api_key",
+            user_email="test@example.com",
+            base_url=["https://busy.api.com", "https://up.api.com"]
+        )
+        client = OrgaAI(config)
+        
+        async def respond(url, headers):
+            if url.startswith("https://busy.api.com"):
+                return MagicMock(
+                    status_code=503,
+                    is_success=False,
+                    reason_phrase="Service Unavailable",
+                    content=b""
+                )
+            return MagicMock(
+                status_code=200,
+                is_success=True,
+                content=json.dumps({
+                    "ephemeral_token": "token",
+                    "iceServers": [{"urls": "stun:up"}],
+                }).encode()
+            )
+        
+        mock_client = AsyncMock()
+        mock_client.post.side_effect = respond
+        mock_client.get.side_effect = respond
+        client._client = mock_client
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_get_fails_over_on_503(self, client):
+        """Test that an ICE request answered with 503 moves to the next endpoint."""
+        servers = await client._fetch_ice_servers("token")
+        
+        urls = [call.args[0] for call in client._client.get.call_args_list]
+        endpoints = client.stats()["endpoints"]
+        assert servers[0].urls == "stun:up"
+        assert urls[0].startswith("https://busy.api.com")
+        assert urls[1].startswith("https://up.api.com")
+        assert endpoints["https://busy.api.com"]["healthy"] is False
+        assert endpoints["https://busy.api.com"]["failures"] == 1
+        assert endpoints["https://busy.api.com"]["error_rate"] > 0
+    
+    @pytest.mark.asyncio
+    async def test_erroring_endpoint_ranked_last(self, client):
+        """Test that later requests go straight to the endpoint serving requests."""
+        await client._fetch_ice_servers("token")
+        client._client.get.reset_mock()
+        
+        await client._fetch_ice_servers("token")
+        
+        assert client._client.get.call_count == 1
+        assert client._client.get.call_args.args[0].startswith("https://up.api.com")
+    
+    @pytest.mark.asyncio
+    async def test_post_not_retried(self, client):
+        """Test that a token request answered with 503 is not sent again elsewhere."""
+        with pytest.raises(OrgaAIServerError):
+            await client._fetch_ephemeral_token()
+        
+        assert client._client.post.call_count == 1
+        assert client.stats()["endpoints"]["https://busy.api.com"]["healthy"] is False
+
+
+class TestIceServerRanking:
+    """Test cases for optional ICE server ranking in the client."""
+    
+    @pytest.mark.asyncio
+    async def test_ranked_servers_are_returned(self):
+        """Test that the prober's ordering is used when ranking is enabled."""
+        config = OrgaAIConfig(
+            api_key="test_api_key",
+            user_email="test@example.com",
+            rank_ice_servers=True,
+            drop_unreachable_ice_servers=True
+        )
+        client = OrgaAI(config)
+        mock_client = AsyncMock()
+        mock_client.post.return_value = MagicMock(
+            status_code=200,
+            is_success=True,
+            content=json.dumps({"ephemeral_token": "token"}).encode()
+        )
+        mock_client.get.return_value = MagicMock(
+            status_code=200,
+            is_success=True,
+            content=json.dumps({"iceServers": [{"urls": "stun:a"}, {"urls": "stun:b"}]}).encode()
+        )
+        client._client = mock_client
+        client._ice_prober.rank = AsyncMock(side_effect=lambda servers, drop_unreachable: servers[::-1])
+        
+        result = await client.get_session_config()
+        
+        assert [server.urls for server in result.ice_servers] == ["stun:b", "stun:a"]
+        assert client._ice_prober.rank.call_args.kwargs == {"drop_unreachable": True}
+
+
+class TestIceSnapshotClient:
+    """Test cases for serving the first session from an ICE snapshot."""
+    
+    @pytest.fixture
+    def client(self, tmp_path):
+        """Create a client with an ICE snapshot file and mocked responses."""
+        config = OrgaAIConfig(
+            api_key="test_api_key",
+            user_email="test@example.com",
+            ice_snapshot_path=str(tmp_path / "ice.json")
+        )
+        client = OrgaAI(config)
+        mock_client = AsyncMock()
+        mock_client.post.return_value = MagicMock(
+            status_code=200,
+            is_success=True,
+            content=json.dumps({"ephemeral_token": "token"}).encode()
+        )
+        mock_client.get.return_value = MagicMock(
+            status_code=200,
+            is_success=True,
+            content=json.dumps({"iceServers": [{"urls": "stun:fresh"}]}).encode()
+        )
+        client._client = mock_client
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_snapshot_written_after_fetch(self, client):
+        """Test that fetched ICE servers are persisted for the next process."""
+        await client.get_session_config()
+        
+        assert client._ice_snapshot.load(client._credentials_key())[0].urls == "stun:fresh"
+    
+    @pytest.mark.asyncio
+    async def test_snapshot_not_rewritten_every_fetch(self, client):
+        """Test that a fresh snapshot is not rewritten on later fetches."""
+        await client.get_session_config()
+        os.unlink(client._ice_snapshot.path)
+        
+        await client.get_session_config()
+        
+        assert client._client.get.call_count == 2
+        assert not os.path.exists(client._ice_snapshot.path)
+    
+    @pytest.mark.asyncio
+    async def test_first_session_served_from_snapshot(self, client):
+        """Test that only the first session skips the ICE round-trip."""
+        client._ice_snapshot.save(client._credentials_key(), [IceServer(urls="stun:snapshot")])
+        
+        first = await client.get_session_config()
+        second = await client.get_session_config()
+        
+        assert first.ice_servers[0].urls == "stun:snapshot"
+        assert second.ice_servers[0].urls == "stun:fresh"
+        assert client._client.get.call_count == 1
+
+
+class TestSharedIceCacheClient:
+    """Test cases for sharing ICE config between worker processes."""
+    
+    def make_worker(self, path):
+        """Create a client standing in for one worker process."""
+        config = OrgaAIConfig(
+            api_key="test_api_key",
+            user_email="test@example.com",
+            shared_ice_cache_path=path
+        )
+        client = OrgaAI(config)
+        mock_client = AsyncMock()
+        mock_client.post.return_value = MagicMock(
+            status_code=200,
+            is_success=True,
+            content=json.dumps({"ephemeral_token": "token"}).encode()
+        )
+        mock_client.get.return_value = MagicMock(
+            status_code=200,
+            is_success=True,
+            content=json.dumps({"iceServers": [{"urls": "stun:shared"}]}).encode()
+        )
+        client._client = mock_client
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_second_worker_reads_shared_config(self, tmp_path):
+        """Test that only the first worker fetches ICE servers."""
+        path = str(tmp_path / "ice.shm")
+        first = self.make_worker(path)
+        second = self.make_worker(path)
+        
+        await first.get_session_config()
+        result = await second.get_session_config()
+        
+        assert result.ice_servers[0].urls == "stun:shared"
+        assert first._client.get.call_count == 1
+        second._client.get.assert_not_called()
+        await first.close()
+        await second.close()
+    
+    @pytest.mark.asyncio
+    async def test_refresh_due_triggers_one_background_refresh(self, tmp_path):
+        """Test that a due refresh is done once, in the background."""
+        path = str(tmp_path / "ice.shm")
+        first = self.make_worker(path)
+        second = self.make_worker(path)
+        first._shared_ice.write([IceServer(urls="stun:old")], ttl=60, refresh_ahead=0)
+        
+        result = await first.get_session_config()
+        await second.get_session_config()
+        await asyncio.gather(*first._background_tasks)
+        
+        assert result.ice_servers[0].urls == "stun:old"
+        assert first._client.get.call_count == 1
+        second._client.get.assert_not_called()
+        assert second._shared_ice.read().ice_servers[0].urls == "stun:shared"
+        await first.close()
+        await second.close()
+
+
+class TestCacheBackendClient:
+    """Test cases for sharing session material through a cache backend."""
+    
+    def make_node(self, backend, token="token"):
+        """Create a client standing in for one node sharing the backend."""
+        config = OrgaAIConfig(
+            api_key="test_api_key",
+            user_email="test@example.com",
+            cache_backend=backend
+        )
+        client = OrgaAI(config)
+        mock_client = AsyncMock()
+        mock_client.post.return_value = MagicMock(
+            status_code=200,
+            is_success=True,
+            content=json.dumps({"ephemeral_token": token}).encode()
+        )
+        
+        async def get(url, headers):
+            await asyncio.sleep(0.01)
+            return MagicMock(
+                status_code=200,
+                is_success=True,
+                content=json.dumps({"iceServers": [{"urls": "stun:backend"}]}).encode()
+            )
+        
+        mock_client.get.side_effect = get
+        client._client = mock_client
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_ice_config_shared_between_nodes(self):
+        """Test that a second node reads ICE servers fetched by the first."""
+        backend = MemoryCacheBackend()
+        first = self.make_node(backend)
+        second = self.make_node(backend)
+        
+        await first.get_session_config()
+        result = await second.get_session_config()
+        
+        assert result.ice_servers[0].urls == "stun:backend"
+        second._client.get.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_single_refresher_elected(self):
+        """Test that concurrent misses on several nodes fetch ICE servers once."""
+        backend = MemoryCacheBackend()
+        nodes = [self.make_node(backend) for _ in range(4)]
+        
+        results = await asyncio.gather(*(node.get_session_config() for node in nodes))
+        
+        assert all(r.ice_servers[0].urls == "stun:backend" for r in results)
+        assert sum(node._client.get.call_count for node in nodes) == 1
+    
+    @pytest.mark.asyncio
+    async def test_slow_refresher_keeps_next_refresher_lock(self):
+        """Test that a refresher outliving its lease leaves the next winner's lock."""
+        backend = MemoryCacheBackend()
+        node = self.make_node(backend)
+        node.timeout = 5  # 5 ms lease, shorter than the 10 ms fetch
+        lock_key = f"{node._cache_key('ice')}:refresh"
+        original_get = node._client.get.side_effect
+        
+        async def get(url, headers):
+            response = await original_get(url, headers)
+            assert await backend.add(lock_key, b"next", ttl=60)
+            return response
+        
+        node._client.get.side_effect = get
+        await node.get_session_config()
+        
+        assert await backend.get(lock_key) == b"next"
+    
+    @pytest.mark.asyncio
+    async def test_prefetched_sessions_claimed_once(self):
+        """Test that prefetched sessions are each handed out to one caller."""
+        backend = MemoryCacheBackend()
+        producer = self.make_node(backend, token="prefetched")
+        consumer = self.make_node(backend, token="fresh")
+        
+        assert await producer.prefetch_sessions(2) == 2
+        tokens = [(await consumer.get_session_config()).ephemeral_token for _ in range(3)]
+        
+        assert tokens == ["prefetched", "prefetched", "fresh"]
+        assert consumer.stats()["prefetched_sessions"]["served"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_expired_prefetched_sessions_are_skipped(self):
+        """Test that sessions past prefetched_session_ttl are discarded."""
+        backend = MemoryCacheBackend()
+        producer = self.make_node(backend, token="prefetched")
+        producer.prefetched_session_ttl = -1000
+        consumer = self.make_node(backend, token="fresh")
+        
+        await producer.prefetch_sessions(1)
+        
+        assert (await consumer.get_session_config()).ephemeral_token == "fresh"
+    
+    @pytest.mark.asyncio
+    async def test_unavailable_backend_does_not_fail_sessions(self):
+        """Test that backend errors fall back to direct API calls."""
+        backend = AsyncMock(spec=MemoryCacheBackend)
+        for name in ("get", "set", "add", "delete", "delete_if", "push", "claim"):
+            getattr(backend, name).side_effect = ConnectionRefusedError("backend down")
+        node = self.make_node(backend)
+        
+        result = await node.get_session_config()
+        
+        assert result.ephemeral_token == "token"
+        assert node._client.get.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_prefetch_requires_backend(self):
+        """Test that prefetching without a backend is rejected."""
+        client = OrgaAI(OrgaAIConfig(api_key="key", user_email="test@example.com"))
+        
+        with pytest.raises(OrgaAIError, match="requires a cache_backend"):
+            await client.prefetch_sessions(1)
+
+
+class TestTokenBatchingClient:
+    """Test cases for micro-batched token issuance against the local stand-in API."""
+    
+    def make_client(self, api, **overrides):
+        """Create a client with token batching pointed at the stand-in API."""
+        config = OrgaAIConfig(
+            api_key="key",
+            user_email="test@example.com",
+            base_url=api.url,
+            token_batch_window=20,
+            **overrides,
+        )
+        return OrgaAI(config)
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_sessions_share_token_request(self):
+        """Test that concurrent sessions are issued from one batched request."""
+        async with FakeOrgaAPI() as api:
+            async with self.make_client(api) as client:
+                results = await asyncio.gather(
+                    *(client.get_session_config() for _ in range(10))
+                )
+                stats = client.stats()["token_batching"]
+        
+        assert len({r.ephemeral_token for r in results}) == 10
+        assert api.requests["/v1/realtime/client-secrets"] == 1
+        assert stats["supports_batching"] is True
+        assert stats["batched_tokens"] == 10
+    
+    @pytest.mark.asyncio
+    async def test_max_size_splits_batches(self):
+        """Test that token_batch_max_size bounds the tokens per request."""
+        async with FakeOrgaAPI() as api:
+            async with self.make_client(api, token_batch_max_size=4) as client:
+                await asyncio.gather(*(client.get_session_config() for _ in range(10)))
+        
+        assert api.requests["/v1/realtime/client-secrets"] == 3
+        assert api.tokens_issued == 10
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_without_batch_support(self):
+        """Test that an API ignoring the count parameter still serves every session."""
+        async with FakeOrgaAPI(batch_tokens=False) as api:
+            async with self.make_client(api) as client:
+                results = await asyncio.gather(
+                    *(client.get_session_config() for _ in range(5))
+                )
+                stats = client.stats()["token_batching"]
+        
+        assert len({r.ephemeral_token for r in results}) == 5
+        assert api.tokens_issued == 5
+        assert stats["supports_batching"] is False
+        assert stats["individual_tokens"] == 4
+    
+    @pytest.mark.asyncio
+    async def test_rejected_count_falls_back(self):
+        """Test that a 400 for the batched request falls back to single requests."""
+        client = OrgaAI(OrgaAIConfig(
+            api_key="key", user_email="test@example.com", token_batch_window=10
+        ))
+        
+        async def post(url, headers):
+            if "count=" in url:
+                return MagicMock(status_code=400, is_success=False, reason_phrase="Bad Request")
+            return MagicMock(
+                status_code=200,
+                is_success=True,
+                content=json.dumps({"ephemeral_token": "single"}).encode(),
+            )
+        
+        client._client = MagicMock()
+        client._client.post = AsyncMock(side_effect=post)
+        
+        tokens = await asyncio.gather(*(client._issue_ephemeral_token() for _ in range(3)))
+        
+        assert tokens == ["single"] * 3
+        assert client._client.post.call_count == 4
+        assert client.stats()["token_batching"]["supports_batching"] is False
+    
+    @pytest.mark.asyncio
+    async def test_batched_authentication_failure(self):
+        """Test that a 401 on a batched request fails every caller."""
+        async with FakeOrgaAPI(api_key="other") as api:
+            async with self.make_client(api) as client:
+                results = await asyncio.gather(
+                    *(client.get_session_config() for _ in range(3)),
+                    return_exceptions=True,
+                )
+        
+        assert all(isinstance(r, OrgaAIAuthenticationError) for r in results)
+        assert api.requests["/v1/realtime/client-secrets"] == 1
+    
+    def test_batching_disabled_by_default(self):
+        """Test that tokens are fetched directly unless a window is configured."""
+        client = OrgaAI(OrgaAIConfig(api_key="key", user_email="test@example.com"))
+        
+        assert client._token_batcher is None
+        assert client.stats()["token_batching"] is None
+
+
+class TestCredentialExpiryClient:
+    """Test cases for token and ICE credential expiry."""
+    
+    def make_client(self, api, **overrides):
+        """Create a client answering from the stand-in API in memory."""
+        config = OrgaAIConfig(api_key="key", user_email="test@example.com", **overrides)
+        client = OrgaAI(config)
+        client._client = httpx.AsyncClient(transport=api.mock_transport())
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_session_reports_expiry(self):
+        """Test that sessions carry the token and ICE credential expiry."""
+        api = FakeOrgaAPI(token_ttl=60, ice_ttl=300)
+        async with self.make_client(api) as client:
+            before = time.time()
+            session = await client.get_session_config()
+        
+        assert before + 60 <= session.expires_at <= time.time() + 60
+        assert before + 300 <= session.ice_expires_at <= time.time() + 300
+        assert session.valid_until == session.expires_at
+    
+    @pytest.mark.asyncio
+    async def test_expired_cached_ice_not_served(self):
+        """Test that ICE servers whose credentials expired are fetched again."""
+        api = FakeOrgaAPI()
+        backend = MemoryCacheBackend()
+        async with self.make_client(api, cache_backend=backend) as client:
+            stale = [{"urls": "turn:stale", "expires_at": time.time() - 1}]
+            await backend.set(client._cache_key("ice"), json.dumps(stale).encode(), 60)
+            
+            session = await client.get_session_config()
+        
+        assert session.ice_servers[0].urls != "turn:stale"
+        assert api.requests["/v1/realtime/ice-config"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_cache_ttl_capped_at_expiry(self):
+        """Test that cached ICE servers are dropped when their credentials expire."""
+        api = FakeOrgaAPI(ice_ttl=0.05)
+        backend = MemoryCacheBackend()
+        async with self.make_client(api, cache_backend=backend) as client:
+            await client.get_session_config()
+            assert await backend.get(client._cache_key("ice")) is not None
+            await asyncio.sleep(0.1)
+            assert await backend.get(client._cache_key("ice")) is None
+    
+    @pytest.mark.asyncio
+    async def test_prefetched_session_expires_with_token(self):
+        """Test that a prefetched session is not handed out past its token's expiry."""
+        api = FakeOrgaAPI(token_ttl=-1)
+        backend = MemoryCacheBackend()
+        async with self.make_client(api, cache_backend=backend) as client:
+            await client.prefetch_sessions(1)
+            await client.get_session_config()
+            served = client.stats()["prefetched_sessions"]["served"]
+        
+        assert served == 0
+    
+    @pytest.mark.asyncio
+    async def test_refresh_ice_servers(self):
+        """Test that refreshed ICE servers are served until they expire."""
+        api = FakeOrgaAPI(ice_ttl=300)
+        async with self.make_client(api) as client:
+            before = time.time()
+            valid_until = await client.refresh_ice_servers()
+            sessions = [await client.get_session_config() for _ in range(3)]
+        
+        assert before + 300 <= valid_until <= time.time() + 300
+        assert api.requests["/v1/realtime/ice-config"] == 1
+        assert api.requests["/v1/realtime/client-secrets"] == 4
+        assert all(s.ice_expires_at == valid_until for s in sessions)
+    
+    @pytest.mark.asyncio
+    async def test_refresh_without_expiry_uses_ice_cache_ttl(self):
+        """Test that ICE servers of unknown expiry are kept for ice_cache_ttl."""
+        api = FakeOrgaAPI()
+        async with self.make_client(api, ice_cache_ttl=5000) as client:
+            before = time.time()
+            valid_until = await client.refresh_ice_servers()
+        
+        assert before + 5 <= valid_until <= time.time() + 5
+
+
+class TestEventLoopAffinity:
+    """Test cases for one client shared by several event loops."""
+    
+    @pytest.fixture
+    def api(self):
+        """Run the stand-in API on its own loop in a thread."""
+        api = FakeOrgaAPI().start_in_thread()
+        yield api
+        api.stop_thread()
+    
+    @pytest.fixture
+    def client(self, api):
+        """Create a client pointed at the stand-in API."""
+        return OrgaAI(OrgaAIConfig(
+            api_key="key", user_email="test@example.com", base_url=api.url
+        ))
+    
+    def test_sequential_loops(self, client):
+        """Test that the client keeps working after the loop it first used closes."""
+        first = asyncio.run(client.get_session_config())
+        second = asyncio.run(client.get_session_config())
+        
+        assert first.ephemeral_token != second.ephemeral_token
+        assert client.stats()["transports"] == 0
+    
+    def test_loops_in_threads(self, client, api):
+        """Test that threads running their own loops share one client."""
+        barrier = threading.Barrier(4)
+        results = []
+        errors = []
+        
+        async def sessions():
+            barrier.wait()
+            return await asyncio.gather(*(client.get_session_config() for _ in range(5)))
+        
+        def run():
+            try:
+                results.extend(asyncio.run(sessions()))
+            except Exception as error:
+                errors.append(error)
+        
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert errors == []
+        assert len({r.ephemeral_token for r in results}) == 20
+        assert api.requests["/v1/realtime/client-secrets"] == 20
+        # Each loop's transport was closed when its loop shut down
+        assert client.stats()["transports"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_close_reaches_other_loops(self, client):
+        """Test that close() closes the transports of other running loops."""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(client.get_session_config(), loop).result(5)
+            other = asyncio.run_coroutine_threadsafe(self._current(client), loop).result(5)
+            await client.get_session_config()
+            assert client.stats()["transports"] == 2
+            
+            await client.close()
+            for _ in range(100):
+                if other.is_closed:
+                    break
+                await asyncio.sleep(0.01)
+            
+            assert other.is_closed
+            assert client.stats()["transports"] == 0
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+    
+    @staticmethod
+    async def _current(client):
+        return client._http_client
+
+
+class TestGracefulDrain:
+    """Test cases for draining a client on shutdown."""
+    
+    @pytest.mark.asyncio
+    async def test_waits_for_calls_in_progress(self):
+        """Test that calls in progress finish and new calls are refused."""
+        async with FakeOrgaAPI(latency=0.05) as api:
+            client = OrgaAI(make_config(api.url))
+            calls = [asyncio.ensure_future(client.get_session_config()) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            assert client.stats()["in_flight"] == 3
+            
+            report = await client.drain(timeout=5)
+            sessions = await asyncio.gather(*calls)
+            with pytest.raises(OrgaAIDrainingError):
+                await client.get_session_config()
+        
+        assert report == {"abandoned": 0, "snapshot_saved": False}
+        assert len(sessions) == 3
+        assert client.stats()["draining"] is True
+        assert client.stats()["transports"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_deadline(self):
+        """Test that calls still running at the deadline are abandoned."""
+        async with FakeOrgaAPI(latency=1.0) as api:
+            client = OrgaAI(make_config(api.url))
+            call = asyncio.ensure_future(client.get_session_config())
+            await asyncio.sleep(0.01)
+            
+            started = time.monotonic()
+            report = await client.drain(timeout=0.05)
+            elapsed = time.monotonic() - started
+            with pytest.raises(OrgaAIServerError):
+                await call
+        
+        assert report["abandoned"] == 1
+        assert elapsed < 0.5
+    
+    @pytest.mark.asyncio
+    async def test_hands_ice_config_to_snapshot(self, tmp_path):
+        """Test that the next process serves its first session from the drained ICE config."""
+        path = str(tmp_path / "ice.json")
+        async with FakeOrgaAPI(ice_ttl=300) as api:
+            client = OrgaAI(make_config(api.url))
+            await client.get_session_config()
+            report = await client.drain(snapshot_path=path)
+            
+            async with OrgaAI(make_config(api.url, ice_snapshot_path=path)) as successor:
+                await successor.get_session_config()
+        
+        assert report["snapshot_saved"] is True
+        assert api.requests["/v1/realtime/ice-config"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_expired_ice_config_not_snapshotted(self, tmp_path):
+        """Test that ICE credentials expired by shutdown are not handed over."""
+        path = tmp_path / "ice.json"
+        async with FakeOrgaAPI(ice_ttl=0.01) as api:
+            client = OrgaAI(make_config(api.url))
+            await client.get_session_config()
+            await asyncio.sleep(0.02)
+            report = await client.drain(snapshot_path=str(path))
+        
+        assert report["snapshot_saved"] is False
+        assert not path.exists()
+    
+    @pytest.mark.asyncio
+    async def test_cancels_background_tasks(self):
+        """Test that background tasks are cancelled once calls have finished."""
+        async with FakeOrgaAPI() as api:
+            client = OrgaAI(make_config(api.url))
+            client._spawn(asyncio.sleep(60))
+            await client.drain()
+        
+        assert not client._background_tasks
+    
+    @pytest.mark.asyncio
+    async def test_sync_context_manager_on_running_loop(self):
+        """Test that exiting ``with`` inside a coroutine still closes the client."""
+        async with FakeOrgaAPI() as api:
+            with OrgaAI(make_config(api.url)) as client:
+                await client.get_session_config()
+            assert client.stats()["transports"] == 1
+            await asyncio.sleep(0.01)
+        
+        assert client.stats()["transports"] == 0
+
+
+class TestSpeculativeIceFetch:
+    """Test cases for fetching ICE servers alongside the ephemeral token."""
+    
+    def make_client(self, api, reject_ice=None, **overrides):
+        """Create a speculative client answering from the stand-in API in memory.
+        
+        ICE requests for which ``reject_ice`` returns True get a 401.
+        """
+        config = OrgaAIConfig(
+            api_key="key", user_email="test@example.com", speculative_ice_fetch=True, **overrides
+        )
+        client = OrgaAI(config)
+        transport = api.mock_transport()
+        if reject_ice is not None:
+            answer = transport.handler
+            
+            def handle(request):
+                if request.url.path.endswith("/ice-config") and reject_ice(request):
+                    return httpx.Response(401, json={"error": "Invalid token"})
+                return answer(request)
+            
+            transport = httpx.MockTransport(handle)
+        client._client = httpx.AsyncClient(transport=transport)
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_ice_fetch_overlaps_token_request(self):
+        """Test that the ICE request starts before the token request finishes."""
+        async with FakeOrgaAPI(latency=0.03, token_ttl=300) as api:
+            config = OrgaAIConfig(
+                api_key="key",
+                user_email="test@example.com",
+                base_url=api.url,
+                speculative_ice_fetch=True,
+                slow_call_threshold=0,
+            )
+            async with OrgaAI(config) as client:
+                await client.get_session_config()
+                await client.get_session_config()
+                serial, speculative = client.slow_calls()
+                stats = client.stats()["speculative_ice"]
+        
+        def requests(record):
+            return [event for event in record["events"] if event["event"] == "request"]
+        
+        first, second = requests(serial)
+        assert second["at_ms"] >= first["at_ms"] + first["duration_ms"]
+        first, second = requests(speculative)
+        assert second["at_ms"] < first["at_ms"] + first["duration_ms"]
+        assert stats == {"attempts": 1, "used": 1, "fallbacks": 0}
+    
+    @pytest.mark.asyncio
+    async def test_recent_token_authorizes_ice_fetch(self):
+        """Test that the ICE request carries the previous session's token."""
+        api = FakeOrgaAPI(token_ttl=300)
+        seen = []
+        
+        def record(request):
+            seen.append(request.headers["authorization"])
+            return False
+        
+        async with self.make_client(api, reject_ice=record) as client:
+            first = await client.get_session_config()
+            second = await client.get_session_config()
+        
+        assert seen == [f"Bearer {first.ephemeral_token}"] * 2
+        assert second.ephemeral_token != first.ephemeral_token
+    
+    @pytest.mark.asyncio
+    async def test_api_key_used_without_recent_token(self):
+        """Test that the first session's ICE fetch uses the API key when allowed."""
+        api = FakeOrgaAPI()
+        async with self.make_client(api, ice_api_key_auth=True) as client:
+            await client.get_session_config()
+            stats = client.stats()["speculative_ice"]
+        
+        assert stats == {"attempts": 1, "used": 1, "fallbacks": 0}
+        assert api.requests["/v1/realtime/ice-config"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_when_speculative_fetch_rejected(self):
+        """Test that a rejected speculative fetch is retried with the new token."""
+        api = FakeOrgaAPI()
+        reject_api_key = lambda request: request.headers["authorization"] == "Bearer key"
+        async with self.make_client(api, reject_ice=reject_api_key, ice_api_key_auth=True) as client:
+            session_config = await client.get_session_config()
+            stats = client.stats()["speculative_ice"]
+        
+        assert len(session_config.ice_servers) == 2
+        assert stats == {"attempts": 1, "used": 0, "fallbacks": 1}
+        # The rejected request never reached the stand-in
+        assert api.requests["/v1/realtime/ice-config"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_revoked_token_forgotten(self):
+        """Test that a recent token the API rejects is not tried again."""
+        api = FakeOrgaAPI(token_ttl=300)
+        revoked = set()
+        
+        async with self.make_client(
+            api, reject_ice=lambda request: request.headers["authorization"] in revoked
+        ) as client:
+            first = await client.get_session_config()
+            revoked.add(f"Bearer {first.ephemeral_token}")
+            await client.get_session_config()
+            revoked.clear()
+            await client.get_session_config()
+            stats = client.stats()["speculative_ice"]
+        
+        assert stats == {"attempts": 2, "used": 1, "fallbacks": 1}
+    
+    @pytest.mark.asyncio
+    async def test_expiring_token_not_used(self):
+        """Test that a token expiring within the request timeout is not used."""
+        api = FakeOrgaAPI(token_ttl=5)
+        async with self.make_client(api, timeout=10000) as client:
+            await client.get_session_config()
+            await client.get_session_config()
+            stats = client.stats()["speculative_ice"]
+        
+        assert stats["attempts"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_token_error_raised(self):
+        """Test that a failed token request fails the call even if ICE succeeded."""
+        api = FakeOrgaAPI(api_key="other")
+        async with self.make_client(api, ice_api_key_auth=True) as client:
+            with pytest.raises(OrgaAIAuthenticationError):
+                await client.get_session_config()
+    
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self):
+        """Test that the ICE fetch waits for the token unless enabled."""
+        client = OrgaAI(OrgaAIConfig(api_key="key", user_email="test@example.com"))
+        
+        assert client.stats()["speculative_ice"] is None
@@ -0,0 +1,53 @@
+"""Tests for low-contention counters.
+
+These tests verify that Counters adds up increments from many threads and
+folds the shards of exited threads into a retired total.
+"""
+
+import threading
+
+from orga_ai.counters import Counters
+
+
+class TestCounters:
+    """Test cases for the Counters class."""
+
+    def test_counts_in_one_thread(self):
+        """Test add, get and snapshot from a single thread."""
+        counters = Counters("hits", "misses")
+        counters.add("hits")
+        counters.add("hits", 4)
+
+        assert counters.get("hits") == 5
+        assert counters.snapshot() == {"hits": 5, "misses": 0}
+
+    def test_no_lost_updates_across_threads(self):
+        """Test that concurrent increments from many threads all count."""
+        counters = Counters("hits")
+        barrier = threading.Barrier(16)
+
+        def run():
+            barrier.wait()
+            for _ in range(10000):
+                counters.add("hits")
+
+        threads = [threading.Thread(target=run) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counters.get("hits") == 160000
+
+    def test_exited_threads_are_folded(self):
+        """Test that shards of finished threads do not accumulate."""
+        counters = Counters("hits")
+
+        for _ in range(50):
+            thread = threading.Thread(target=counters.add, args=("hits",))
+            thread.start()
+            thread.join()
+        counters.add("hits")
+
+        assert counters.get("hits") == 51
+        assert len(counters._shards) <= 2
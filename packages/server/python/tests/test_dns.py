@@ -0,0 +1,301 @@
+"""Tests for the DNS resolution cache.
+
+These tests use a stub resolver and a fake network backend, plus one
+end-to-end request through httpx against a local HTTP server.
+"""
+
+import asyncio
+import socket
+import threading
+
+import httpcore
+import httpx
+import pytest
+
+from orga_ai.dns import (
+    CachingDNSTransport,
+    CachingNetworkBackend,
+    CachingResolver,
+    interleave_families,
+)
+
+
+class StubResolver:
+    """Resolver returning canned answers and counting queries."""
+    
+    def __init__(self, addresses, ttl=None):
+        self.addresses = addresses
+        self.ttl = ttl
+        self.queries = 0
+        self.fail = False
+    
+    async def resolve(self, host, port):
+        self.queries += 1
+        await asyncio.sleep(0)
+        if self.fail:
+            raise socket.gaierror("Temporary failure in name resolution")
+        return list(self.addresses), self.ttl
+
+
+class FakeStream(httpcore.AsyncNetworkStream):
+    """Network stream that only records whether it was closed."""
+    
+    def __init__(self, address):
+        self.address = address
+        self.closed = False
+    
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeBackend(httpcore.AsyncNetworkBackend):
+    """Network backend with per-address connect delays and failures."""
+    
+    def __init__(self, delays=None, failures=()):
+        self.delays = delays or {}
+        self.failures = set(failures)
+        self.attempts = []
+    
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        self.attempts.append(host)
+        await asyncio.sleep(self.delays.get(host, 0))
+        if host in self.failures:
+            raise httpcore.ConnectError(f"Connection refused: {host}")
+        return FakeStream(host)
+
+
+class TestCachingResolver:
+    """Test cases for the CachingResolver class."""
+    
+    @pytest.mark.asyncio
+    async def test_caches_within_ttl(self, clock):
+        """Test that repeated lookups within the TTL hit the cache."""
+        stub = StubResolver(["10.0.0.1"], ttl=30)
+        resolver = CachingResolver(stub, clock=clock)
+        
+        assert await resolver.resolve("api.orga-ai.com", 443) == ["10.0.0.1"]
+        clock.now = 10
+        assert await resolver.resolve("api.orga-ai.com", 443) == ["10.0.0.1"]
+        
+        assert stub.queries == 1
+        assert resolver.stats()["hits"] == 1
+        assert resolver.stats()["misses"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_honours_reported_ttl(self, clock):
+        """Test that the upstream TTL, not the default, controls expiry."""
+        stub = StubResolver(["10.0.0.1"], ttl=5)
+        resolver = CachingResolver(stub, default_ttl=60, refresh_ahead=1.0, clock=clock)
+        
+        await resolver.resolve("api.orga-ai.com", 443)
+        clock.now = 5
+        await resolver.resolve("api.orga-ai.com", 443)
+        
+        assert stub.queries == 2
+    
+    @pytest.mark.asyncio
+    async def test_default_ttl_when_unreported(self, clock):
+        """Test that the default TTL applies when none is reported."""
+        stub = StubResolver(["10.0.0.1"])
+        resolver = CachingResolver(stub, default_ttl=60, refresh_ahead=1.0, clock=clock)
+        
+        await resolver.resolve("api.orga-ai.com", 443)
+        clock.now = 59
+        await resolver.resolve("api.orga-ai.com", 443)
+        
+        assert stub.queries == 1
+    
+    @pytest.mark.asyncio
+    async def test_background_refresh(self, clock):
+        """Test that a lookup near expiry serves the cache and refreshes."""
+        stub = StubResolver(["10.0.0.1"], ttl=10)
+        resolver = CachingResolver(stub, refresh_ahead=0.8, clock=clock)
+        await resolver.resolve("api.orga-ai.com", 443)
+        
+        stub.addresses = ["10.0.0.2"]
+        clock.now = 9
+        assert await resolver.resolve("api.orga-ai.com", 443) == ["10.0.0.1"]
+        await asyncio.sleep(0.01)
+        assert await resolver.resolve("api.orga-ai.com", 443) == ["10.0.0.2"]
+        
+        assert stub.queries == 2
+        assert resolver.stats()["refreshes"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_serves_stale_on_failure(self, clock):
+        """Test that an expired entry is served if the resolver fails."""
+        stub = StubResolver(["10.0.0.1"], ttl=10)
+        resolver = CachingResolver(stub, stale_ttl=30, clock=clock)
+        await resolver.resolve("api.orga-ai.com", 443)
+        
+        stub.fail = True
+        clock.now = 20
+        assert await resolver.resolve("api.orga-ai.com", 443) == ["10.0.0.1"]
+        clock.now = 45
+        with pytest.raises(socket.gaierror):
+            await resolver.resolve("api.orga-ai.com", 443)
+        
+        assert resolver.stats()["stale_served"] == 1
+        assert resolver.stats()["failures"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_coalesces_concurrent_misses(self):
+        """Test that concurrent misses share one upstream query."""
+        stub = StubResolver(["10.0.0.1"])
+        resolver = CachingResolver(stub)
+        
+        results = await asyncio.gather(*(resolver.resolve("api.orga-ai.com", 443) for _ in range(5)))
+        
+        assert results == [["10.0.0.1"]] * 5
+        assert stub.queries == 1
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_lookup(self):
+        """Test that cancelling the caller that started a lookup spares the others."""
+        stub = StubResolver(["10.0.0.1"])
+        release = asyncio.Event()
+        resolve = stub.resolve
+        
+        async def slow_resolve(host, port):
+            await release.wait()
+            return await resolve(host, port)
+        
+        stub.resolve = slow_resolve
+        resolver = CachingResolver(stub)
+        first = asyncio.ensure_future(resolver.resolve("api.orga-ai.com", 443))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(resolver.resolve("api.orga-ai.com", 443))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        
+        assert await second == ["10.0.0.1"]
+        assert first.cancelled()
+        assert stub.queries == 1
+    
+    @pytest.mark.asyncio
+    async def test_aclose_fails_waiters(self):
+        """Test that a lookup cancelled by aclose() fails its waiters with OSError."""
+        stub = StubResolver(["10.0.0.1"])
+        
+        async def hang(host, port):
+            await asyncio.Event().wait()
+        
+        stub.resolve = hang
+        resolver = CachingResolver(stub)
+        waiter = asyncio.ensure_future(resolver.resolve("api.orga-ai.com", 443))
+        await asyncio.sleep(0)
+        await resolver.aclose()
+        
+        with pytest.raises(OSError):
+            await waiter
+
+
+class TestHappyEyeballs:
+    """Test cases for connection racing across cached addresses."""
+    
+    def test_interleave_families(self):
+        """Test that address families alternate, keeping the first family first."""
+        addresses = ["2001:db8::1", "2001:db8::2", "10.0.0.1", "10.0.0.2"]
+        
+        assert interleave_families(addresses) == ["2001:db8::1", "10.0.0.1", "2001:db8::2", "10.0.0.2"]
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_after_failure(self):
+        """Test that a refused address moves on to the next one."""
+        backend = FakeBackend(failures={"10.0.0.1"})
+        network = CachingNetworkBackend(backend, CachingResolver(StubResolver(["10.0.0.1", "10.0.0.2"])))
+        
+        stream = await network.connect_tcp("api.orga-ai.com", 443)
+        
+        assert stream.address == "10.0.0.2"
+    
+    @pytest.mark.asyncio
+    async def test_slow_address_is_raced(self):
+        """Test that a hanging address does not block the connection."""
+        backend = FakeBackend(delays={"10.0.0.1": 5})
+        resolver = CachingResolver(StubResolver(["10.0.0.1", "10.0.0.2"]))
+        network = CachingNetworkBackend(backend, resolver, happy_eyeballs_delay=0.01)
+        
+        stream = await asyncio.wait_for(network.connect_tcp("api.orga-ai.com", 443), 1)
+        
+        assert stream.address == "10.0.0.2"
+        assert backend.attempts == ["10.0.0.1", "10.0.0.2"]
+        assert await resolver.resolve("api.orga-ai.com", 443) == ["10.0.0.2", "10.0.0.1"]
+    
+    @pytest.mark.asyncio
+    async def test_all_addresses_fail(self):
+        """Test that the last connection error is raised when nothing connects."""
+        backend = FakeBackend(failures={"10.0.0.1", "10.0.0.2"})
+        network = CachingNetworkBackend(backend, CachingResolver(StubResolver(["10.0.0.1", "10.0.0.2"])))
+        
+        with pytest.raises(httpcore.ConnectError):
+            await network.connect_tcp("api.orga-ai.com", 443)
+    
+    @pytest.mark.asyncio
+    async def test_ip_literal_bypasses_resolver(self):
+        """Test that IP hosts are connected to directly."""
+        stub = StubResolver(["10.0.0.1"])
+        network = CachingNetworkBackend(FakeBackend(), CachingResolver(stub))
+        
+        stream = await network.connect_tcp("192.0.2.1", 443)
+        
+        assert stream.address == "192.0.2.1"
+        assert stub.queries == 0
+
+
+class TestCachingDNSTransport:
+    """Test cases for the httpx transport integration."""
+    
+    @pytest.mark.asyncio
+    async def test_request_through_stub_resolver(self):
+        """Test that httpx requests resolve hosts through the cache."""
+        async def handle(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+            writer.close()
+        
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        stub = StubResolver(["127.0.0.1"])
+        resolver = CachingResolver(stub)
+        
+        try:
+            async with httpx.AsyncClient(transport=CachingDNSTransport(resolver)) as client:
+                first = await client.get(f"http://api.orga-ai.test:{port}/")
+                second = await client.get(f"http://api.orga-ai.test:{port}/")
+        finally:
+            server.close()
+        
+        assert first.text == "ok" and second.text == "ok"
+        assert stub.queries == 1
+        assert resolver.stats()["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_close_spares_other_loops(self):
+        """Test that closing one loop's transport leaves other loops' lookups running."""
+        stub = StubResolver(["10.0.0.1"])
+        resolve = stub.resolve
+        
+        async def slow_resolve(host, port):
+            await asyncio.sleep(0.1)
+            return await resolve(host, port)
+        
+        stub.resolve = slow_resolve
+        resolver = CachingResolver(stub)
+        other = asyncio.new_event_loop()
+        thread = threading.Thread(target=other.run_forever)
+        thread.start()
+        try:
+            lookup = asyncio.run_coroutine_threadsafe(
+                resolver.resolve("api.orga-ai.com", 443), other
+            )
+            await asyncio.sleep(0.02)
+            await CachingDNSTransport(resolver).aclose()
+            
+            assert await asyncio.wrap_future(lookup) == ["10.0.0.1"]
+        finally:
+            other.call_soon_threadsafe(other.stop)
+            thread.join()
+            other.close()
@@ -10,6 +10,8 @@ from orga_ai.errors import (
     OrgaAIError,
     OrgaAIAuthenticationError,
     OrgaAIServerError,
+    OrgaAIDrainingError,
+    AgentUnavailableError,
 )
 
 
@@ -76,6 +78,26 @@ class TestOrgaAIErrors:
         assert error.code == "SERVER_ERROR"
         assert error.name == "OrgaAIServerError"
     
+    def test_draining_error(self):
+        """Test draining error defaults."""
+        error = OrgaAIDrainingError()
+        
+        assert error.message == "Client is draining and accepts no new requests"
+        assert error.status is None
+        assert error.code == "CLIENT_DRAINING"
+        assert error.name == "OrgaAIDrainingError"
+        assert isinstance(error, OrgaAIError)
+    
+    def test_agent_unavailable_error(self):
+        """Test agent unavailable error defaults."""
+        error = AgentUnavailableError()
+        
+        assert error.message == "Session agent is unavailable"
+        assert error.status is None
+        assert error.code == "AGENT_UNAVAILABLE"
+        assert error.name == "AgentUnavailableError"
+        assert isinstance(error, OrgaAIError)
+    
     def test_error_inheritance(self):
         """Test that custom errors inherit from OrgaAIError."""
         auth_error = OrgaAIAuthenticationError()
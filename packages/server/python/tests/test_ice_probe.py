@@ -0,0 +1,225 @@
+"""Tests for ICE server reachability probing.
+
+These tests run against a local STUN stand-in (a UDP socket answering
+binding requests) and a local TCP listener standing in for a TURNS server.
+"""
+
+import asyncio
+import socket
+import struct
+
+import pytest
+
+from orga_ai.ice_probe import (
+    STUN_BINDING_SUCCESS,
+    STUN_MAGIC_COOKIE,
+    IceServerProber,
+    IceTarget,
+    RttCache,
+    build_binding_request,
+    is_binding_response,
+    parse_ice_url,
+)
+from orga_ai.types import IceServer
+
+
+class StunStandIn(asyncio.DatagramProtocol):
+    """Minimal STUN server that answers binding requests after the first ``drop``."""
+    
+    def __init__(self, delay=0.0, drop=0):
+        self.delay = delay
+        self.drop = drop
+        self.requests = 0
+    
+    def connection_made(self, transport):
+        self.transport = transport
+    
+    def datagram_received(self, data, addr):
+        self.requests += 1
+        if self.requests <= self.drop:
+            return
+        response = struct.pack("!HHI", STUN_BINDING_SUCCESS, 0, STUN_MAGIC_COOKIE) + data[8:20]
+        loop = asyncio.get_running_loop()
+        loop.call_later(self.delay, self.transport.sendto, response, addr)
+
+
+async def start_stun(delay=0.0, drop=0):
+    """Start a STUN stand-in on a free local port."""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: StunStandIn(delay, drop), local_addr=("127.0.0.1", 0)
+    )
+    return transport, protocol, transport.get_extra_info("sockname")[1]
+
+
+def unused_udp_port():
+    """Return a local UDP port with nothing listening on it."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestParseIceUrl:
+    """Test cases for ICE URL parsing."""
+    
+    def test_stun_default_port(self):
+        """Test that STUN URLs default to port 3478 over UDP."""
+        assert parse_ice_url("stun:stun.example.com") == IceTarget("stun.example.com", 3478, "udp")
+    
+    def test_turn_tcp_transport(self):
+        """Test that the transport parameter selects TCP."""
+        target = parse_ice_url("turn:turn.example.com:80?transport=tcp")
+        assert target == IceTarget("turn.example.com", 80, "tcp")
+    
+    def test_turns_is_tcp(self):
+        """Test that TURNS URLs are probed over TCP on port 5349."""
+        assert parse_ice_url("turns:turn.example.com") == IceTarget("turn.example.com", 5349, "tcp")
+    
+    def test_ipv6_literal(self):
+        """Test that bracketed IPv6 literals are parsed."""
+        assert parse_ice_url("stun:[::1]:3479") == IceTarget("::1", 3479, "udp")
+    
+    def test_unknown_scheme(self):
+        """Test that unsupported URLs are rejected."""
+        assert parse_ice_url("https://example.com") is None
+        assert parse_ice_url("stun:host:notaport") is None
+
+
+class TestStunMessages:
+    """Test cases for STUN message encoding."""
+    
+    def test_binding_request_format(self):
+        """Test that the binding request has a valid STUN header."""
+        request, transaction_id = build_binding_request()
+        
+        assert len(request) == 20
+        assert struct.unpack("!HHI", request[:8]) == (0x0001, 0, STUN_MAGIC_COOKIE)
+        assert request[8:] == transaction_id
+    
+    def test_rejects_mismatched_transaction(self):
+        """Test that responses to other transactions are ignored."""
+        _, transaction_id = build_binding_request()
+        response = struct.pack("!HHI", STUN_BINDING_SUCCESS, 0, STUN_MAGIC_COOKIE) + bytes(12)
+        
+        assert not is_binding_response(response, transaction_id)
+        assert is_binding_response(response[:8] + transaction_id, transaction_id)
+
+
+class TestIceServerProber:
+    """Test cases for the IceServerProber class."""
+    
+    @pytest.fixture
+    def prober(self):
+        """Create a prober with a private cache and a short timeout."""
+        return IceServerProber(timeout=0.2, cache=RttCache())
+    
+    @pytest.mark.asyncio
+    async def test_probe_stun(self, prober):
+        """Test that a STUN binding round-trip is measured."""
+        transport, stun, port = await start_stun()
+        try:
+            rtt = await prober.probe(f"stun:127.0.0.1:{port}")
+        finally:
+            transport.close()
+        
+        assert rtt is not None and rtt < 0.2
+        assert stun.requests == 1
+    
+    @pytest.mark.asyncio
+    async def test_lost_request_retransmitted(self):
+        """Test that a binding request lost on the way is sent again."""
+        prober = IceServerProber(timeout=0.5, cache=RttCache())
+        transport, stun, port = await start_stun(drop=2)
+        try:
+            rtt = await prober.probe(f"stun:127.0.0.1:{port}")
+        finally:
+            transport.close()
+        
+        assert rtt is not None and rtt >= 0.3
+        assert stun.requests == 3
+    
+    @pytest.mark.asyncio
+    async def test_probe_unreachable(self, prober):
+        """Test that a silent or refusing server is unreachable."""
+        assert await prober.probe(f"stun:127.0.0.1:{unused_udp_port()}") is None
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("scheme", ["stun", "turns"])
+    async def test_probe_invalid_hostname(self, prober, scheme):
+        """Test that a hostname the IDNA codec rejects is unreachable."""
+        url = f"{scheme}:{'a' * 64}.example.com:3478"
+        
+        assert await prober.probe(url) is None
+    
+    @pytest.mark.asyncio
+    async def test_probe_tcp(self, prober):
+        """Test that TURNS servers are probed with a TCP connect."""
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            rtt = await prober.probe(f"turns:127.0.0.1:{port}")
+        finally:
+            server.close()
+        
+        assert rtt is not None
+    
+    @pytest.mark.asyncio
+    async def test_results_are_cached(self, prober):
+        """Test that a target is only probed once within the cache TTL."""
+        transport, stun, port = await start_stun()
+        try:
+            await prober.probe(f"stun:127.0.0.1:{port}")
+            await prober.probe(f"turn:127.0.0.1:{port}")
+        finally:
+            transport.close()
+        
+        assert stun.requests == 1
+        assert prober.probes_sent == 1
+    
+    @pytest.mark.asyncio
+    async def test_rank_orders_by_rtt(self, prober):
+        """Test that servers are reordered fastest first, unreachable last."""
+        slow_transport, _, slow_port = await start_stun(delay=0.05)
+        fast_transport, _, fast_port = await start_stun()
+        dead_port = unused_udp_port()
+        servers = [
+            IceServer(urls=f"stun:127.0.0.1:{dead_port}"),
+            IceServer(urls=f"stun:127.0.0.1:{slow_port}"),
+            IceServer(
+                urls=[f"turn:127.0.0.1:{dead_port}", f"turn:127.0.0.1:{fast_port}"],
+                username="user",
+                credential="pass"
+            ),
+        ]
+        try:
+            ranked = await prober.rank(servers)
+        finally:
+            slow_transport.close()
+            fast_transport.close()
+        
+        assert ranked[0].urls == [f"turn:127.0.0.1:{fast_port}", f"turn:127.0.0.1:{dead_port}"]
+        assert ranked[0].username == "user"
+        assert ranked[1] is servers[1]
+        assert ranked[2] is servers[0]
+    
+    @pytest.mark.asyncio
+    async def test_rank_drop_unreachable(self, prober):
+        """Test that unreachable servers can be filtered out."""
+        transport, _, port = await start_stun()
+        servers = [
+            IceServer(urls=f"stun:127.0.0.1:{unused_udp_port()}"),
+            IceServer(urls=f"stun:127.0.0.1:{port}"),
+        ]
+        try:
+            ranked = await prober.rank(servers, drop_unreachable=True)
+        finally:
+            transport.close()
+        
+        assert ranked == [servers[1]]
+    
+    @pytest.mark.asyncio
+    async def test_rank_keeps_all_when_none_reachable(self, prober):
+        """Test that filtering never leaves the client without ICE servers."""
+        servers = [IceServer(urls=f"stun:127.0.0.1:{unused_udp_port()}")]
+        
+        assert await prober.rank(servers, drop_unreachable=True) == servers
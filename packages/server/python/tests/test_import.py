@@ -0,0 +1,69 @@
+"""Import-time benchmark for the OrgaAI package.
+
+Cold starts in serverless runtimes pay for every module imported. These tests
+run ``import orga_ai`` in a fresh interpreter and check that importing types
+and errors does not pull in the HTTP stack, and that the import stays within
+a time budget.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+# Generous so the test is stable on slow CI machines; a regression that pulls
+# httpx back into the import path roughly doubles the measured time
+IMPORT_BUDGET_SECONDS = 0.15
+
+HEAVY_MODULES = ["httpx", "httpcore", "pydantic", "ssl", "orga_ai.client"]
+
+
+def run_python(code):
+    """Run code in a fresh interpreter with the current import path."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+class TestImportTime:
+    """Test cases for cold-start import cost."""
+    
+    def test_types_and_errors_do_not_import_http_stack(self):
+        """Test that importing types and errors leaves httpx unloaded."""
+        loaded = run_python(
+            "import json, sys\n"
+            "from orga_ai import OrgaAIConfig, SessionConfig, IceServer, OrgaAIError\n"
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+        )
+        assert loaded == []
+    
+    def test_client_is_imported_on_access(self):
+        """Test that the client is available from the package root.
+        
+        The HTTP library is only imported once a client picks its transport.
+        """
+        loaded = run_python(
+            "import json, sys\n"
+            "import orga_ai\n"
+            "client_class = orga_ai.OrgaAI\n"
+            "imported = 'httpx' in sys.modules\n"
+            "orga_ai.OrgaAI(orga_ai.OrgaAIConfig(api_key='key', user_email='a@example.com'))\n"
+            "print(json.dumps([client_class.__module__, imported, 'httpx' in sys.modules]))\n"
+        )
+        assert loaded == ["orga_ai.client", False, True]
+    
+    def test_import_time_budget(self):
+        """Benchmark: cold ``import orga_ai`` must stay within budget."""
+        timings = run_python(
+            "import json, time\n"
+            "started = time.perf_counter()\n"
+            "import orga_ai\n"
+            "print(json.dumps(time.perf_counter() - started))\n"
+        )
+        assert timings < IMPORT_BUDGET_SECONDS, f"import orga_ai took {timings * 1000:.1f} ms"
@@ -0,0 +1,190 @@
+"""Tests for session leases.
+
+These tests verify that sessions released unused go back into the ready
+pool while they are still valid, are handed out once more, and are counted
+as reused or discarded.
+"""
+
+import threading
+import time
+
+import httpx
+import pytest
+
+from orga_ai import OrgaAI, OrgaAIConfig, SessionConfig
+from orga_ai.leases import SessionPool
+from orga_ai.testing import FakeOrgaAPI
+
+
+def session(token, expires_at=None):
+    return SessionConfig(ephemeral_token=token, ice_servers=[], expires_at=expires_at)
+
+
+class TestSessionPool:
+    """Test cases for the SessionPool class."""
+
+    def make_pool(self, **overrides):
+        options = dict(size=10, lease_ttl=30.0, min_validity=5.0)
+        options.update(overrides)
+        return SessionPool(**options)
+
+    def test_release_and_reuse(self):
+        """Test that a released session is handed out again."""
+        pool = self.make_pool()
+        pool.lease(session("a"))
+
+        assert pool.release("a") is True
+        assert pool.take().ephemeral_token == "a"
+        assert pool.take() is None
+        assert pool.stats() == {
+            "acquired": 1, "released": 1, "reused": 1, "discarded": 0,
+            "outstanding": 0, "ready": 0,
+        }
+
+    def test_release_once(self):
+        """Test that only outstanding leases can be released."""
+        pool = self.make_pool()
+        pool.lease(session("a"))
+
+        assert pool.release("a") is True
+        assert pool.release("a") is False
+        assert pool.release("unknown") is False
+        assert len(pool) == 1
+
+    def test_expiring_session_discarded(self):
+        """Test that a session without enough validity left is not pooled."""
+        pool = self.make_pool()
+        pool.lease(session("a", expires_at=time.time() + 2))
+
+        assert pool.release("a") is False
+        assert pool.stats()["discarded"] == 1
+
+    def test_stale_pooled_session_skipped(self):
+        """Test that pooled sessions which have run low on validity are discarded."""
+        pool = self.make_pool(min_validity=0.05)
+        pool.lease(session("a", expires_at=time.time() + 0.1))
+        pool.release("a")
+        time.sleep(0.06)
+
+        assert pool.take() is None
+        assert pool.stats()["discarded"] == 1
+
+    def test_pool_bounded(self):
+        """Test that a full pool drops the session closest to expiry."""
+        pool = self.make_pool(size=2)
+        now = time.time()
+        for token, lifetime in (("a", 60), ("b", 30), ("c", 90)):
+            pool.lease(session(token, expires_at=now + lifetime))
+            pool.release(token)
+
+        assert [pool.take().ephemeral_token for _ in range(2)] == ["c", "a"]
+        assert pool.stats()["discarded"] == 1
+
+    def test_expired_leases_forgotten(self):
+        """Test that leases never released are dropped once they expire."""
+        pool = self.make_pool(lease_ttl=0.01)
+        pool.lease(session("a"))
+        time.sleep(0.02)
+        pool.lease(session("b"))
+
+        assert pool.stats()["outstanding"] == 1
+        assert pool.release("a") is False
+
+    def test_release_keeps_first_deadline(self):
+        """Test that leasing a session of unknown expiry again does not extend it."""
+        pool = self.make_pool(lease_ttl=0.1, min_validity=0.02)
+        pool.lease(session("a"))
+        time.sleep(0.05)
+        assert pool.release("a") is True
+        pool.lease(pool.take())
+        time.sleep(0.05)
+
+        assert pool.release("a") is False
+        assert pool.take() is None
+
+    def test_concurrent_release(self):
+        """Test that a lease released from many threads is pooled once."""
+        pool = self.make_pool()
+        pool.lease(session("a"))
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(pool.release("a")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results.count(True) == 1
+        assert len(pool) == 1
+
+
+class TestSessionLeases:
+    """Test cases for OrgaAI.acquire_session() and release_session()."""
+
+    def make_client(self, api, **overrides):
+        """Create a client answering from the stand-in API in memory."""
+        config = OrgaAIConfig(api_key="key", user_email="test@example.com", **overrides)
+        client = OrgaAI(config)
+        client._client = httpx.AsyncClient(transport=api.mock_transport())
+        return client
+
+    @pytest.mark.asyncio
+    async def test_released_session_reused(self):
+        """Test that the next caller gets a released session without any request."""
+        api = FakeOrgaAPI(token_ttl=300)
+        async with self.make_client(api) as client:
+            first = await client.acquire_session()
+            assert client.release_session(first) is True
+            second = await client.acquire_session()
+            third = await client.get_session_config()
+            stats = client.stats()["leases"]
+
+        assert second.ephemeral_token == first.ephemeral_token
+        assert third.ephemeral_token != first.ephemeral_token
+        assert api.requests["/v1/realtime/client-secrets"] == 2
+        assert stats["reused"] == 1
+        assert stats["outstanding"] == 1
+
+    @pytest.mark.asyncio
+    async def test_release_by_token(self):
+        """Test that a lease can be released by its token alone."""
+        api = FakeOrgaAPI(token_ttl=300)
+        async with self.make_client(api) as client:
+            leased = await client.acquire_session()
+
+            assert client.release_session(leased.ephemeral_token) is True
+            assert client.release_session(leased.ephemeral_token) is False
+
+    @pytest.mark.asyncio
+    async def test_get_session_config_not_leased(self):
+        """Test that only acquired sessions can be released."""
+        api = FakeOrgaAPI(token_ttl=300)
+        async with self.make_client(api) as client:
+            session_config = await client.get_session_config()
+
+            assert client.release_session(session_config) is False
+
+    @pytest.mark.asyncio
+    async def test_expiring_session_discarded(self):
+        """Test that a session too close to expiry is not handed out again."""
+        api = FakeOrgaAPI(token_ttl=2)
+        async with self.make_client(api) as client:
+            leased = await client.acquire_session()
+            kept = client.release_session(leased)
+            stats = client.stats()["leases"]
+
+        assert kept is False
+        assert stats["discarded"] == 1
+
+    @pytest.mark.asyncio
+    async def test_release_while_draining(self):
+        """Test that sessions released during a drain are discarded."""
+        api = FakeOrgaAPI(token_ttl=300)
+        client = self.make_client(api)
+        leased = await client.acquire_session()
+        await client.drain()
+
+        assert client.release_session(leased) is False
+        assert client.stats()["leases"]["ready"] == 0
@@ -0,0 +1,154 @@
+"""Tests for the load generator.
+
+These tests run short loads against the local stand-in API and check the
+statistics helpers, including coordinated-omission correction.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from orga_ai.errors import OrgaAIAuthenticationError, OrgaAIServerError
+from orga_ai.loadgen import (
+    LoadgenOptions,
+    backfill,
+    classify,
+    format_text,
+    percentile,
+    run_load,
+    summarize,
+)
+from orga_ai.testing import FakeOrgaAPI
+
+
+def make_options(api, **overrides):
+    """Create options for a short run against the stand-in API."""
+    options = dict(
+        base_url=api.url,
+        api_key="key",
+        user_email="test@example.com",
+        duration=0.3,
+        concurrency=4,
+        warmup=1,
+    )
+    options.update(overrides)
+    return LoadgenOptions(**options)
+
+
+class TestStatistics:
+    """Test cases for the statistics helpers."""
+    
+    def test_nearest_rank_percentile(self):
+        """Test percentiles of a known distribution."""
+        ordered = [i / 1000 for i in range(1, 101)]
+        
+        assert percentile(ordered, 50) == 0.05
+        assert percentile(ordered, 99) == 0.099
+        assert percentile(ordered, 99.9) == 0.1
+        assert percentile([], 50) == 0.0
+    
+    def test_summary_in_milliseconds(self):
+        """Test that summaries are reported in milliseconds."""
+        summary = summarize([0.001, 0.002, 0.003])
+        
+        assert summary["p50"] == 2.0
+        assert summary["max"] == 3.0
+        assert summary["mean"] == 2.0
+    
+    def test_backfill_adds_missed_samples(self):
+        """Test that a stall records the requests it delayed."""
+        corrected = backfill([1.0, 1.0, 5.0], expected_interval=1.0)
+        
+        assert sorted(corrected) == [1.0, 1.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+    
+    def test_backfill_without_stalls_is_unchanged(self):
+        """Test that latencies within the interval are not corrected."""
+        assert backfill([1.0, 1.5], expected_interval=1.0) == [1.0, 1.5]
+    
+    def test_classify_includes_status(self):
+        """Test that the error breakdown groups by type and status."""
+        assert classify(OrgaAIServerError("boom", 503)) == "OrgaAIServerError 503"
+        assert classify(OrgaAIAuthenticationError()) == "OrgaAIAuthenticationError 401"
+        assert classify(ValueError("x")) == "ValueError"
+
+
+class TestRunLoad:
+    """Test cases for load runs against the stand-in API."""
+    
+    @pytest.mark.asyncio
+    async def test_closed_loop(self):
+        """Test that a closed loop reports throughput and latencies."""
+        async with FakeOrgaAPI() as api:
+            report = (await run_load(make_options(api))).report()
+        
+        assert report["mode"] == "closed"
+        assert report["sessions"]["succeeded"] > 0
+        assert report["sessions"]["failed"] == 0
+        assert report["throughput"] > 0
+        assert report["corrected_latency_ms"]["p99"] >= report["latency_ms"]["p50"]
+    
+    @pytest.mark.asyncio
+    async def test_open_loop_follows_arrival_rate(self):
+        """Test that an open loop starts sessions on schedule."""
+        async with FakeOrgaAPI() as api:
+            result = await run_load(make_options(api, rate=100, duration=0.5))
+        
+        assert 40 <= len(result.latencies) <= 60
+        # Corrected latency is measured from the scheduled start, so is never shorter
+        assert sum(result.corrected) >= sum(result.latencies)
+    
+    @pytest.mark.asyncio
+    async def test_errors_are_broken_down(self):
+        """Test that failed sessions are counted by error type."""
+        async with FakeOrgaAPI(api_key="other") as api:
+            report = (await run_load(make_options(api, duration=0.1))).report()
+        
+        assert report["sessions"]["succeeded"] == 0
+        assert report["errors"]["OrgaAIAuthenticationError 401"] > 0
+        assert "OrgaAIAuthenticationError 401" in format_text(report)
+    
+    @pytest.mark.asyncio
+    async def test_client_features_are_applied(self):
+        """Test that caching and batching options reach the client."""
+        async with FakeOrgaAPI() as api:
+            report = (await run_load(
+                make_options(api, ice_cache=True, token_batch_window=1, pool_size=2)
+            )).report()
+            ice_requests = api.requests["/v1/realtime/ice-config"]
+        
+        assert report["sessions"]["succeeded"] > ice_requests
+        assert "ice cache" in format_text(report)
+
+
+class TestCommandLine:
+    """Test cases for python -m orga_ai loadgen."""
+    
+    def run_cli(self, *args):
+        """Run the CLI in a fresh interpreter."""
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        return subprocess.run(
+            [sys.executable, "-m", "orga_ai", "loadgen", *args],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+    
+    def test_json_report_against_stand_in(self):
+        """Test a run against the bundled stand-in API with JSON output."""
+        result = self.run_cli("--stand-in", "--duration", "0.3", "--json")
+        
+        assert result.returncode == 0, result.stderr
+        report = json.loads(result.stdout)
+        assert report["target"].endswith("(stand-in)")
+        assert report["sessions"]["succeeded"] > 0
+    
+    def test_target_is_required(self):
+        """Test that a base URL or the stand-in must be chosen."""
+        result = self.run_cli("--duration", "0.1")
+        
+        assert result.returncode == 2
+        assert "--base-url" in result.stderr
@@ -0,0 +1,151 @@
+"""Tests for per-event-loop values.
+
+These tests verify that LoopLocal keeps one value per loop, finalizes each
+value on its own loop when the loop shuts down, and forgets values of loops
+that were closed without shutting down.
+"""
+
+import asyncio
+import itertools
+import threading
+
+import pytest
+
+from orga_ai.loops import LoopLocal
+
+
+class Recorder:
+    """Creates numbered values and records which thread finalized them."""
+
+    def __init__(self):
+        self._counter = itertools.count(1)
+        self.finalized = []
+
+    def create(self):
+        return next(self._counter)
+
+    async def finalize(self, value):
+        await asyncio.sleep(0)
+        self.finalized.append((value, threading.current_thread().name))
+
+
+class TestLoopLocal:
+    """Test cases for the LoopLocal class."""
+
+    @pytest.fixture
+    def recorder(self):
+        """Create a value recorder."""
+        return Recorder()
+
+    @pytest.fixture
+    def local(self, recorder):
+        """Create a LoopLocal over the recorder."""
+        return LoopLocal(recorder.create, recorder.finalize)
+
+    def test_one_value_per_loop(self, local):
+        """Test that a loop reuses its value and other loops get their own."""
+        async def values():
+            return local.get(), local.get()
+
+        first = asyncio.run(values())
+        second = asyncio.run(values())
+
+        assert first == (1, 1)
+        assert second == (2, 2)
+
+    def test_finalized_when_loop_shuts_down(self, local, recorder):
+        """Test that asyncio.run finalizes the value on the loop's thread."""
+        def run():
+            async def use():
+                return local.get()
+            asyncio.run(use())
+
+        thread = threading.Thread(target=run, name="worker")
+        thread.start()
+        thread.join()
+
+        assert recorder.finalized == [(1, "worker")]
+        assert len(local) == 0
+
+    def test_closed_loop_dropped(self, local, recorder):
+        """Test that a loop closed without shutting down is forgotten."""
+        async def use():
+            return local.get()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(use())
+        loop.close()
+        assert len(local) == 1
+
+        asyncio.run(use())
+
+        assert len(local) == 0
+        assert [value for value, _ in recorder.finalized] == [2]
+
+    def test_peek_does_not_create(self, local):
+        """Test that peek returns None until the loop has a value."""
+        async def peek_then_get():
+            before = local.peek()
+            local.get()
+            return before, local.peek()
+
+        assert asyncio.run(peek_then_get()) == (None, 1)
+
+    def test_loop_less_value(self, local, recorder):
+        """Test that a value is shared outside any running loop."""
+        assert local.get() == 1
+        assert local.get() == 1
+
+        async def close():
+            await local.aclose()
+
+        asyncio.run(close())
+        assert recorder.finalized == [(1, "MainThread")]
+
+    @pytest.mark.asyncio
+    async def test_aclose_finalizes_other_loops_on_their_thread(self, local, recorder):
+        """Test that aclose() hands other loops' values to those loops."""
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        async def use():
+            local.get()
+            ready.set()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(use())
+            loop.run_forever()
+
+        thread = threading.Thread(target=run, name="other")
+        thread.start()
+        ready.wait()
+        local.get()
+
+        await local.aclose()
+        for _ in range(100):
+            if len(recorder.finalized) == 2:
+                break
+            await asyncio.sleep(0.01)
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        assert sorted(recorder.finalized) == [(1, "other"), (2, "MainThread")]
+        assert len(local) == 0
+
+    def test_aclose_keeps_values_of_idle_loops(self, local, recorder):
+        """Test that a loop that is not running finalizes its value at shutdown."""
+        async def use():
+            local.get()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(use())
+
+        asyncio.run(local.aclose())
+        assert len(local) == 1
+
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+        assert recorder.finalized == [(1, "MainThread")]
+        assert len(local) == 0
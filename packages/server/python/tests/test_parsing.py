@@ -0,0 +1,203 @@
+"""Tests for OrgaAI response parsing.
+
+These tests verify that API responses are parsed into SDK types in both
+validated and trusted mode, and that malformed responses always surface
+as ValueError.
+"""
+
+import base64
+import json
+import time
+
+import pytest
+
+from orga_ai import EphemeralToken, IceServer
+from orga_ai.parsing import (
+    parse_ephemeral_token,
+    parse_ephemeral_tokens,
+    parse_ice_servers,
+    token_claims_expiry,
+)
+
+
+def body(data):
+    return json.dumps(data).encode()
+
+
+def jwt(claims):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=")
+    return f"eyJhbGciOiJIUzI1NiJ9.{payload.decode()}.signature"
+
+
+MODES = [False, True]
+
+
+class TestParseEphemeralToken:
+    """Test cases for client-secrets responses."""
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_token(self, trusted):
+        """Test that the token is returned."""
+        assert parse_ephemeral_token(body({"ephemeral_token": "abc"}), trusted) == "abc"
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    @pytest.mark.parametrize("content", [b"{}", b"[]", b"not json", b""])
+    def test_malformed(self, trusted, content):
+        """Test that malformed responses raise ValueError."""
+        with pytest.raises(ValueError):
+            parse_ephemeral_token(content, trusted)
+    
+    def test_wrong_type_rejected(self):
+        """Test that validation rejects a non-string token."""
+        with pytest.raises(ValueError):
+            parse_ephemeral_token(body({"ephemeral_token": 42}))
+    
+    def test_trusted_passes_wrong_type_through(self):
+        """Test that trusted mode does not check field types."""
+        assert parse_ephemeral_token(body({"ephemeral_token": 42}), trusted=True) == 42
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_unknown_expiry_stays_plain(self, trusted):
+        """Test that a token of unknown expiry is a plain string."""
+        token = parse_ephemeral_token(body({"ephemeral_token": "abc"}), trusted)
+        assert type(token) is str
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_reported_expiry(self, trusted):
+        """Test that expires_at and expires_in are attached to the token."""
+        token = parse_ephemeral_token(
+            body({"ephemeral_token": "abc", "expires_at": 2000000000}), trusted
+        )
+        assert isinstance(token, EphemeralToken)
+        assert token == "abc"
+        assert token.expires_at == 2000000000
+        
+        before = time.time()
+        token = parse_ephemeral_token(body({"ephemeral_token": "abc", "expires_in": 60}), trusted)
+        assert before + 60 <= token.expires_at <= time.time() + 60
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_claims_expiry(self, trusted):
+        """Test that the exp claim of a JWT token is used when not reported."""
+        token = parse_ephemeral_token(body({"ephemeral_token": jwt({"exp": 1900000000})}), trusted)
+        assert token.expires_at == 1900000000
+    
+    def test_reported_expiry_wins_over_claims(self):
+        """Test that the response's expiry takes precedence over the claims."""
+        content = body({"ephemeral_token": jwt({"exp": 1900000000}), "expires_at": 1800000000})
+        assert parse_ephemeral_token(content).expires_at == 1800000000
+
+
+class TestTokenClaimsExpiry:
+    """Test cases for reading the exp claim."""
+    
+    @pytest.mark.parametrize("token", [
+        "opaque-token",
+        "a.b.c",
+        jwt({"sub": "user"}),
+        jwt({"exp": "soon"}),
+        jwt({"exp": True}),
+        jwt(["not", "an", "object"]),
+    ])
+    def test_no_expiry(self, token):
+        """Test that tokens without a usable exp claim have no expiry."""
+        assert token_claims_expiry(token) is None
+    
+    def test_unpadded_payload(self):
+        """Test that base64url payloads without padding decode."""
+        assert token_claims_expiry(jwt({"exp": 1, "x": "ab"})) == 1.0
+
+
+class TestParseEphemeralTokens:
+    """Test cases for batched client-secrets responses."""
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_tokens(self, trusted):
+        """Test that every token is returned."""
+        content = body({"ephemeral_tokens": ["a", "b"]})
+        assert parse_ephemeral_tokens(content, trusted) == ["a", "b"]
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_single_token(self, trusted):
+        """Test that a single-token answer becomes a list of one."""
+        content = body({"ephemeral_token": "a"})
+        assert parse_ephemeral_tokens(content, trusted) == ["a"]
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_malformed(self, trusted):
+        """Test that a response without tokens raises ValueError."""
+        with pytest.raises(ValueError):
+            parse_ephemeral_tokens(body({"tokens": []}), trusted)
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_reported_expiry_applies_to_every_token(self, trusted):
+        """Test that one reported expiry is attached to all tokens."""
+        content = body({"ephemeral_tokens": ["a", "b"], "expires_at": 2000000000})
+        tokens = parse_ephemeral_tokens(content, trusted)
+        assert [token.expires_at for token in tokens] == [2000000000, 2000000000]
+
+
+class TestParseIceServers:
+    """Test cases for ice-config responses."""
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_servers(self, trusted):
+        """Test that servers are built with their optional fields."""
+        content = body({"iceServers": [
+            {"urls": "stun:a"},
+            {"urls": ["turn:b", "turns:b"], "username": "u", "credential": "c"},
+        ]})
+        
+        servers = parse_ice_servers(content, trusted)
+        
+        assert servers == [
+            IceServer(urls="stun:a"),
+            IceServer(urls=["turn:b", "turns:b"], username="u", credential="c"),
+        ]
+        assert all(type(server) is IceServer for server in servers)
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    @pytest.mark.parametrize("data", [
+        {"iceServers": [{"username": "u"}]},
+        {"iceServers": ["stun:a"]},
+        {"iceServers": None},
+        {"servers": []},
+        [],
+    ])
+    def test_malformed(self, trusted, data):
+        """Test that malformed servers raise ValueError rather than KeyError."""
+        with pytest.raises(ValueError):
+            parse_ice_servers(body(data), trusted)
+    
+    def test_wrong_type_rejected(self):
+        """Test that validation rejects a non-string username."""
+        with pytest.raises(ValueError):
+            parse_ice_servers(body({"iceServers": [{"urls": "stun:a", "username": 1}]}))
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_expiry_sources(self, trusted):
+        """Test per-server expiry, then the response's, then TURN REST usernames."""
+        content = body({
+            "iceServers": [
+                {"urls": "turn:a", "username": "u", "credential": "c", "expires_at": 1700000000},
+                {"urls": "turn:b", "username": "u", "credential": "c"},
+            ],
+            "expires_at": 1800000000,
+        })
+        servers = parse_ice_servers(content, trusted)
+        assert [server.expires_at for server in servers] == [1700000000, 1800000000]
+        
+        content = body({"iceServers": [
+            {"urls": "turn:a", "username": "1900000000:user", "credential": "c"},
+            {"urls": "turn:b", "username": "user:1900000000", "credential": "c"},
+            {"urls": "stun:c"},
+        ]})
+        servers = parse_ice_servers(content, trusted)
+        assert [server.expires_at for server in servers] == [1900000000, None, None]
+    
+    @pytest.mark.parametrize("trusted", MODES)
+    def test_ttl(self, trusted):
+        """Test that a ttl is turned into an expiry."""
+        before = time.time()
+        servers = parse_ice_servers(body({"iceServers": [{"urls": "stun:a"}], "ttl": 300}), trusted)
+        assert before + 300 <= servers[0].expires_at <= time.time() + 300
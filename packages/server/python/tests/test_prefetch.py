@@ -0,0 +1,220 @@
+"""Tests for adaptive prefetch sizing.
+
+These tests verify that arrival rates are estimated and bursts detected,
+that the reserve target follows the arrival rate, upstream latency and token
+lifetime, and that the client serves calls from a reserve it keeps topped up.
+"""
+
+import asyncio
+import math
+import time
+
+import httpx
+import pytest
+
+from orga_ai import OrgaAI, OrgaAIConfig, SessionConfig
+from orga_ai.prefetch import AdaptivePrefetcher, RateEstimator
+from orga_ai.testing import FakeOrgaAPI
+
+from tests.helpers import FakeClock
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(1000.0)
+    monkeypatch.setattr("orga_ai.prefetch.time.monotonic", clock)
+    return clock
+
+
+def arrive(prefetcher, clock, rate, seconds):
+    """Send arrivals at a steady rate for a while."""
+    for _ in range(int(rate * seconds)):
+        clock.now += 1 / rate
+        prefetcher.arrive()
+
+
+class TestRateEstimator:
+    """Test cases for the RateEstimator class."""
+
+    def test_converges_to_steady_rate(self):
+        """Test that a steady rate is estimated as itself."""
+        estimator = RateEstimator(window=5.0)
+        now = 0.0
+        for _ in range(1000):
+            now += 0.02
+            estimator.record(now)
+
+        assert estimator.rate(now) == pytest.approx(50, rel=0.05)
+
+    def test_decays_when_idle(self):
+        """Test that the estimate decays by e every window without events."""
+        estimator = RateEstimator(window=5.0)
+        estimator.record(0.0)
+        rate = estimator.rate(0.0)
+
+        assert estimator.rate(5.0) == pytest.approx(rate / math.e)
+        assert RateEstimator(window=5.0).rate(10.0) == 0.0
+
+
+class TestAdaptivePrefetcher:
+    """Test cases for the AdaptivePrefetcher class."""
+
+    def test_no_target_before_latency_known(self, clock):
+        """Test that nothing is prefetched before a mint has been timed."""
+        prefetcher = AdaptivePrefetcher()
+        arrive(prefetcher, clock, rate=50, seconds=10)
+
+        assert prefetcher.target() == 0
+        assert prefetcher.start_refill() == 0
+
+    def test_target_from_rate_and_latency(self, clock):
+        """Test that the target covers the demand during a refill, with margin."""
+        prefetcher = AdaptivePrefetcher(slow_window=5.0, fast_window=5.0)
+        prefetcher.observe_latency(0.2)
+        arrive(prefetcher, clock, rate=50, seconds=60)
+
+        rate = prefetcher.arrival_rate()
+        demand = rate * 0.2
+        assert rate == pytest.approx(50, rel=0.05)
+        assert prefetcher.target() == math.ceil(demand + 2 * math.sqrt(demand))
+
+    def test_target_capped_by_lifetime(self, clock):
+        """Test that no more sessions are kept than are used before they expire."""
+        prefetcher = AdaptivePrefetcher(session_ttl=5.5, min_validity=5.0, slow_window=5.0)
+        prefetcher.observe_latency(1.0)
+        arrive(prefetcher, clock, rate=2, seconds=60)
+
+        assert prefetcher.target() == 1
+
+    def test_target_capped_by_max_size(self, clock):
+        """Test that the reserve never exceeds max_size."""
+        prefetcher = AdaptivePrefetcher(max_size=5)
+        prefetcher.observe_latency(1.0)
+        arrive(prefetcher, clock, rate=200, seconds=10)
+
+        assert prefetcher.target() == 5
+
+    def test_idle_target_shrinks(self, clock):
+        """Test that the target falls to nothing once arrivals stop."""
+        prefetcher = AdaptivePrefetcher()
+        prefetcher.observe_latency(0.2)
+        arrive(prefetcher, clock, rate=50, seconds=120)
+        busy = prefetcher.target()
+        clock.now += 600
+
+        assert busy > 0
+        assert prefetcher.target() == 0
+
+    def test_burst_detected(self, clock):
+        """Test that a spike switches sizing to the short-term rate."""
+        prefetcher = AdaptivePrefetcher()
+        prefetcher.observe_latency(0.2)
+        arrive(prefetcher, clock, rate=5, seconds=300)
+        assert not prefetcher.bursting()
+        steady = prefetcher.target()
+
+        arrive(prefetcher, clock, rate=100, seconds=2)
+
+        assert prefetcher.bursting()
+        assert prefetcher.arrival_rate() > 20
+        assert prefetcher.target() > steady
+
+    def test_take_skips_expiring_sessions(self):
+        """Test that reserved sessions without enough validity left are dropped."""
+        prefetcher = AdaptivePrefetcher(min_validity=5.0)
+        now = time.time()
+        prefetcher.put(SessionConfig("short", [], expires_at=now + 2))
+        prefetcher.put(SessionConfig("long", [], expires_at=now + 60))
+
+        assert prefetcher.take().ephemeral_token == "long"
+        assert prefetcher.take() is None
+        stats = prefetcher.stats()
+        assert (stats["hits"], stats["misses"], stats["expired"]) == (1, 1, 1)
+        assert stats["hit_ratio"] == 0.5
+
+    def test_single_refill(self, clock):
+        """Test that only one refill runs at a time."""
+        prefetcher = AdaptivePrefetcher()
+        prefetcher.observe_latency(0.2)
+        arrive(prefetcher, clock, rate=50, seconds=10)
+        count = prefetcher.start_refill()
+
+        assert count == prefetcher.target()
+        assert prefetcher.start_refill() == 0
+        prefetcher.finish_refill()
+        assert prefetcher.start_refill() == count
+
+
+class TestAdaptivePrefetch:
+    """Test cases for the client's adaptive prefetch reserve."""
+
+    def make_client(self, api, **overrides):
+        """Create a client answering from the stand-in API in memory."""
+        config = OrgaAIConfig(
+            api_key="key", user_email="test@example.com", adaptive_prefetch=True, **overrides
+        )
+        client = OrgaAI(config)
+        client._client = httpx.AsyncClient(transport=api.mock_transport())
+        return client
+
+    @pytest.mark.asyncio
+    async def test_calls_served_from_reserve(self):
+        """Test that steady traffic is mostly served from the reserve."""
+        api = FakeOrgaAPI(token_ttl=300)
+        async with self.make_client(api) as client:
+            sessions = []
+            for _ in range(50):
+                sessions.append(await client.get_session_config())
+                await asyncio.sleep(0.005)
+            stats = client.stats()["adaptive_prefetch"]
+
+        assert len({session.ephemeral_token for session in sessions}) == 50
+        assert stats["hits"] > 25
+        assert stats["hits"] + stats["misses"] == 50
+        assert stats["hit_ratio"] == round(stats["hits"] / 50, 4)
+        assert stats["target"] >= 1
+        assert stats["latency_ms"] is not None
+        assert stats["lifetime_s"] == pytest.approx(30, abs=1)
+
+    @pytest.mark.asyncio
+    async def test_reserve_bounded(self):
+        """Test that the reserve stays within prefetch_max_sessions."""
+        api = FakeOrgaAPI()
+        async with self.make_client(api, prefetch_max_sessions=2) as client:
+            await asyncio.gather(*(client.get_session_config() for _ in range(100)))
+            await asyncio.sleep(0.05)
+            stats = client.stats()["adaptive_prefetch"]
+
+        assert stats["target"] <= 2
+        assert stats["reserve"] <= 2
+        assert stats["prefetched"] <= 4
+
+    @pytest.mark.asyncio
+    async def test_returned_leases_count_as_arrivals(self):
+        """Test that calls answered by returned leases still size the reserve."""
+        api = FakeOrgaAPI(token_ttl=300)
+        async with self.make_client(api) as client:
+            for _ in range(20):
+                session = await client.acquire_session()
+                client.release_session(session)
+                await client.get_session_config()
+            stats = client.stats()
+            rate = client._prefetcher._slow.rate(time.monotonic())
+
+        assert stats["leases"]["reused"] == 20
+        assert stats["adaptive_prefetch"]["hits"] + stats["adaptive_prefetch"]["misses"] == 20
+        assert rate == pytest.approx(40 / 60, rel=0.05)
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self):
+        """Test that no reserve is kept unless enabled."""
+        api = FakeOrgaAPI()
+        config = OrgaAIConfig(api_key="key", user_email="test@example.com")
+        async with OrgaAI(config) as client:
+            client._client = httpx.AsyncClient(transport=api.mock_transport())
+            for _ in range(5):
+                await client.get_session_config()
+            stats = client.stats()
+
+        assert stats["adaptive_prefetch"] is None
+        assert api.requests["/v1/realtime/client-secrets"] == 5
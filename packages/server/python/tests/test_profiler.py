@@ -0,0 +1,257 @@
+"""Tests for slow call capture.
+
+These tests verify that call timelines record events and phases in order,
+that only calls over the threshold are kept in the bounded buffer, and that
+the client and both transports report cache decisions, failovers and
+connection phases for slow get_session_config() calls.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from orga_ai import MemoryCacheBackend, OrgaAI, OrgaAIConfig
+from orga_ai.errors import OrgaAIAuthenticationError, OrgaAIError
+from orga_ai.profiler import CallTimeline, SlowCallRecorder, current_timeline, mark
+from orga_ai.testing import FakeOrgaAPI
+
+from tests.helpers import make_config, unused_url
+
+
+def names(record):
+    return [event["event"] for event in record["events"]]
+
+
+class TestCallTimeline:
+    """Test cases for the CallTimeline class."""
+
+    def test_events_and_phases_in_start_order(self):
+        """Test that phases are reported where they started, with their duration."""
+        timeline = CallTimeline()
+        timeline.begin("request")
+        timeline.mark("cache", "miss")
+        timeline.end("request", "GET /x: 200")
+        timeline.end("never-opened")
+        record = timeline.to_dict(timeline.started + 1)
+
+        assert names(record) == ["request", "cache"]
+        assert record["events"][0]["duration_ms"] is not None
+        assert record["events"][0]["detail"] == "GET /x: 200"
+        assert record["events"][1]["duration_ms"] is None
+        assert record["duration_ms"] == 1000.0
+
+    def test_unfinished_phase(self):
+        """Test that phases open when the call ends are marked unfinished."""
+        timeline = CallTimeline()
+        timeline.begin("ttfb")
+        record = timeline.to_dict(timeline.started + 0.5)
+
+        assert record["events"][0]["event"] == "ttfb"
+        assert record["events"][0]["detail"] == "unfinished"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_phases_kept_apart(self):
+        """Test that phases of one name opened by concurrent tasks do not collide."""
+        timeline = CallTimeline()
+
+        async def request(delay):
+            timeline.begin("request")
+            await asyncio.sleep(delay)
+            timeline.end("request", str(delay))
+
+        await asyncio.gather(request(0.01), request(0.02))
+        record = timeline.to_dict(timeline.started + 1)
+
+        assert [event["detail"] for event in record["events"]] == ["0.01", "0.02"]
+
+    @pytest.mark.asyncio
+    async def test_httpcore_trace(self):
+        """Test that httpcore trace events map onto connection phases."""
+        timeline = CallTimeline()
+        timeline.begin("pool_wait")
+        for name in [
+            "connection.connect_tcp.started",
+            "connection.connect_tcp.complete",
+            "connection.start_tls.started",
+            "connection.start_tls.complete",
+            "http11.send_request_headers.started",
+            "http11.send_request_headers.complete",
+            "http11.receive_response_headers.started",
+            "http11.receive_response_headers.complete",
+            "http11.receive_response_body.started",
+            "http11.receive_response_body.failed",
+        ]:
+            await timeline.httpcore_trace(name, {})
+        record = timeline.to_dict(timeline.started + 1)
+
+        assert names(record) == ["pool_wait", "connect", "tls", "ttfb", "body"]
+        assert record["events"][-1]["detail"] == "failed"
+
+
+class TestSlowCallRecorder:
+    """Test cases for the SlowCallRecorder class."""
+
+    def test_only_slow_calls_kept(self):
+        """Test that calls under the threshold are counted but dropped."""
+        recorder = SlowCallRecorder(threshold=0.05)
+        fast = recorder.start()
+        recorder.finish(fast)
+        slow = recorder.start()
+        slow.started -= 0.1
+        recorder.finish(slow)
+
+        assert len(recorder.records()) == 1
+        assert recorder.stats() == {"calls": 2, "captured": 1, "buffered": 1}
+
+    def test_buffer_bounded(self):
+        """Test that only the most recent slow calls are kept."""
+        recorder = SlowCallRecorder(threshold=0.0, size=3)
+        for index in range(5):
+            timeline = recorder.start()
+            mark("call", str(index))
+            recorder.finish(timeline)
+        records = recorder.records(clear=True)
+
+        assert [record["events"][0]["detail"] for record in records] == ["2", "3", "4"]
+        assert recorder.records() == []
+
+    def test_context_restored(self):
+        """Test that the timeline is only current between start() and finish()."""
+        recorder = SlowCallRecorder(threshold=0.0)
+        timeline = recorder.start()
+        assert current_timeline() is timeline
+        recorder.finish(timeline)
+
+        assert current_timeline() is None
+        mark("ignored")
+
+    def test_dump(self, tmp_path):
+        """Test that the buffer is written as JSON."""
+        recorder = SlowCallRecorder(threshold=0.0)
+        recorder.finish(recorder.start())
+        path = tmp_path / "slow.json"
+
+        assert recorder.dump(str(path)) == 1
+        data = json.loads(path.read_text())
+        assert data["threshold_ms"] == 0.0
+        assert len(data["calls"]) == 1
+
+
+class TestSlowCallCapture:
+    """Test cases for capturing slow get_session_config() calls."""
+
+    def make_config(self, base_url, **overrides):
+        """Create a config capturing calls over 20 ms."""
+        overrides.setdefault("slow_call_threshold", 20)
+        return make_config(base_url, **overrides)
+
+    @pytest.mark.parametrize("transport", ["httpx", "aiohttp"])
+    @pytest.mark.asyncio
+    async def test_connection_phases(self, transport):
+        """Test that a slow call reports each request's connection phases."""
+        async with FakeOrgaAPI(latency=0.03) as api:
+            async with OrgaAI(self.make_config(api.url, transport=transport)) as client:
+                session = await client.get_session_config()
+                records = client.slow_calls()
+
+        assert len(records) == 1
+        record = records[0]
+        events = names(record)
+        assert record["error"] is None
+        assert record["duration_ms"] >= 60
+        assert events.count("request") == 2
+        assert events.count("ttfb") == 2
+        assert events.count("body") == 2
+        assert "connect" in events
+        assert "Fetched ICE servers" in events
+        ttfb = [event for event in record["events"] if event["event"] == "ttfb"]
+        assert all(event["duration_ms"] >= 25 for event in ttfb)
+        assert session.ephemeral_token not in json.dumps(records)
+
+    @pytest.mark.asyncio
+    async def test_fast_calls_not_kept(self):
+        """Test that calls under the threshold leave nothing behind."""
+        async with FakeOrgaAPI() as api:
+            config = self.make_config(api.url, slow_call_threshold=10000)
+            async with OrgaAI(config) as client:
+                for _ in range(3):
+                    await client.get_session_config()
+                stats = client.stats()["slow_calls"]
+                records = client.slow_calls()
+
+        assert records == []
+        assert stats == {"calls": 3, "captured": 0, "buffered": 0}
+
+    @pytest.mark.asyncio
+    async def test_failover_and_dns(self):
+        """Test that failovers and DNS cache lookups appear in the timeline."""
+        down = unused_url()
+        async with FakeOrgaAPI(latency=0.03) as api:
+            config = self.make_config([down, f"http://localhost:{api.port}"], dns_cache=True)
+            async with OrgaAI(config) as client:
+                await client.get_session_config()
+                record = client.slow_calls()[0]
+
+        requests = [event for event in record["events"] if event["event"] == "request"]
+        dns = [event for event in record["events"] if event["event"] == "dns"]
+        assert requests[0]["detail"].startswith(f"POST {down}: Connect")
+        assert f"Endpoint {down} unreachable, failing over" in names(record)
+        assert dns[0]["detail"] == "localhost"
+
+    @pytest.mark.asyncio
+    async def test_cache_decision(self):
+        """Test that a prefetched session shows up as the call's source."""
+        async with FakeOrgaAPI() as api:
+            config = self.make_config(
+                api.url, slow_call_threshold=0, cache_backend=MemoryCacheBackend()
+            )
+            async with OrgaAI(config) as client:
+                await client.prefetch_sessions(1)
+                await client.get_session_config()
+                record = client.slow_calls()[0]
+
+        assert names(record) == ["Fetching session config", "Using prefetched session config"]
+
+    @pytest.mark.asyncio
+    async def test_error_recorded(self):
+        """Test that a failed slow call records its error."""
+        async with FakeOrgaAPI(api_key="other") as api:
+            async with OrgaAI(self.make_config(api.url, slow_call_threshold=0)) as client:
+                with pytest.raises(OrgaAIAuthenticationError):
+                    await client.get_session_config()
+                record = client.slow_calls()[0]
+
+        assert record["error"].startswith("OrgaAIAuthenticationError")
+
+    @pytest.mark.asyncio
+    async def test_dump(self, tmp_path):
+        """Test that slow calls can be dumped to a JSON file."""
+        path = tmp_path / "slow.json"
+        async with FakeOrgaAPI() as api:
+            async with OrgaAI(self.make_config(api.url, slow_call_threshold=0)) as client:
+                await client.get_session_config()
+                written = client.dump_slow_calls(str(path))
+
+        assert written == 1
+        assert len(json.loads(path.read_text())["calls"]) == 1
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self):
+        """Test that capture is off unless a threshold is configured."""
+        client = OrgaAI(OrgaAIConfig(api_key="key", user_email="test@example.com"))
+
+        assert client.stats()["slow_calls"] is None
+        with pytest.raises(OrgaAIError):
+            client.slow_calls()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_keep_separate_timelines(self):
+        """Test that concurrent calls each record only their own requests."""
+        async with FakeOrgaAPI(latency=0.03) as api:
+            async with OrgaAI(self.make_config(api.url)) as client:
+                await asyncio.gather(*(client.get_session_config() for _ in range(4)))
+                records = client.slow_calls()
+
+        assert len(records) == 4
+        assert all(names(record).count("request") == 2 for record in records)
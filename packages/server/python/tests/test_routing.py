@@ -0,0 +1,136 @@
+"""Tests for OrgaAI endpoint routing.
+
+These tests verify EWMA latency tracking, demotion of unreachable
+endpoints and re-probe scheduling.
+"""
+
+import threading
+
+import pytest
+
+from orga_ai.routing import EndpointRouter
+
+
+class TestEndpointRouter:
+    """Test cases for the EndpointRouter class."""
+    
+    @pytest.fixture
+    def router(self, clock):
+        """Create a router over three endpoints."""
+        return EndpointRouter(
+            ["https://us", "https://eu", "https://ap"],
+            reprobe_interval=10,
+            max_reprobe_interval=25,
+            clock=clock
+        )
+    
+    def test_requires_endpoint(self):
+        """Test that an empty endpoint list is rejected."""
+        with pytest.raises(ValueError):
+            EndpointRouter([])
+    
+    def test_config_order_before_measurements(self, router):
+        """Test that unmeasured endpoints keep configuration order."""
+        assert router.candidates() == ["https://us", "https://eu", "https://ap"]
+    
+    def test_prefers_lowest_latency(self, router):
+        """Test that the fastest endpoint is routed to first."""
+        router.record_success("https://us", 0.200)
+        router.record_success("https://eu", 0.050)
+        router.record_success("https://ap", 0.100)
+        
+        assert router.candidates() == ["https://eu", "https://ap", "https://us"]
+    
+    def test_latency_is_smoothed(self, router):
+        """Test that a single slow sample only moves the EWMA partially."""
+        router.record_success("https://us", 0.100)
+        router.record_success("https://us", 0.200)
+        
+        latency = router.snapshot()["https://us"]["latency"]
+        assert latency == pytest.approx(0.130)
+    
+    def test_error_rate_penalises_score(self, router):
+        """Test that recent errors push an otherwise faster endpoint down."""
+        router.failure_threshold = 5
+        router.record_success("https://us", 0.050)
+        router.record_success("https://eu", 0.080)
+        router.record_failure("https://us")
+        
+        candidates = router.candidates()
+        assert candidates.index("https://eu") < candidates.index("https://us")
+    
+    def test_failure_demotes_endpoint(self, router):
+        """Test that an unreachable endpoint moves behind healthy ones."""
+        router.record_failure("https://us")
+        
+        assert router.candidates() == ["https://eu", "https://ap", "https://us"]
+        assert router.snapshot()["https://us"]["healthy"] is False
+    
+    def test_probe_schedule_with_backoff(self, router, clock):
+        """Test that demoted endpoints are re-probed with exponential backoff."""
+        router.record_failure("https://us")
+        assert router.due_for_probe() == []
+        
+        clock.now = 10
+        assert router.due_for_probe() == ["https://us"]
+        assert router.due_for_probe() == []
+        
+        router.record_failure("https://us")
+        clock.now = 29
+        assert router.due_for_probe() == []
+        clock.now = 30
+        assert router.due_for_probe() == ["https://us"]
+        
+        router.record_failure("https://us")
+        clock.now = 54
+        assert router.due_for_probe() == []
+        clock.now = 55
+        assert router.due_for_probe() == ["https://us"]
+    
+    def test_successful_probe_restores_endpoint(self, router, clock):
+        """Test that a successful probe returns the endpoint to rotation."""
+        router.record_success("https://eu", 0.050)
+        router.record_success("https://ap", 0.050)
+        router.record_failure("https://us")
+        clock.now = 10
+        router.due_for_probe()
+        router.record_success("https://us", 0.010)
+        
+        assert router.snapshot()["https://us"]["healthy"] is True
+        assert router.candidates()[0] == "https://us"
+    
+    def test_demoted_count(self, router):
+        """Test that demotions are counted once per endpoint until restored."""
+        assert router.demoted_count == 0
+        
+        router.record_failure("https://us")
+        router.record_failure("https://us")
+        router.record_failure("https://eu")
+        assert router.demoted_count == 2
+        
+        router.record_success("https://us", 0.010)
+        assert router.demoted_count == 1
+    
+    def test_contended_sample_is_dropped_but_counted(self, router):
+        """Test that a healthy endpoint skips a sample rather than wait for the lock."""
+        router.record_success("https://us", 0.100)
+        
+        with router._lock:
+            router.record_success("https://us", 0.900)
+        
+        snapshot = router.snapshot()["https://us"]
+        assert snapshot["latency"] == pytest.approx(0.100)
+        assert snapshot["requests"] == 2
+    
+    def test_recovery_waits_for_the_lock(self, router):
+        """Test that a success after a failure is always recorded."""
+        router.record_failure("https://us")
+        router._lock.acquire()
+        thread = threading.Thread(target=router.record_success, args=("https://us", 0.1))
+        thread.start()
+        thread.join(0.05)
+        assert thread.is_alive()
+        
+        router._lock.release()
+        thread.join()
+        assert router.demoted_count == 0
@@ -0,0 +1,233 @@
+"""Tests for proactive refresh scheduling.
+
+These tests verify that the timer wheel fires every timer on time across
+its levels, and that RefreshScheduler refreshes entries ahead of expiry from
+a single driver task, retrying failures and bounding concurrency.
+"""
+
+import asyncio
+import random
+import time
+
+import httpx
+import pytest
+
+from orga_ai import OrgaAI, OrgaAIConfig
+from orga_ai.scheduler import RefreshScheduler, TimerWheel
+from orga_ai.testing import FakeOrgaAPI
+
+
+class TestTimerWheel:
+    """Test cases for the TimerWheel class."""
+
+    def test_fires_on_time(self):
+        """Test that a timer fires on the first advance past its deadline."""
+        wheel = TimerWheel(resolution=1.0, now=0.0)
+        wheel.schedule("a", 5.5)
+
+        assert wheel.advance(5.9) == []
+        assert wheel.advance(6.0) == ["a"]
+        assert len(wheel) == 0
+
+    def test_cancel_and_reschedule(self):
+        """Test that cancelled timers never fire and rescheduling moves them."""
+        wheel = TimerWheel(resolution=1.0, now=0.0)
+        wheel.schedule("a", 3)
+        wheel.schedule("b", 3)
+        wheel.schedule("b", 10)
+
+        assert wheel.cancel("a") is True
+        assert wheel.cancel("a") is False
+        assert wheel.advance(5) == []
+        assert wheel.next_deadline() == 10
+        assert wheel.advance(10) == ["b"]
+        assert wheel.next_deadline() is None
+
+    def test_past_deadline_fires_next_tick(self):
+        """Test that a deadline already passed fires on the next tick."""
+        wheel = TimerWheel(resolution=1.0, now=0.0)
+        wheel.advance(10)
+        wheel.schedule("a", 2)
+
+        assert wheel.advance(11) == ["a"]
+
+    def test_matches_sorted_deadlines(self):
+        """Test random timers across every level, including beyond the top span."""
+        rng = random.Random(7)
+        wheel = TimerWheel(resolution=1.0, slots=4, levels=3, now=0.0)
+        deadlines = {key: rng.uniform(0, 500) for key in range(300)}
+        for key, deadline in deadlines.items():
+            wheel.schedule(key, deadline)
+
+        now = 0.0
+        fired = {}
+        while len(wheel):
+            now += rng.uniform(0, 3)
+            for key in wheel.advance(now):
+                fired[key] = now
+
+        assert fired.keys() == deadlines.keys()
+        for key, deadline in deadlines.items():
+            assert deadline <= fired[key] < deadline + 4
+
+    def test_slots_must_be_power_of_two(self):
+        """Test that a slot count that is not a power of two is rejected."""
+        with pytest.raises(ValueError):
+            TimerWheel(slots=10)
+
+
+class Material:
+    """Refresh callable recording each call and returning a fixed lifetime."""
+
+    def __init__(self, lifetime=60.0, failures=0, delay=0.0):
+        self.lifetime = lifetime
+        self.failures = failures
+        self.delay = delay
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+
+    async def refresh(self):
+        self.calls.append(time.monotonic())
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("refresh failed")
+        return time.time() + self.lifetime
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.005)
+
+
+class TestRefreshScheduler:
+    """Test cases for the RefreshScheduler class."""
+
+    def make_scheduler(self, **overrides):
+        options = dict(jitter=0.0, min_interval=0.0, retry_delay=0.01, resolution=0.005)
+        options.update(overrides)
+        return RefreshScheduler(**options)
+
+    @pytest.mark.asyncio
+    async def test_refreshes_ahead_of_expiry(self):
+        """Test an immediate refresh, then one at refresh_ahead of the lifetime."""
+        scheduler = self.make_scheduler(refresh_ahead=0.5)
+        material = Material(lifetime=0.2)
+
+        scheduler.add("tenant", material.refresh)
+        await wait_for(lambda: len(material.calls) == 2)
+        await scheduler.aclose()
+
+        interval = material.calls[1] - material.calls[0]
+        assert 0.09 <= interval < 0.2
+        assert scheduler.stats()["refreshes"] == 2
+
+    @pytest.mark.asyncio
+    async def test_known_expiry_not_refreshed_now(self):
+        """Test that an entry added with its expiry waits for its refresh time."""
+        scheduler = self.make_scheduler()
+        material = Material()
+
+        scheduler.add("tenant", material.refresh, expires_at=time.time() + 60)
+        await asyncio.sleep(0.05)
+        await scheduler.aclose()
+
+        assert material.calls == []
+
+    @pytest.mark.asyncio
+    async def test_failures_retried_with_backoff(self):
+        """Test that a failed refresh is retried until it succeeds."""
+        scheduler = self.make_scheduler()
+        material = Material(failures=3)
+
+        scheduler.add("tenant", material.refresh)
+        await wait_for(lambda: scheduler.stats()["refreshes"] == 1)
+        stats = scheduler.stats()
+        await scheduler.aclose()
+
+        assert stats["failures"] == 3
+        gaps = [b - a for a, b in zip(material.calls, material.calls[1:])]
+        assert gaps[2] > gaps[0]
+
+    @pytest.mark.asyncio
+    async def test_concurrency_bounded(self):
+        """Test that due entries wait for a free refresh slot."""
+        scheduler = self.make_scheduler(max_concurrency=4)
+        material = Material(delay=0.01)
+
+        for tenant in range(40):
+            scheduler.add(tenant, material.refresh)
+        await wait_for(lambda: scheduler.stats()["refreshes"] == 40)
+        await scheduler.aclose()
+
+        assert material.peak == 4
+
+    @pytest.mark.asyncio
+    async def test_remove_stops_refreshes(self):
+        """Test that a removed entry is not refreshed again."""
+        scheduler = self.make_scheduler(refresh_ahead=0.5)
+        material = Material(lifetime=0.02)
+
+        scheduler.add("tenant", material.refresh)
+        await wait_for(lambda: len(material.calls) == 1)
+        assert scheduler.remove("tenant") is True
+        await asyncio.sleep(0.05)
+        await scheduler.aclose()
+
+        assert len(material.calls) == 1
+        assert "tenant" not in scheduler
+
+    @pytest.mark.asyncio
+    async def test_one_task_for_many_entries(self):
+        """Test that thousands of idle entries share the driver task."""
+        scheduler = self.make_scheduler()
+        material = Material()
+        tasks_before = len(asyncio.all_tasks())
+
+        for tenant in range(5000):
+            scheduler.add(tenant, material.refresh, expires_at=time.time() + 3600)
+        await asyncio.sleep(0.01)
+        tasks_during = len(asyncio.all_tasks())
+        await scheduler.aclose()
+
+        assert tasks_during == tasks_before + 1
+        assert len(scheduler) == 0
+
+    @pytest.mark.asyncio
+    async def test_watch_client(self):
+        """Test that a watched client serves sessions from refreshed ICE servers."""
+        api = FakeOrgaAPI(ice_ttl=300)
+        config = OrgaAIConfig(api_key="key", user_email="test@example.com")
+        scheduler = self.make_scheduler()
+        async with OrgaAI(config) as client:
+            client._client = httpx.AsyncClient(transport=api.mock_transport())
+            scheduler.watch(client)
+            await wait_for(lambda: scheduler.expires_at(client) is not None)
+            await client.get_session_config()
+            await scheduler.aclose()
+
+        assert scheduler.stats()["refreshes"] == 1
+        assert api.requests["/v1/realtime/ice-config"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_draining_client_removed(self):
+        """Test that a client which starts draining stops being refreshed."""
+        api = FakeOrgaAPI(ice_ttl=300)
+        config = OrgaAIConfig(api_key="key", user_email="test@example.com")
+        scheduler = self.make_scheduler()
+        client = OrgaAI(config)
+        client._client = httpx.AsyncClient(transport=api.mock_transport())
+        await client.drain()
+        scheduler.watch(client)
+        await wait_for(lambda: client not in scheduler)
+        await scheduler.aclose()
+        
+        assert scheduler.stats()["failures"] == 0
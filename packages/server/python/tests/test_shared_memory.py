@@ -0,0 +1,137 @@
+"""Tests for the cross-process shared-memory ICE cache."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from orga_ai.cache import credentials_key
+from orga_ai.shared_memory import _SEQ, _SEQ_OFFSET, SharedIceCache
+from orga_ai.types import IceServer
+
+from tests.helpers import FakeClock
+
+
+KEY = credentials_key("key", "dev@example.com", "https://api.orga-ai.com")
+
+
+class TestSharedIceCache:
+    """Test cases for the SharedIceCache class."""
+    
+    @pytest.fixture
+    def clock(self):
+        """Create a controllable wall clock."""
+        return FakeClock(1_000_000.0)
+    
+    @pytest.fixture
+    def path(self, tmp_path):
+        """Path of the shared cache file."""
+        return str(tmp_path / "ice.shm")
+    
+    @pytest.fixture
+    def servers(self):
+        """Create sample ICE servers."""
+        return [
+            IceServer(urls="stun:stun.example.com:3478"),
+            IceServer(urls=["turn:turn.example.com:3478"], username="user", credential="pass"),
+        ]
+    
+    def test_empty_file_is_a_miss(self, path):
+        """Test that a freshly created file has no entry."""
+        cache = SharedIceCache(path, KEY)
+        
+        assert cache.read() is None
+        assert os.stat(path).st_mode & 0o777 == 0o600
+    
+    def test_visible_to_other_mappings(self, path, servers, clock):
+        """Test that one worker's write is read by another mapping."""
+        writer = SharedIceCache(path, KEY, clock=clock)
+        reader = SharedIceCache(path, KEY, clock=clock)
+        writer.write(servers, ttl=60)
+        
+        entry = reader.read()
+        
+        assert entry.ice_servers == servers
+        assert entry.refresh_due is False
+    
+    def test_decodes_only_on_change(self, path, servers, clock):
+        """Test that unchanged payloads are not decoded again."""
+        writer = SharedIceCache(path, KEY, clock=clock)
+        reader = SharedIceCache(path, KEY, clock=clock)
+        writer.write(servers, ttl=60)
+        
+        reader.read()
+        reader.read()
+        assert reader.stats()["decodes"] == 1
+        
+        writer.write(servers[:1], ttl=60)
+        assert reader.read().ice_servers == servers[:1]
+        assert reader.stats()["decodes"] == 2
+    
+    def test_refresh_due_and_expiry(self, path, servers, clock):
+        """Test the soft refresh point and hard expiry."""
+        cache = SharedIceCache(path, KEY, clock=clock)
+        cache.write(servers, ttl=10, refresh_ahead=0.5)
+        
+        clock.now += 5
+        assert cache.read().refresh_due is True
+        clock.now += 5
+        assert cache.read() is None
+    
+    def test_other_credentials_are_a_miss(self, path, servers):
+        """Test that entries written for other credentials are not served."""
+        SharedIceCache(path, KEY).write(servers, ttl=60)
+        other = SharedIceCache(path, credentials_key("other", "dev@example.com", "https://api.orga-ai.com"))
+        
+        assert other.read() is None
+    
+    def test_single_refresher_is_elected(self, path, servers, clock):
+        """Test that only one worker wins the refresh claim until it lapses."""
+        first = SharedIceCache(path, KEY, clock=clock)
+        second = SharedIceCache(path, KEY, clock=clock)
+        first.write(servers, ttl=60)
+        
+        assert first.try_claim_refresh(lease=5) is True
+        assert second.try_claim_refresh(lease=5) is False
+        clock.now += 5
+        assert second.try_claim_refresh(lease=5) is True
+        
+        second.write(servers, ttl=60)
+        assert first.try_claim_refresh(lease=5) is True
+    
+    def test_reader_skips_write_in_progress(self, path, servers):
+        """Test that a reader never returns data while the sequence is odd."""
+        cache = SharedIceCache(path, KEY)
+        cache.write(servers, ttl=60)
+        seq = _SEQ.unpack_from(cache._map, _SEQ_OFFSET)[0]
+        _SEQ.pack_into(cache._map, _SEQ_OFFSET, seq + 1)
+        
+        assert cache.read() is None
+        assert cache.stats()["retries"] > 0
+        
+        # The next writer recovers from the interrupted write
+        cache.write(servers, ttl=60)
+        assert cache.read().ice_servers == servers
+    
+    def test_payload_over_capacity(self, path):
+        """Test that oversized payloads are rejected rather than truncated."""
+        cache = SharedIceCache(path, KEY, capacity=32)
+        
+        assert cache.write([IceServer(urls="stun:" + "x" * 64)], ttl=60) is False
+        assert cache.read() is None
+    
+    def test_cross_process(self, path, servers):
+        """Test that a write from another process is visible here."""
+        code = (
+            "import sys\n"
+            "from orga_ai.shared_memory import SharedIceCache\n"
+            "from orga_ai.types import IceServer\n"
+            "SharedIceCache(sys.argv[1], sys.argv[2]).write([IceServer(urls='stun:child')], ttl=60)\n"
+        )
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        cache = SharedIceCache(path, KEY)
+        
+        subprocess.run([sys.executable, "-c", code, path, KEY], env=env, check=True)
+        
+        assert cache.read().ice_servers == [IceServer(urls="stun:child")]
@@ -0,0 +1,90 @@
+"""Tests for the on-disk ICE config snapshot."""
+
+import json
+import os
+import time
+
+import pytest
+
+from orga_ai.snapshot import IceSnapshot
+from orga_ai.types import IceServer
+
+
+class TestIceSnapshot:
+    """Test cases for the IceSnapshot class."""
+    
+    @pytest.fixture
+    def snapshot(self, tmp_path):
+        """Create a snapshot in a temporary directory."""
+        return IceSnapshot(str(tmp_path / "ice.json"), max_age=60)
+    
+    @pytest.fixture
+    def servers(self):
+        """Create sample ICE servers."""
+        return [
+            IceServer(urls="stun:stun.example.com:3478"),
+            IceServer(urls=["turn:turn.example.com:3478"], username="user", credential="pass"),
+        ]
+    
+    def test_round_trip(self, snapshot, servers):
+        """Test that saved servers load back unchanged."""
+        assert snapshot.save("key", servers)
+        
+        assert snapshot.load("key") == servers
+    
+    def test_file_is_private(self, snapshot, servers):
+        """Test that the snapshot is only readable by its owner."""
+        snapshot.save("key", servers)
+        
+        assert os.stat(snapshot.path).st_mode & 0o777 == 0o600
+    
+    def test_other_credentials_are_ignored(self, snapshot, servers):
+        """Test that a snapshot is only served to the credentials that saved it."""
+        snapshot.save("key", servers)
+        
+        assert snapshot.load("other") is None
+    
+    def test_stale_snapshot_is_ignored(self, snapshot, servers):
+        """Test that snapshots older than max_age are not served."""
+        snapshot.save("key", servers, saved_at=time.time() - 61)
+        
+        assert snapshot.load("key") is None
+    
+    def test_missing_or_corrupt_file(self, snapshot):
+        """Test that unreadable snapshots are treated as absent."""
+        assert snapshot.load("key") is None
+        
+        with open(snapshot.path, "w") as file:
+            file.write("{not json")
+        assert snapshot.load("key") is None
+        
+        with open(snapshot.path, "w") as file:
+            json.dump({"key": "key", "saved_at": time.time(), "ice_servers": [{}]}, file)
+        assert snapshot.load("key") is None
+    
+    def test_unwritable_location(self, tmp_path, servers):
+        """Test that a failed write is reported rather than raised."""
+        snapshot = IceSnapshot(str(tmp_path / "missing" / "ice.json"), max_age=60)
+        
+        assert snapshot.save("key", servers) is False
+    
+    def test_claim_save_until_stale(self, snapshot, servers):
+        """Test that rewrites are claimed once, then again at half of max_age."""
+        assert snapshot.claim_save()
+        assert not snapshot.claim_save()
+        
+        snapshot.save("key", servers, saved_at=time.time() - 31)
+        snapshot.load("key")
+        assert snapshot.claim_save()
+    
+    def test_failed_save_is_retried(self, tmp_path, servers):
+        """Test that a failed write releases the claim instead of counting as saved."""
+        snapshot = IceSnapshot(str(tmp_path / "missing" / "ice.json"), max_age=60)
+        assert snapshot.claim_save()
+        assert snapshot.save("key", servers) is False
+        
+        assert snapshot.saved_at is None
+        assert snapshot.claim_save()
+        (tmp_path / "missing").mkdir()
+        assert snapshot.save("key", servers) is True
+        assert not snapshot.claim_save()
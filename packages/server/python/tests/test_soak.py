@@ -0,0 +1,55 @@
+"""Short runs of the soak harness in benchmarks/soak.py.
+
+The full harness runs for millions of iterations; these tests run every
+scenario briefly in a fresh interpreter so the harness itself keeps working
+and gross leaks (a socket or task per client) fail the suite.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+SOAK_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "soak.py"
+)
+
+
+def run_soak(*args):
+    """Run the soak harness and return its exit status and JSON report."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run(
+        [sys.executable, SOAK_SCRIPT, "--json", *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    return result.returncode, json.loads(result.stdout)
+
+
+class TestSoakHarness:
+    """Test cases for the soak harness."""
+    
+    def test_scenarios_do_not_leak(self):
+        """Test that no scenario leaks file descriptors, tasks or threads."""
+        status, report = run_soak(
+            "--iterations", "40", "--samples", "2", "--warmup", "10",
+            # Too few iterations for memory growth to be meaningful
+            "--max-rss-growth", "65536", "--max-heap-growth", "65536",
+            "--max-fd-growth", "0",
+        )
+        
+        failures = {r["scenario"]: r["failures"] for r in report["results"] if not r["passed"]}
+        assert status == 0, failures
+        assert len(report["results"]) == 5
+    
+    def test_growth_past_threshold_fails(self):
+        """Test that exceeding a threshold fails the run."""
+        status, report = run_soak(
+            "--scenario", "construct", "--iterations", "10", "--samples", "1",
+            "--max-heap-growth", "-1",
+        )
+        
+        assert status == 1
+        assert report["results"][0]["failures"][0].startswith("heap_kb grew")
@@ -0,0 +1,247 @@
+"""Tests for the pluggable HTTP transports.
+
+These tests verify how the client picks its transport, and that the httpx
+and aiohttp transports behave the same against the local stand-in API:
+sessions, error mapping, failover, timeouts, DNS caching and shutdown.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import aiohttp
+import httpx
+import pytest
+
+from orga_ai import OrgaAI
+from orga_ai.errors import OrgaAIAuthenticationError, OrgaAIError, OrgaAIServerError
+from orga_ai.testing import FakeOrgaAPI
+from orga_ai.transports import (
+    AiohttpTransport,
+    HttpxTransport,
+    Transport,
+    detect_transport,
+)
+
+from tests.helpers import make_config, unused_url
+
+TRANSPORTS = ["httpx", "aiohttp"]
+
+
+class StubResolver:
+    """Resolver mapping every host to the loopback address."""
+
+    def __init__(self):
+        self.queries = 0
+
+    async def resolve(self, host, port):
+        self.queries += 1
+        return ["127.0.0.1"], 60
+
+
+class TestTransportSelection:
+    """Test cases for choosing a transport from the configuration."""
+
+    def test_default_is_httpx(self, monkeypatch):
+        """Test that httpx is used when the process has loaded it."""
+        monkeypatch.setitem(sys.modules, "httpx", httpx)
+        client = OrgaAI(make_config(None))
+
+        assert isinstance(client.transport, HttpxTransport)
+
+    def test_named_transport(self):
+        """Test that the config can name the transport."""
+        client = OrgaAI(make_config(None, transport="aiohttp"))
+
+        assert isinstance(client.transport, AiohttpTransport)
+
+    def test_session_selects_aiohttp(self):
+        """Test that passing an aiohttp session selects the aiohttp transport."""
+        session = object()
+        client = OrgaAI(make_config(None, aiohttp_session=session))
+
+        assert isinstance(client.transport, AiohttpTransport)
+        assert client.transport.session is session
+
+    def test_custom_transport(self):
+        """Test that a Transport instance is used as given."""
+        transport = HttpxTransport(timeout=1.0)
+        client = OrgaAI(make_config(None, transport=transport))
+
+        assert client.transport is transport
+
+    @pytest.mark.parametrize("overrides, message", [
+        ({"transport": "requests"}, "Unknown transport"),
+        ({"transport": "aiohttp", "http2": True}, "http2 is not supported"),
+        ({"transport": "httpx", "aiohttp_session": object()}, "requires the aiohttp transport"),
+    ])
+    def test_invalid_combinations(self, overrides, message):
+        """Test that unusable transport settings are rejected up front."""
+        with pytest.raises(OrgaAIError, match=message):
+            OrgaAI(make_config(None, **overrides))
+
+    @pytest.mark.parametrize("loaded, expected", [
+        ({"httpx", "aiohttp"}, "httpx"),
+        ({"aiohttp"}, "aiohttp"),
+        (set(), "httpx"),
+    ])
+    def test_detect_transport(self, monkeypatch, loaded, expected):
+        """Test that aiohttp is detected only in processes using it without httpx."""
+        for name in ("httpx", "aiohttp"):
+            if name in loaded:
+                monkeypatch.setitem(sys.modules, name, sys.modules.get(name) or object())
+            else:
+                monkeypatch.delitem(sys.modules, name, raising=False)
+
+        assert detect_transport() == expected
+
+    def test_aiohttp_does_not_import_httpx(self):
+        """Test that an aiohttp application never loads httpx."""
+        code = (
+            "import asyncio, json, sys\n"
+            "import aiohttp\n"
+            "from orga_ai import OrgaAI, OrgaAIConfig\n"
+            "from orga_ai.testing import FakeOrgaAPI\n"
+            "async def main():\n"
+            "    async with FakeOrgaAPI() as api:\n"
+            "        config = OrgaAIConfig(api_key='key', user_email='a@example.com', base_url=api.url)\n"
+            "        async with OrgaAI(config) as client:\n"
+            "            await client.get_session_config()\n"
+            "            return client.transport.name\n"
+            "name = asyncio.run(main())\n"
+            "print(json.dumps([name, 'httpx' in sys.modules]))\n"
+        )
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        result = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+        )
+
+        assert json.loads(result.stdout) == ["aiohttp", False]
+
+
+class TestTransportParity:
+    """Test cases run against both transports."""
+
+    @pytest.fixture(params=TRANSPORTS)
+    def transport(self, request):
+        """Name of the transport under test."""
+        return request.param
+
+    @pytest.mark.asyncio
+    async def test_session_config(self, transport):
+        """Test that a session is minted through the transport."""
+        async with FakeOrgaAPI(token_ttl=60) as api:
+            async with OrgaAI(make_config(api.url, transport=transport)) as client:
+                session = await client.get_session_config()
+                open_pools = client.stats()["transports"]
+            closed_pools = client.stats()["transports"]
+
+        assert session.ephemeral_token == "fake-ephemeral-1"
+        assert session.expires_at is not None
+        assert session.ice_servers
+        assert (open_pools, closed_pools) == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_batched_tokens(self, transport):
+        """Test that batched token requests work over the transport."""
+        async with FakeOrgaAPI() as api:
+            config = make_config(api.url, transport=transport, token_batch_window=20)
+            async with OrgaAI(config) as client:
+                sessions = await asyncio.gather(*(client.get_session_config() for _ in range(5)))
+
+        assert len({session.ephemeral_token for session in sessions}) == 5
+        assert api.requests["/v1/realtime/client-secrets"] == 1
+
+    @pytest.mark.asyncio
+    async def test_authentication_error(self, transport):
+        """Test that a 401 is reported the same way."""
+        async with FakeOrgaAPI(api_key="other") as api:
+            async with OrgaAI(make_config(api.url, transport=transport)) as client:
+                with pytest.raises(OrgaAIAuthenticationError):
+                    await client.get_session_config()
+
+    @pytest.mark.asyncio
+    async def test_http_error(self, transport):
+        """Test that an error status carries the status and reason."""
+        async with FakeOrgaAPI() as api:
+            async with OrgaAI(make_config(api.url, transport=transport)) as client:
+                templates = client._request_templates()
+                response = await client._send("GET", {api.url: f"{api.url}/missing"}, templates.token_headers)
+
+        assert response.status_code == 404
+        assert response.reason_phrase == "Not Found"
+        assert response.is_success is False
+
+    @pytest.mark.asyncio
+    async def test_fails_over_on_connection_refused(self, transport):
+        """Test that a refused connection moves on to the next endpoint."""
+        down = unused_url()
+        async with FakeOrgaAPI() as api:
+            async with OrgaAI(make_config([down, api.url], transport=transport)) as client:
+                await client.get_session_config()
+                endpoints = client.stats()["endpoints"]
+
+        assert endpoints[down]["healthy"] is False
+        assert endpoints[api.url]["healthy"] is True
+
+    @pytest.mark.asyncio
+    async def test_network_error(self, transport):
+        """Test that an unreachable API surfaces as a network error."""
+        async with OrgaAI(make_config(unused_url(), transport=transport)) as client:
+            with pytest.raises(OrgaAIServerError, match="Network error"):
+                await client.get_session_config()
+
+    @pytest.mark.asyncio
+    async def test_timeout(self, transport):
+        """Test that a slow API surfaces as a network error."""
+        async with FakeOrgaAPI(latency=0.5) as api:
+            async with OrgaAI(make_config(api.url, transport=transport, timeout=50)) as client:
+                with pytest.raises(OrgaAIServerError, match="Network error"):
+                    await client.get_session_config()
+
+    @pytest.mark.asyncio
+    async def test_dns_cache(self, transport):
+        """Test that the DNS cache resolves the API host for either transport."""
+        stub = StubResolver()
+        async with FakeOrgaAPI() as api:
+            config = make_config(
+                f"http://api.orga.test:{api.port}", transport=transport, dns_resolver=stub
+            )
+            async with OrgaAI(config) as client:
+                for _ in range(3):
+                    await client.get_session_config()
+
+        assert stub.queries == 1
+
+
+class TestSharedAiohttpSession:
+    """Test cases for sending requests through the application's session."""
+
+    @pytest.mark.asyncio
+    async def test_shared_session_used_and_left_open(self):
+        """Test that the SDK uses the given session and does not close it."""
+        requests = []
+
+        async def on_request_start(session, context, params):
+            requests.append(str(params.url))
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_request_start)
+        async with FakeOrgaAPI() as api:
+            async with aiohttp.ClientSession(trace_configs=[trace]) as session:
+                async with OrgaAI(make_config(api.url, aiohttp_session=session)) as client:
+                    await client.get_session_config()
+                assert not session.closed
+
+        assert len(requests) == 2
+
+
+class TestTransportInterface:
+    """Test cases for the Transport base class."""
+
+    def test_abstract(self):
+        """Test that create_client() must be implemented."""
+        with pytest.raises(TypeError):
+            Transport()
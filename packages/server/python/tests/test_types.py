@@ -3,9 +3,11 @@
 These tests verify that dataclasses are properly defined and behave as expected.
 """
 
+import pickle
+
 import pytest
 
-from orga_ai.types import OrgaAIConfig, SessionConfig, IceServer
+from orga_ai.types import OrgaAIConfig, SessionConfig, IceServer, EphemeralToken
 
 
 class TestOrgaAITypes:
@@ -88,6 +90,45 @@ class TestOrgaAITypes:
         assert config.ephemeral_token == "test_token_123"
         assert config.ice_servers == ice_servers
         assert len(config.ice_servers) == 2
+        assert config.expires_at is None
+        assert config.valid_until is None
+    
+    def test_session_config_expiry(self):
+        """Test that validity ends with the first of the token and ICE credentials."""
+        config = SessionConfig(
+            ephemeral_token="token",
+            ice_servers=[
+                IceServer(urls="stun:a"),
+                IceServer(urls="turn:b", username="u", credential="c", expires_at=200.0),
+                IceServer(urls="turn:c", username="u", credential="c", expires_at=150.0),
+            ],
+            expires_at=300.0,
+        )
+        
+        assert config.ice_expires_at == 150.0
+        assert config.valid_until == 150.0
+        config.expires_at = 100.0
+        assert config.valid_until == 100.0
+    
+    def test_ice_server_dict_round_trip(self):
+        """Test that expires_at is only serialized when known."""
+        server = IceServer(urls="turn:a", username="u", credential="c")
+        assert "expires_at" not in server.to_dict()
+        
+        server.expires_at = 1700000000.0
+        assert server.to_dict()["expires_at"] == 1700000000.0
+        assert IceServer.from_dict(server.to_dict()) == server
+    
+    def test_ephemeral_token(self):
+        """Test that an ephemeral token is its string and keeps its expiry."""
+        token = EphemeralToken("abc", expires_at=1700000000.0)
+        
+        assert token == "abc"
+        assert f"Bearer {token}" == "Bearer abc"
+        assert token.expires_at == 1700000000.0
+        restored = pickle.loads(pickle.dumps(token))
+        assert restored == "abc"
+        assert restored.expires_at == 1700000000.0
     
     def test_dataclass_equality(self):
         """Test that dataclasses support equality comparison."""